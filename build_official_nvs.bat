@@ -4,7 +4,7 @@ setlocal enabledelayedexpansion
 
 echo ===============================================
 echo JingleMiner Official NVS Build Script
-echo Using ESP-IDF nvs_partition_gen.py tool
+echo Using scripts\esp32_nvs_generator.py
 echo ===============================================
 
 REM Check ESP-IDF environment
@@ -19,14 +19,8 @@ if "%IDF_PATH%"=="" (
 echo IDF_PATH: %IDF_PATH%
 echo.
 
-REM Check ESP-IDF NVS tool
-set "NVS_TOOL=%IDF_PATH%\components\nvs_flash\nvs_partition_generator\nvs_partition_gen.py"
-if not exist "%NVS_TOOL%" (
-    echo Error: ESP-IDF NVS tool not found.
-    echo Path: %NVS_TOOL%
-    pause
-    exit /b 1
-)
+REM NVS generator, the partition size is read from partitions.csv
+set "NVS_TOOL=scripts\esp32_nvs_generator.py"
 
 REM Ensure required directories exist
 if not exist release mkdir release
@@ -60,7 +54,7 @@ if not "!cmd_err!"=="0" (
 )
 
 echo [3/4] Generating official NVS partition (1.2T)...
-python "%NVS_TOOL%" generate config\JingleMiner1.2T.cvs build\nvs_1.2T_official.bin 0x6000
+python "%NVS_TOOL%" generate config\JingleMiner1.2T.cvs build\nvs_1.2T_official.bin
 set "cmd_err=!errorlevel!"
 if not "!cmd_err!"=="0" (
     echo Error: NVS partition generation failed (1.2T).
@@ -116,7 +110,7 @@ if not "!cmd_err!"=="0" (
 )
 
 echo [3/4] Generating official NVS partition (4.8T)...
-python "%NVS_TOOL%" generate config\JingleMiner4.8T.cvs build\nvs_4.8T_official.bin 0x6000
+python "%NVS_TOOL%" generate config\JingleMiner4.8T.cvs build\nvs_4.8T_official.bin
 set "cmd_err=!errorlevel!"
 if not "!cmd_err!"=="0" (
     echo Error: NVS partition generation failed (4.8T).
@@ -168,7 +162,7 @@ if "%files_ok%"=="1" (
     echo   release\JingleMiner4.8T_Official.bin
     echo.
     echo Additional notes:
-    echo   Generated with ESP-IDF nvs_partition_gen.py
+    echo   Generated and verified with scripts\esp32_nvs_generator.py
     echo   Compatible with ESP32 NVS format
     echo   Matches esp_nvs library requirements
     echo   Ensures configuration is readable
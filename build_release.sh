@@ -0,0 +1,16 @@
+#!/bin/bash
+# Build the 1.2T and 4.8T firmware into separate build directories and
+# merge both release bundles (firmware + NVS config) in one go.
+set -e
+
+rpath="$( dirname "$( readlink -f "$0" )" )"
+cd "$rpath"
+
+build() {
+    BOARD="$1" idf.py -B "build-$2" set-target esp32s3 build
+}
+
+build NERDAXEGAMMA 1.2T
+build NERDQAXEPLUS2 4.8T
+
+python3 scripts/merge_firmware.py 1.2T=build-1.2T 4.8T=build-4.8T
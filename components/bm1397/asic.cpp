@@ -31,6 +31,8 @@ typedef struct __attribute__((__packed__))
     uint8_t version[4];
 } BM1368_job;
 
+static_assert(sizeof(BM1368_job) + 6 == ASIC_JOB_PACKET_SIZE, "job packet size mismatch");
+
 const static char* TAG = "asic";
 
 Asic::Asic() {
@@ -42,13 +44,11 @@ uint16_t Asic::reverseUint16(uint16_t num)
     return (num >> 8) | (num << 8);
 }
 
-void Asic::send(uint8_t header, uint8_t *data, uint8_t data_len, bool debug)
+uint8_t Asic::buildPacket(uint8_t header, const uint8_t *data, uint8_t data_len, uint8_t *buf)
 {
     packet_type_t packet_type = (header & TYPE_JOB) ? JOB_PACKET : CMD_PACKET;
     uint8_t total_length = (packet_type == JOB_PACKET) ? (data_len + 6) : (data_len + 5);
 
-    unsigned char buf[total_length];
-
     // add the preamble
     buf[0] = 0x55;
     buf[1] = 0xAA;
@@ -71,6 +71,15 @@ void Asic::send(uint8_t header, uint8_t *data, uint8_t data_len, bool debug)
         buf[4 + data_len] = crc5(buf + 2, data_len + 2);
     }
 
+    return total_length;
+}
+
+void Asic::send(uint8_t header, uint8_t *data, uint8_t data_len, bool debug)
+{
+    unsigned char buf[data_len + 6];
+
+    uint8_t total_length = buildPacket(header, data, data_len, buf);
+
     // send serial data
     SERIAL_send(buf, total_length, debug);
 }
@@ -255,7 +264,7 @@ bool Asic::setAsicFrequency(float target_freq) {
 }
 
 
-uint8_t Asic::sendWork(uint32_t job_id, bm_job *next_bm_job)
+uint8_t Asic::prepareWork(uint32_t job_id, const bm_job *next_bm_job, uint8_t packet[ASIC_JOB_PACKET_SIZE])
 {
     BM1368_job job;
 
@@ -269,12 +278,17 @@ uint8_t Asic::sendWork(uint32_t job_id, bm_job *next_bm_job)
     memcpy(job.prev_block_hash, next_bm_job->prev_block_hash_be, 32);
     memcpy(&job.version, &next_bm_job->version, 4);
 
-    send((TYPE_JOB | GROUP_SINGLE | CMD_WRITE), (uint8_t*) &job, sizeof(BM1368_job), ASIC_DEBUG_WORK);
+    buildPacket((TYPE_JOB | GROUP_SINGLE | CMD_WRITE), (uint8_t*) &job, sizeof(BM1368_job), packet);
 
     // we return it because different asics calculate it differently
     return job.job_id;
 }
 
+void Asic::sendPacket(const uint8_t *packet, uint8_t len)
+{
+    SERIAL_send((uint8_t*) packet, len, ASIC_DEBUG_WORK);
+}
+
 bool Asic::receiveWork(asic_result_t *result)
 {
     // wait for a response, wait time is pretty arbitrary
@@ -17,6 +17,9 @@
 
 #define CMD_JOB 0x01
 
+// serialized job: preamble, header, length, 82 byte job, crc16
+#define ASIC_JOB_PACKET_SIZE 88
+
 #define CMD_SETADDRESS 0x00
 #define CMD_WRITE 0x01
 #define CMD_READ 0x02
@@ -76,6 +79,7 @@ class Asic {
 protected:
     float m_current_frequency;
 
+    uint8_t buildPacket(uint8_t header, const uint8_t *data, uint8_t data_len, uint8_t *buf);
     void send(uint8_t header, uint8_t *data, uint8_t data_len, bool debug);
     void send2(uint8_t header, uint8_t b0, uint8_t b1);
     void send6(uint8_t header, uint8_t b0, uint8_t b1, uint8_t b2, uint8_t b3, uint8_t b4, uint8_t b5);
@@ -96,7 +100,9 @@ protected:
 public:
     Asic();
     virtual const char* getName() = 0;
-    uint8_t sendWork(uint32_t job_id, bm_job *next_bm_job);
+    // serialize a job without sending it, returns the asic job id
+    uint8_t prepareWork(uint32_t job_id, const bm_job *next_bm_job, uint8_t packet[ASIC_JOB_PACKET_SIZE]);
+    void sendPacket(const uint8_t *packet, uint8_t len);
     bool processWork(task_result *result);
     void setJobDifficultyMask(int difficulty);
     bool setAsicFrequency(float frequency);
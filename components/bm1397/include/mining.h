@@ -1,7 +1,10 @@
 #pragma once
 
+#include "mbedtls/sha256.h"
 #include "stratum_api.h"
 
+#define MAX_EXTRANONCE_2_LEN 32
+
 typedef struct
 {
     uint32_t version;
@@ -21,18 +24,40 @@ typedef struct
     // is limited to [ASIC_MIN_DIFFICULTY...ASIC_MAX_DIFFICULTY]
     uint32_t asic_diff;
 
-    char *jobid;
-    char *extranonce2;
+    // inline so jobs can be copied around without heap allocations
+    char jobid[MAX_JOB_ID_LEN];
+    char extranonce2[MAX_EXTRANONCE_2_LEN * 2 + 1];
 } bm_job;
 
-void free_bm_job(bm_job *job);
+// Coinbase of a mining.notify prepared once per job and extranonce 1:
+// the SHA-256 state after coinbase_1 + extranonce_1, coinbase_2 and the
+// merkle branches in binary. A new extranonce 2 then only hashes the
+// bytes after the last complete 64 byte block of the prefix.
+typedef struct
+{
+    mbedtls_sha256_context prefix;
+    uint8_t *coinbase_2;
+    size_t coinbase_2_len;
+    int extranonce_2_len;
+    uint8_t merkle_branches[MAX_MERKLE_BRANCHES][HASH_SIZE];
+    size_t n_merkle_branches;
+} coinbase_midstate;
 
 char *construct_coinbase_tx(const char *coinbase_1, const char *coinbase_2, const char *extranonce, const char *extranonce_2);
 
+bool coinbase_midstate_init(coinbase_midstate *cb, const mining_notify *job, const char *extranonce_1, int extranonce_2_len);
+
+void coinbase_midstate_free(coinbase_midstate *cb);
+
+// big endian extranonce 2 of extranonce_2_len bytes, the way it is sent as hex to the pool
+void extranonce_2_to_bin(uint32_t extranonce_2, uint8_t *output, int extranonce_2_len);
+
+void calculate_merkle_root_midstate(const coinbase_midstate *cb, const uint8_t *extranonce_2, uint8_t merkle_root[32]);
+
 void calculate_merkle_root_hash(const char *coinbase_tx, const uint8_t merkle_branches[][32], const int num_merkle_branches,
-                                char merkle_root_hash[65]);
+                                uint8_t merkle_root[32]);
 
-void construct_bm_job(mining_notify *params, const char *merkle_root, const uint32_t version_mask, bm_job *new_job);
+void construct_bm_job(mining_notify *params, const uint8_t merkle_root[32], const uint32_t version_mask, bm_job *new_job);
 
 double test_nonce_value(const bm_job *job, const uint32_t nonce, const uint32_t rolled_version);
 
@@ -26,7 +26,7 @@ void double_sha256_bin(const uint8_t *data, const size_t data_len, uint8_t hash[
 void single_sha256_bin(const uint8_t *data, const size_t data_len, uint8_t *dest);
 
 void swap_endian_words(const char *hex, uint8_t *output);
-void swap_endian_words_bin(uint8_t *data, uint8_t *output, size_t data_length);
+void swap_endian_words_bin(const uint8_t *data, uint8_t *output, size_t data_length);
 
 void reverse_bytes(uint8_t *data, size_t len);
 
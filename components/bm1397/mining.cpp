@@ -3,38 +3,111 @@
 #include "utils.h"
 #include <limits.h>
 #include <stdio.h>
+#include <stdlib.h>
 #include <string.h>
 
-void free_bm_job(bm_job *job)
+static void walk_merkle_branches(uint8_t root[32], const uint8_t merkle_branches[][32], const int num_merkle_branches)
 {
-    free(job->jobid);
-    free(job->extranonce2);
-    free(job);
+    uint8_t both_merkles[64];
+
+    memcpy(both_merkles, root, 32);
+    for (int i = 0; i < num_merkle_branches; i++) {
+        memcpy(both_merkles + 32, merkle_branches[i], 32);
+        double_sha256_bin(both_merkles, 64, both_merkles);
+    }
+    memcpy(root, both_merkles, 32);
 }
 
-void calculate_merkle_root_hash(const char *coinbase_tx, const uint8_t merkle_branches[][32], const int num_merkle_branches, char merkle_root_hash[65])
+static size_t hex2bin_alloc(const char *hex, uint8_t **bin)
 {
-    size_t coinbase_tx_bin_len = strlen(coinbase_tx) / 2;
-    uint8_t coinbase_tx_bin[coinbase_tx_bin_len];
+    size_t len = strlen(hex) / 2;
+    *bin = (uint8_t *) malloc(len ? len : 1);
+    if (!*bin) {
+        return 0;
+    }
+    return hex2bin(hex, *bin, len);
+}
 
-    hex2bin(coinbase_tx, coinbase_tx_bin, coinbase_tx_bin_len);
+bool coinbase_midstate_init(coinbase_midstate *cb, const mining_notify *job, const char *extranonce_1, int extranonce_2_len)
+{
+    if (extranonce_2_len < 0 || extranonce_2_len > MAX_EXTRANONCE_2_LEN || job->n_merkle_branches > MAX_MERKLE_BRANCHES) {
+        return false;
+    }
 
-    uint8_t both_merkles[64];
-    uint8_t new_root[32];
-    double_sha256_bin(coinbase_tx_bin, coinbase_tx_bin_len, new_root);
+    uint8_t *coinbase_1;
+    uint8_t *extranonce_1_bin;
+    size_t coinbase_1_len = hex2bin_alloc(job->coinbase_1, &coinbase_1);
+    size_t extranonce_1_len = hex2bin_alloc(extranonce_1, &extranonce_1_bin);
+    size_t coinbase_2_len = hex2bin_alloc(job->coinbase_2, &cb->coinbase_2);
+
+    if (!coinbase_1 || !extranonce_1_bin || !cb->coinbase_2) {
+        free(coinbase_1);
+        free(extranonce_1_bin);
+        free(cb->coinbase_2);
+        cb->coinbase_2 = NULL;
+        return false;
+    }
 
-    memcpy(both_merkles, new_root, 32);
-    for (int i = 0; i < num_merkle_branches; i++) {
-        memcpy(both_merkles + 32, merkle_branches[i], 32);
-        double_sha256_bin(both_merkles, 64, new_root);
-        memcpy(both_merkles, new_root, 32);
+    // hashes the complete blocks, the context keeps the remaining bytes
+    mbedtls_sha256_init(&cb->prefix);
+    mbedtls_sha256_starts(&cb->prefix, 0);
+    mbedtls_sha256_update(&cb->prefix, coinbase_1, coinbase_1_len);
+    mbedtls_sha256_update(&cb->prefix, extranonce_1_bin, extranonce_1_len);
+    free(coinbase_1);
+    free(extranonce_1_bin);
+
+    cb->coinbase_2_len = coinbase_2_len;
+    cb->extranonce_2_len = extranonce_2_len;
+    memcpy(cb->merkle_branches, job->_merkle_branches, job->n_merkle_branches * HASH_SIZE);
+    cb->n_merkle_branches = job->n_merkle_branches;
+    return true;
+}
+
+void coinbase_midstate_free(coinbase_midstate *cb)
+{
+    if (cb->coinbase_2) {
+        mbedtls_sha256_free(&cb->prefix);
+        free(cb->coinbase_2);
+        cb->coinbase_2 = NULL;
+    }
+}
+
+void extranonce_2_to_bin(uint32_t extranonce_2, uint8_t *output, int extranonce_2_len)
+{
+    for (int i = 0; i < extranonce_2_len; i++) {
+        output[extranonce_2_len - 1 - i] = (i < 4) ? (uint8_t) (extranonce_2 >> (i * 8)) : 0;
     }
+}
+
+void calculate_merkle_root_midstate(const coinbase_midstate *cb, const uint8_t *extranonce_2, uint8_t merkle_root[32])
+{
+    mbedtls_sha256_context ctx;
+    mbedtls_sha256_init(&ctx);
+    mbedtls_sha256_clone(&ctx, &cb->prefix);
+    mbedtls_sha256_update(&ctx, extranonce_2, cb->extranonce_2_len);
+    mbedtls_sha256_update(&ctx, cb->coinbase_2, cb->coinbase_2_len);
+    mbedtls_sha256_finish(&ctx, merkle_root);
+    mbedtls_sha256_free(&ctx);
+
+    // second round of the coinbase double SHA-256
+    mbedtls_sha256(merkle_root, 32, merkle_root, 0);
+
+    walk_merkle_branches(merkle_root, cb->merkle_branches, cb->n_merkle_branches);
+}
+
+void calculate_merkle_root_hash(const char *coinbase_tx, const uint8_t merkle_branches[][32], const int num_merkle_branches, uint8_t merkle_root[32])
+{
+    size_t coinbase_tx_bin_len = strlen(coinbase_tx) / 2;
+    uint8_t coinbase_tx_bin[coinbase_tx_bin_len];
+
+    hex2bin(coinbase_tx, coinbase_tx_bin, coinbase_tx_bin_len);
 
-    bin2hex(both_merkles, 32, merkle_root_hash, 65);
+    double_sha256_bin(coinbase_tx_bin, coinbase_tx_bin_len, merkle_root);
+    walk_merkle_branches(merkle_root, merkle_branches, num_merkle_branches);
 }
 
-// take a mining_notify struct with ascii hex strings and convert it to a bm_job struct
-void construct_bm_job(mining_notify *params, const char *merkle_root, const uint32_t version_mask, bm_job *new_job)
+// take a mining_notify struct and the binary merkle root and convert it to a bm_job struct
+void construct_bm_job(mining_notify *params, const uint8_t merkle_root[32], const uint32_t version_mask, bm_job *new_job)
 {
     new_job->version = params->version;
     new_job->starting_nonce = 0;
@@ -42,10 +115,9 @@ void construct_bm_job(mining_notify *params, const char *merkle_root, const uint
     new_job->ntime = params->ntime;
     new_job->pool_diff = params->difficulty;
 
-    hex2bin(merkle_root, new_job->merkle_root, 32);
+    memcpy(new_job->merkle_root, merkle_root, 32);
 
-    // hex2bin(merkle_root, new_job.merkle_root_be, 32);
-    swap_endian_words(merkle_root, new_job->merkle_root_be);
+    swap_endian_words_bin(merkle_root, new_job->merkle_root_be, 32);
     reverse_bytes(new_job->merkle_root_be, 32);
 
     swap_endian_words_bin(params->_prev_block_hash, new_job->prev_block_hash, HASH_SIZE);
@@ -1,6 +1,7 @@
 #include "utils.h"
 
 #include <stdio.h>
+#include <stdlib.h>
 #include <string.h>
 
 #include "mbedtls/sha256.h"
@@ -168,7 +169,7 @@ void single_sha256_bin(const uint8_t *data, const size_t data_len, uint8_t *dest
     memcpy(dest, hash, 32);
 }
 
-void swap_endian_words_bin(uint8_t *data, uint8_t *output, size_t data_length)
+void swap_endian_words_bin(const uint8_t *data, uint8_t *output, size_t data_length)
 {
     // Ensure the binary data length is a multiple of 4 bytes (32 bits)
     if (data_length % 4 != 0) {
@@ -176,7 +177,7 @@ void swap_endian_words_bin(uint8_t *data, uint8_t *output, size_t data_length)
         exit(EXIT_FAILURE);
     }
 
-    uint32_t *src = (uint32_t *) data;
+    const uint32_t *src = (const uint32_t *) data;
     uint32_t *dst = (uint32_t *) output;
     size_t num_words = data_length / 4;
 
@@ -2,6 +2,8 @@
 
 #include <pthread.h>
 
+#define INFLUX_MAX_HASHRATES 8
+
 typedef struct
 {
     float temp;
@@ -26,6 +28,10 @@ typedef struct
     float pwr_vout;
     float pwr_iout;
     float pwr_pout;
+    // moving averages of the hashrate, a field hashing_speed_<name> each
+    int num_hashrates;
+    const char *hashrate_names[INFLUX_MAX_HASHRATES];
+    float hashrates[INFLUX_MAX_HASHRATES];
 } Stats;
 
 class Influx {
@@ -399,6 +399,12 @@ void Influx::write()
              m_stats.pwr_vout, m_stats.pwr_iout, m_stats.pwr_pout, m_stats.total_blocks_found,
              m_stats.duplicate_hashes);
 
+    size_t len = strlen(m_big_buffer);
+    for (int i = 0; i < m_stats.num_hashrates && len < m_big_buffer_SIZE; i++) {
+        len += snprintf(m_big_buffer + len, m_big_buffer_SIZE - len, ",hashing_speed_%s=%f", m_stats.hashrate_names[i],
+                        m_stats.hashrates[i]);
+    }
+
     snprintf(url, sizeof(url), "%s:%d/api/v2/write?bucket=%s&org=%s&precision=s", m_host, m_port, m_bucket,
              m_org);
 
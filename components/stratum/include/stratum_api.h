@@ -1,14 +1,18 @@
 #pragma once
 
+#include <atomic>
 #include <cstddef>
 #include <stdbool.h>
 #include <stdint.h>
 #include "ArduinoJson.h"
+#include "stratum_framer.h"
 
 #define MAX_MERKLE_BRANCHES 32
 #define HASH_SIZE 32
 #define COINBASE_SIZE 100
 #define COINBASE2_SIZE 128
+// longest job id of a mining.notify, including the terminator
+#define MAX_JOB_ID_LEN 64
 
 typedef enum
 {
@@ -72,9 +76,9 @@ class StratumApi {
         BIG_BUFFER_SIZE = 16384,
     };
     char *m_buffer;
+    StratumFramer m_framer; // Splits m_buffer into lines.
     char *m_requestBuffer;
-    size_t m_len;   // Current length of valid data in m_buffer.
-    int m_send_uid; // Message ID counter (each message gets a unique ID).
+    std::atomic<int> m_send_uid; // Message ID counter (each message gets a unique ID).
 
     // Helper: logs a transmit message (removing any trailing newline).
     void debugTx(const char *msg);
@@ -82,6 +86,7 @@ class StratumApi {
     // Helper functions for hex conversion.
     static uint8_t hex2val(char c);
     static size_t hex2bin(const char *hex, uint8_t *bin, size_t bin_len);
+    static size_t hex2bin(const char *hex, size_t hex_len, uint8_t *bin, size_t bin_len);
 
     // Helper: checks whether the socket is still connected.
     static int isSocketConnected(int socket);
@@ -97,8 +102,9 @@ class StratumApi {
     ~StratumApi();
 
     // Receives a JSON-RPC line (terminated by '\n') from the socket.
-    // Returns a dynamically allocated C-string that the caller must free.
-    char *receiveJsonRpcLine(int sockfd);
+    // Returns a view into the receive buffer that stays valid until the
+    // next call, len is set to the line length.
+    const char *receiveJsonRpcLine(int sockfd, size_t *len);
 
     // Sends a subscribe message.
     bool subscribe(int socket, const char *device, const char *asic);
@@ -109,9 +115,13 @@ class StratumApi {
     // Sends an authentication message.
     bool authenticate(int socket, const char *username, const char *pass);
 
-    // Submits a share.
-    bool submitShare(int socket, const char *username, const char *jobid, const char *extranonce_2, uint32_t ntime, uint32_t nonce,
-                     uint32_t version);
+    // Formats a submit line into buffer without sending it and sets id to
+    // its message ID. Returns the line length, 0 if it doesn't fit.
+    size_t formatSubmit(char *buffer, size_t size, int *id, const char *username, const char *jobid, const char *extranonce_2,
+                        uint32_t ntime, uint32_t nonce, uint32_t version);
+
+    // Sends len bytes of complete lines in as few writes as possible.
+    bool sendLines(int socket, const char *lines, size_t len);
 
     // Sends a configure-version-rolling message.
     bool configureVersionRolling(int socket);
@@ -126,7 +136,15 @@ class StratumApi {
     static bool parse(StratumApiV1Message* message, const char* stratum_json);
     static bool parse(StratumApiV1Message *message, JsonDocument &doc);
 
+    // Parses mining.notify and mining.set_difficulty straight from the line
+    // without a JsonDocument. Returns false for everything else, the line
+    // then has to go through parse().
+    static bool parseFast(StratumApiV1Message *message, const char *json, size_t len);
+
     // Frees a mining_notify structure allocated in parse().
     static void freeMiningNotify(mining_notify *params);
 
+    // Frees everything parse() or parseFast() allocated in the message.
+    static void freeMessage(StratumApiV1Message *message);
+
 };
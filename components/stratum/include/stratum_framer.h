@@ -0,0 +1,41 @@
+#pragma once
+
+#include <stddef.h>
+
+// Splits the stratum byte stream into '\n' terminated lines inside a fixed
+// buffer. Received bytes are appended at the end, complete lines are handed
+// out as views into the buffer and nothing is copied per line. The scan
+// position is remembered, so every byte is searched for the newline once no
+// matter in how many pieces a large mining.notify arrives. The unconsumed
+// tail is moved to the front only when the free space runs low.
+class StratumFramer {
+  private:
+    char *m_buffer;
+    size_t m_size;
+    size_t m_start; // first byte of the current line
+    size_t m_scan;  // no newline in [m_start, m_scan)
+    size_t m_end;   // end of the received data
+
+  public:
+    StratumFramer(char *buffer, size_t size);
+
+    // Next complete line without its line ending, terminated in place.
+    // The view stays valid until the next call of recvBuffer().
+    // Returns NULL if no complete line is buffered.
+    char *nextLine(size_t *len);
+
+    // Free space for the next recv(), 0 if a single line fills the whole
+    // buffer (the caller should clear() it then).
+    char *recvBuffer(size_t *available);
+
+    // Appends len bytes written to recvBuffer().
+    void commit(size_t len);
+
+    void clear();
+
+    // Bytes of the incomplete line buffered so far.
+    size_t pending() const
+    {
+        return m_end - m_start;
+    }
+};
@@ -0,0 +1,60 @@
+#include <string.h>
+
+#include "stratum_framer.h"
+
+// compact the buffer when less than this fraction is left behind the data
+#define COMPACT_DIVISOR 4
+
+StratumFramer::StratumFramer(char *buffer, size_t size) : m_buffer(buffer), m_size(size)
+{
+    clear();
+}
+
+void StratumFramer::clear()
+{
+    m_start = 0;
+    m_scan = 0;
+    m_end = 0;
+}
+
+char *StratumFramer::nextLine(size_t *len)
+{
+    char *newline = (char *) memchr(m_buffer + m_scan, '\n', m_end - m_scan);
+    if (!newline) {
+        m_scan = m_end;
+        return NULL;
+    }
+
+    char *line = m_buffer + m_start;
+    size_t line_len = newline - line;
+    if (line_len && line[line_len - 1] == '\r') {
+        line_len--;
+    }
+    line[line_len] = '\0';
+
+    m_start = m_scan = newline - m_buffer + 1;
+    *len = line_len;
+    return line;
+}
+
+char *StratumFramer::recvBuffer(size_t *available)
+{
+    // start over at the front once everything was consumed
+    if (m_start == m_end) {
+        clear();
+    } else if (m_start && m_size - m_end < m_size / COMPACT_DIVISOR) {
+        size_t pending = m_end - m_start;
+        memmove(m_buffer, m_buffer + m_start, pending);
+        m_scan -= m_start;
+        m_end = pending;
+        m_start = 0;
+    }
+
+    *available = m_size - m_end;
+    return m_buffer + m_end;
+}
+
+void StratumFramer::commit(size_t len)
+{
+    m_end += len;
+}
@@ -0,0 +1,680 @@
+/******************************************************************************
+ * Parsing of received stratum messages, kept apart from the socket code so
+ * it builds on the host (test/host).
+ *
+ * References:
+ *  1. Stratum Protocol - https://reference.cash/mining/stratum-protocol
+ *****************************************************************************/
+
+#include <limits.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "stratum_api.h"
+#include "ArduinoJson.h"
+
+#include "esp_log.h"
+
+// The logging tag for ESP logging.
+static const char *TAG = "stratum_api";
+
+#ifdef CONFIG_SPIRAM
+#include "esp_heap_caps.h"
+#define ALLOC(s) heap_caps_malloc(s, MALLOC_CAP_SPIRAM)
+#else
+#define ALLOC(s) malloc(s)
+#endif
+
+static void safe_free(char *&ptr)
+{
+    if (ptr) {         // Check if pointer is not null
+        free(ptr);     // Free memory
+        ptr = nullptr; // Set pointer to null to prevent dangling pointer issues
+    }
+}
+
+uint8_t StratumApi::hex2val(char c)
+{
+    if (c >= '0' && c <= '9') {
+        return c - '0';
+    } else if (c >= 'a' && c <= 'f') {
+        return c - 'a' + 10;
+    } else if (c >= 'A' && c <= 'F') {
+        return c - 'A' + 10;
+    } else {
+        return 0;
+    }
+}
+
+size_t StratumApi::hex2bin(const char *hex, uint8_t *bin, size_t bin_len)
+{
+    size_t len = 0;
+    while (*hex && len < bin_len) {
+        bin[len] = hex2val(*hex++) << 4;
+        if (!*hex) {
+            len++;
+            break;
+        }
+        bin[len++] |= hex2val(*hex++);
+    }
+    return len;
+}
+
+bool StratumApi::parseMethods(JsonDocument &doc, const char *method_str, StratumApiV1Message *message)
+{
+    message->method = STRATUM_UNKNOWN;
+
+    if (strcmp(method_str, "mining.notify") == 0) {
+        message->method = MINING_NOTIFY;
+    } else if (strcmp(method_str, "mining.set_difficulty") == 0) {
+        message->method = MINING_SET_DIFFICULTY;
+    } else if (strcmp(method_str, "mining.set_version_mask") == 0) {
+        message->method = MINING_SET_VERSION_MASK;
+    } else if (strcmp(method_str, "client.reconnect") == 0) {
+        message->method = CLIENT_RECONNECT;
+    } else {
+        ESP_LOGI(TAG, "Unhandled method in stratum message: %s", method_str);
+        return false;
+    }
+
+    switch (message->method) {
+    case MINING_NOTIFY: {
+        ESP_LOGI(TAG, "mining notify");
+        JsonArray params = doc["params"].as<JsonArray>();
+
+        // the job id is copied into every job and share
+        const char *job_id = params[0].as<const char *>();
+        if (!job_id || strlen(job_id) >= MAX_JOB_ID_LEN) {
+            ESP_LOGE(TAG, "Job id longer than %d characters, mining notify dropped.", MAX_JOB_ID_LEN - 1);
+            return false;
+        }
+
+        mining_notify *new_work = (mining_notify *) ALLOC(sizeof(mining_notify));
+        if (!new_work) {
+            return false;
+        }
+        memset(new_work, 0, sizeof(mining_notify));
+        // owned by the message from here on, also when parsing fails
+        message->mining_notification = new_work;
+
+        new_work->job_id = strdup(job_id);
+        hex2bin(params[1].as<const char *>(), new_work->_prev_block_hash, HASH_SIZE);
+
+        new_work->coinbase_1 = strdup(params[2].as<const char *>());
+        new_work->coinbase_2 = strdup(params[3].as<const char *>());
+
+        JsonArray merkle_branch = params[4].as<JsonArray>();
+        new_work->n_merkle_branches = merkle_branch.size();
+        if (new_work->n_merkle_branches > MAX_MERKLE_BRANCHES) {
+            ESP_LOGE(TAG, "Too many Merkle branches.");
+            return false;
+        }
+
+        for (size_t i = 0; i < new_work->n_merkle_branches; i++) {
+            hex2bin(merkle_branch[i].as<const char *>(), new_work->_merkle_branches[i], HASH_SIZE);
+        }
+
+        new_work->version = strtoul(params[5].as<const char *>(), NULL, 16);
+        new_work->target = strtoul(params[6].as<const char *>(), NULL, 16);
+        new_work->ntime = strtoul(params[7].as<const char *>(), NULL, 16);
+
+        int paramsLength = params.size();
+        message->should_abandon_work = params[paramsLength - 1].as<bool>();
+        break;
+    }
+    case MINING_SET_DIFFICULTY:
+        message->new_difficulty = doc["params"][0].as<uint32_t>();
+        break;
+    case MINING_SET_VERSION_MASK:
+        message->version_mask = strtoul(doc["params"][0].as<const char *>(), NULL, 16);
+        break;
+    default:
+        break;
+    }
+
+    // ESP_LOGI(TAG, "allocs: %d, deallocs: %d, reallocs: %d", allocs, deallocs, reallocs);
+    return true;
+}
+
+bool StratumApi::parseResult(JsonDocument &doc) {
+    JsonVariant result_json = doc["result"];
+    JsonVariant error_json = doc["error"];
+
+    if (!error_json.isNull()) {
+        return false;
+    }
+
+    if (!result_json.isNull()) {
+        return result_json.is<bool>() ? result_json.as<bool>() : false;
+    }
+
+    return false;
+}
+
+bool StratumApi::parseResponses(JsonDocument &doc, StratumApiV1Message *message)
+{
+    message->method = STRATUM_RESULT;
+    message->response_success = parseResult(doc);
+    return true;
+}
+
+bool StratumApi::parseSetupResponses(JsonDocument &doc, StratumApiV1Message *message)
+{
+    // first messages are responses to our mining setup requests
+    message->method = STRATUM_UNKNOWN;
+
+    JsonVariant result_json = doc["result"];
+
+    switch (message->message_id) {
+    case STRATUM_ID_SUBSCRIBE: {
+        message->method = STRATUM_RESULT_SUBSCRIBE;
+
+        JsonArray result_arr = result_json.as<JsonArray>();
+        if (result_arr.size() < 3) {
+            ESP_LOGE(TAG, "Invalid result array for subscribe.");
+            return false;
+        }
+        message->extranonce_2_len = result_arr[2].as<int>();
+
+        const char *extranonce_str = result_arr[1].as<const char *>();
+        if (!extranonce_str) {
+            ESP_LOGE(TAG, "extranonce is null");
+            return false;
+        }
+        message->extranonce_str = strdup(extranonce_str);
+
+        ESP_LOGI(TAG, "extranonce_str: %s", message->extranonce_str);
+        ESP_LOGI(TAG, "extranonce_2_len: %d", message->extranonce_2_len);
+        break;
+    }
+    case STRATUM_ID_CONFIGURE: {
+        message->method = STRATUM_RESULT_VERSION_MASK;
+
+        const char *mask = result_json["version-rolling.mask"].as<const char *>();
+        if (!mask) {
+            return false;
+        }
+        message->version_mask = strtoul(mask, NULL, 16);
+        ESP_LOGI(TAG, "Set version mask: %08lx", message->version_mask);
+        break;
+    }
+    case STRATUM_ID_AUTHORIZE: {
+        message->method = STRATUM_RESULT_SETUP;
+        message->response_success = parseResult(doc);
+        break;
+    }
+    case STRATUM_ID_SUGGEST_DIFFICULTY: {
+        message->method = STRATUM_RESULT_SETUP;
+        message->response_success = parseResult(doc);
+        break;
+    }
+    default:
+        ESP_LOGW(TAG, "unhandled ID");
+        return false;
+    }
+    return true;
+}
+
+bool StratumApi::parse(StratumApiV1Message *message, JsonDocument &doc)
+{
+    // Extract message ID
+    message->message_id = doc["id"].is<int>() ? doc["id"].as<int>() : -1;
+
+    // Extract method
+    const char *method_str = doc["method"].as<const char *>();
+
+    if (method_str) {
+        return parseMethods(doc, method_str, message);
+    } else {
+        if (message->message_id < 5) {
+            return parseSetupResponses(doc, message);
+        }
+        return parseResponses(doc, message);
+    }
+}
+
+//--------------------------------------------------------------------
+// freeMiningNotify()
+//--------------------------------------------------------------------
+void StratumApi::freeMiningNotify(mining_notify *params)
+{
+    safe_free(params->job_id);
+    safe_free(params->coinbase_1);
+    safe_free(params->coinbase_2);
+}
+
+//--------------------------------------------------------------------
+// freeMessage()
+//--------------------------------------------------------------------
+void StratumApi::freeMessage(StratumApiV1Message *message)
+{
+    if (message->mining_notification) {
+        freeMiningNotify(message->mining_notification);
+        free(message->mining_notification);
+        message->mining_notification = nullptr;
+    }
+    safe_free(message->extranonce_str);
+}
+
+//--------------------------------------------------------------------
+// parseFast()
+//--------------------------------------------------------------------
+// Single pass over the line for the messages that arrive all the time.
+// mining.notify and mining.set_difficulty are decoded straight from the
+// line, the hex fields into the binary fields of mining_notify, without
+// building a JsonDocument. Everything else and every shape the scanner is
+// not sure about (escapes, fractions, missing fields) returns false and
+// goes the JsonDocument way, which gives the same result.
+//--------------------------------------------------------------------
+
+#define MAX_FAST_PARAMS 16
+#define MAX_FAST_DEPTH 8
+
+namespace {
+
+enum TokenType
+{
+    TOKEN_STRING,
+    TOKEN_NUMBER,
+    TOKEN_TRUE,
+    TOKEN_FALSE,
+    TOKEN_NULL,
+    TOKEN_ARRAY,
+    TOKEN_OBJECT,
+};
+
+struct Token {
+    TokenType type;
+    const char *start; // strings without the quotes
+    size_t len;
+};
+
+struct Scanner {
+    const char *p;
+    const char *end;
+
+    void skipSpace()
+    {
+        while (p < end && (*p == ' ' || *p == '\t' || *p == '\r' || *p == '\n')) {
+            p++;
+        }
+    }
+
+    bool consume(char c)
+    {
+        skipSpace();
+        if (p < end && *p == c) {
+            p++;
+            return true;
+        }
+        return false;
+    }
+
+    // strings with escapes are left to ArduinoJson
+    bool string(Token *token)
+    {
+        skipSpace();
+        if (p >= end || *p != '"') {
+            return false;
+        }
+        const char *start = ++p;
+        while (p < end && *p != '"') {
+            if (*p == '\\' || (unsigned char) *p < 0x20) {
+                return false;
+            }
+            p++;
+        }
+        if (p >= end) {
+            return false;
+        }
+        *token = {TOKEN_STRING, start, (size_t) (p - start)};
+        p++;
+        return true;
+    }
+
+    bool digits()
+    {
+        const char *start = p;
+        while (p < end && *p >= '0' && *p <= '9') {
+            p++;
+        }
+        return p > start;
+    }
+
+    bool number(Token *token)
+    {
+        const char *start = p;
+        if (p < end && *p == '-') {
+            p++;
+        }
+        if (p < end && *p == '0') {
+            p++;
+        } else if (!digits()) {
+            return false;
+        }
+        if (p < end && *p == '.') {
+            p++;
+            if (!digits()) {
+                return false;
+            }
+        }
+        if (p < end && (*p == 'e' || *p == 'E')) {
+            p++;
+            if (p < end && (*p == '+' || *p == '-')) {
+                p++;
+            }
+            if (!digits()) {
+                return false;
+            }
+        }
+        *token = {TOKEN_NUMBER, start, (size_t) (p - start)};
+        return true;
+    }
+
+    bool literal(const char *word, TokenType type, Token *token)
+    {
+        size_t len = strlen(word);
+        if ((size_t) (end - p) < len || memcmp(p, word, len)) {
+            return false;
+        }
+        *token = {type, p, len};
+        p += len;
+        return true;
+    }
+
+    // any value, containers are only checked and skipped
+    bool value(Token *token, int depth)
+    {
+        skipSpace();
+        if (p >= end || depth > MAX_FAST_DEPTH) {
+            return false;
+        }
+        const char *start = p;
+        Token inner;
+        switch (*p) {
+        case '"':
+            return string(token);
+        case 't':
+            return literal("true", TOKEN_TRUE, token);
+        case 'f':
+            return literal("false", TOKEN_FALSE, token);
+        case 'n':
+            return literal("null", TOKEN_NULL, token);
+        case '[':
+            p++;
+            if (!consume(']')) {
+                do {
+                    if (!value(&inner, depth + 1)) {
+                        return false;
+                    }
+                } while (consume(','));
+                if (!consume(']')) {
+                    return false;
+                }
+            }
+            *token = {TOKEN_ARRAY, start, (size_t) (p - start)};
+            return true;
+        case '{':
+            p++;
+            if (!consume('}')) {
+                do {
+                    if (!string(&inner) || !consume(':') || !value(&inner, depth + 1)) {
+                        return false;
+                    }
+                } while (consume(','));
+                if (!consume('}')) {
+                    return false;
+                }
+            }
+            *token = {TOKEN_OBJECT, start, (size_t) (p - start)};
+            return true;
+        default:
+            return number(token);
+        }
+    }
+
+    // the params array, the strings of a nested array at index 4 are the merkle branches
+    bool params(Token *params, size_t *n_params, Token *branches, size_t *n_branches)
+    {
+        if (!consume('[')) {
+            return false;
+        }
+        if (consume(']')) {
+            return true;
+        }
+        do {
+            if (*n_params >= MAX_FAST_PARAMS) {
+                return false;
+            }
+            skipSpace();
+            if (*n_params == 4 && p < end && *p == '[') {
+                const char *array_start = p++;
+                if (!consume(']')) {
+                    do {
+                        if (*n_branches >= MAX_MERKLE_BRANCHES || !string(&branches[*n_branches])) {
+                            return false;
+                        }
+                        (*n_branches)++;
+                    } while (consume(','));
+                    if (!consume(']')) {
+                        return false;
+                    }
+                }
+                params[*n_params] = {TOKEN_ARRAY, array_start, (size_t) (p - array_start)};
+            } else if (!value(&params[*n_params], 1)) {
+                return false;
+            }
+            (*n_params)++;
+        } while (consume(','));
+        return consume(']');
+    }
+};
+
+bool token_equals(const Token &token, const char *str)
+{
+    return token.type == TOKEN_STRING && strlen(str) == token.len && !memcmp(token.start, str, token.len);
+}
+
+// plain non-negative integer up to max
+bool token_to_uint(const Token &token, unsigned long long max, unsigned long long *value)
+{
+    if (token.type != TOKEN_NUMBER || !token.len) {
+        return false;
+    }
+    unsigned long long result = 0;
+    for (size_t i = 0; i < token.len; i++) {
+        char c = token.start[i];
+        if (c < '0' || c > '9') {
+            return false;
+        }
+        result = result * 10 + (c - '0');
+        if (result > max) {
+            return false;
+        }
+    }
+    *value = result;
+    return true;
+}
+
+// strtoul(hex, NULL, 16) of a string token
+bool token_to_hex32(const Token &token, uint32_t *value)
+{
+    char buf[16];
+    if (token.type != TOKEN_STRING || token.len >= sizeof(buf)) {
+        return false;
+    }
+    memcpy(buf, token.start, token.len);
+    buf[token.len] = '\0';
+    *value = strtoul(buf, NULL, 16);
+    return true;
+}
+
+char *token_strdup(const Token &token)
+{
+    char *str = (char *) malloc(token.len + 1);
+    if (str) {
+        memcpy(str, token.start, token.len);
+        str[token.len] = '\0';
+    }
+    return str;
+}
+
+} // namespace
+
+size_t StratumApi::hex2bin(const char *hex, size_t hex_len, uint8_t *bin, size_t bin_len)
+{
+    const char *end = hex + hex_len;
+    size_t len = 0;
+    while (hex < end && len < bin_len) {
+        bin[len] = hex2val(*hex++) << 4;
+        if (hex == end) {
+            len++;
+            break;
+        }
+        bin[len++] |= hex2val(*hex++);
+    }
+    return len;
+}
+
+bool StratumApi::parseFast(StratumApiV1Message *message, const char *json, size_t len)
+{
+    Scanner scanner = {json, json + len};
+    Token id = {TOKEN_NULL, nullptr, 0};
+    Token method = {TOKEN_NULL, nullptr, 0};
+    Token params[MAX_FAST_PARAMS];
+    Token branches[MAX_MERKLE_BRANCHES];
+    size_t n_params = 0;
+    size_t n_branches = 0;
+    bool has_id = false;
+    bool has_method = false;
+    bool has_params = false;
+
+    if (!scanner.consume('{')) {
+        return false;
+    }
+    if (!scanner.consume('}')) {
+        do {
+            Token key;
+            if (!scanner.string(&key) || !scanner.consume(':')) {
+                return false;
+            }
+            if (token_equals(key, "params")) {
+                if (has_params || !scanner.params(params, &n_params, branches, &n_branches)) {
+                    return false;
+                }
+                has_params = true;
+                continue;
+            }
+            Token value;
+            if (!scanner.value(&value, 1)) {
+                return false;
+            }
+            if (token_equals(key, "id")) {
+                if (has_id) {
+                    return false;
+                }
+                id = value;
+                has_id = true;
+            } else if (token_equals(key, "method")) {
+                if (has_method) {
+                    return false;
+                }
+                method = value;
+                has_method = true;
+            }
+        } while (scanner.consume(','));
+        if (!scanner.consume('}')) {
+            return false;
+        }
+    }
+    scanner.skipSpace();
+    if (scanner.p != scanner.end || !has_params) {
+        return false;
+    }
+
+    bool notify = token_equals(method, "mining.notify");
+    if (!notify && !token_equals(method, "mining.set_difficulty")) {
+        return false;
+    }
+
+    // same as doc["id"].is<int>() ? doc["id"].as<int>() : -1
+    int64_t message_id = -1;
+    if (id.type == TOKEN_NUMBER) {
+        unsigned long long value;
+        bool negative = id.len && id.start[0] == '-';
+        Token digits = negative ? Token{TOKEN_NUMBER, id.start + 1, id.len - 1} : id;
+        if (!token_to_uint(digits, negative ? (unsigned long long) INT_MAX + 1 : INT_MAX, &value)) {
+            return false;
+        }
+        message_id = negative ? -(int64_t) value : (int64_t) value;
+    }
+
+    if (!notify) {
+        unsigned long long difficulty;
+        if (n_params < 1 || !token_to_uint(params[0], UINT32_MAX, &difficulty)) {
+            return false;
+        }
+        message->message_id = message_id;
+        message->method = MINING_SET_DIFFICULTY;
+        message->new_difficulty = difficulty;
+        return true;
+    }
+
+    // job_id, prevhash, coinb1, coinb2, merkle_branch, version, nbits, ntime, clean_jobs
+    if (n_params < 9 || params[4].type != TOKEN_ARRAY) {
+        return false;
+    }
+    for (size_t i : {0, 1, 2, 3, 5, 6, 7}) {
+        if (params[i].type != TOKEN_STRING) {
+            return false;
+        }
+    }
+    const Token &clean_jobs = params[n_params - 1];
+    if (clean_jobs.type != TOKEN_TRUE && clean_jobs.type != TOKEN_FALSE) {
+        return false;
+    }
+    // left to parse(), which logs and rejects it
+    if (params[0].len >= MAX_JOB_ID_LEN) {
+        return false;
+    }
+
+    uint32_t version, target, ntime;
+    if (!token_to_hex32(params[5], &version) || !token_to_hex32(params[6], &target) || !token_to_hex32(params[7], &ntime)) {
+        return false;
+    }
+
+    ESP_LOGI(TAG, "mining notify");
+    mining_notify *new_work = (mining_notify *) ALLOC(sizeof(mining_notify));
+    if (!new_work) {
+        return false;
+    }
+    memset(new_work, 0, sizeof(mining_notify));
+    message->mining_notification = new_work;
+
+    new_work->job_id = token_strdup(params[0]);
+    hex2bin(params[1].start, params[1].len, new_work->_prev_block_hash, HASH_SIZE);
+    new_work->coinbase_1 = token_strdup(params[2]);
+    new_work->coinbase_2 = token_strdup(params[3]);
+    if (!new_work->job_id || !new_work->coinbase_1 || !new_work->coinbase_2) {
+        ESP_LOGE(TAG, "Failed to allocate memory for mining notify.");
+        freeMiningNotify(new_work);
+        free(new_work);
+        message->mining_notification = nullptr;
+        return false;
+    }
+
+    new_work->n_merkle_branches = n_branches;
+    for (size_t i = 0; i < n_branches; i++) {
+        hex2bin(branches[i].start, branches[i].len, new_work->_merkle_branches[i], HASH_SIZE);
+    }
+
+    new_work->version = version;
+    new_work->target = target;
+    new_work->ntime = ntime;
+
+    message->message_id = message_id;
+    message->method = MINING_NOTIFY;
+    message->should_abandon_work = clean_jobs.type == TOKEN_TRUE;
+    return true;
+}
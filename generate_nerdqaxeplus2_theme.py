@@ -8,9 +8,12 @@ NerdQaxePlus2主题图片转换脚本
 import os
 import sys
 import subprocess
-from PIL import Image
 import argparse
 
+# 共享的图片编码模块位于Converter Tool目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "main", "displays", "images", "Converter Tool"))
+import image_encoder
+
 def convert_png_to_c(theme_name, image_path, screen_name, output_dir):
     """
     将PNG图片转换为LVGL格式的.c文件
@@ -35,87 +38,21 @@ def convert_png_to_c(theme_name, image_path, screen_name, output_dir):
     
     try:
         # 打开图片
-        image = Image.open(image_path)
+        image, use_alpha = image_encoder.load_image(image_path)
         print(f"处理图片: {os.path.basename(image_path)} ({image.width}x{image.height})")
         
-        # 检查是否有透明通道
-        if image.mode == 'RGBA':
-            use_alpha = True
-            image = image.convert('RGBA')
-        else:
-            use_alpha = False
-            image = image.convert('RGB')
-        
         # 图片尺寸
         width, height = image.size
         
         # 生成变量名
         var_name = f"{theme_name}_{screen_name}"
         
+        # 一次性转换整张图片为RGB565(A)
+        pixel_data = image_encoder.encode_rgb565(image, use_alpha)
+        
         # 写入.c文件
         with open(output_c_file, 'w', encoding='utf-8') as f:
-            # 写入文件头
-            f.write('#include "lvgl.h"\n\n')
-            f.write('#ifndef LV_ATTRIBUTE_MEM_ALIGN\n')
-            f.write('    #define LV_ATTRIBUTE_MEM_ALIGN\n')
-            f.write('#endif\n\n')
-            
-            # 写入图片数据注释
-            f.write(f'// IMAGE DATA: {os.path.basename(image_path)}\n')
-            f.write(f'const LV_ATTRIBUTE_MEM_ALIGN uint8_t ui_img_{var_name}_png_data[] = {{\n')
-            
-            # 处理图片像素
-            pixel_data = []
-            for y in range(height):
-                for x in range(width):
-                    if use_alpha:
-                        r, g, b, a = image.getpixel((x, y))
-                    else:
-                        r, g, b = image.getpixel((x, y))
-                    
-                    # 转换为16位565格式
-                    r = (r >> 3) & 0x1F    # 红色5位
-                    g = (g >> 2) & 0x3F    # 绿色6位  
-                    b = (b >> 3) & 0x1F    # 蓝色5位
-                    
-                    # 合并为16位值
-                    rgb565 = (r << 11) | (g << 5) | b
-                    
-                    # 分解为两个8位值 (高字节和低字节)
-                    high_byte = (rgb565 >> 8) & 0xFF
-                    low_byte = rgb565 & 0xFF
-                    
-                    # 添加到像素数据列表
-                    pixel_data.append(f'0x{high_byte:02X}')
-                    pixel_data.append(f'0x{low_byte:02X}')
-                    
-                    # 如果使用透明通道，添加alpha字节
-                    if use_alpha:
-                        pixel_data.append(f'0x{a:02X}')
-            
-            # 写入像素数据到.c文件
-            for i, value in enumerate(pixel_data):
-                if i % 16 == 0:
-                    f.write('    ')
-                f.write(value + ', ')
-                if (i + 1) % 16 == 0:
-                    f.write('\n')
-            
-            # 结束数据数组
-            f.write('\n};\n\n')
-            
-            # 确定正确的颜色格式
-            color_format = "LV_IMG_CF_TRUE_COLOR_ALPHA" if use_alpha else "LV_IMG_CF_TRUE_COLOR"
-            
-            # 写入lv_img_dsc_t结构体
-            f.write(f'const lv_img_dsc_t ui_img_{var_name}_png = {{\n')
-            f.write(f'    .header.always_zero = 0,\n')
-            f.write(f'    .header.w = {width},\n')
-            f.write(f'    .header.h = {height},\n')
-            f.write(f'    .data_size = sizeof(ui_img_{var_name}_png_data),\n')
-            f.write(f'    .header.cf = {color_format},\n')
-            f.write(f'    .data = ui_img_{var_name}_png_data\n')
-            f.write('};\n')
+            f.write(image_encoder.render_c_image(var_name, os.path.basename(image_path), width, height, pixel_data, use_alpha))
         
         print(f"转换完成！输出保存到: {output_c_file}")
         return True
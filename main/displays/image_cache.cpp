@@ -0,0 +1,218 @@
+#include <string.h>
+
+#include "esp_heap_caps.h"
+#include "esp_log.h"
+#include "esp_timer.h"
+
+#include "image_cache.h"
+
+static const char *TAG = "image_cache";
+
+static bool isCompressed(const lv_img_dsc_t *img)
+{
+    return img->header.cf == IMAGE_CF_LZ4_TRUE_COLOR || img->header.cf == IMAGE_CF_LZ4_TRUE_COLOR_ALPHA;
+}
+
+static uint32_t decodedSize(const lv_img_dsc_t *img)
+{
+    uint32_t pixelSize = (img->header.cf == IMAGE_CF_LZ4_TRUE_COLOR_ALPHA) ? LV_IMG_PX_SIZE_ALPHA_BYTE : sizeof(lv_color_t);
+    return (uint32_t) img->header.w * img->header.h * pixelSize;
+}
+
+void ImageCache::init()
+{
+    if (m_decoder) {
+        return;
+    }
+
+    m_decoder = lv_img_decoder_create();
+    m_decoder->user_data = this;
+    lv_img_decoder_set_info_cb(m_decoder, infoCb);
+    lv_img_decoder_set_open_cb(m_decoder, openCb);
+    lv_img_decoder_set_close_cb(m_decoder, closeCb);
+}
+
+// Decompress an LZ4 block (no frame header). Every read and write is bounds checked,
+// a corrupt image only fails to show.
+bool ImageCache::decompress(const uint8_t *src, uint32_t srcSize, uint8_t *dst, uint32_t dstSize)
+{
+    const uint8_t *ip = src;
+    const uint8_t *iend = src + srcSize;
+    uint8_t *op = dst;
+    uint8_t *oend = dst + dstSize;
+
+    while (ip < iend) {
+        uint8_t token = *ip++;
+
+        // literals
+        uint32_t length = token >> 4;
+        if (length == 15) {
+            uint8_t b;
+            do {
+                if (ip >= iend) {
+                    return false;
+                }
+                b = *ip++;
+                length += b;
+            } while (b == 255);
+        }
+        if (length > (uint32_t) (iend - ip) || length > (uint32_t) (oend - op)) {
+            return false;
+        }
+        memcpy(op, ip, length);
+        op += length;
+        ip += length;
+
+        // the last sequence has no match
+        if (ip >= iend) {
+            break;
+        }
+
+        // match
+        if (iend - ip < 2) {
+            return false;
+        }
+        uint32_t offset = ip[0] | (ip[1] << 8);
+        ip += 2;
+        if (offset == 0 || offset > (uint32_t) (op - dst)) {
+            return false;
+        }
+
+        length = token & 0x0F;
+        if (length == 15) {
+            uint8_t b;
+            do {
+                if (ip >= iend) {
+                    return false;
+                }
+                b = *ip++;
+                length += b;
+            } while (b == 255);
+        }
+        length += 4;
+        if (length > (uint32_t) (oend - op)) {
+            return false;
+        }
+
+        const uint8_t *match = op - offset;
+        if (offset >= length) {
+            memcpy(op, match, length);
+            op += length;
+        } else {
+            // overlapping match, repeats the last offset bytes
+            while (length--) {
+                *op++ = *match++;
+            }
+        }
+    }
+
+    return op == oend;
+}
+
+// Least recently used entry that is not in use. Free slots are preferred.
+ImageCache::Entry *ImageCache::findVictim()
+{
+    Entry *victim = nullptr;
+    for (int i = 0; i < IMAGE_CACHE_MAX_ENTRIES; i++) {
+        Entry *e = &m_entries[i];
+        if (!e->src) {
+            return e;
+        }
+        if (e->refs) {
+            continue;
+        }
+        if (!victim || e->lastUsed < victim->lastUsed) {
+            victim = e;
+        }
+    }
+    return victim;
+}
+
+ImageCache::Entry *ImageCache::acquire(const lv_img_dsc_t *src)
+{
+    // hit
+    for (int i = 0; i < IMAGE_CACHE_MAX_ENTRIES; i++) {
+        Entry *e = &m_entries[i];
+        if (e->src == src) {
+            e->lastUsed = ++m_useCounter;
+            e->refs++;
+            return e;
+        }
+    }
+
+    uint32_t size = decodedSize(src);
+    Entry *e = findVictim();
+    if (!e) {
+        ESP_LOGE(TAG, "all %d cache entries are in use", IMAGE_CACHE_MAX_ENTRIES);
+        return nullptr;
+    }
+
+    // reuse the buffer of the evicted image if it has the right size
+    if (e->data && e->size != size) {
+        heap_caps_free(e->data);
+        e->data = nullptr;
+    }
+    e->src = nullptr;
+    if (!e->data) {
+        e->data = (uint8_t *) heap_caps_malloc(size, MALLOC_CAP_SPIRAM);
+        if (!e->data) {
+            ESP_LOGE(TAG, "no memory for a %lu byte image", (unsigned long) size);
+            return nullptr;
+        }
+        e->size = size;
+    }
+
+    int64_t start = esp_timer_get_time();
+    if (!decompress(src->data, src->data_size, e->data, size)) {
+        ESP_LOGE(TAG, "corrupt image data (%lu bytes compressed)", (unsigned long) src->data_size);
+        return nullptr;
+    }
+    ESP_LOGI(TAG, "decompressed %lu -> %lu bytes in %lldus", (unsigned long) src->data_size, (unsigned long) size,
+             (long long) (esp_timer_get_time() - start));
+
+    e->src = src;
+    e->lastUsed = ++m_useCounter;
+    e->refs = 1;
+    return e;
+}
+
+lv_res_t ImageCache::infoCb(lv_img_decoder_t *decoder, const void *src, lv_img_header_t *header)
+{
+    if (lv_img_src_get_type(src) != LV_IMG_SRC_VARIABLE) {
+        return LV_RES_INV;
+    }
+
+    const lv_img_dsc_t *img = (const lv_img_dsc_t *) src;
+    if (!isCompressed(img)) {
+        return LV_RES_INV;
+    }
+
+    // report the format of the decompressed pixels so LVGL draws them like any other image
+    header->w = img->header.w;
+    header->h = img->header.h;
+    header->cf = (img->header.cf == IMAGE_CF_LZ4_TRUE_COLOR_ALPHA) ? LV_IMG_CF_TRUE_COLOR_ALPHA : LV_IMG_CF_TRUE_COLOR;
+    return LV_RES_OK;
+}
+
+lv_res_t ImageCache::openCb(lv_img_decoder_t *decoder, lv_img_decoder_dsc_t *dsc)
+{
+    ImageCache *cache = (ImageCache *) decoder->user_data;
+
+    Entry *e = cache->acquire((const lv_img_dsc_t *) dsc->src);
+    if (!e) {
+        return LV_RES_INV;
+    }
+
+    dsc->img_data = e->data;
+    dsc->user_data = e;
+    return LV_RES_OK;
+}
+
+void ImageCache::closeCb(lv_img_decoder_t *decoder, lv_img_decoder_dsc_t *dsc)
+{
+    Entry *e = (Entry *) dsc->user_data;
+    if (e && e->refs > 0) {
+        e->refs--;
+    }
+    dsc->user_data = nullptr;
+}
@@ -0,0 +1,42 @@
+#pragma once
+
+#include "lvgl.h"
+
+// Color formats of LZ4 compressed theme images (create_themes.py --format lz4)
+#define IMAGE_CF_LZ4_TRUE_COLOR LV_IMG_CF_USER_ENCODED_0
+#define IMAGE_CF_LZ4_TRUE_COLOR_ALPHA LV_IMG_CF_USER_ENCODED_1
+
+// number of decompressed images kept in PSRAM
+// (two screens are drawn at the same time during a screen change)
+#define IMAGE_CACHE_MAX_ENTRIES 3
+
+// LVGL image decoder for LZ4 compressed images. An image is decompressed
+// into PSRAM the first time it is drawn and stays there until it is the
+// least recently used one and its slot is needed for another image.
+class ImageCache {
+  protected:
+    struct Entry {
+        const lv_img_dsc_t *src = nullptr;
+        uint8_t *data = nullptr;
+        uint32_t size = 0;
+        uint32_t lastUsed = 0;
+        int refs = 0; // open decoder descriptors, entries in use are never evicted
+    };
+
+    Entry m_entries[IMAGE_CACHE_MAX_ENTRIES];
+    uint32_t m_useCounter = 0;
+    lv_img_decoder_t *m_decoder = nullptr;
+
+    Entry *acquire(const lv_img_dsc_t *src);
+    Entry *findVictim();
+
+    static bool decompress(const uint8_t *src, uint32_t srcSize, uint8_t *dst, uint32_t dstSize);
+
+    static lv_res_t infoCb(lv_img_decoder_t *decoder, const void *src, lv_img_header_t *header);
+    static lv_res_t openCb(lv_img_decoder_t *decoder, lv_img_decoder_dsc_t *dsc);
+    static void closeCb(lv_img_decoder_t *decoder, lv_img_decoder_dsc_t *dsc);
+
+  public:
+    // registers the decoder, call once after lv_init
+    void init();
+};
@@ -0,0 +1,81 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+import image_encoder
+
+# The reference implementation is optional. When it is installed the blocks are
+# also checked against it and its decode time is a good estimate for the C decoder.
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    rpath = os.path.dirname(os.path.realpath(__file__))
+
+    parser = argparse.ArgumentParser(description='Round trip the theme images through the LZ4 codec and time it')
+    parser.add_argument('--themes-dir', default=os.path.join(rpath, '../themes'), help='directory containing the themes')
+    args = parser.parse_args()
+
+    images = sorted(glob.glob(os.path.join(args.themes_dir, '*', 'Raw Images', '*.png')))
+    if not images:
+        print(f"No images found in '{args.themes_dir}'")
+        return 1
+
+    total_raw = 0
+    total_compressed = 0
+    total_encode = 0.0
+    total_decode = 0.0
+    total_reference = 0.0
+    mismatches = 0
+
+    print(f"{'image':<50} {'raw':>8} {'lz4':>8} {'ratio':>6} {'encode':>10} {'decode':>10} {'ref':>9}")
+    for image_path in images:
+        theme = os.path.basename(os.path.dirname(os.path.dirname(image_path)))
+        screen = os.path.splitext(os.path.basename(image_path))[0]
+
+        image, use_alpha = image_encoder.load_image(image_path)
+        raw = image_encoder.encode_rgb565(image, use_alpha)
+
+        compressed, t_encode = time_call(image_encoder.compress_lz4, raw)
+        decoded, t_decode = time_call(image_encoder.decompress_lz4, compressed, len(raw))
+        ok = decoded == raw
+
+        ref = '-'
+        if lz4:
+            decoded, t_reference = time_call(lambda: lz4.block.decompress(compressed, uncompressed_size=len(raw)))
+            ok = ok and decoded == raw
+            total_reference += t_reference
+            ref = f"{t_reference * 1e3:.2f}ms"
+
+        total_raw += len(raw)
+        total_compressed += len(compressed)
+        total_encode += t_encode
+        total_decode += t_decode
+        mismatches += not ok
+
+        status = '' if ok else '  MISMATCH'
+        print(f"{theme + '/' + screen:<50} {len(raw):>8} {len(compressed):>8} {len(raw) / len(compressed):>5.1f}x "
+              f"{t_encode * 1e3:>8.1f}ms {t_decode * 1e3:>8.1f}ms {ref:>9}{status}")
+
+    print('-' * 107)
+    print(f"{len(images)} images, {total_raw} -> {total_compressed} bytes ({total_raw / total_compressed:.1f}x), "
+          f"encode: {total_encode:.2f}s, decode: {total_decode:.2f}s, mismatches: {mismatches}")
+    if lz4:
+        print(f"reference decoder: {total_reference * 1e3:.1f}ms, {total_reference / len(images) * 1e3:.2f}ms per image")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
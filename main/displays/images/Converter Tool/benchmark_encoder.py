@@ -0,0 +1,115 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+import image_encoder
+
+
+# The historic converter: one getpixel() call and one string per byte.
+# Kept here as the reference the vectorized encoder is checked against.
+def legacy_convert(image_path, var_name):
+    image, use_alpha = image_encoder.load_image(image_path)
+    width, height = image.size
+
+    out = []
+    out.append('#include "lvgl.h"\n\n')
+    out.append('#ifndef LV_ATTRIBUTE_MEM_ALIGN\n')
+    out.append('    #define LV_ATTRIBUTE_MEM_ALIGN\n')
+    out.append('#endif\n\n')
+    out.append(f'// IMAGE DATA: {os.path.basename(image_path)}\n')
+    out.append(f'const LV_ATTRIBUTE_MEM_ALIGN uint8_t ui_img_{var_name}_png_data[] = {{\n')
+
+    pixel_data = []
+    for y in range(height):
+        for x in range(width):
+            if use_alpha:
+                r, g, b, a = image.getpixel((x, y))
+            else:
+                r, g, b = image.getpixel((x, y))
+
+            rgb565 = (((r >> 3) & 0x1F) << 11) | (((g >> 2) & 0x3F) << 5) | ((b >> 3) & 0x1F)
+
+            pixel_data.append(f'0x{(rgb565 >> 8) & 0xFF:02X}')
+            pixel_data.append(f'0x{rgb565 & 0xFF:02X}')
+            if use_alpha:
+                pixel_data.append(f'0x{a:02X}')
+
+    for i, value in enumerate(pixel_data):
+        if i % 16 == 0:
+            out.append('    ')
+        out.append(value + ', ')
+        if (i + 1) % 16 == 0:
+            out.append('\n')
+
+    out.append('\n};\n\n')
+
+    color_format = "LV_IMG_CF_TRUE_COLOR_ALPHA" if use_alpha else "LV_IMG_CF_TRUE_COLOR"
+    out.append(f'const lv_img_dsc_t ui_img_{var_name}_png = {{\n')
+    out.append(f'    .header.always_zero = 0,\n')
+    out.append(f'    .header.w = {width},\n')
+    out.append(f'    .header.h = {height},\n')
+    out.append(f'    .data_size = sizeof(ui_img_{var_name}_png_data),\n')
+    out.append(f'    .header.cf = {color_format},\n')
+    out.append(f'    .data = ui_img_{var_name}_png_data\n')
+    out.append('};\n')
+
+    return ''.join(out)
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    rpath = os.path.dirname(os.path.realpath(__file__))
+
+    parser = argparse.ArgumentParser(description='Compare the legacy and the vectorized theme image encoder')
+    parser.add_argument('--themes-dir', default=os.path.join(rpath, '../themes'), help='directory containing the themes')
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the vectorized encoder')
+    args = parser.parse_args()
+
+    images = sorted(glob.glob(os.path.join(args.themes_dir, '*', 'Raw Images', '*.png')))
+    if not images:
+        print(f"No images found in '{args.themes_dir}'")
+        return 1
+
+    total_legacy = 0.0
+    total_new = 0.0
+    mismatches = 0
+
+    print(f"{'image':<50} {'legacy':>10} {'new':>10} {'speedup':>9}")
+    for image_path in images:
+        theme = os.path.basename(os.path.dirname(os.path.dirname(image_path)))
+        screen = os.path.splitext(os.path.basename(image_path))[0]
+        var_name = f"{theme}_{screen}"
+
+        new, t_new = time_call(image_encoder.convert_png, image_path, var_name)
+        total_new += t_new
+
+        if args.skip_legacy:
+            print(f"{theme + '/' + screen:<50} {'-':>10} {t_new * 1e3:>8.1f}ms")
+            continue
+
+        old, t_old = time_call(legacy_convert, image_path, var_name)
+        total_legacy += t_old
+
+        status = '' if old == new else '  MISMATCH'
+        mismatches += old != new
+        print(f"{theme + '/' + screen:<50} {t_old * 1e3:>8.1f}ms {t_new * 1e3:>8.1f}ms {t_old / t_new:>8.1f}x{status}")
+
+    print('-' * 82)
+    if args.skip_legacy:
+        print(f"{len(images)} images, new: {total_new:.2f}s")
+    else:
+        print(f"{len(images)} images, legacy: {total_legacy:.2f}s, new: {total_new:.2f}s, "
+              f"speedup: {total_legacy / total_new:.1f}x, mismatches: {mismatches}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,154 @@
+import argparse
+import hashlib
+import json
 import os
-import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 from jinja2 import Environment, FileSystemLoader
 
-# Function to process each theme directory and convert PNG files to C files
-def process_theme(theme, rpath):
-    theme_path = os.path.join("../themes", theme)
-    os.chdir(theme_path)
+import image_encoder
 
-    for screen in ["initscreen2", "miningscreen2", "portalscreen", "btcscreen", "settingsscreen", "splashscreen2" , "globalStats"]:
-        image_path = f"./Raw Images/{screen}.png"
-        # Run the convert_single.py script to generate the C files for each image
-        #subprocess.run(["python3", f"{rpath}/convert_single.py", theme, image_path, screen], check=True)
-        subprocess.run([sys.executable, os.path.join(rpath, "convert_single.py"), theme, image_path, screen], check=True)
+SCREENS = ["initscreen2", "miningscreen2", "portalscreen", "btcscreen", "settingsscreen", "splashscreen2", "globalStats"]
 
+# build cache, lives next to the generated themes.c/themes.h
+MANIFEST_FILE = ".themes_manifest.json"
+MANIFEST_VERSION = 3
+
+TEMPLATES = ["themes.h.j2", "themes.c.j2", "themes.cmake.j2"]
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Hash of everything that influences the generated image files.
+# Changing the encoder invalidates all cached outputs.
+def converter_hash(rpath, output_format, max_error):
+    h = hashlib.sha256()
+    h.update(f"{MANIFEST_VERSION}:{output_format}:{max_error}".encode())
+    with open(os.path.join(rpath, "image_encoder.py"), 'rb') as f:
+        h.update(f.read())
+    return h.hexdigest()
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest
+
+
+def save_manifest(path, manifest):
+    manifest['version'] = MANIFEST_VERSION
+    tmp = path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp, path)
+
+
+# Output files of a screen for the given format, relative to the theme directory
+def screen_outputs(theme, screen, output_format):
+    outputs = [f"ui_img_{screen}_png.c"]
+    if output_format == "bin":
+        outputs.append(image_encoder.blob_name(f"{theme}_{screen}"))
+    return outputs
+
+
+# Function to convert a single screen of a theme, runs in a worker process
+def convert_screen(theme, screen, image_path, theme_path, output_format, max_error):
+    var_name = f"{theme}_{screen}"
+    outputs = [os.path.join(theme_path, o) for o in screen_outputs(theme, screen, output_format)]
+
+    source, data, info = image_encoder.convert_image(image_path, var_name, output_format, max_error)
+    if output_format == "bin":
+        with open(outputs[1], 'wb') as f:
+            f.write(data)
+
+    with open(outputs[0], 'w') as f:
+        f.write(source)
+
+    return theme, screen, [file_hash(o) for o in outputs], len(data), info
+
+
+# Function to find out which screens have to be (re-)generated
+def collect_jobs(themes_path, theme_dirs, manifest, conv_hash, output_format, max_error, force):
+    jobs = []
+    entries = {}
+    cached = manifest.get('images', {})
+
+    for theme in theme_dirs:
+        for screen in SCREENS:
+            theme_path = os.path.join(themes_path, theme)
+            image_path = os.path.join(theme_path, "Raw Images", f"{screen}.png")
+            outputs = [os.path.join(theme_path, o) for o in screen_outputs(theme, screen, output_format)]
+            key = f"{theme}/{screen}"
+
+            if not os.path.isfile(image_path):
+                print(f"Error: The file '{image_path}' does not exist.")
+                continue
+
+            entry = {
+                'source': file_hash(image_path),
+                'converter': conv_hash,
+            }
+
+            old = cached.get(key)
+            if (not force and old and old.get('source') == entry['source'] and old.get('converter') == conv_hash and
+                    all(os.path.isfile(o) for o in outputs) and [file_hash(o) for o in outputs] == old.get('outputs')):
+                entries[key] = old
+                continue
+
+            entries[key] = entry
+            jobs.append((theme, screen, image_path, theme_path, output_format, max_error))
+
+    return jobs, entries
+
+
+# Themes linked into the firmware of each board, keyed by the BOARD compile
+# definition main/CMakeLists.txt sets. Every board shows the theme of the same name.
+def board_themes(theme_dirs):
+    return {theme.upper(): [theme] for theme in theme_dirs}
+
+
+# Preprocessor condition under which a theme is compiled and linked
+def theme_conditions(theme_dirs, boards):
+    conditions = {}
+    for theme in theme_dirs:
+        defines = [f"defined({board})" for board, themes in boards.items() if theme in themes]
+        conditions[theme] = " || ".join(defines) if defines else "0"
+    return conditions
+
+
+# Print how much image data every board links compared to linking all themes
+def print_size_report(theme_dirs, boards, entries):
+    theme_sizes = {theme: 0 for theme in theme_dirs}
+    for key, entry in entries.items():
+        theme = key.split('/')[0]
+        theme_sizes[theme] += entry.get('data_size', 0)
+    total = sum(theme_sizes.values())
+
+    print(f"{'board':<18} {'linked':>10} {'saved':>10}")
+    for board, themes in boards.items():
+        linked = sum(theme_sizes[theme] for theme in themes)
+        print(f"{board:<18} {linked:>10} {total - linked:>10}")
+    print(f"image data of all themes: {total} bytes")
 
-    os.chdir(rpath)
 
 # Function to generate a file using Jinja2 templates
-def generate_file(template_file, output_file, context):
+def generate_file(template_dir, template_file, output_file, context):
     env = Environment(
-        loader=FileSystemLoader('.'),
+        loader=FileSystemLoader(template_dir),
         trim_blocks=True,
         lstrip_blocks=True
     )
@@ -34,31 +161,89 @@ def generate_file(template_file, output_file, context):
     with open(output_file, 'w') as f:
         f.write(rendered_output)
 
+
+# Hash of the inputs of the generated theme files: theme set, screen set, blobs and the templates
+def templates_hash(rpath, context):
+    h = hashlib.sha256()
+    h.update(json.dumps(context, sort_keys=True).encode())
+    for template in TEMPLATES:
+        with open(os.path.join(rpath, template), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
 # Main function to process themes and generate necessary files
 def main():
     rpath = os.path.dirname(os.path.realpath(__file__))
-    os.chdir(os.path.join(rpath, "../themes"))
+    themes_path = os.path.normpath(os.path.join(rpath, "../themes"))
 
-    # Process each theme directory and convert its images
-    theme_dirs = [d for d in os.listdir(".") if os.path.isdir(d) and d != "."]
-    for theme in theme_dirs:
-        theme_name = os.path.basename(theme)
-        if theme_name:
-            print(f"Processing theme: {theme_name}")
-            process_theme(theme_name, rpath)
+    parser = argparse.ArgumentParser(description='Convert the theme images and generate themes.c, themes.h and themes.cmake')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('-f', '--force', action='store_true', help='ignore the build cache and regenerate everything')
+    parser.add_argument('--format', choices=['c', 'bin', 'lz4'], default='c',
+                        help='c: pixel data as C arrays, bin: raw blobs embedded via target_add_binary_data, '
+                        'lz4: LZ4 compressed C arrays, decoded on the device when shown')
+    parser.add_argument('--max-error', type=float, default=None,
+                        help='store images with an indexed 1/2/4/8 bit palette when the RMS error '
+                        '(8 bit channel units) stays below this value, c and bin format only')
+    args = parser.parse_args()
+
+    if args.max_error is not None and args.format == "lz4":
+        parser.error("--max-error is not supported with --format lz4")
+
+    manifest_path = os.path.join(themes_path, MANIFEST_FILE)
+    manifest = {} if args.force else load_manifest(manifest_path)
+
+    theme_dirs = sorted(d for d in os.listdir(themes_path) if os.path.isdir(os.path.join(themes_path, d)))
+
+    conv_hash = converter_hash(rpath, args.format, args.max_error)
+    jobs, entries = collect_jobs(themes_path, theme_dirs, manifest, conv_hash, args.format, args.max_error, args.force)
+    print(f"{len(theme_dirs)} themes, {len(entries)} images, {len(jobs)} to convert")
+
+    # Convert the outdated images in parallel
+    if jobs:
+        with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            futures = [pool.submit(convert_screen, *job) for job in jobs]
+            for future in futures:
+                theme, screen, output_hashes, data_size, info = future.result()
+                entries[f"{theme}/{screen}"]['outputs'] = output_hashes
+                entries[f"{theme}/{screen}"]['data_size'] = data_size
+                print(f"Converted {theme}/{screen}: {info['color_format']}, {info['true_color_size']} -> {data_size} bytes "
+                      f"({100 - 100 * data_size / info['true_color_size']:.0f}% smaller), PSNR {info['psnr']:.1f} dB")
+
+    boards = board_themes(theme_dirs)
 
     # Context for Jinja2 templates
-    screens = ["initscreen2", "miningscreen2", "portalscreen", "btcscreen", "settingsscreen", "splashscreen2", "globalStats"]
     context = {
         'themes': theme_dirs,
-        'screens': screens
+        'screens': SCREENS,
+        'boards': boards,
+        'conditions': theme_conditions(theme_dirs, boards),
+        'blobs': {board: [f"{theme}/{image_encoder.blob_name(f'{theme}_{screen}')}" for theme in themes for screen in SCREENS]
+                  if args.format == "bin" else [] for board, themes in boards.items()},
     }
 
-    # Generate themes.h using Jinja2
-    generate_file('themes.h.j2', '../themes/themes.h', context)
+    # Remove blobs left over from a previous binary build
+    if args.format != "bin":
+        for theme in theme_dirs:
+            for screen in SCREENS:
+                stale = os.path.join(themes_path, theme, image_encoder.blob_name(f"{theme}_{screen}"))
+                if os.path.isfile(stale):
+                    os.remove(stale)
+
+    # Only re-render themes.c/themes.h/themes.cmake when the theme or screen set changed
+    tpl_hash = templates_hash(rpath, context)
+    outputs = [os.path.join(themes_path, os.path.splitext(template)[0]) for template in TEMPLATES]
+    if args.force or manifest.get('templates') != tpl_hash or not all(os.path.isfile(o) for o in outputs):
+        for template, output_file in zip(TEMPLATES, outputs):
+            generate_file(rpath, template, output_file, context)
+            print(f"Generated {os.path.basename(output_file)}")
+
+    save_manifest(manifest_path, {'images': entries, 'templates': tpl_hash})
+
+    print_size_report(theme_dirs, boards, entries)
+    return 0
 
-    # Generate themes.c using Jinja2
-    generate_file('themes.c.j2', '../themes/themes.c', context)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
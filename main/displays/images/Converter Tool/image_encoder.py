@@ -0,0 +1,449 @@
+import os
+import re
+
+import numpy as np
+from PIL import Image
+
+# number of hex literals per line in the generated C arrays
+BYTES_PER_LINE = 16
+
+# "0xHH, " for every possible byte value, indexed by the byte itself
+_HEX_TABLE = np.frombuffer(b''.join(f'0x{i:02X}, '.encode('ascii') for i in range(256)), dtype=np.uint8).reshape(256, 6)
+_INDENT = np.frombuffer(b'    ', dtype=np.uint8)
+_NEWLINE = np.frombuffer(b'\n', dtype=np.uint8)
+
+# Indexed color formats LVGL can draw, smallest first
+INDEXED_BITS = (1, 2, 4, 8)
+
+# LZ4 block format limits, see lz4_Block_format.md
+LZ4_MIN_MATCH = 4
+LZ4_LAST_LITERALS = 5    # the last 5 bytes are always literals
+LZ4_MFLIMIT = 12         # the last match must start at least 12 bytes before the end
+LZ4_MAX_OFFSET = 0xFFFF
+LZ4_CHAIN_DEPTH = 8      # candidates checked per position
+
+# Color formats of compressed images, the decoder on the device maps them
+# back to LV_IMG_CF_TRUE_COLOR and LV_IMG_CF_TRUE_COLOR_ALPHA
+COMPRESSED_COLOR_FORMATS = {False: "LV_IMG_CF_USER_ENCODED_0", True: "LV_IMG_CF_USER_ENCODED_1"}
+
+
+# Open an image and normalize it the same way the converters always did:
+# RGBA images keep their alpha channel, everything else becomes plain RGB
+def load_image(image_path):
+    image = Image.open(image_path)
+
+    if image.mode == 'RGBA':
+        return image.convert('RGBA'), True
+
+    return image.convert('RGB'), False
+
+
+# LVGL color format of an RGB565(A) pixel array
+def true_color_format(use_alpha):
+    return "LV_IMG_CF_TRUE_COLOR_ALPHA" if use_alpha else "LV_IMG_CF_TRUE_COLOR"
+
+
+# Convert a whole image to big endian RGB565 in one pass.
+# With alpha every pixel is followed by its alpha byte (LV_IMG_CF_TRUE_COLOR_ALPHA).
+def encode_rgb565(image, use_alpha):
+    width, height = image.size
+    channels = 4 if use_alpha else 3
+    pixels = np.asarray(image, dtype=np.uint8).reshape(height * width, channels)
+
+    r = pixels[:, 0]
+    g = pixels[:, 1]
+    b = pixels[:, 2]
+
+    out = np.empty((height * width, channels), dtype=np.uint8)
+    out[:, 0] = (r & 0xF8) | (g >> 5)
+    out[:, 1] = ((g << 3) & 0xE0) | (b >> 3)
+    if use_alpha:
+        out[:, 2] = pixels[:, 3]
+
+    # drop the unused third column for plain RGB565
+    return out[:, :3 if use_alpha else 2].tobytes()
+
+
+# Format a byte buffer as the body of a C array, 16 literals per line.
+# The layout (indent, trailing ", ", no newline after a partial last line)
+# matches the historic per-byte writer exactly.
+def format_hex_array(data):
+    values = np.frombuffer(data, dtype=np.uint8)
+    full_lines = len(values) // BYTES_PER_LINE
+    rest = len(values) % BYTES_PER_LINE
+
+    chunks = []
+    if full_lines:
+        body = _HEX_TABLE[values[:full_lines * BYTES_PER_LINE]].reshape(full_lines, BYTES_PER_LINE * 6)
+        indent = np.broadcast_to(_INDENT, (full_lines, len(_INDENT)))
+        newline = np.broadcast_to(_NEWLINE, (full_lines, 1))
+        chunks.append(np.hstack((indent, body, newline)).tobytes())
+
+    if rest:
+        chunks.append(_INDENT.tobytes())
+        chunks.append(_HEX_TABLE[values[full_lines * BYTES_PER_LINE:]].tobytes())
+
+    return b''.join(chunks).decode('ascii')
+
+
+# Render the complete C source for one image
+def render_c_image(var_name, source_name, width, height, data, use_alpha, color_format=None):
+    color_format = color_format or true_color_format(use_alpha)
+
+    return ''.join([
+        '#include "lvgl.h"\n\n',
+        '#ifndef LV_ATTRIBUTE_MEM_ALIGN\n',
+        '    #define LV_ATTRIBUTE_MEM_ALIGN\n',
+        '#endif\n\n',
+        f'// IMAGE DATA: {source_name}\n',
+        f'const LV_ATTRIBUTE_MEM_ALIGN uint8_t ui_img_{var_name}_png_data[] = {{\n',
+        format_hex_array(data),
+        '\n};\n\n',
+        f'const lv_img_dsc_t ui_img_{var_name}_png = {{\n',
+        '    .header.always_zero = 0,\n',
+        f'    .header.w = {width},\n',
+        f'    .header.h = {height},\n',
+        f'    .data_size = sizeof(ui_img_{var_name}_png_data),\n',
+        f'    .header.cf = {color_format},\n',
+        f'    .data = ui_img_{var_name}_png_data\n',
+        '};\n',
+    ])
+
+
+# Pixels reduced to the precision the display actually has (RGB565, 8 bit alpha)
+def reduce_to_rgb565(image):
+    pixels = np.array(image, dtype=np.uint8)
+    pixels[..., 0] &= 0xF8
+    pixels[..., 1] &= 0xFC
+    pixels[..., 2] &= 0xF8
+    return pixels
+
+
+# Reduced pixels back to 8 bit channels the way the display shows them,
+# the top bits of each RGB565 channel repeated in the dropped low bits
+def expand_rgb565(pixels):
+    pixels = pixels.copy()
+    pixels[..., 0] |= pixels[..., 0] >> 5
+    pixels[..., 1] |= pixels[..., 1] >> 6
+    pixels[..., 2] |= pixels[..., 2] >> 5
+    return pixels
+
+
+# RMS error (8 bit channel units) and PSNR of a reconstruction
+def image_error(reference, reconstructed):
+    mse = np.mean((reference.astype(np.float64) - reconstructed.astype(np.float64)) ** 2)
+    rms = float(np.sqrt(mse))
+    psnr = float('inf') if mse == 0 else float(10 * np.log10(255 ** 2 / mse))
+    return rms, psnr
+
+
+# Map an image to a palette of at most 2^bits colors. Images with few enough
+# distinct colors get an exact palette, the others are quantized by Pillow.
+def quantize(pixels, use_alpha, bits):
+    channels = pixels.shape[2]
+    flat = pixels.reshape(-1, channels)
+
+    colors, indices = np.unique(flat, axis=0, return_inverse=True)
+    if len(colors) > 1 << bits:
+        method = Image.Quantize.FASTOCTREE if use_alpha else Image.Quantize.MEDIANCUT
+        quantized = Image.fromarray(pixels).quantize(colors=1 << bits, method=method, dither=Image.Dither.NONE)
+        indices = np.asarray(quantized, dtype=np.uint8).reshape(-1)
+        palette = quantized.getpalette(rawmode='RGBA' if use_alpha else 'RGB')
+        colors = np.array(palette, dtype=np.uint8).reshape(-1, channels)[:1 << bits]
+
+    return colors, indices.reshape(pixels.shape[:2]).astype(np.uint8)
+
+
+# LVGL indexed image data: 2^bits lv_color32_t palette entries (B, G, R, A)
+# followed by the indices, MSB first and every row starting on a byte boundary
+def encode_indexed(colors, indices, bits):
+    palette = np.zeros((1 << bits, 4), dtype=np.uint8)
+    palette[:len(colors), 0] = colors[:, 2]
+    palette[:len(colors), 1] = colors[:, 1]
+    palette[:len(colors), 2] = colors[:, 0]
+    palette[:len(colors), 3] = colors[:, 3] if colors.shape[1] == 4 else 0xFF
+
+    height, width = indices.shape
+    per_byte = 8 // bits
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :width] = indices
+    groups = padded.reshape(height, -1, per_byte)
+
+    packed = np.zeros(groups.shape[:2], dtype=np.uint8)
+    for i in range(per_byte):
+        packed |= groups[:, :, i] << (8 - bits * (i + 1))
+
+    return palette.tobytes() + packed.tobytes()
+
+
+# PSNR of an image as the display shows it in true color (RGB565 round trip)
+def true_color_psnr(image):
+    return image_error(np.asarray(image), expand_rgb565(reduce_to_rgb565(image)))[1]
+
+
+# Pick the smallest indexed format whose RMS error stays within max_error.
+# Returns (color_format, data, psnr), or None when true color has to be kept.
+# The error is measured against the RGB565 image, the PSNR against the
+# original like the one of true color.
+def choose_indexed(image, use_alpha, max_error):
+    pixels = reduce_to_rgb565(image)
+    true_color_size = pixels.shape[0] * pixels.shape[1] * (3 if use_alpha else 2)
+
+    for bits in INDEXED_BITS:
+        colors, indices = quantize(pixels, use_alpha, bits)
+        rms, _ = image_error(pixels, colors[indices])
+        if rms > max_error:
+            continue
+
+        data = encode_indexed(colors, indices, bits)
+        if len(data) >= true_color_size:
+            break
+        _, psnr = image_error(np.asarray(image), expand_rgb565(colors[indices]))
+        return f"LV_IMG_CF_INDEXED_{bits}BIT", data, psnr
+
+    return None
+
+
+# File name of the raw blob of an image when using the binary output format
+def blob_name(var_name):
+    return f"ui_img_{var_name}_png.bin"
+
+
+# Symbol ESP-IDF creates for a file embedded with EMBED_FILES/target_add_binary_data
+def blob_symbol(file_name):
+    return "_binary_" + re.sub(r'[^A-Za-z0-9_]', '_', file_name) + "_start"
+
+
+# Render a descriptor that points at the embedded blob of an image instead of
+# carrying the pixel data. The lv_img_dsc_t keeps its name so it stays a drop-in
+# replacement for the array variant.
+def render_c_descriptor(var_name, source_name, width, height, data_size, use_alpha, color_format=None):
+    color_format = color_format or true_color_format(use_alpha)
+    file_name = blob_name(var_name)
+
+    return ''.join([
+        '#include "lvgl.h"\n\n',
+        f'// IMAGE DATA: {source_name} (embedded from {file_name})\n',
+        f'extern const uint8_t ui_img_{var_name}_png_data[] asm("{blob_symbol(file_name)}");\n\n',
+        f'const lv_img_dsc_t ui_img_{var_name}_png = {{\n',
+        '    .header.always_zero = 0,\n',
+        f'    .header.w = {width},\n',
+        f'    .header.h = {height},\n',
+        f'    .data_size = {data_size},\n',
+        f'    .header.cf = {color_format},\n',
+        f'    .data = ui_img_{var_name}_png_data\n',
+        '};\n',
+    ])
+
+
+# Length bytes that follow a token nibble of 15
+def _lz4_length(length):
+    out = bytearray()
+    length -= 15
+    while length >= 255:
+        out.append(255)
+        length -= 255
+    out.append(length)
+    return out
+
+
+# Append one sequence (literals followed by an optional match) to out
+def _lz4_sequence(out, literals, offset=0, match_length=0):
+    lit_len = len(literals)
+    match_code = match_length - LZ4_MIN_MATCH if offset else 0
+
+    out.append((min(lit_len, 15) << 4) | min(match_code, 15))
+    if lit_len >= 15:
+        out += _lz4_length(lit_len)
+    out += literals
+
+    if offset:
+        out += offset.to_bytes(2, 'little')
+        if match_code >= 15:
+            out += _lz4_length(match_code)
+
+
+# Number of equal bytes at data[a:] and data[b:] (a < b), stopping at limit.
+# Compares growing slices instead of single bytes, long runs are common in the themes.
+def _match_length(data, a, b, limit):
+    n = 0
+    step = 16
+    while step:
+        if b + n + step <= limit and data[a + n:a + n + step] == data[b + n:b + n + step]:
+            n += step
+            step = min(step * 2, 4096)
+        else:
+            step //= 2
+    return n
+
+
+# LZ4 block compressor with a small hash chain and one step lazy matching.
+# Slower than the reference lz4 fast mode but gets ~5x on the theme images.
+# The output is a plain LZ4 block (no frame header) that the decoder in
+# image_cache.cpp understands.
+def compress_lz4(data, chain_depth=LZ4_CHAIN_DEPTH):
+    data = bytes(data)
+    end = len(data)
+    match_limit = end - LZ4_LAST_LITERALS
+    last_match = end - LZ4_MFLIMIT
+    chains = {}
+    out = bytearray()
+    anchor = 0
+    i = 0
+
+    def find_match(pos):
+        best_length, best_offset = 0, 0
+        for ref in reversed(chains.get(data[pos:pos + LZ4_MIN_MATCH], [])[-chain_depth:]):
+            if pos - ref > LZ4_MAX_OFFSET:
+                break
+            length = LZ4_MIN_MATCH + _match_length(data, ref + LZ4_MIN_MATCH, pos + LZ4_MIN_MATCH, match_limit)
+            if length > best_length:
+                best_length, best_offset = length, pos - ref
+        return best_length, best_offset
+
+    def insert(pos):
+        chain = chains.setdefault(data[pos:pos + LZ4_MIN_MATCH], [])
+        chain.append(pos)
+        if len(chain) > 4 * chain_depth:
+            del chain[:2 * chain_depth]
+
+    while i <= last_match:
+        length, offset = find_match(i)
+        insert(i)
+        if not length:
+            i += 1
+            continue
+
+        # prefer a clearly longer match starting at the next byte
+        if i + 1 <= last_match:
+            next_length, next_offset = find_match(i + 1)
+            if next_length > length + 1:
+                i += 1
+                insert(i)
+                length, offset = next_length, next_offset
+
+        _lz4_sequence(out, data[anchor:i], offset, length)
+
+        # index a few positions inside the match, enough to find repeated rows
+        for pos in range(i + 1, min(i + length, last_match + 1), max(1, length // 16)):
+            insert(pos)
+
+        i += length
+        anchor = i
+
+    _lz4_sequence(out, data[anchor:])
+    return bytes(out)
+
+
+# Reference decoder, used to verify the compressor output
+def decompress_lz4(data, size):
+    out = bytearray()
+    i = 0
+    n = len(data)
+
+    def read_length(length):
+        nonlocal i
+        if length == 15:
+            while True:
+                b = data[i]
+                i += 1
+                length += b
+                if b != 255:
+                    break
+        return length
+
+    while i < n:
+        token = data[i]
+        i += 1
+
+        lit_len = read_length(token >> 4)
+        out += data[i:i + lit_len]
+        i += lit_len
+        if i >= n:
+            break
+
+        offset = data[i] | (data[i + 1] << 8)
+        i += 2
+        length = read_length(token & 0x0F) + LZ4_MIN_MATCH
+
+        start = len(out) - offset
+        if offset == 0 or start < 0:
+            raise ValueError(f"invalid match offset {offset} at {i}")
+        if offset >= length:
+            out += out[start:start + length]
+        else:
+            # overlapping match, repeats the last offset bytes
+            out += (out[start:] * (length // offset + 1))[:length]
+
+    if len(out) != size:
+        raise ValueError(f"decompressed {len(out)} bytes, expected {size}")
+    return bytes(out)
+
+
+# Render an image whose pixel data is LZ4 compressed. The device decompresses
+# it into PSRAM the first time the screen is drawn.
+def render_c_compressed(var_name, source_name, width, height, data, use_alpha):
+    return ''.join([
+        '#include "lvgl.h"\n\n',
+        '#ifndef LV_ATTRIBUTE_MEM_ALIGN\n',
+        '    #define LV_ATTRIBUTE_MEM_ALIGN\n',
+        '#endif\n\n',
+        f'// IMAGE DATA: {source_name} (LZ4 compressed)\n',
+        f'const LV_ATTRIBUTE_MEM_ALIGN uint8_t ui_img_{var_name}_png_data[] = {{\n',
+        format_hex_array(data),
+        '\n};\n\n',
+        f'const lv_img_dsc_t ui_img_{var_name}_png = {{\n',
+        '    .header.always_zero = 0,\n',
+        f'    .header.w = {width},\n',
+        f'    .header.h = {height},\n',
+        f'    .data_size = sizeof(ui_img_{var_name}_png_data),\n',
+        f'    .header.cf = {COMPRESSED_COLOR_FORMATS[use_alpha]},\n',
+        f'    .data = ui_img_{var_name}_png_data\n',
+        '};\n',
+    ])
+
+
+# Convert a PNG file for the given output format. Returns the C source, the
+# image data as it ends up in flash (pixel array, raw blob or compressed block)
+# and the chosen color format, true color size and PSNR for reports.
+# With max_error set, c and bin images are stored with a palette if the error allows it.
+def convert_image(image_path, var_name, output_format="c", max_error=None):
+    image, use_alpha = load_image(image_path)
+    width, height = image.size
+    source_name = os.path.basename(image_path)
+    data = encode_rgb565(image, use_alpha)
+    info = {'color_format': true_color_format(use_alpha), 'true_color_size': len(data)}
+
+    indexed = None
+    if max_error is not None and output_format != "lz4":
+        indexed = choose_indexed(image, use_alpha, max_error)
+    if indexed:
+        info['color_format'], data, info['psnr'] = indexed
+    else:
+        info['psnr'] = true_color_psnr(image)
+
+    if output_format == "bin":
+        source = render_c_descriptor(var_name, source_name, width, height, len(data), use_alpha, info['color_format'])
+    elif output_format == "lz4":
+        data = compress_lz4(data)
+        info['color_format'] = COMPRESSED_COLOR_FORMATS[use_alpha]
+        source = render_c_compressed(var_name, source_name, width, height, data, use_alpha)
+    else:
+        source = render_c_image(var_name, source_name, width, height, data, use_alpha, info['color_format'])
+
+    return source, data, info
+
+
+# Convert a PNG file into a raw blob plus the C source of its descriptor
+def convert_png_to_blob(image_path, var_name):
+    return convert_image(image_path, var_name, "bin")[:2]
+
+
+# Convert a PNG file into the C source of a compressed lv_img_dsc_t
+def convert_png_compressed(image_path, var_name):
+    return convert_image(image_path, var_name, "lz4")[0]
+
+
+# Convert a PNG file into the C source of an lv_img_dsc_t named ui_img_<var_name>_png
+def convert_png(image_path, var_name):
+    return convert_image(image_path, var_name)[0]
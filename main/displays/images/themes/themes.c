@@ -2,6 +2,9 @@
 
 // autogenerated, do not modify!
 
+// only the themes of the board this firmware is built for are compiled
+
+#if defined(NERDAXE)
 #include "./NerdAxe/ui_img_initscreen2_png.c"
 #include "./NerdAxe/ui_img_miningscreen2_png.c"
 #include "./NerdAxe/ui_img_portalscreen_png.c"
@@ -9,7 +12,9 @@
 #include "./NerdAxe/ui_img_settingsscreen_png.c"
 #include "./NerdAxe/ui_img_splashscreen2_png.c"
 #include "./NerdAxe/ui_img_globalStats_png.c"
+#endif
 
+#if defined(NERDAXEGAMMA)
 #include "./NerdAxeGamma/ui_img_initscreen2_png.c"
 #include "./NerdAxeGamma/ui_img_miningscreen2_png.c"
 #include "./NerdAxeGamma/ui_img_portalscreen_png.c"
@@ -17,7 +22,9 @@
 #include "./NerdAxeGamma/ui_img_settingsscreen_png.c"
 #include "./NerdAxeGamma/ui_img_splashscreen2_png.c"
 #include "./NerdAxeGamma/ui_img_globalStats_png.c"
+#endif
 
+#if defined(NERDEKO)
 #include "./NerdEko/ui_img_initscreen2_png.c"
 #include "./NerdEko/ui_img_miningscreen2_png.c"
 #include "./NerdEko/ui_img_portalscreen_png.c"
@@ -25,7 +32,9 @@
 #include "./NerdEko/ui_img_settingsscreen_png.c"
 #include "./NerdEko/ui_img_splashscreen2_png.c"
 #include "./NerdEko/ui_img_globalStats_png.c"
+#endif
 
+#if defined(NERDHAXEGAMMA)
 #include "./NerdHaxeGamma/ui_img_initscreen2_png.c"
 #include "./NerdHaxeGamma/ui_img_miningscreen2_png.c"
 #include "./NerdHaxeGamma/ui_img_portalscreen_png.c"
@@ -33,7 +42,9 @@
 #include "./NerdHaxeGamma/ui_img_settingsscreen_png.c"
 #include "./NerdHaxeGamma/ui_img_splashscreen2_png.c"
 #include "./NerdHaxeGamma/ui_img_globalStats_png.c"
+#endif
 
+#if defined(NERDOCTAXEGAMMA)
 #include "./NerdOctaxeGamma/ui_img_initscreen2_png.c"
 #include "./NerdOctaxeGamma/ui_img_miningscreen2_png.c"
 #include "./NerdOctaxeGamma/ui_img_portalscreen_png.c"
@@ -41,7 +52,9 @@
 #include "./NerdOctaxeGamma/ui_img_settingsscreen_png.c"
 #include "./NerdOctaxeGamma/ui_img_splashscreen2_png.c"
 #include "./NerdOctaxeGamma/ui_img_globalStats_png.c"
+#endif
 
+#if defined(NERDOCTAXEPLUS)
 #include "./NerdOctaxePlus/ui_img_initscreen2_png.c"
 #include "./NerdOctaxePlus/ui_img_miningscreen2_png.c"
 #include "./NerdOctaxePlus/ui_img_portalscreen_png.c"
@@ -49,7 +62,9 @@
 #include "./NerdOctaxePlus/ui_img_settingsscreen_png.c"
 #include "./NerdOctaxePlus/ui_img_splashscreen2_png.c"
 #include "./NerdOctaxePlus/ui_img_globalStats_png.c"
+#endif
 
+#if defined(NERDQAXEPLUS)
 #include "./NerdQaxePlus/ui_img_initscreen2_png.c"
 #include "./NerdQaxePlus/ui_img_miningscreen2_png.c"
 #include "./NerdQaxePlus/ui_img_portalscreen_png.c"
@@ -57,7 +72,9 @@
 #include "./NerdQaxePlus/ui_img_settingsscreen_png.c"
 #include "./NerdQaxePlus/ui_img_splashscreen2_png.c"
 #include "./NerdQaxePlus/ui_img_globalStats_png.c"
+#endif
 
+#if defined(NERDQAXEPLUS2)
 #include "./NerdQaxePlus2/ui_img_initscreen2_png.c"
 #include "./NerdQaxePlus2/ui_img_miningscreen2_png.c"
 #include "./NerdQaxePlus2/ui_img_portalscreen_png.c"
@@ -65,4 +82,5 @@
 #include "./NerdQaxePlus2/ui_img_settingsscreen_png.c"
 #include "./NerdQaxePlus2/ui_img_splashscreen2_png.c"
 #include "./NerdQaxePlus2/ui_img_globalStats_png.c"
+#endif
 
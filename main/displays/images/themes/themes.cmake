@@ -0,0 +1,20 @@
+# autogenerated, do not modify!
+
+# theme images that are embedded as raw blobs (create_themes.py --format bin),
+# one list per board
+set(THEME_BINARY_FILES_NERDAXE
+)
+set(THEME_BINARY_FILES_NERDAXEGAMMA
+)
+set(THEME_BINARY_FILES_NERDEKO
+)
+set(THEME_BINARY_FILES_NERDHAXEGAMMA
+)
+set(THEME_BINARY_FILES_NERDOCTAXEGAMMA
+)
+set(THEME_BINARY_FILES_NERDOCTAXEPLUS
+)
+set(THEME_BINARY_FILES_NERDQAXEPLUS
+)
+set(THEME_BINARY_FILES_NERDQAXEPLUS2
+)
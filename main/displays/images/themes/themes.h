@@ -62,6 +62,7 @@ class Theme {
     }
 };
 
+#if defined(NERDAXE)
 // image files for theme NerdAxe
 LV_IMG_DECLARE(ui_img_NerdAxe_initscreen2_png);
 LV_IMG_DECLARE(ui_img_NerdAxe_miningscreen2_png);
@@ -71,70 +72,6 @@ LV_IMG_DECLARE(ui_img_NerdAxe_settingsscreen_png);
 LV_IMG_DECLARE(ui_img_NerdAxe_splashscreen2_png);
 LV_IMG_DECLARE(ui_img_NerdAxe_globalStats_png);
 
-// image files for theme NerdAxeGamma
-LV_IMG_DECLARE(ui_img_NerdAxeGamma_initscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdAxeGamma_miningscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdAxeGamma_portalscreen_png);
-LV_IMG_DECLARE(ui_img_NerdAxeGamma_btcscreen_png);
-LV_IMG_DECLARE(ui_img_NerdAxeGamma_settingsscreen_png);
-LV_IMG_DECLARE(ui_img_NerdAxeGamma_splashscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdAxeGamma_globalStats_png);
-
-// image files for theme NerdEko
-LV_IMG_DECLARE(ui_img_NerdEko_initscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdEko_miningscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdEko_portalscreen_png);
-LV_IMG_DECLARE(ui_img_NerdEko_btcscreen_png);
-LV_IMG_DECLARE(ui_img_NerdEko_settingsscreen_png);
-LV_IMG_DECLARE(ui_img_NerdEko_splashscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdEko_globalStats_png);
-
-// image files for theme NerdHaxeGamma
-LV_IMG_DECLARE(ui_img_NerdHaxeGamma_initscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdHaxeGamma_miningscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdHaxeGamma_portalscreen_png);
-LV_IMG_DECLARE(ui_img_NerdHaxeGamma_btcscreen_png);
-LV_IMG_DECLARE(ui_img_NerdHaxeGamma_settingsscreen_png);
-LV_IMG_DECLARE(ui_img_NerdHaxeGamma_splashscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdHaxeGamma_globalStats_png);
-
-// image files for theme NerdOctaxeGamma
-LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_initscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_miningscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_portalscreen_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_btcscreen_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_settingsscreen_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_splashscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_globalStats_png);
-
-// image files for theme NerdOctaxePlus
-LV_IMG_DECLARE(ui_img_NerdOctaxePlus_initscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxePlus_miningscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxePlus_portalscreen_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxePlus_btcscreen_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxePlus_settingsscreen_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxePlus_splashscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdOctaxePlus_globalStats_png);
-
-// image files for theme NerdQaxePlus
-LV_IMG_DECLARE(ui_img_NerdQaxePlus_initscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus_miningscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus_portalscreen_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus_btcscreen_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus_settingsscreen_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus_splashscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus_globalStats_png);
-
-// image files for theme NerdQaxePlus2
-LV_IMG_DECLARE(ui_img_NerdQaxePlus2_initscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus2_miningscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus2_portalscreen_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus2_btcscreen_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus2_settingsscreen_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus2_splashscreen2_png);
-LV_IMG_DECLARE(ui_img_NerdQaxePlus2_globalStats_png);
-
-
 // class  for theme NerdAxe
 class ThemeNerdaxe : public Theme {
 public:
@@ -148,6 +85,17 @@ public:
         setGlobalstats(&ui_img_NerdAxe_globalStats_png);
     }
 };
+#endif
+
+#if defined(NERDAXEGAMMA)
+// image files for theme NerdAxeGamma
+LV_IMG_DECLARE(ui_img_NerdAxeGamma_initscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdAxeGamma_miningscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdAxeGamma_portalscreen_png);
+LV_IMG_DECLARE(ui_img_NerdAxeGamma_btcscreen_png);
+LV_IMG_DECLARE(ui_img_NerdAxeGamma_settingsscreen_png);
+LV_IMG_DECLARE(ui_img_NerdAxeGamma_splashscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdAxeGamma_globalStats_png);
 
 // class  for theme NerdAxeGamma
 class ThemeNerdaxegamma : public Theme {
@@ -162,6 +110,17 @@ public:
         setGlobalstats(&ui_img_NerdAxeGamma_globalStats_png);
     }
 };
+#endif
+
+#if defined(NERDEKO)
+// image files for theme NerdEko
+LV_IMG_DECLARE(ui_img_NerdEko_initscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdEko_miningscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdEko_portalscreen_png);
+LV_IMG_DECLARE(ui_img_NerdEko_btcscreen_png);
+LV_IMG_DECLARE(ui_img_NerdEko_settingsscreen_png);
+LV_IMG_DECLARE(ui_img_NerdEko_splashscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdEko_globalStats_png);
 
 // class  for theme NerdEko
 class ThemeNerdeko : public Theme {
@@ -176,6 +135,17 @@ public:
         setGlobalstats(&ui_img_NerdEko_globalStats_png);
     }
 };
+#endif
+
+#if defined(NERDHAXEGAMMA)
+// image files for theme NerdHaxeGamma
+LV_IMG_DECLARE(ui_img_NerdHaxeGamma_initscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdHaxeGamma_miningscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdHaxeGamma_portalscreen_png);
+LV_IMG_DECLARE(ui_img_NerdHaxeGamma_btcscreen_png);
+LV_IMG_DECLARE(ui_img_NerdHaxeGamma_settingsscreen_png);
+LV_IMG_DECLARE(ui_img_NerdHaxeGamma_splashscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdHaxeGamma_globalStats_png);
 
 // class  for theme NerdHaxeGamma
 class ThemeNerdhaxegamma : public Theme {
@@ -190,6 +160,17 @@ public:
         setGlobalstats(&ui_img_NerdHaxeGamma_globalStats_png);
     }
 };
+#endif
+
+#if defined(NERDOCTAXEGAMMA)
+// image files for theme NerdOctaxeGamma
+LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_initscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_miningscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_portalscreen_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_btcscreen_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_settingsscreen_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_splashscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxeGamma_globalStats_png);
 
 // class  for theme NerdOctaxeGamma
 class ThemeNerdoctaxegamma : public Theme {
@@ -204,6 +185,17 @@ public:
         setGlobalstats(&ui_img_NerdOctaxeGamma_globalStats_png);
     }
 };
+#endif
+
+#if defined(NERDOCTAXEPLUS)
+// image files for theme NerdOctaxePlus
+LV_IMG_DECLARE(ui_img_NerdOctaxePlus_initscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxePlus_miningscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxePlus_portalscreen_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxePlus_btcscreen_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxePlus_settingsscreen_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxePlus_splashscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdOctaxePlus_globalStats_png);
 
 // class  for theme NerdOctaxePlus
 class ThemeNerdoctaxeplus : public Theme {
@@ -218,6 +210,17 @@ public:
         setGlobalstats(&ui_img_NerdOctaxePlus_globalStats_png);
     }
 };
+#endif
+
+#if defined(NERDQAXEPLUS)
+// image files for theme NerdQaxePlus
+LV_IMG_DECLARE(ui_img_NerdQaxePlus_initscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus_miningscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus_portalscreen_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus_btcscreen_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus_settingsscreen_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus_splashscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus_globalStats_png);
 
 // class  for theme NerdQaxePlus
 class ThemeNerdqaxeplus : public Theme {
@@ -232,6 +235,17 @@ public:
         setGlobalstats(&ui_img_NerdQaxePlus_globalStats_png);
     }
 };
+#endif
+
+#if defined(NERDQAXEPLUS2)
+// image files for theme NerdQaxePlus2
+LV_IMG_DECLARE(ui_img_NerdQaxePlus2_initscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus2_miningscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus2_portalscreen_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus2_btcscreen_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus2_settingsscreen_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus2_splashscreen2_png);
+LV_IMG_DECLARE(ui_img_NerdQaxePlus2_globalStats_png);
 
 // class  for theme NerdQaxePlus2
 class ThemeNerdqaxeplus2 : public Theme {
@@ -246,4 +260,52 @@ public:
         setGlobalstats(&ui_img_NerdQaxePlus2_globalStats_png);
     }
 };
+#endif
+
+// theme of the board this firmware is built for
+#if defined(NERDAXE)
+typedef ThemeNerdaxe BoardTheme;
+#elif defined(NERDAXEGAMMA)
+typedef ThemeNerdaxegamma BoardTheme;
+#elif defined(NERDEKO)
+typedef ThemeNerdeko BoardTheme;
+#elif defined(NERDHAXEGAMMA)
+typedef ThemeNerdhaxegamma BoardTheme;
+#elif defined(NERDOCTAXEGAMMA)
+typedef ThemeNerdoctaxegamma BoardTheme;
+#elif defined(NERDOCTAXEPLUS)
+typedef ThemeNerdoctaxeplus BoardTheme;
+#elif defined(NERDQAXEPLUS)
+typedef ThemeNerdqaxeplus BoardTheme;
+#elif defined(NERDQAXEPLUS2)
+typedef ThemeNerdqaxeplus2 BoardTheme;
+#else
+#error "no theme for this board, add it to create_themes.py"
+#endif
 
+// themes that are not linked into this firmware fall back to the board theme
+// so the constructors of the other boards still compile
+#if !(defined(NERDAXE))
+class ThemeNerdaxe : public BoardTheme {};
+#endif
+#if !(defined(NERDAXEGAMMA))
+class ThemeNerdaxegamma : public BoardTheme {};
+#endif
+#if !(defined(NERDEKO))
+class ThemeNerdeko : public BoardTheme {};
+#endif
+#if !(defined(NERDHAXEGAMMA))
+class ThemeNerdhaxegamma : public BoardTheme {};
+#endif
+#if !(defined(NERDOCTAXEGAMMA))
+class ThemeNerdoctaxegamma : public BoardTheme {};
+#endif
+#if !(defined(NERDOCTAXEPLUS))
+class ThemeNerdoctaxeplus : public BoardTheme {};
+#endif
+#if !(defined(NERDQAXEPLUS))
+class ThemeNerdqaxeplus : public BoardTheme {};
+#endif
+#if !(defined(NERDQAXEPLUS2))
+class ThemeNerdqaxeplus2 : public BoardTheme {};
+#endif
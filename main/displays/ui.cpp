@@ -670,6 +670,9 @@ void UI::init(Board* board)
     m_board = board;
     m_theme = board->getTheme();
 
+    // decoder for compressed theme images, they are decompressed into PSRAM when shown
+    m_imageCache.init();
+
     lv_disp_t *dispp = lv_disp_get_default();
     lv_theme_t *m_theme =
         lv_theme_default_init(dispp, lv_palette_main(LV_PALETTE_BLUE), lv_palette_main(LV_PALETTE_RED), true, LV_FONT_DEFAULT);
@@ -2,6 +2,7 @@
 
 #include "lvgl.h"
 #include "../boards/board.h"
+#include "image_cache.h"
 
 
 LV_IMG_DECLARE(ui_img_overheat_png);      // overheating screen
@@ -79,6 +80,7 @@ protected:
 
     Board* m_board;
     Theme* m_theme;
+    ImageCache m_imageCache;
 
     int64_t m_last_screen_change_time;
 
@@ -1,14 +1,11 @@
 #include <math.h>
-#include <pthread.h>
 #include <stdint.h>
 
+#include "esp_heap_caps.h"
 #include "esp_log.h"
+#include "esp_random.h"
 #include "esp_timer.h" // Include esp_timer for esp_timer_get_time
-#include "freertos/FreeRTOS.h"
-#include "freertos/queue.h"
-#include "freertos/task.h"
 
-#include "global_state.h"
 #include "history.h"
 
 #pragma GCC diagnostic error "-Wall"
@@ -20,6 +17,13 @@ static const char *TAG = "history";
 // define for wrapped access of psram
 #define WRAP(a) ((a) & (HISTORY_MAX_SAMPLES - 1))
 
+// samples or buckets readers copy at once to the stack
+#define HISTORY_READ_CHUNK 16
+
+// a sample's source byte, the pool above the ASIC
+#define HISTORY_SOURCE_POOL_SHIFT 5
+#define HISTORY_SOURCE_ASIC_MASK ((1 << HISTORY_SOURCE_POOL_SHIFT) - 1)
+
 
 NonceDistribution::NonceDistribution() {
     // NOP
@@ -51,7 +55,7 @@ void NonceDistribution::toLog()
 
     // Iterate through each ASIC and append its count to the log message
     for (int i = 0; i < m_numAsics; i++) {
-        offset += snprintf(buffer + offset, sizeof(buffer) - offset, "%lu/", m_distribution[i]);
+        offset += snprintf(buffer + offset, sizeof(buffer) - offset, "%lu/", (unsigned long) m_distribution[i]);
     }
     if (offset > 0) {
         buffer[offset - 1] = 0; // remove trailing slash
@@ -81,19 +85,33 @@ float History::getHashrate1dSample(int index)
     return m_hashrate1d[WRAP(index)];
 }
 
+double History::getCurrentHashrate(int window)
+{
+    history_snapshot snapshot;
+    getSnapshot(&snapshot);
+    return snapshot.hashrate[window];
+}
+
 double History::getCurrentHashrate10m()
 {
-    return m_avg10m.getGh();
+    return getCurrentHashrate(HISTORY_WINDOW_10M);
 }
 
 double History::getCurrentHashrate1h()
 {
-    return m_avg10m.getGh();
+    return getCurrentHashrate(HISTORY_WINDOW_1H);
 }
 
 double History::getCurrentHashrate1d()
 {
-    return m_avg10m.getGh();
+    return getCurrentHashrate(HISTORY_WINDOW_1D);
+}
+
+int History::getNumSamples()
+{
+    history_snapshot snapshot;
+    getSnapshot(&snapshot);
+    return snapshot.numSamples;
 }
 
 uint32_t History::getShareSample(int index)
@@ -101,20 +119,129 @@ uint32_t History::getShareSample(int index)
     return m_shares[WRAP(index)];
 }
 
+uint8_t History::getSourceSample(int index)
+{
+    return m_sources[WRAP(index)];
+}
+
 uint64_t History::getCurrentTimestamp()
 {
+    history_snapshot snapshot;
+    getSnapshot(&snapshot);
+    return snapshot.timestamp;
+}
+
+// fills the copy readers aren't pointed to and points them to it
+void History::publish()
+{
+    uint32_t published = m_published.load(std::memory_order_relaxed) + 1;
+    auto *slot = &m_snapshots[published & 1];
+    uint32_t seq = slot->seq.load(std::memory_order_relaxed);
+
+    slot->seq.store(seq + 1, std::memory_order_relaxed);
+    std::atomic_thread_fence(std::memory_order_release);
+
+    history_snapshot *snapshot = &slot->snapshot;
+    snapshot->numSamples = m_numSamples;
     // all timestamps are equal
-    return m_avg10m.getTimestamp();
+    snapshot->timestamp = m_avgs[0].getTimestamp();
+    // stored as float like the samples, exports of the latest one give the same value
+    snapshot->numAsics = m_sources ? m_numAsics : 0;
+    snapshot->numPools = m_sources ? HISTORY_NUM_POOLS : 0;
+    for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+        snapshot->hashrate[w] = m_avgs[w].getGh();
+        for (int i = 0; i < snapshot->numAsics; i++) {
+            snapshot->asicHashrate[w][i] = m_avgs[w].getAsicGh(i);
+        }
+        for (int i = 0; i < snapshot->numPools; i++) {
+            snapshot->poolHashrate[w][i] = m_avgs[w].getPoolGh(i);
+        }
+    }
+    for (int i = 0; i < HISTORY_NUM_TIERS; i++) {
+        snapshot->numBuckets[i] = m_tiers[i].getNumBuckets();
+        snapshot->hasBucket[i] = m_tiers[i].hasBucket();
+        snapshot->bucket[i] = *m_tiers[i].getBucket();
+    }
+
+    slot->seq.store(seq + 2, std::memory_order_release);
+    m_published.store(published, std::memory_order_release);
+}
+
+// doesn't wait for the writer, the copy it was pointed to is only written
+// again after the writer published the other one
+void History::getSnapshot(history_snapshot *snapshot)
+{
+    while (true) {
+        auto *slot = &m_snapshots[m_published.load(std::memory_order_acquire) & 1];
+        uint32_t seq = slot->seq.load(std::memory_order_acquire);
+        if (seq & 1) {
+            continue;
+        }
+        *snapshot = slot->snapshot;
+        std::atomic_thread_fence(std::memory_order_acquire);
+        if (slot->seq.load(std::memory_order_relaxed) == seq) {
+            return;
+        }
+    }
 }
 
-void History::lock()
+// copies up to max samples from index below num_samples of a snapshot,
+// returns -1 if the writer overwrote them meanwhile
+int History::readSamples(history_sample *samples, int index, int max, int num_samples)
 {
-    pthread_mutex_lock(&m_mutex);
+    int num = num_samples - index;
+    num = (num > max) ? max : num;
+    if (num <= 0) {
+        return 0;
+    }
+
+    for (int i = 0; i < num; i++) {
+        samples[i].timestamp = m_timestamps[WRAP(index + i)];
+        samples[i].hashrate10m = m_hashrate10m[WRAP(index + i)];
+        samples[i].hashrate1h = m_hashrate1h[WRAP(index + i)];
+        samples[i].hashrate1d = m_hashrate1d[WRAP(index + i)];
+    }
+
+    // the writer claims a sample before it overwrites the one HISTORY_MAX_SAMPLES older
+    std::atomic_thread_fence(std::memory_order_acquire);
+    if (index < m_claimed.load(std::memory_order_relaxed) - HISTORY_MAX_SAMPLES) {
+        return -1;
+    }
+    return num;
 }
 
-void History::unlock()
+void History::restoreBucket(int tier, const history_bucket *bucket)
 {
-    pthread_mutex_unlock(&m_mutex);
+    if (tier >= 0 && tier < HISTORY_NUM_TIERS) {
+        m_tiers[tier].restore(bucket);
+        publish();
+    }
+}
+
+// the averages start from the latest logged bucket, mined at until end,
+// instead of zero and aren't preliminary for a day
+void History::warmUp(const history_bucket *latest, int64_t end, uint64_t now)
+{
+    // the log keeps three of the averages, every window starts from the
+    // closest one that isn't shorter
+    for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+        uint32_t seconds = HISTORY_WINDOWS[w].seconds;
+        double gh = (seconds <= 600) ? latest->avg10m : (seconds <= 3600) ? latest->avg1h : latest->avg1d;
+        m_avgs[w].warmUp(gh, end, now);
+    }
+    publish();
+}
+
+int History::getNumBuckets(int tier)
+{
+    history_snapshot snapshot;
+    getSnapshot(&snapshot);
+    return snapshot.numBuckets[tier];
+}
+
+int History::readBuckets(int tier, history_bucket *buckets, int index, int max)
+{
+    return m_tiers[tier].readBuckets(buckets, index, max, getNumBuckets(tier));
 }
 
 bool History::isAvailable()
@@ -122,28 +249,50 @@ bool History::isAvailable()
     return m_shares && m_timestamps && m_hashrate10m && m_hashrate1h && m_hashrate1d;
 }
 
-History::History() : m_avg10m(this, 600llu * 1000llu), m_avg1h(this, 3600llu * 1000llu), m_avg1d(this, 86400llu * 1000llu)
+History::History() : m_tiers{{60llu * 1000llu, 1440}, {600llu * 1000llu, 1008}, {3600llu * 1000llu, 720}}
 {
     // NOP
 }
 
-bool History::init(int num_asics)
+bool History::init(int num_asics, bool breakdowns)
 {
     m_shares = (uint32_t *) heap_caps_malloc(HISTORY_MAX_SAMPLES * sizeof(uint32_t), MALLOC_CAP_SPIRAM);
     m_timestamps = (uint64_t *) heap_caps_malloc(HISTORY_MAX_SAMPLES * sizeof(uint64_t), MALLOC_CAP_SPIRAM);
     m_hashrate10m = (float *) heap_caps_malloc(HISTORY_MAX_SAMPLES * sizeof(float), MALLOC_CAP_SPIRAM);
     m_hashrate1h = (float *) heap_caps_malloc(HISTORY_MAX_SAMPLES * sizeof(float), MALLOC_CAP_SPIRAM);
     m_hashrate1d = (float *) heap_caps_malloc(HISTORY_MAX_SAMPLES * sizeof(float), MALLOC_CAP_SPIRAM);
+    if (breakdowns) {
+        m_sources = (uint8_t *) heap_caps_malloc(HISTORY_MAX_SAMPLES * sizeof(uint8_t), MALLOC_CAP_SPIRAM);
+        if (!m_sources) {
+            ESP_LOGW(TAG, "no memory for the per ASIC and pool hashrates");
+        }
+    }
+    m_numAsics = (num_asics > HISTORY_MAX_ASICS) ? HISTORY_MAX_ASICS : num_asics;
+
+    // never 0, that's a client without a cursor
+    do {
+        m_bootId = esp_random();
+    } while (!m_bootId);
+
+    for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+        m_avgs[w].init(this, HISTORY_WINDOWS[w].seconds * 1000llu, m_sources != nullptr);
+    }
+
+    bool tiers = true;
+    for (int i = 0; i < HISTORY_NUM_TIERS; i++) {
+        tiers = m_tiers[i].init() && tiers;
+    }
 
     m_distribution.init(num_asics);
 
-    return isAvailable();
+    return isAvailable() && tiers;
 }
 
 void History::getTimestamps(uint64_t *first, uint64_t *last, int *num_samples)
 {
-    int lowest_index = (m_numSamples - HISTORY_MAX_SAMPLES < 0) ? 0 : m_numSamples - HISTORY_MAX_SAMPLES;
-    int highest_index = m_numSamples - 1;
+    int count = getNumSamples();
+    int lowest_index = (count - HISTORY_MAX_SAMPLES < 0) ? 0 : count - HISTORY_MAX_SAMPLES;
+    int highest_index = count - 1;
 
     int _num_samples = highest_index - lowest_index + 1;
 
@@ -155,40 +304,172 @@ void History::getTimestamps(uint64_t *first, uint64_t *last, int *num_samples)
     *num_samples = _num_samples;
 }
 
-HistoryAvg::HistoryAvg(History *history, uint64_t timespan)
+HistoryTier::HistoryTier(uint64_t interval, int capacity)
+{
+    m_interval = interval;
+    m_capacity = capacity;
+}
+
+bool HistoryTier::init()
+{
+    m_buckets = (history_bucket *) heap_caps_malloc(m_capacity * sizeof(history_bucket), MALLOC_CAP_SPIRAM);
+    return m_buckets != nullptr;
+}
+
+// adds a sample to the bucket being filled or completes it and starts a new
+// one, O(1) per sample
+void HistoryTier::add(uint64_t timestamp, float hashrate10m, float hashrate1h, float hashrate1d)
+{
+    if (!m_buckets) {
+        return;
+    }
+
+    uint64_t current = timestamp / m_interval;
+    if (m_hasBucket && current != m_current) {
+        // announce the overwrite of the oldest bucket before writing its slot
+        m_claimed.store(m_numBuckets + 1, std::memory_order_relaxed);
+        std::atomic_thread_fence(std::memory_order_release);
+        m_buckets[m_numBuckets % m_capacity] = m_bucket;
+        m_numBuckets++;
+    }
+
+    if (!m_hasBucket || current != m_current) {
+        m_hasBucket = true;
+        m_current = current;
+        m_count = 0;
+        m_sum10m = 0;
+        m_sum1h = 0;
+        m_sum1d = 0;
+        m_bucket.min10m = hashrate10m;
+        m_bucket.max10m = hashrate10m;
+    }
+
+    m_count++;
+    m_sum10m += hashrate10m;
+    m_sum1h += hashrate1h;
+    m_sum1d += hashrate1d;
+
+    m_bucket.timestamp = timestamp;
+    m_bucket.avg10m = m_sum10m / m_count;
+    m_bucket.avg1h = m_sum1h / m_count;
+    m_bucket.avg1d = m_sum1d / m_count;
+    m_bucket.min10m = fminf(m_bucket.min10m, hashrate10m);
+    m_bucket.max10m = fmaxf(m_bucket.max10m, hashrate10m);
+}
+
+// a completed bucket from the log, before the first sample is added
+void HistoryTier::restore(const history_bucket *bucket)
+{
+    if (!m_buckets) {
+        return;
+    }
+
+    m_claimed.store(m_numBuckets + 1, std::memory_order_relaxed);
+    std::atomic_thread_fence(std::memory_order_release);
+    m_buckets[m_numBuckets % m_capacity] = *bucket;
+    m_numBuckets++;
+}
+
+// the bucket timestamps are ascending, returns num_buckets if all are older
+int HistoryTier::lowerBound(int64_t timestamp, int num_buckets)
+{
+    int low = (num_buckets > m_capacity) ? num_buckets - m_capacity : 0;
+    int high = num_buckets;
+    while (low < high) {
+        int mid = low + (high - low) / 2;
+        if ((int64_t) m_buckets[mid % m_capacity].timestamp < timestamp) {
+            low = mid + 1;
+        } else {
+            high = mid;
+        }
+    }
+    return low;
+}
+
+// like History::readSamples for the completed buckets
+int HistoryTier::readBuckets(history_bucket *buckets, int index, int max, int num_buckets)
+{
+    int num = num_buckets - index;
+    num = (num > max) ? max : num;
+    if (num <= 0) {
+        return 0;
+    }
+
+    for (int i = 0; i < num; i++) {
+        buckets[i] = m_buckets[(index + i) % m_capacity];
+    }
+
+    std::atomic_thread_fence(std::memory_order_acquire);
+    if (index < m_claimed.load(std::memory_order_relaxed) - m_capacity) {
+        return -1;
+    }
+    return num;
+}
+
+void HistoryAvg::init(History *history, uint64_t timespan, bool breakdowns)
 {
     m_history = history;
     m_timespan = timespan;
+    m_breakdowns = breakdowns;
+}
+
+void HistoryAvg::addSample(int index)
+{
+    uint64_t diff = m_history->getShareSample(index);
+    m_diffSum += diff;
+    if (m_breakdowns) {
+        uint8_t source = m_history->getSourceSample(index);
+        int asic = source & HISTORY_SOURCE_ASIC_MASK;
+        if (asic < HISTORY_MAX_ASICS) {
+            m_asicSums[asic] += diff;
+        }
+        m_poolSums[source >> HISTORY_SOURCE_POOL_SHIFT] += diff;
+    }
+}
+
+void HistoryAvg::removeSample(int index)
+{
+    uint64_t diff = m_history->getShareSample(index);
+    m_diffSum -= diff;
+    if (m_breakdowns) {
+        uint8_t source = m_history->getSourceSample(index);
+        int asic = source & HISTORY_SOURCE_ASIC_MASK;
+        if (asic < HISTORY_MAX_ASICS) {
+            m_asicSums[asic] -= diff;
+        }
+        m_poolSums[source >> HISTORY_SOURCE_POOL_SHIFT] -= diff;
+    }
+}
+
+double HistoryAvg::toGh(uint64_t diffSum)
+{
+    // a share of difficulty 1 is 2^32 hashes
+    return (m_duration > 0) ? (double) diffSum * 4294967296.0 / m_duration / 1.0e9 : 0.0;
 }
 
 // move avg window and track and adjust the total sum of all shares in the
 // desired time window. Calculates GH.
 // calculates incrementally without "scanning" the entire time span
-void HistoryAvg::update()
+void HistoryAvg::update(int numSamples)
 {
     // Catch up with the latest sample and update diffsum
-    uint64_t lastTimestamp = 0;
-    while (lastTimestamp = m_history->getTimestampSample(m_lastSample), m_lastSample + 1 < m_history->getNumSamples()) {
+    while (m_lastSample + 1 < numSamples) {
         m_lastSample++;
-        m_diffSum += (uint64_t) m_history->getShareSample(m_lastSample);
+        addSample(m_lastSample);
     }
+    uint64_t lastTimestamp = m_history->getTimestampSample(m_lastSample);
 
     // adjust the window on the older side
     // we move the lower window bound until the next sample would be out of
     // the desired timespan.
     while (m_firstSample + 1 < m_lastSample && lastTimestamp - m_history->getTimestampSample(m_firstSample + 1) >= m_timespan) {
-        m_diffSum -= (uint64_t) m_history->getShareSample(m_firstSample);
         m_firstSample++;
+        removeSample(m_firstSample);
+        m_truncated = false;
     }
 
     uint64_t firstTimestamp = m_history->getTimestampSample(m_firstSample);
 
-    // Check for overflow in diffsum
-    if (m_diffSum >> 63ull) {
-        ESP_LOGE(TAG, "Error in hashrate calculation: diffsum overflowed");
-        return;
-    }
-
     // Prevent division by zero
     if (lastTimestamp == firstTimestamp) {
         ESP_LOGW(TAG, "Timestamps are equal; cannot compute average.");
@@ -200,60 +481,127 @@ void HistoryAvg::update()
 
     // preliminary means that it's not the real hashrate because
     // it's ramping up slowly
-    m_preliminary = duration < m_timespan;
+    m_preliminary = duration < m_timespan && !m_truncated;
+
+    double hashes = (double) m_diffSum * 4294967296.0;
+    if (m_warm && !m_truncated) {
+        hashes += warmHashes((int64_t) lastTimestamp - (int64_t) m_timespan, (int64_t) firstTimestamp);
+        m_preliminary = false;
+    }
 
-    // clamp duration to a minimum value of avg->timespan
-    duration = (m_timespan > duration) ? m_timespan : duration;
+    // clamp duration to a minimum value of avg->timespan, a window the ring
+    // doesn't reach back far enough for is averaged over what is left
+    duration = (m_timespan > duration && !m_truncated) ? m_timespan : duration;
 
-    m_avg = (double) (m_diffSum << 32llu) / ((double) duration / 1.0e3);
+    m_duration = (double) duration / 1.0e3;
+    m_avg = hashes / m_duration;
     m_avgGh = m_avg / 1.0e9;
     m_timestamp = lastTimestamp;
 }
 
+// the sample at index is about to be overwritten, the window starts after it
+void HistoryAvg::evict(int index)
+{
+    while (m_firstSample <= index && m_firstSample < m_lastSample) {
+        m_firstSample++;
+        removeSample(m_firstSample);
+        m_truncated = true;
+    }
+}
+
+// hashes of the logged average between the start of the window and the
+// first sample, nothing for the time the miner was off
+double HistoryAvg::warmHashes(int64_t windowStart, int64_t firstTimestamp)
+{
+    int64_t end = (m_warmEnd < firstTimestamp) ? m_warmEnd : firstTimestamp;
+    return (end > windowStart) ? m_warmGh * 1.0e6 * (double) (end - windowStart) : 0.0;
+}
+
+// before the first share after a reboot, the logged average up to end
+void HistoryAvg::warmUp(double gh, int64_t end, uint64_t now)
+{
+    m_warm = true;
+    m_warmGh = gh;
+    m_warmEnd = end;
+    m_preliminary = false;
+    m_duration = (double) m_timespan / 1.0e3;
+    m_avg = warmHashes((int64_t) now - (int64_t) m_timespan, (int64_t) now) / m_duration;
+    m_avgGh = m_avg / 1.0e9;
+}
 
-void History::pushShare(uint32_t diff, uint64_t timestamp, int asic_nr)
+
+void History::pushShare(uint32_t diff, uint64_t timestamp, int asic_nr, int pool_nr)
 {
     if (!isAvailable()) {
         ESP_LOGW(TAG, "PSRAM not initialized");
         return;
     }
 
-    lock();
+    // the windows reaching back to the oldest sample let go of it first
+    if (m_numSamples >= HISTORY_MAX_SAMPLES) {
+        for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+            m_avgs[w].evict(m_numSamples - HISTORY_MAX_SAMPLES);
+        }
+    }
+
+    // announce the overwrite of the oldest sample before writing its slot
+    m_claimed.store(m_numSamples + 1, std::memory_order_relaxed);
+    std::atomic_thread_fence(std::memory_order_release);
+
     m_shares[WRAP(m_numSamples)] = diff;
     m_timestamps[WRAP(m_numSamples)] = timestamp;
+    if (m_sources) {
+        int asic = (asic_nr >= 0 && asic_nr < HISTORY_SOURCE_ASIC_MASK) ? asic_nr : HISTORY_SOURCE_ASIC_MASK;
+        int pool = (pool_nr >= 0 && pool_nr < HISTORY_NUM_POOLS) ? pool_nr : 0;
+        m_sources[WRAP(m_numSamples)] = (uint8_t) (asic | (pool << HISTORY_SOURCE_POOL_SHIFT));
+    }
     m_numSamples++;
 
-    m_avg10m.update();
-    m_avg1h.update();
-    m_avg1d.update();
+    for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+        m_avgs[w].update(m_numSamples);
+    }
 
-    m_hashrate10m[WRAP(m_numSamples - 1)] = m_avg10m.getGh();
-    m_hashrate1h[WRAP(m_numSamples - 1)] = m_avg1h.getGh();
-    m_hashrate1d[WRAP(m_numSamples - 1)] = m_avg1d.getGh();
+    float hashrate10m = m_avgs[HISTORY_WINDOW_10M].getGh();
+    float hashrate1h = m_avgs[HISTORY_WINDOW_1H].getGh();
+    float hashrate1d = m_avgs[HISTORY_WINDOW_1D].getGh();
+    m_hashrate10m[WRAP(m_numSamples - 1)] = hashrate10m;
+    m_hashrate1h[WRAP(m_numSamples - 1)] = hashrate1h;
+    m_hashrate1d[WRAP(m_numSamples - 1)] = hashrate1d;
 
-    m_distribution.addShare(asic_nr);
+    for (int i = 0; i < HISTORY_NUM_TIERS; i++) {
+        m_tiers[i].add(timestamp, hashrate10m, hashrate1h, hashrate1d);
+    }
 
-    unlock();
+    publish();
 
-    char preliminary_10m = (m_avg10m.isPreliminary()) ? '*' : ' ';
-    char preliminary_1h = (m_avg1h.isPreliminary()) ? '*' : ' ';
-    char preliminary_1d = (m_avg1d.isPreliminary()) ? '*' : ' ';
+    m_distribution.addShare(asic_nr);
+
+    HistoryAvg *avg10m = &m_avgs[HISTORY_WINDOW_10M];
+    HistoryAvg *avg1h = &m_avgs[HISTORY_WINDOW_1H];
+    HistoryAvg *avg1d = &m_avgs[HISTORY_WINDOW_1D];
+    char preliminary_10m = (avg10m->isPreliminary()) ? '*' : ' ';
+    char preliminary_1h = (avg1h->isPreliminary()) ? '*' : ' ';
+    char preliminary_1d = (avg1d->isPreliminary()) ? '*' : ' ';
 
-    ESP_LOGI(TAG, "hashrate: 10m:%.3fGH%c 1h:%.3fGH%c 1d:%.3fGH%c", m_avg10m.getGh(), preliminary_10m, m_avg1h.getGh(),
-             preliminary_1h, m_avg1d.getGh(), preliminary_1d);
+    ESP_LOGI(TAG, "hashrate: 10m:%.3fGH%c 1h:%.3fGH%c 1d:%.3fGH%c", avg10m->getGh(), preliminary_10m, avg1h->getGh(),
+             preliminary_1h, avg1d->getGh(), preliminary_1d);
 
     m_distribution.toLog();
 }
 
 // successive approximation in a wrapped ring buffer with
 // monotonic/unwrapped write pointer :woozy:
+// the samples may be overwritten while searching, the result is only a hint
+// for readSamples then
 int History::searchNearestTimestamp(int64_t timestamp)
 {
+    int num_samples = getNumSamples();
+
     // get index of the first sample, clamp to min 0
-    int lowest_index = (m_numSamples - HISTORY_MAX_SAMPLES < 0) ? 0 : m_numSamples - HISTORY_MAX_SAMPLES;
+    int lowest_index = (num_samples - HISTORY_MAX_SAMPLES < 0) ? 0 : num_samples - HISTORY_MAX_SAMPLES;
 
     // last sample
-    int highest_index = m_numSamples - 1;
+    int highest_index = num_samples - 1;
 
     ESP_LOGD(TAG, "lowest_index: %d highest_index: %d", lowest_index, highest_index);
 
@@ -280,7 +628,7 @@ int History::searchNearestTimestamp(int64_t timestamp)
 
     ESP_LOGD(TAG, "current return %d", current);
 
-    if (current < 0 || current >= m_numSamples) {
+    if (current < 0 || current >= num_samples) {
         return -1;
     }
 
@@ -288,10 +636,90 @@ int History::searchNearestTimestamp(int64_t timestamp)
 }
 
 
+// raw samples from start_index to end_index (exclusive)
+void History::exportSamples(JsonObject &json_history, int start_index, int end_index, int64_t sys_start)
+{
+    // Create arrays for history samples using the new method
+    JsonArray hashrate_10m = json_history["hashrate_10m"].to<JsonArray>();
+    JsonArray hashrate_1h  = json_history["hashrate_1h"].to<JsonArray>();
+    JsonArray hashrate_1d  = json_history["hashrate_1d"].to<JsonArray>();
+    JsonArray timestamps   = json_history["timestamps"].to<JsonArray>();
+
+    history_sample samples[HISTORY_READ_CHUNK];
+    for (int index = start_index; index < end_index;) {
+        int num = readSamples(samples, index, HISTORY_READ_CHUNK, end_index);
+        if (num <= 0) {
+            // overwritten while exporting, they were the oldest ones anyway
+            index += HISTORY_READ_CHUNK;
+            continue;
+        }
+        for (int i = 0; i < num; i++) {
+            if ((int64_t) samples[i].timestamp < sys_start) {
+                continue;
+            }
+            // Multiply by 100.0 and cast to int as in the original code
+            hashrate_10m.add((int)(samples[i].hashrate10m * 100.0));
+            hashrate_1h.add((int)(samples[i].hashrate1h * 100.0));
+            hashrate_1d.add((int)(samples[i].hashrate1d * 100.0));
+            timestamps.add((int64_t) samples[i].timestamp - sys_start);
+        }
+        index += num;
+    }
+
+    json_history["resolution"] = 0;
+}
+
+static void addBucket(JsonArray *arrays, const history_bucket *bucket, int64_t sys_start)
+{
+    arrays[0].add((int)(bucket->avg10m * 100.0));
+    arrays[1].add((int)(bucket->min10m * 100.0));
+    arrays[2].add((int)(bucket->max10m * 100.0));
+    arrays[3].add((int)(bucket->avg1h * 100.0));
+    arrays[4].add((int)(bucket->avg1d * 100.0));
+    arrays[5].add((int64_t) bucket->timestamp - sys_start);
+}
+
+// completed buckets of a tier from first to last (exclusive) and the one being
+// filled if last is past them, with the min and max of the 10m hashrate
+void History::exportTier(JsonObject &json_history, int tier, const history_snapshot *snapshot, int first, int last,
+                         int64_t sys_start)
+{
+    JsonArray arrays[] = {
+        json_history["hashrate_10m"].to<JsonArray>(),
+        json_history["hashrate_10m_min"].to<JsonArray>(),
+        json_history["hashrate_10m_max"].to<JsonArray>(),
+        json_history["hashrate_1h"].to<JsonArray>(),
+        json_history["hashrate_1d"].to<JsonArray>(),
+        json_history["timestamps"].to<JsonArray>(),
+    };
+
+    int completed = snapshot->numBuckets[tier];
+    history_bucket buckets[HISTORY_READ_CHUNK];
+    for (int index = first; index < last && index < completed;) {
+        int max = ((last < completed) ? last : completed) - index;
+        int num = m_tiers[tier].readBuckets(buckets, index, (max > HISTORY_READ_CHUNK) ? HISTORY_READ_CHUNK : max, completed);
+        if (num <= 0) {
+            index += HISTORY_READ_CHUNK;
+            continue;
+        }
+        for (int i = 0; i < num; i++) {
+            addBucket(arrays, &buckets[i], sys_start);
+        }
+        index += num;
+    }
+    if (last > completed) {
+        addBucket(arrays, &snapshot->bucket[tier], sys_start);
+    }
+
+    json_history["resolution"] = m_tiers[tier].getInterval();
+}
+
 // Helper: fills a JsonObject with history data using ArduinoJson
-void History::exportHistoryData(JsonObject &json_history, uint64_t start_timestamp, uint64_t end_timestamp, uint64_t current_timestamp) {
+void History::exportHistoryData(JsonObject &json_history, uint64_t start_timestamp, uint64_t end_timestamp, uint64_t current_timestamp,
+                                int max_points) {
     // Ensure consistency
-    lock();
+    history_snapshot snapshot;
+    getSnapshot(&snapshot);
 
     int64_t rel_start = (int64_t) start_timestamp - (int64_t) current_timestamp;
     int64_t rel_end   = (int64_t) end_timestamp - (int64_t) current_timestamp;
@@ -303,6 +731,7 @@ void History::exportHistoryData(JsonObject &json_history, uint64_t start_timesta
 
     int start_index = searchNearestTimestamp(sys_start);
     int end_index   = searchNearestTimestamp(sys_end);
+    end_index = (end_index >= snapshot.numSamples) ? snapshot.numSamples - 1 : end_index;
     int num_samples = end_index - start_index + 1;
 
     if (!isAvailable() || start_index == -1 || end_index == -1 ||
@@ -312,26 +741,111 @@ void History::exportHistoryData(JsonObject &json_history, uint64_t start_timesta
         num_samples = 0;
     }
 
-    // Create arrays for history samples using the new method
-    JsonArray hashrate_10m = json_history["hashrate_10m"].to<JsonArray>();
-    JsonArray hashrate_1h  = json_history["hashrate_1h"].to<JsonArray>();
-    JsonArray hashrate_1d  = json_history["hashrate_1d"].to<JsonArray>();
-    JsonArray timestamps   = json_history["timestamps"].to<JsonArray>();
+    // after a reboot the buckets restored from the log reach further back
+    // than the samples
+    bool restored = false;
+    if (max_points > 0 && snapshot.numBuckets[0]) {
+        history_bucket oldest;
+        int first = m_tiers[0].lowerBound(sys_start, snapshot.numBuckets[0]);
+        restored = m_tiers[0].readBuckets(&oldest, first, 1, snapshot.numBuckets[0]) == 1 &&
+                   (!num_samples || (int64_t) oldest.timestamp < (int64_t) getTimestampSample(start_index));
+    }
 
-    for (int i = start_index; i < start_index + num_samples; i++) {
-        uint64_t sample_timestamp = getTimestampSample(i);
-        if ((int64_t) sample_timestamp < sys_start) {
-            continue;
+    if (max_points > 0 && (num_samples > max_points || restored)) {
+        // too many samples for the budget, take the finest tier that fits
+        int tier = 0;
+        int first = 0;
+        int last = 0;
+        for (tier = 0; tier < HISTORY_NUM_TIERS; tier++) {
+            first = m_tiers[tier].lowerBound(sys_start, snapshot.numBuckets[tier]);
+            last = m_tiers[tier].lowerBound(sys_end + 1, snapshot.numBuckets[tier]);
+            // the bucket being filled is the latest one
+            const history_bucket *bucket = &snapshot.bucket[tier];
+            if (snapshot.hasBucket[tier] && (int64_t) bucket->timestamp >= sys_start && (int64_t) bucket->timestamp <= sys_end) {
+                last++;
+            }
+            if (last - first <= max_points || tier == HISTORY_NUM_TIERS - 1) {
+                break;
+            }
+        }
+        // even the coarsest tier has more, keep the latest buckets
+        if (last - first > max_points) {
+            first = last - max_points;
         }
-        // Multiply by 100.0 and cast to int as in the original code
-        hashrate_10m.add((int)(getHashrate10mSample(i) * 100.0));
-        hashrate_1h.add((int)(getHashrate1hSample(i) * 100.0));
-        hashrate_1d.add((int)(getHashrate1dSample(i) * 100.0));
-        timestamps.add((int64_t) sample_timestamp - sys_start);
+        exportTier(json_history, tier, &snapshot, first, last, sys_start);
+    } else {
+        exportSamples(json_history, start_index, start_index + num_samples, sys_start);
     }
 
     // Add base timestamp for reference
     json_history["timestampBase"] = start_timestamp;
+}
+
+// fills the header and returns the number of records, a cursor that is too old
+// or from before a reboot starts at the oldest sample, a negative one counts
+// back from the newest
+int History::exportBinaryHeader(history_binary_header *header, int since, int limit, int64_t time_offset, uint32_t boot_id)
+{
+    int num_samples = getNumSamples();
+    if (since < 0) {
+        since += num_samples;
+    }
+
+    int lowest_index = num_samples - HISTORY_MAX_SAMPLES + HISTORY_EXPORT_MARGIN;
+    lowest_index = (lowest_index < 0) ? 0 : lowest_index;
+    if ((boot_id && boot_id != m_bootId) || since < lowest_index || since > num_samples) {
+        since = lowest_index;
+    }
+
+    int count = num_samples - since;
+    if (limit > 0 && count > limit) {
+        count = limit;
+    }
 
-    unlock();
-}
\ No newline at end of file
+    header->magic = HISTORY_BINARY_MAGIC;
+    header->version = HISTORY_BINARY_VERSION;
+    header->recordSize = sizeof(history_record);
+    header->first = since;
+    header->count = count;
+    header->timestamp = 0;
+    header->bootId = m_bootId;
+    header->reserved = 0;
+
+    history_sample sample;
+    if (count && readSamples(&sample, since, 1, num_samples) == 1) {
+        header->timestamp = sample.timestamp + time_offset;
+    }
+
+    return count;
+}
+
+// encodes up to max samples from index, timestamp is the one of the previous
+// record (0 before the first), returns -1 if the samples were overwritten meanwhile
+int History::exportRecords(history_record *records, int index, int max, uint64_t *timestamp)
+{
+    int num_samples = getNumSamples();
+    history_sample samples[HISTORY_READ_CHUNK];
+
+    int total = 0;
+    while (total < max) {
+        int chunk = max - total;
+        int num = readSamples(samples, index + total, (chunk > HISTORY_READ_CHUNK) ? HISTORY_READ_CHUNK : chunk, num_samples);
+        if (num < 0) {
+            return -1;
+        }
+        if (num == 0) {
+            break;
+        }
+        for (int i = 0; i < num; i++) {
+            history_record *record = &records[total + i];
+            record->delta = (*timestamp) ? (uint32_t) (samples[i].timestamp - *timestamp) : 0;
+            record->hashrate10m = (uint32_t) (samples[i].hashrate10m * 100.0);
+            record->hashrate1h = (uint32_t) (samples[i].hashrate1h * 100.0);
+            record->hashrate1d = (uint32_t) (samples[i].hashrate1d * 100.0);
+            *timestamp = samples[i].timestamp;
+        }
+        total += num;
+    }
+
+    return total;
+}
@@ -1,5 +1,7 @@
 #pragma once
 
+#include <atomic>
+
 #include "ArduinoJson.h"
 
 #include "esp_psram.h"
@@ -8,6 +10,67 @@
 // must be power of two
 #define HISTORY_MAX_SAMPLES 0x20000
 
+// downsampled tiers for long range charts: 1 day of 1 min, 1 week of
+// 10 min and 30 days of 1 h buckets
+#define HISTORY_NUM_TIERS 3
+
+// samples at the old end of the ring a binary export doesn't start at, they
+// would be overwritten while the response is sent
+#define HISTORY_EXPORT_MARGIN 256
+
+// moving averages of the hashrate, shortest window first. Any list works,
+// every window costs O(1) amortized per share. The 10m, 1h and 1d ones are
+// kept per sample for the charts and the exports.
+#define HISTORY_NUM_WINDOWS 6
+#define HISTORY_WINDOW_10M 2
+#define HISTORY_WINDOW_1H 3
+#define HISTORY_WINDOW_1D 5
+
+typedef struct
+{
+    const char *name; // API and influx keys, hashRate_<name>
+    uint32_t seconds;
+} history_window;
+
+inline constexpr history_window HISTORY_WINDOWS[] = {
+    {"1m", 60}, {"5m", 300}, {"10m", 600}, {"1h", 3600}, {"6h", 21600}, {"1d", 86400},
+};
+
+static_assert(sizeof(HISTORY_WINDOWS) / sizeof(HISTORY_WINDOWS[0]) == HISTORY_NUM_WINDOWS, "one entry per window");
+static_assert(HISTORY_WINDOWS[HISTORY_WINDOW_10M].seconds == 600 && HISTORY_WINDOWS[HISTORY_WINDOW_1H].seconds == 3600 &&
+                  HISTORY_WINDOWS[HISTORY_WINDOW_1D].seconds == 86400,
+              "the per sample windows");
+
+// the averages can be broken down by the ASIC and the pool a share came from,
+// ASICs beyond HISTORY_MAX_ASICS only count in the total
+#define HISTORY_MAX_ASICS 16
+#define HISTORY_NUM_POOLS 2 // primary and fallback
+
+// binary export, little endian: a history_binary_header followed by count
+// history_record, hashrates in 0.01 GH/s like the JSON export
+#define HISTORY_BINARY_MAGIC 0x42484d4a // "JMHB"
+#define HISTORY_BINARY_VERSION 2
+
+typedef struct
+{
+    uint32_t magic;
+    uint16_t version;
+    uint16_t recordSize;
+    uint32_t first;     // index of the first record, pass first + count as since to poll for newer ones
+    uint32_t count;
+    uint64_t timestamp; // ms of the first record
+    uint32_t bootId;    // random per boot, a cursor is only valid with the bootId it came with
+    uint32_t reserved;
+} history_binary_header;
+
+typedef struct
+{
+    uint32_t delta;     // ms since the previous record, 0 for the first one
+    uint32_t hashrate10m;
+    uint32_t hashrate1h;
+    uint32_t hashrate1d;
+} history_record;
+
 class History;
 
 class NonceDistribution {
@@ -22,6 +85,9 @@ class NonceDistribution {
     void toLog();
 };
 
+// Moving average of the shares in one window of the raw ring. Both ends of
+// the window only move forward, every sample is added and removed once. The
+// sums cover the samples after m_firstSample up to m_lastSample.
 class HistoryAvg {
   protected:
     int m_firstSample = 0;
@@ -30,19 +96,47 @@ class HistoryAvg {
     uint64_t m_diffSum = 0;
     double m_avg = 0;
     double m_avgGh = 0;
+    double m_duration = 0; // s the sums are divided by
     uint64_t m_timestamp = 0;
     bool m_preliminary = true;
+    bool m_truncated = false; // the ring wrapped within the window
+
+    // per ASIC and pool, only if the History keeps the breakdowns
+    bool m_breakdowns = false;
+    uint64_t m_asicSums[HISTORY_MAX_ASICS] = {};
+    uint64_t m_poolSums[HISTORY_NUM_POOLS] = {};
 
-    History *m_history;
+    // the average before a reboot fills the window up to when it was logged
+    bool m_warm = false;
+    double m_warmGh = 0;
+    int64_t m_warmEnd = 0;
+
+    History *m_history = nullptr;
+
+    void addSample(int index);
+    void removeSample(int index);
+    double warmHashes(int64_t windowStart, int64_t firstTimestamp);
+    double toGh(uint64_t diffSum);
 
   public:
-    HistoryAvg(History *history, uint64_t timespan);
+    void init(History *history, uint64_t timespan, bool breakdowns);
 
     float getGh()
     {
         return m_avgGh;
     };
 
+    // without the warm up, the breakdowns start at zero after a reboot
+    float getAsicGh(int asic)
+    {
+        return toGh(m_asicSums[asic]);
+    };
+
+    float getPoolGh(int pool)
+    {
+        return toGh(m_poolSums[pool]);
+    };
+
     uint64_t getTimestamp()
     {
         return m_timestamp;
@@ -52,50 +146,172 @@ class HistoryAvg {
     {
         return m_preliminary;
     };
-    void update();
+    void update(int numSamples);
+    void evict(int index);
+    void warmUp(double gh, int64_t end, uint64_t now);
 };
 
+// min/avg/max of the hashrate samples within one bucket of a tier
+typedef struct
+{
+    uint64_t timestamp; // of the last sample in the bucket
+    float avg10m;
+    float min10m;
+    float max10m;
+    float avg1h;
+    float avg1d;
+} history_bucket;
+
+// Ring of fixed length buckets, filled incrementally with every sample.
+// Only completed buckets go into the ring, the one being filled is
+// published with the history_snapshot.
+class HistoryTier {
+  protected:
+    uint64_t m_interval; // bucket length in ms
+    int m_capacity;
+    history_bucket *m_buckets = nullptr;
+    int m_numBuckets = 0;           // completed buckets, unwrapped
+    std::atomic<int> m_claimed{0};  // completed buckets plus the one being written
+    history_bucket m_bucket = {};   // being filled
+    bool m_hasBucket = false;
+    uint64_t m_current = 0;         // timestamp / interval of m_bucket
+    uint32_t m_count = 0;           // samples in m_bucket
+    double m_sum10m = 0;
+    double m_sum1h = 0;
+    double m_sum1d = 0;
+
+  public:
+    HistoryTier(uint64_t interval, int capacity);
+    bool init();
+    void add(uint64_t timestamp, float hashrate10m, float hashrate1h, float hashrate1d);
+    void restore(const history_bucket *bucket);
+
+    // readers, num_buckets from a snapshot
+    int lowerBound(int64_t timestamp, int num_buckets); // first completed bucket at or after timestamp
+    int readBuckets(history_bucket *buckets, int index, int max, int num_buckets);
+
+    int getNumBuckets()
+    {
+        return m_numBuckets;
+    };
+
+    bool hasBucket()
+    {
+        return m_hasBucket;
+    };
+
+    const history_bucket *getBucket()
+    {
+        return &m_bucket;
+    };
+
+    uint64_t getInterval()
+    {
+        return m_interval;
+    };
+};
+
+// the latest sample and the counts readers may read up to, published as a
+// whole after every share
+typedef struct
+{
+    int numSamples;
+    uint64_t timestamp;
+    float hashrate[HISTORY_NUM_WINDOWS];
+    int numAsics; // both 0 without the breakdowns
+    float asicHashrate[HISTORY_NUM_WINDOWS][HISTORY_MAX_ASICS];
+    int numPools;
+    float poolHashrate[HISTORY_NUM_WINDOWS][HISTORY_NUM_POOLS];
+    int numBuckets[HISTORY_NUM_TIERS];        // completed buckets per tier
+    bool hasBucket[HISTORY_NUM_TIERS];
+    history_bucket bucket[HISTORY_NUM_TIERS]; // the ones being filled
+} history_snapshot;
+
+typedef struct
+{
+    uint64_t timestamp;
+    float hashrate10m;
+    float hashrate1h;
+    float hashrate1d;
+} history_sample;
+
+// pushShare is the only writer and only called from ASIC_result_task. Readers
+// never block it: they take a history_snapshot and copy samples below its
+// counts, which don't change until the ring wraps around. A reader checks
+// after copying that the writer didn't overwrite what it read meanwhile.
 class History {
   protected:
-    int m_numSamples = 0;
+    int m_numSamples = 0;               // writer
+    std::atomic<int> m_claimed{0};      // samples plus the one being written
     uint32_t *m_shares = nullptr;
     uint64_t *m_timestamps = nullptr;
     float *m_hashrate10m = nullptr;
     float *m_hashrate1h = nullptr;
     float *m_hashrate1d = nullptr;
+    uint8_t *m_sources = nullptr;       // ASIC and pool of the samples, with the breakdowns
+    int m_numAsics = 0;
+    uint32_t m_bootId = 0;
 
-    pthread_mutex_t m_mutex = PTHREAD_MUTEX_INITIALIZER;
+    // two seqlocked copies, the writer fills the one readers weren't pointed to
+    struct {
+        std::atomic<uint32_t> seq{0};
+        history_snapshot snapshot = {};
+    } m_snapshots[2];
+    std::atomic<uint32_t> m_published{0};
 
-    HistoryAvg m_avg10m;
-    HistoryAvg m_avg1h;
-    HistoryAvg m_avg1d;
+    HistoryAvg m_avgs[HISTORY_NUM_WINDOWS];
+    HistoryTier m_tiers[HISTORY_NUM_TIERS];
     NonceDistribution m_distribution;
 
+    void publish();
+    int readSamples(history_sample *samples, int index, int max, int num_samples);
+    void exportSamples(JsonObject &json_history, int start_index, int end_index, int64_t sys_start);
+    void exportTier(JsonObject &json_history, int tier, const history_snapshot *snapshot, int first, int last,
+                    int64_t sys_start);
+
   public:
     History();
-    bool init(int numAsics);
+    // the per ASIC and per pool averages cost another byte per sample and a
+    // sum per ASIC and pool in every window
+    bool init(int numAsics, bool breakdowns = true);
     bool isAvailable();
     void getTimestamps(uint64_t *first, uint64_t *last, int *num_samples);
-    void pushShare(uint32_t diff, uint64_t timestamp, int asic_nr);
+    void pushShare(uint32_t diff, uint64_t timestamp, int asic_nr, int pool_nr = 0);
+    void getSnapshot(history_snapshot *snapshot);
 
-    void lock();
-    void unlock();
+    // from the HistoryLog before the first share, bucket timestamps before
+    // the boot are negative
+    void restoreBucket(int tier, const history_bucket *bucket);
+    void warmUp(const history_bucket *latest, int64_t end, uint64_t now);
 
+    // completed buckets of a tier for the HistoryLog, -1 if overwritten
+    int getNumBuckets(int tier);
+    int readBuckets(int tier, history_bucket *buckets, int index, int max);
+
+    // direct access to the ring for the writer
     uint64_t getTimestampSample(int index);
     float getHashrate10mSample(int index);
     float getHashrate1hSample(int index);
     float getHashrate1dSample(int index);
+    uint32_t getShareSample(int index);
+    uint8_t getSourceSample(int index);
+
     uint64_t getCurrentTimestamp(void);
     double getCurrentHashrate10m();
     double getCurrentHashrate1h();
     double getCurrentHashrate1d();
-    uint32_t getShareSample(int index);
+    double getCurrentHashrate(int window);
+    int getNumSamples();
     int searchNearestTimestamp(int64_t timestamp);
 
-    void exportHistoryData(JsonObject &json_history, uint64_t start_timestamp, uint64_t end_timestamp, uint64_t current_timestamp);
+    // max_points > 0 exports the finest tier that has at most max_points
+    // values in the range instead of the raw samples
+    void exportHistoryData(JsonObject &json_history, uint64_t start_timestamp, uint64_t end_timestamp, uint64_t current_timestamp,
+                           int max_points = 0);
 
-    int getNumSamples()
-    {
-        return m_numSamples;
-    };
+    // binary export of the samples from the cursor since, limit 0 for all of
+    // them, since -n for the latest n. A cursor of another boot_id starts at
+    // the oldest sample, the indices of this boot started at 0 again.
+    int exportBinaryHeader(history_binary_header *header, int since, int limit, int64_t time_offset, uint32_t boot_id = 0);
+    int exportRecords(history_record *records, int index, int max, uint64_t *timestamp);
 };
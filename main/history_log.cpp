@@ -0,0 +1,375 @@
+#include <string.h>
+#include <time.h>
+
+#include "esp_log.h"
+#include "esp_timer.h"
+
+#include "history_log.h"
+
+#pragma GCC diagnostic error "-Wall"
+#pragma GCC diagnostic error "-Wextra"
+#pragma GCC diagnostic error "-Wmissing-prototypes"
+
+static const char *TAG = "history log";
+
+// anything before isn't a set wall clock
+#define HISTORY_LOG_MIN_WALL 1600000000
+
+// CRC-32 (IEEE), bitwise, the pages are small and written every few minutes
+static uint32_t crc32(const uint8_t *data, size_t len)
+{
+    uint32_t crc = 0xffffffff;
+    for (size_t i = 0; i < len; i++) {
+        crc ^= data[i];
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc >> 1) ^ (0xedb88320 & (0 - (crc & 1)));
+        }
+    }
+    return ~crc;
+}
+
+static uint32_t page_crc(const history_log_page *page)
+{
+    history_log_page copy = *page;
+    copy.header.crc = 0;
+    return crc32((const uint8_t *) &copy, sizeof(copy));
+}
+
+// the system time survives a software reset in the RTC, not a power loss
+static uint32_t wall_time()
+{
+    time_t now = time(NULL);
+    return (now >= HISTORY_LOG_MIN_WALL) ? (uint32_t) now : 0;
+}
+
+HistoryLog::HistoryLog()
+{
+    memset(&m_page, 0xff, sizeof(m_page));
+    m_page.header.count = 0;
+}
+
+bool HistoryLog::init()
+{
+    m_partition = esp_partition_find_first(ESP_PARTITION_TYPE_DATA, ESP_PARTITION_SUBTYPE_ANY, HISTORY_LOG_LABEL);
+    if (!m_partition) {
+        ESP_LOGW(TAG, "no '%s' partition, the history isn't kept across reboots", HISTORY_LOG_LABEL);
+        return false;
+    }
+
+    // whole sectors only
+    m_numPages = (int) (m_partition->size / HISTORY_LOG_SECTOR_SIZE) * HISTORY_LOG_PAGES_PER_SECTOR;
+    if (m_numPages < 2 * HISTORY_LOG_PAGES_PER_SECTOR) {
+        ESP_LOGE(TAG, "partition too small for the history log");
+        m_partition = nullptr;
+        return false;
+    }
+
+    mount();
+    return true;
+}
+
+bool HistoryLog::readPage(int index, history_log_page *page)
+{
+    if (esp_partition_read(m_partition, (size_t) index * HISTORY_LOG_PAGE_SIZE, page, sizeof(*page)) != ESP_OK) {
+        return false;
+    }
+    return page->header.magic == HISTORY_LOG_MAGIC && page->header.version == HISTORY_LOG_VERSION &&
+           page->header.count <= HISTORY_LOG_RECORDS_PER_PAGE && page->header.crc == page_crc(page);
+}
+
+bool HistoryLog::readHeader(int index, history_log_page_header *header)
+{
+    if (esp_partition_read(m_partition, (size_t) index * HISTORY_LOG_PAGE_SIZE, header, sizeof(*header)) != ESP_OK) {
+        return false;
+    }
+    return header->magic == HISTORY_LOG_MAGIC && header->version == HISTORY_LOG_VERSION;
+}
+
+bool HistoryLog::isErased(int index)
+{
+    uint32_t words[HISTORY_LOG_PAGE_SIZE / sizeof(uint32_t)];
+    if (esp_partition_read(m_partition, (size_t) index * HISTORY_LOG_PAGE_SIZE, words, sizeof(words)) != ESP_OK) {
+        return false;
+    }
+    for (size_t i = 0; i < sizeof(words) / sizeof(words[0]); i++) {
+        if (words[i] != 0xffffffff) {
+            return false;
+        }
+    }
+    return true;
+}
+
+// finds the newest page and continues after it on the timeline it was written on
+void HistoryLog::mount()
+{
+    // the headers are enough to find it, a page that turns out to be torn
+    // is left out in the next round. The order is by seq and then index, so
+    // a torn page doesn't hide a page with the same seq from an older log.
+    history_log_page page;
+    history_log_page_header newest = {};
+    int newestIndex = -1;
+    uint64_t limit = UINT64_MAX;
+    while (true) {
+        newestIndex = -1;
+        for (int i = 0; i < m_numPages; i++) {
+            history_log_page_header header;
+            if (!readHeader(i, &header) || ((uint64_t) header.seq << 32 | (uint32_t) i) >= limit) {
+                continue;
+            }
+            if (newestIndex < 0 || header.seq >= newest.seq) {
+                newest = header;
+                newestIndex = i;
+            }
+        }
+        if (newestIndex < 0 || readPage(newestIndex, &page)) {
+            break;
+        }
+        limit = (uint64_t) newest.seq << 32 | (uint32_t) newestIndex;
+    }
+
+    // torn pages after the newest one used up their seqs, a seq beyond a
+    // pass of the log was torn within the header itself
+    uint32_t base = (newestIndex < 0) ? 0 : newest.seq;
+    bool found = newestIndex >= 0;
+    uint32_t highest = base;
+    for (int i = 0; i < m_numPages; i++) {
+        history_log_page_header header;
+        if (readHeader(i, &header) && header.seq >= base && header.seq - base <= (uint32_t) m_numPages) {
+            found = true;
+            highest = (header.seq > highest) ? header.seq : highest;
+        }
+    }
+
+    int64_t uptime = esp_timer_get_time() / 1000000;
+    if (newestIndex < 0) {
+        // empty or never used, the first write erases the sector
+        m_head = 0;
+        m_seq = found ? highest + 1 : 0;
+        m_base = 0;
+        ESP_LOGI(TAG, "empty, %d pages", m_numPages);
+        return;
+    }
+
+    // a page torn by a power loss after the newest one isn't written again,
+    // a new sector is erased before its first page is written
+    m_head = (newestIndex + 1) % m_numPages;
+    while (m_head % HISTORY_LOG_PAGES_PER_SECTOR && !isErased(m_head)) {
+        m_head = (m_head + 1) % m_numPages;
+    }
+    m_seq = highest + 1;
+    m_written = newest.time;
+
+    // the time off is only known if the clock survived the reset, otherwise
+    // the log continues as if the miner was off only while booting
+    int64_t now = newest.time + uptime;
+    uint32_t wall = wall_time();
+    if (newest.wall && wall > newest.wall && newest.time + (int64_t) (wall - newest.wall) > now) {
+        now = newest.time + (int64_t) (wall - newest.wall);
+    }
+    m_base = now - uptime;
+
+    ESP_LOGI(TAG, "%d pages, next page %d seq %lu, %lds since the last write", m_numPages, m_head, (unsigned long) m_seq,
+             (long) (now - newest.time));
+}
+
+int HistoryLog::scan(history_log_visitor visitor, void *arg)
+{
+    if (!m_partition) {
+        return 0;
+    }
+
+    // the sector of the next page is the oldest one, unless the next page is
+    // within the newest sector, then its remaining pages are still erased
+    history_log_page page;
+    bool found = false;
+    uint32_t seq = 0;
+    int count = 0;
+    for (int i = 0; i < m_numPages; i++) {
+        int index = (m_head + i) % m_numPages;
+        if (!readPage(index, &page) || (found && page.header.seq <= seq)) {
+            continue;
+        }
+        found = true;
+        seq = page.header.seq;
+        for (int j = 0; j < page.header.count; j++) {
+            visitor(&page.records[j], arg);
+        }
+        count += page.header.count;
+    }
+    return count;
+}
+
+int HistoryLog::replay(History *history)
+{
+    struct Replay {
+        History *history;
+        int64_t base;
+        int count;
+        bool hasLatest;
+        history_bucket latest;
+    } replay = {history, m_base, 0, false, {}};
+
+    int64_t start = esp_timer_get_time();
+
+    scan(
+        [](const history_log_record *record, void *arg) {
+            Replay *replay = (Replay *) arg;
+            int tier = record->time >> HISTORY_LOG_TIER_SHIFT;
+            if (tier >= HISTORY_NUM_TIERS) {
+                return;
+            }
+            // before this boot, so the timestamps in ms since boot are negative
+            history_bucket bucket;
+            bucket.timestamp = (uint64_t) (((int64_t) (record->time & HISTORY_LOG_TIME_MASK) - replay->base) * 1000);
+            bucket.avg10m = record->avg10m;
+            bucket.min10m = record->min10m;
+            bucket.max10m = record->max10m;
+            bucket.avg1h = record->avg1h;
+            bucket.avg1d = record->avg1d;
+            replay->history->restoreBucket(tier, &bucket);
+            replay->count++;
+            if (tier == 0) {
+                replay->hasLatest = true;
+                replay->latest = bucket;
+            }
+        },
+        &replay);
+
+    // the restored buckets aren't appended again
+    for (int i = 0; i < HISTORY_NUM_TIERS; i++) {
+        m_cursor[i] = history->getNumBuckets(i);
+    }
+
+    if (replay.hasLatest) {
+        // the miner was still running when the page was written, a flush
+        // before a restart writes the latest one
+        int64_t end = (m_written - m_base) * 1000;
+        end = ((int64_t) replay.latest.timestamp > end) ? (int64_t) replay.latest.timestamp : end;
+        history->warmUp(&replay.latest, end, esp_timer_get_time() / 1000);
+    }
+
+    ESP_LOGI(TAG, "restored %d buckets in %lld ms", replay.count, (long long) (esp_timer_get_time() - start) / 1000);
+    return replay.count;
+}
+
+bool HistoryLog::add(int tier, const history_bucket *bucket)
+{
+    if (!m_partition) {
+        return false;
+    }
+
+    pthread_mutex_lock(&m_mutex);
+    bool ok = addRecord(tier, bucket);
+    pthread_mutex_unlock(&m_mutex);
+    return ok;
+}
+
+void HistoryLog::append(History *history)
+{
+    if (!m_partition) {
+        return;
+    }
+
+    pthread_mutex_lock(&m_mutex);
+    appendBuckets(history);
+    pthread_mutex_unlock(&m_mutex);
+}
+
+void HistoryLog::flush(History *history)
+{
+    if (!m_partition) {
+        return;
+    }
+
+    pthread_mutex_lock(&m_mutex);
+    if (history) {
+        appendBuckets(history);
+    }
+    writePage();
+    pthread_mutex_unlock(&m_mutex);
+}
+
+// with the mutex held
+bool HistoryLog::addRecord(int tier, const history_bucket *bucket)
+{
+    int64_t time = m_base + (int64_t) bucket->timestamp / 1000;
+    time = (time < 0) ? 0 : time;
+
+    bool ok = true;
+    if (m_page.header.count == HISTORY_LOG_RECORDS_PER_PAGE) {
+        // the previous write failed, retry before the record is dropped
+        ok = writePage();
+    }
+    if (m_page.header.count < HISTORY_LOG_RECORDS_PER_PAGE) {
+        history_log_record *record = &m_page.records[m_page.header.count++];
+        record->time = ((uint32_t) tier << HISTORY_LOG_TIER_SHIFT) | ((uint32_t) time & HISTORY_LOG_TIME_MASK);
+        record->avg10m = bucket->avg10m;
+        record->min10m = bucket->min10m;
+        record->max10m = bucket->max10m;
+        record->avg1h = bucket->avg1h;
+        record->avg1d = bucket->avg1d;
+    }
+    if (m_page.header.count == HISTORY_LOG_RECORDS_PER_PAGE) {
+        ok = writePage() && ok;
+    }
+    return ok;
+}
+
+// with the mutex held
+void HistoryLog::appendBuckets(History *history)
+{
+    history_bucket buckets[HISTORY_LOG_RECORDS_PER_PAGE];
+    for (int tier = 0; tier < HISTORY_NUM_TIERS; tier++) {
+        int num;
+        while ((num = history->readBuckets(tier, buckets, m_cursor[tier], HISTORY_LOG_RECORDS_PER_PAGE)) != 0) {
+            if (num < 0) {
+                // the tier wrapped since the last call
+                ESP_LOGW(TAG, "tier %d fell behind", tier);
+                m_cursor[tier] = history->getNumBuckets(tier);
+                break;
+            }
+            for (int i = 0; i < num; i++) {
+                addRecord(tier, &buckets[i]);
+            }
+            m_cursor[tier] += num;
+        }
+    }
+}
+
+// with the mutex held
+bool HistoryLog::writePage()
+{
+    if (!m_page.header.count) {
+        return true;
+    }
+
+    if (m_head % HISTORY_LOG_PAGES_PER_SECTOR == 0) {
+        // drops the oldest sector
+        esp_err_t err = esp_partition_erase_range(m_partition, (size_t) m_head * HISTORY_LOG_PAGE_SIZE, HISTORY_LOG_SECTOR_SIZE);
+        if (err != ESP_OK) {
+            ESP_LOGE(TAG, "erasing sector %d failed: %s", m_head / HISTORY_LOG_PAGES_PER_SECTOR, esp_err_to_name(err));
+            return false;
+        }
+    }
+
+    m_page.header.magic = HISTORY_LOG_MAGIC;
+    m_page.header.version = HISTORY_LOG_VERSION;
+    m_page.header.seq = m_seq;
+    m_page.header.time = (uint32_t) (m_base + esp_timer_get_time() / 1000000);
+    m_page.header.wall = wall_time();
+    m_page.header.crc = page_crc(&m_page);
+
+    esp_err_t err = esp_partition_write(m_partition, (size_t) m_head * HISTORY_LOG_PAGE_SIZE, &m_page, sizeof(m_page));
+    // a failed write may have programmed a part of the page, the page and
+    // its sequence number aren't used again
+    m_head = (m_head + 1) % m_numPages;
+    m_seq++;
+    if (err != ESP_OK) {
+        ESP_LOGE(TAG, "writing page failed: %s", esp_err_to_name(err));
+        return false;
+    }
+
+    memset(&m_page, 0xff, sizeof(m_page));
+    m_page.header.count = 0;
+    return true;
+}
@@ -0,0 +1,107 @@
+#pragma once
+
+#include <pthread.h>
+#include <stdint.h>
+
+#include "esp_partition.h"
+
+#include "history.h"
+
+// Append-only log of the completed history tier buckets in the "history"
+// partition, so the charts and the averages survive a reboot. The partition
+// is used as a ring of sectors: pages are appended in order and the oldest
+// sector is erased when the log wraps, which wears all sectors evenly. Every
+// page carries a sequence number and a CRC, a page torn by a power loss is
+// skipped on replay and never written again.
+#define HISTORY_LOG_LABEL "history"
+#define HISTORY_LOG_MAGIC 0x4c48 // "HL"
+#define HISTORY_LOG_VERSION 1
+#define HISTORY_LOG_PAGE_SIZE 256
+#define HISTORY_LOG_SECTOR_SIZE 4096
+#define HISTORY_LOG_PAGES_PER_SECTOR (HISTORY_LOG_SECTOR_SIZE / HISTORY_LOG_PAGE_SIZE)
+#define HISTORY_LOG_RECORDS_PER_PAGE 9
+
+// the tier is stored in the top bits of the record time
+#define HISTORY_LOG_TIER_SHIFT 30
+#define HISTORY_LOG_TIME_MASK ((1u << HISTORY_LOG_TIER_SHIFT) - 1)
+
+typedef struct
+{
+    uint16_t magic;
+    uint8_t version;
+    uint8_t count;   // records in the page
+    uint32_t seq;    // pages written since the log was created
+    uint32_t time;   // log time when the page was written
+    uint32_t wall;   // unix time when the page was written, 0 if the clock wasn't set
+    uint32_t crc;    // of the page with this field zeroed
+} history_log_page_header;
+
+// a completed bucket, times are seconds on the log timeline which continues
+// across reboots
+typedef struct
+{
+    uint32_t time;   // tier << HISTORY_LOG_TIER_SHIFT | end of the bucket
+    float avg10m;
+    float min10m;
+    float max10m;
+    float avg1h;
+    float avg1d;
+} history_log_record;
+
+typedef struct
+{
+    history_log_page_header header;
+    history_log_record records[HISTORY_LOG_RECORDS_PER_PAGE];
+    uint8_t padding[HISTORY_LOG_PAGE_SIZE - sizeof(history_log_page_header) -
+                    HISTORY_LOG_RECORDS_PER_PAGE * sizeof(history_log_record)];
+} history_log_page;
+
+static_assert(sizeof(history_log_page) == HISTORY_LOG_PAGE_SIZE, "history log page must fill a flash page");
+
+typedef void (*history_log_visitor)(const history_log_record *record, void *arg);
+
+class HistoryLog {
+  protected:
+    const esp_partition_t *m_partition = nullptr;
+    pthread_mutex_t m_mutex = PTHREAD_MUTEX_INITIALIZER;
+    int m_numPages = 0;
+    int m_head = 0;          // next page to write
+    uint32_t m_seq = 0;      // of the next page
+    int64_t m_base = 0;      // log time at uptime 0 of this boot
+    int64_t m_written = 0;   // log time of the newest page before this boot
+    history_log_page m_page; // records not written yet
+    int m_cursor[HISTORY_NUM_TIERS] = {}; // next bucket of each tier to append
+
+    bool readPage(int index, history_log_page *page);
+    bool readHeader(int index, history_log_page_header *header);
+    bool isErased(int index);
+    bool writePage();
+    bool addRecord(int tier, const history_bucket *bucket);
+    void appendBuckets(History *history);
+    void mount();
+
+  public:
+    HistoryLog();
+    bool init();
+
+    // restores the tiers of a History that didn't get a share yet and warms
+    // up its averages, returns the number of restored buckets
+    int replay(History *history);
+
+    // appends the buckets the tiers completed since the last call, writes
+    // full pages only
+    void append(History *history);
+    bool add(int tier, const history_bucket *bucket);
+
+    // appends the completed buckets of history if given and writes the
+    // buffered records even if the page isn't full, before a restart
+    void flush(History *history = nullptr);
+
+    // the valid records oldest first, returns their number
+    int scan(history_log_visitor visitor, void *arg);
+
+    bool isAvailable()
+    {
+        return m_partition != nullptr;
+    };
+};
@@ -5,6 +5,11 @@ export interface IHistory {
     hashrate_10m: number[],
     hashrate_1h: number[],
     hashrate_1d: number[],
+    // min/max of the 10m hashrate per bucket, only with downsampled data
+    hashrate_10m_min?: number[],
+    hashrate_10m_max?: number[],
     timestamps: number[],
-    timestampBase: number
+    timestampBase: number,
+    // bucket length in ms, 0 for raw samples
+    resolution?: number
 }
@@ -0,0 +1,12 @@
+export interface IHistoryBinary {
+
+    // cursor of the first sample, next and bootId are since and boot of the following poll
+    first: number,
+    next: number,
+    bootId: number,
+    // absolute timestamps in ms and hashrates in GH/s
+    timestamps: Float64Array,
+    hashrate_10m: Float64Array,
+    hashrate_1h: Float64Array,
+    hashrate_1d: Float64Array
+}
@@ -1,6 +1,16 @@
 import { eASICModel } from './enum/eASICModel';
 import { IHistory } from '../models/IHistory';
 
+export interface ISubmitLatency {
+    count: number,
+    lost: number,
+    pending: number,
+    avgMs: number,
+    maxMs: number,
+    lastMs: number,
+    counts: number[]
+}
+
 export interface ISystemInfo {
 
     flipscreen: number;
@@ -19,9 +29,15 @@ export interface ISystemInfo {
     vrTemp: number,
     hashRateTimestamp: number,
     hashRate: number,
+    hashRate_1m: number,
+    hashRate_5m: number,
     hashRate_10m: number,
     hashRate_1h: number,
+    hashRate_6h: number,
     hashRate_1d: number,
+    // per window, missing if the firmware doesn't keep the breakdowns
+    asicHashRates?: { [window: string]: number[] },
+    poolHashRates?: { [window: string]: number[] },
     bestDiff: string,
     bestSessionDiff: string,
     freeHeap: number,
@@ -46,6 +62,10 @@ export interface ISystemInfo {
     stratumUser: string,
     fallbackStratumURL: string,
     fallbackStratumPort: number,
+    stratumHotStandby: number,
+    failoverCount: number,
+    failoverLastMs: number,
+    failoverMaxMs: number,
     fallbackStratumUser: string,
     isUsingFallbackStratum: boolean,
     isStratumConnected: boolean,
@@ -63,6 +83,15 @@ export interface ISystemInfo {
     lastResetReason: string,
     jobInterval: number,
     lastpingrtt: number,
+    jobsSent: number,
+    jobRingMisses: number,
+    jobIntervalActual: number,
+    idleCount: number,
+    idleTimeTotalMs: number,
+    idleTimeMaxMs: number,
+    submitQueueDropped: number,
+    submitLatencyBucketsMs: number[],
+    submitLatency: ISubmitLatency[],
 
     boardtemp1?: number,
     boardtemp2?: number,
@@ -72,6 +72,7 @@ export class EditComponent implements OnInit {
     'fallbackStratumURL',
     'fallbackStratumPort',
     'fallbackStratumUser',
+    'stratumHotStandby',
     'invertfanpolarity',
     'autofanpolarity',
     'stratumDifficulty',
@@ -165,6 +166,7 @@ export class EditComponent implements OnInit {
           ]],
           fallbackStratumUser: [info.fallbackStratumUser],
           fallbackStratumPassword: ['*****'],
+          stratumHotStandby: [info.stratumHotStandby == 1],
 
           hostname: [info.hostname, [Validators.required]],
           ssid: [info.ssid, [Validators.required]],
@@ -1,8 +1,9 @@
 import { Component, AfterViewChecked, OnInit, OnDestroy } from '@angular/core';
-import { interval, map, Observable, shareReplay, startWith, switchMap, tap } from 'rxjs';
+import { forkJoin, interval, map, Observable, shareReplay, startWith, switchMap, tap } from 'rxjs';
 import { HashSuffixPipe } from '../../pipes/hash-suffix.pipe';
 import { SystemService } from '../../services/system.service';
 import { ISystemInfo } from '../../models/ISystemInfo';
+import { IHistoryBinary } from '../../models/IHistoryBinary';
 import { Chart } from 'chart.js';  // Import Chart.js
 import { ElementRef, ViewChild } from "@angular/core";
 import { TimeScale} from "chart.js/auto";
@@ -39,6 +40,10 @@ export class HomeComponent implements AfterViewChecked, OnInit, OnDestroy {
 
   private localStorageKey = 'chartData';
   private timestampKey = 'lastTimestamp'; // Key to store lastTimestamp
+  private maxChartPoints = 600; // point budget for the history query
+  // cursor of the binary history polls, null until the first load is imported
+  private historySince: number | null = null;
+  private historyBootId = 0;
 
   ngAfterViewChecked(): void {
     // Ensure chart is initialized only once when the canvas becomes available
@@ -154,6 +159,19 @@ export class HomeComponent implements AfterViewChecked, OnInit, OnDestroy {
     this.info$ = interval(5000).pipe(
       startWith(0), // Immediately start the interval observable
       switchMap(() => {
+        // after the first load only the new samples, binary from the cursor of the previous poll
+        if (this.historySince !== null) {
+          return forkJoin([
+            this.systemService.getInfo(0),
+            this.systemService.getHistoryBinary(this.historySince, this.historyBootId)
+          ]).pipe(
+            map(([info, history]) => {
+              this.importBinaryHistory(history);
+              return info;
+            })
+          );
+        }
+
         const storedLastTimestamp = this.getStoredTimestamp();
         const currentTimestamp = new Date().getTime();
         const oneHourAgo = currentTimestamp - 3600 * 1000;
@@ -161,7 +179,8 @@ export class HomeComponent implements AfterViewChecked, OnInit, OnDestroy {
         // Cap the startTimestamp to be at most one hour ago
         let startTimestamp = storedLastTimestamp ? Math.max(storedLastTimestamp + 1, oneHourAgo) : oneHourAgo;
 
-        return this.systemService.getInfo(startTimestamp);
+        // the first load of up to an hour comes downsampled
+        return this.systemService.getInfo(startTimestamp, '', this.maxChartPoints);
       }),
       tap(info => {
         if (!info) {
@@ -267,6 +286,30 @@ export class HomeComponent implements AfterViewChecked, OnInit, OnDestroy {
 
     // set flag that we have finished the initial import
     this.updateChart();
+
+    // the following polls overlap with the latest samples, the ones already
+    // shown are skipped by their timestamp
+    this.historySince = -this.maxChartPoints;
+    this.historyBootId = 0;
+  }
+
+  // samples since the previous poll, absolute timestamps and GH/s
+  private importBinaryHistory(history: IHistoryBinary) {
+    this.historySince = history.next;
+    this.historyBootId = history.bootId;
+
+    this.appendChartData(
+      Array.from(history.timestamps),
+      Array.from(history.hashrate_10m, hr => hr * 1000000000.0),
+      Array.from(history.hashrate_1h, hr => hr * 1000000000.0),
+      Array.from(history.hashrate_1d, hr => hr * 1000000000.0)
+    );
+
+    this.filterOldData();
+    if (this.wasLoaded) {
+      this.saveChartData();
+    }
+    this.updateChart();
   }
 
   private clearChartData(): void {
@@ -283,6 +326,11 @@ export class HomeComponent implements AfterViewChecked, OnInit, OnDestroy {
     const convertedhashrate_1h = data.hashrate_1h.map((hr: number) => hr * 1000000000.0 / 100.0);
     const convertedhashrate_1d = data.hashrate_1d.map((hr: number) => hr * 1000000000.0 / 100.0);
 
+    this.appendChartData(convertedTimestamps, convertedhashrate_10m, convertedhashrate_1h, convertedhashrate_1d);
+  }
+
+  private appendChartData(convertedTimestamps: number[], convertedhashrate_10m: number[],
+                          convertedhashrate_1h: number[], convertedhashrate_1d: number[]): void {
     // Find the highest existing timestamp
     const lastTimestamp = this.dataLabel.length > 0 ? Math.max(...this.dataLabel) : -Infinity;
 
@@ -0,0 +1,42 @@
+import { IHistoryBinary } from '../models/IHistoryBinary';
+
+// layout of GET /api/history/binary, see history_binary_header in main/history.h
+const MAGIC = 0x42484d4a; // "JMHB"
+const VERSION = 2;
+const HEADER_SIZE = 32;
+
+export function decodeHistoryBinary(buffer: ArrayBuffer): IHistoryBinary {
+  const header = new DataView(buffer, 0, HEADER_SIZE);
+  if (header.getUint32(0, true) !== MAGIC || header.getUint16(4, true) !== VERSION) {
+    throw new Error('not a binary history export');
+  }
+  const recordSize = header.getUint16(6, true);
+  const first = header.getUint32(8, true);
+  // the device cuts the stream short if samples were overwritten while sending
+  const count = Math.min(header.getUint32(12, true), Math.floor((buffer.byteLength - HEADER_SIZE) / recordSize));
+  const timestamp = Number(header.getBigUint64(16, true));
+  const bootId = header.getUint32(24, true);
+
+  // records are delta ms and the hashrates 10m/1h/1d in 0.01 GH/s, newer versions may append fields
+  const stride = recordSize / 4;
+  const words = new Uint32Array(buffer, HEADER_SIZE, count * stride);
+  const result: IHistoryBinary = {
+    first,
+    next: first + count,
+    bootId,
+    timestamps: new Float64Array(count),
+    hashrate_10m: new Float64Array(count),
+    hashrate_1h: new Float64Array(count),
+    hashrate_1d: new Float64Array(count)
+  };
+
+  let ts = timestamp;
+  for (let i = 0, w = 0; i < count; i++, w += stride) {
+    ts += words[w];
+    result.timestamps[i] = ts;
+    result.hashrate_10m[i] = words[w + 1] / 100;
+    result.hashrate_1h[i] = words[w + 2] / 100;
+    result.hashrate_1d[i] = words[w + 3] / 100;
+  }
+  return result;
+}
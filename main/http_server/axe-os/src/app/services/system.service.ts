@@ -1,9 +1,11 @@
 import { HttpClient, HttpEvent } from '@angular/common/http';
 import { Injectable } from '@angular/core';
-import { delay, Observable, of } from 'rxjs';
+import { delay, map, Observable, of } from 'rxjs';
 import { eASICModel } from '../models/enum/eASICModel';
 import { ISystemInfo } from '../models/ISystemInfo';
 import { IHistory } from '../models/IHistory';
+import { IHistoryBinary } from '../models/IHistoryBinary';
+import { decodeHistoryBinary } from './history-decoder';
 
 import { environment } from '../../environments/environment';
 import { IInfluxDB } from '../models/IInfluxDB';
@@ -20,8 +22,11 @@ const defaultInfo: ISystemInfo = {
   vrTemp: 45,
   hashRateTimestamp: 1724398272483,
   hashRate: 475,
+  hashRate_1m: 475,
+  hashRate_5m: 475,
   hashRate_10m: 475,
   hashRate_1h: 475,
+  hashRate_6h: 475,
   hashRate_1d: 475,
   bestDiff: "0",
   bestSessionDiff: "0",
@@ -48,6 +53,10 @@ const defaultInfo: ISystemInfo = {
   stratumUser: "bc1q99n3pu025yyu0jlywpmwzalyhm36tg5u37w20d.JingleMiner",
   fallbackStratumURL: "",
   fallbackStratumPort: 3333,
+  stratumHotStandby: 0,
+  failoverCount: 0,
+  failoverLastMs: 0,
+  failoverMaxMs: 0,
   fallbackStratumUser: "",
   isUsingFallbackStratum: false,
   isStratumConnected: false,
@@ -68,6 +77,18 @@ const defaultInfo: ISystemInfo = {
   jobInterval: 1200,
   stratumDifficulty: 1000,
   lastpingrtt: 0.00,
+  jobsSent: 0,
+  jobRingMisses: 0,
+  jobIntervalActual: 1200,
+  idleCount: 0,
+  idleTimeTotalMs: 0,
+  idleTimeMaxMs: 0,
+  submitQueueDropped: 0,
+  submitLatencyBucketsMs: [10, 25, 50, 100, 250, 500, 1000, 2500, 5000],
+  submitLatency: [
+    { count: 42, lost: 0, pending: 0, avgMs: 38.5, maxMs: 212.0, lastMs: 31.2, counts: [0, 3, 30, 7, 2, 0, 0, 0, 0, 0] },
+    { count: 0, lost: 0, pending: 0, avgMs: 0, maxMs: 0, lastMs: 0, counts: [0, 0, 0, 0, 0, 0, 0, 0, 0, 0] }
+  ],
   poolDifficulty: 0,
 
   pidTargetTemp: 55,
@@ -101,9 +122,10 @@ export class SystemService {
     return defaultInfo;
   }
 
-  public getInfo(ts: number, uri: string = ''): Observable<ISystemInfo> {
+  public getInfo(ts: number, uri: string = '', points: number = 0): Observable<ISystemInfo> {
     if (environment.production) {
-      return this.httpClient.get(`${uri}/api/system/info?ts=${ts}&cur=${Math.floor(Date.now())}`) as Observable<ISystemInfo>;
+      const budget = points > 0 ? `&points=${points}` : '';
+      return this.httpClient.get(`${uri}/api/system/info?ts=${ts}&cur=${Math.floor(Date.now())}${budget}`) as Observable<ISystemInfo>;
     } else {
       return of(defaultInfo).pipe(delay(1000));
     }
@@ -135,6 +157,19 @@ export class SystemService {
     return this.httpClient.get<any>(`/api/history/data?ts=${ts}`);
   }
 
+  // samples from the cursor since (-n for the latest n), pass next and bootId
+  // of the result to poll for newer ones
+  public getHistoryBinary(since: number = 0, bootId: number = 0, uri: string = ''): Observable<IHistoryBinary> {
+    if (environment.production) {
+      const boot = bootId ? `&boot=${bootId}` : '';
+      return this.httpClient.get(`${uri}/api/history/binary?since=${since}${boot}&cur=${Math.floor(Date.now())}`,
+        { responseType: 'arraybuffer' }).pipe(map(decodeHistoryBinary));
+    } else {
+      const none = new Float64Array(0);
+      return of({ first: 0, next: 0, bootId: 0, timestamps: none, hashrate_10m: none, hashrate_1h: none, hashrate_1d: none });
+    }
+  }
+
 
   public restart(uri: string = '') {
     return this.httpClient.post(`${uri}/api/system/restart`, {}, { responseType: 'text' });
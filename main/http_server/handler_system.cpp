@@ -12,6 +12,7 @@
 #include "http_utils.h"
 
 #include "ping_task.h"
+#include "create_jobs_task.h"
 #include "esp_wifi.h"
 #include <vector>
 #include <string>
@@ -114,7 +115,9 @@ esp_err_t GET_system_info(httpd_req_t *req)
 
     // Parse optional start_timestamp parameter
     uint64_t start_timestamp = 0;
+    uint64_t end_timestamp = 0;
     uint64_t current_timestamp = 0;
+    int max_points = 0;
     bool history_requested = false;
     char query_str[128];
     if (httpd_req_get_url_query_str(req, query_str, sizeof(query_str)) == ESP_OK) {
@@ -129,6 +132,13 @@ esp_err_t GET_system_info(httpd_req_t *req)
             current_timestamp = strtoull(param, NULL, 10);
             ESP_LOGI(TAG, "cur: %llu", current_timestamp);
         }
+        // optional end of the range and point budget, longer ranges come from the downsampled tiers
+        if (httpd_query_key_value(query_str, "te", param, sizeof(param)) == ESP_OK) {
+            end_timestamp = strtoull(param, NULL, 10);
+        }
+        if (httpd_query_key_value(query_str, "points", param, sizeof(param)) == ESP_OK) {
+            max_points = (int) strtol(param, NULL, 10);
+        }
     }
 
     Board* board   = SYSTEM_MODULE.getBoard();
@@ -163,11 +173,31 @@ esp_err_t GET_system_info(httpd_req_t *req)
     doc["current"]            = POWER_MANAGEMENT_MODULE.getCurrent();
     doc["temp"]               = POWER_MANAGEMENT_MODULE.getChipTempMax();
     doc["vrTemp"]             = POWER_MANAGEMENT_MODULE.getVRTemp();
-    doc["hashRateTimestamp"]  = history->getCurrentTimestamp();
-    doc["hashRate"]           = history->getCurrentHashrate10m();
-    doc["hashRate_10m"]       = history->getCurrentHashrate10m();
-    doc["hashRate_1h"]        = history->getCurrentHashrate1h();
-    doc["hashRate_1d"]        = history->getCurrentHashrate1d();
+
+    // all moving averages of one share, hashRate_<window> and the breakdowns
+    // as {"<window>": [asic 0, asic 1, ...]} and {"<window>": [primary, fallback]}
+    history_snapshot hashrates;
+    history->getSnapshot(&hashrates);
+    doc["hashRateTimestamp"]  = hashrates.timestamp;
+    doc["hashRate"]           = hashrates.hashrate[HISTORY_WINDOW_10M];
+    for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+        doc[std::string("hashRate_") + HISTORY_WINDOWS[w].name] = hashrates.hashrate[w];
+    }
+    if (hashrates.numAsics || hashrates.numPools) {
+        JsonObject json_asics = doc["asicHashRates"].to<JsonObject>();
+        JsonObject json_pools = doc["poolHashRates"].to<JsonObject>();
+        for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+            JsonArray json_asic = json_asics[HISTORY_WINDOWS[w].name].to<JsonArray>();
+            for (int i = 0; i < hashrates.numAsics; i++) {
+                json_asic.add(hashrates.asicHashrate[w][i]);
+            }
+            JsonArray json_pool = json_pools[HISTORY_WINDOWS[w].name].to<JsonArray>();
+            for (int i = 0; i < hashrates.numPools; i++) {
+                json_pool.add(hashrates.poolHashrate[w][i]);
+            }
+        }
+    }
+
     doc["bestDiff"]           = SYSTEM_MODULE.getBestDiffString();
     doc["bestSessionDiff"]    = SYSTEM_MODULE.getBestSessionDiffString();
     doc["coreVoltage"]        = board->getAsicVoltageMillis();
@@ -177,18 +207,60 @@ esp_err_t GET_system_info(httpd_req_t *req)
     doc["sharesRejected"]     = SYSTEM_MODULE.getSharesRejected();
     doc["isUsingFallbackStratum"] = STRATUM_MANAGER.isUsingFallback();
     doc["isStratumConnected"] = STRATUM_MANAGER.isAnyConnected();
+
+    // time without work from losing the selected pool to the first job of the next one
+    failover_stats failoverStats;
+    STRATUM_MANAGER.getFailoverStats(&failoverStats);
+    doc["failoverCount"]      = failoverStats.count;
+    doc["failoverLastMs"]     = failoverStats.last_ms;
+    doc["failoverMaxMs"]      = failoverStats.max_ms;
     doc["fanspeed"]           = POWER_MANAGEMENT_MODULE.getFanPerc();
     doc["fanrpm"]             = POWER_MANAGEMENT_MODULE.getFanRPM();
     doc["lastpingrtt"]        = get_last_ping_rtt();
     doc["poolDifficulty"]     = SYSTEM_MODULE.getPoolDifficulty();
 
+    // time the asics were idle between jobs
+    job_stats jobStats;
+    create_job_get_stats(&jobStats);
+    doc["jobsSent"]           = jobStats.jobs_sent;
+    doc["jobRingMisses"]      = jobStats.ring_misses;
+    doc["jobIntervalActual"]  = jobStats.job_interval_ms;
+    doc["idleCount"]          = jobStats.idle_count;
+    doc["idleTimeTotalMs"]    = jobStats.total_idle_ms;
+    doc["idleTimeMaxMs"]      = jobStats.max_idle_ms;
+
+    // share submit latency per pool, the buckets are the upper bounds in ms
+    doc["submitQueueDropped"] = STRATUM_MANAGER.getSubmitDropped();
+    JsonArray json_buckets = doc["submitLatencyBucketsMs"].to<JsonArray>();
+    for (int i = 0; i < SUBMIT_LATENCY_BUCKETS - 1; i++) {
+        json_buckets.add(SUBMIT_LATENCY_BUCKET_MS[i]);
+    }
+    JsonArray json_latency = doc["submitLatency"].to<JsonArray>();
+    for (int pool = 0; pool < 2; pool++) {
+        submit_stats submitStats;
+        STRATUM_MANAGER.getSubmitStats(pool, &submitStats);
+        JsonObject json_pool = json_latency.add<JsonObject>();
+        json_pool["count"]   = submitStats.count;
+        json_pool["lost"]    = submitStats.lost;
+        json_pool["pending"] = submitStats.pending;
+        json_pool["avgMs"]   = submitStats.count ? submitStats.totalMs / submitStats.count : 0.0;
+        json_pool["maxMs"]   = submitStats.maxMs;
+        json_pool["lastMs"]  = submitStats.lastMs;
+        JsonArray json_counts = json_pool["counts"].to<JsonArray>();
+        for (int i = 0; i < SUBMIT_LATENCY_BUCKETS; i++) {
+            json_counts.add(submitStats.counts[i]);
+        }
+    }
+
     // If history was requested, add the history data as a nested object
     if (history_requested) {
-        uint64_t end_timestamp = start_timestamp + 3600 * 1000ULL; // 1 hour later
+        if (end_timestamp <= start_timestamp) {
+            end_timestamp = start_timestamp + 3600 * 1000ULL; // 1 hour later
+        }
         JsonObject json_history = doc["history"].to<JsonObject>();
 
         History *history = SYSTEM_MODULE.getHistory();
-        history->exportHistoryData(json_history, start_timestamp, end_timestamp, current_timestamp);
+        history->exportHistoryData(json_history, start_timestamp, end_timestamp, current_timestamp, max_points);
     }
 
     // settings
@@ -207,6 +279,7 @@ esp_err_t GET_system_info(httpd_req_t *req)
     doc["fallbackStratumURL"] = fallbackStratumURL;
     doc["fallbackStratumPort"]= Config::getStratumFallbackPortNumber();
     doc["fallbackStratumUser"] = fallbackStratumUser;
+    doc["stratumHotStandby"]  = Config::isStratumHotStandbyEnabled() ? 1 : 0;
     doc["voltage"]            = POWER_MANAGEMENT_MODULE.getVoltage();
     doc["frequency"]          = board->getAsicFrequency();
     doc["defaultFrequency"]   = board->getDefaultAsicFrequency();
@@ -253,6 +326,98 @@ esp_err_t GET_system_info(httpd_req_t *req)
     return ret;
 }
 
+// records per chunk of the binary history export
+#define HISTORY_CHUNK_RECORDS 256
+
+/* Binary history export, streamed in chunks without a JSON document.
+ * since: cursor of the first sample (first + count of the previous response),
+ *        -n for the latest n samples
+ * boot:  bootId of the previous response, a cursor from before a reboot
+ *        starts at the oldest sample
+ * limit: max number of samples, all of them if not given
+ * cur:   current time of the client in ms, the header timestamp is in the
+ *        client's time then, otherwise in ms since boot */
+esp_err_t GET_history_binary(httpd_req_t *req)
+{
+    if (is_network_allowed(req) != ESP_OK) {
+        return httpd_resp_send_err(req, HTTPD_401_UNAUTHORIZED, "Unauthorized");
+    }
+
+    // Set CORS headers
+    if (set_cors_headers(req) != ESP_OK) {
+        httpd_resp_send_500(req);
+        return ESP_FAIL;
+    }
+
+    int since = 0;
+    int limit = 0;
+    int64_t time_offset = 0;
+    uint32_t boot_id = 0;
+    char query_str[128];
+    if (httpd_req_get_url_query_str(req, query_str, sizeof(query_str)) == ESP_OK) {
+        char param[64];
+        if (httpd_query_key_value(query_str, "since", param, sizeof(param)) == ESP_OK) {
+            since = (int) strtol(param, NULL, 10);
+        }
+        if (httpd_query_key_value(query_str, "limit", param, sizeof(param)) == ESP_OK) {
+            limit = (int) strtol(param, NULL, 10);
+        }
+        if (httpd_query_key_value(query_str, "cur", param, sizeof(param)) == ESP_OK) {
+            time_offset = (int64_t) strtoull(param, NULL, 10) - esp_timer_get_time() / 1000;
+        }
+        if (httpd_query_key_value(query_str, "boot", param, sizeof(param)) == ESP_OK) {
+            boot_id = (uint32_t) strtoul(param, NULL, 10);
+        }
+    }
+
+    History *history = SYSTEM_MODULE.getHistory();
+    if (!history->isAvailable()) {
+        return httpd_resp_send_err(req, HTTPD_500_INTERNAL_SERVER_ERROR, "History not available");
+    }
+
+    history_record *records = (history_record *) MALLOC(HISTORY_CHUNK_RECORDS * sizeof(history_record));
+    if (!records) {
+        ESP_LOGE(TAG, "Failed to allocate memory for history records");
+        return httpd_resp_send_err(req, HTTPD_500_INTERNAL_SERVER_ERROR, "Memory allocation error");
+    }
+
+    history_binary_header header;
+    int count = history->exportBinaryHeader(&header, since, limit, time_offset, boot_id);
+
+    httpd_resp_set_type(req, "application/octet-stream");
+    if (httpd_resp_send_chunk(req, (const char *) &header, sizeof(header)) != ESP_OK) {
+        FREE(records);
+        return ESP_FAIL;
+    }
+
+    // nothing is locked: every chunk takes the number of samples from the
+    // seqlocked snapshot (reread while the writer publishes one), copies the
+    // samples out of the ring and then checks the writer's claim counter. If
+    // the writer wrapped around onto them meanwhile the response ends early,
+    // a client retries from its cursor and starts at the oldest sample again
+    uint64_t timestamp = 0;
+    for (int index = header.first; index < (int) header.first + count;) {
+        int max = (int) header.first + count - index;
+        int num = history->exportRecords(records, index, (max > HISTORY_CHUNK_RECORDS) ? HISTORY_CHUNK_RECORDS : max, &timestamp);
+        if (num <= 0) {
+            // the client sees fewer records than announced
+            ESP_LOGW(TAG, "history samples overwritten during export");
+            FREE(records);
+            return ESP_FAIL;
+        }
+        if (httpd_resp_send_chunk(req, (const char *) records, num * sizeof(history_record)) != ESP_OK) {
+            FREE(records);
+            return ESP_FAIL;
+        }
+        index += num;
+    }
+
+    FREE(records);
+
+    // Signal the end of the response
+    return httpd_resp_send_chunk(req, NULL, 0);
+}
+
 
 
 esp_err_t PATCH_update_settings(httpd_req_t *req)
@@ -325,6 +490,9 @@ esp_err_t PATCH_update_settings(httpd_req_t *req)
     if (doc["fallbackStratumPort"].is<uint16_t>()) {
         Config::setStratumFallbackPortNumber(doc["fallbackStratumPort"].as<uint16_t>());
     }
+    if (doc["stratumHotStandby"].is<bool>()) {
+        Config::setStratumHotStandby(doc["stratumHotStandby"].as<bool>());
+    }
     if (doc["ssid"].is<const char*>()) {
         Config::setWifiSSID(doc["ssid"].as<const char*>());
     }
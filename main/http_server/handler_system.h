@@ -1,5 +1,6 @@
 #pragma once
 
 esp_err_t GET_system_info(httpd_req_t *req);
+esp_err_t GET_history_binary(httpd_req_t *req);
 esp_err_t PATCH_update_settings(httpd_req_t *req);
 esp_err_t GET_wifi_scan(httpd_req_t *req);
\ No newline at end of file
@@ -21,6 +21,7 @@
 #include "create_jobs_task.h"
 #include "global_state.h"
 #include "history.h"
+#include "history_log_task.h"
 #include "http_server.h"
 #include "influx_task.h"
 #include "main.h"
@@ -228,6 +229,7 @@ extern "C" void app_main(void)
         xTaskCreate(influx_task, "influx", 8192, NULL, 1, NULL);
         xTaskCreate(APIs_FETCHER.taskWrapper, "apis ticker", 4096, (void*) &APIs_FETCHER, 5, NULL);
         xTaskCreate(ping_task, "ping task", 4096, NULL, 1, NULL);
+        xTaskCreate(history_log_task, "history log", 4096, NULL, 1, NULL);
 
         initWatchdog(stratum_manager_handle);
     }
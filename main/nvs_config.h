@@ -18,6 +18,7 @@
 #define NVS_CONFIG_STRATUM_FALLBACK_USER "fbstratumuser"
 #define NVS_CONFIG_STRATUM_FALLBACK_PASS "fbstratumpass"
 #define NVS_CONFIG_STRATUM_DIFFICULTY "stratumdiff"
+#define NVS_CONFIG_STRATUM_HOT_STANDBY "stratumstandby"
 
 #define NVS_CONFIG_ASIC_FREQ "asicfrequency"
 #define NVS_CONFIG_ASIC_VOLTAGE "asicvoltage"
@@ -148,6 +149,7 @@ namespace Config {
     inline bool isAutoScreenOffEnabled() { return nvs_config_get_u16(NVS_CONFIG_AUTO_SCREEN_OFF, CONFIG_AUTO_SCREEN_OFF_VALUE) != 0; }
     inline bool isAutoScreenRotateEnabled() { return nvs_config_get_u16(NVS_CONFIG_AUTO_SCREEN_ROTATE, CONFIG_AUTO_SCREEN_ROTATE_VALUE) != 0; }
     inline bool isInfluxEnabled() { return nvs_config_get_u16(NVS_CONFIG_INFLUX_ENABLE, CONFIG_INFLUX_ENABLE_VALUE) != 0; }
+    inline bool isStratumHotStandbyEnabled() { return nvs_config_get_u16(NVS_CONFIG_STRATUM_HOT_STANDBY, 0) != 0; }
 
     // ---- Boolean Setters ----
     inline void setFlipScreen(bool value) { nvs_config_set_u16(NVS_CONFIG_FLIP_SCREEN, value ? 1 : 0); }
@@ -158,6 +160,7 @@ namespace Config {
     inline void setAutoScreenOff(bool value) { nvs_config_set_u16(NVS_CONFIG_AUTO_SCREEN_OFF, value ? 1 : 0); }
     inline void setAutoScreenRotate(bool value) { nvs_config_set_u16(NVS_CONFIG_AUTO_SCREEN_ROTATE, value ? 1 : 0); }
     inline void setInfluxEnabled(bool value) { nvs_config_set_u16(NVS_CONFIG_INFLUX_ENABLE, value ? 1 : 0); }
+    inline void setStratumHotStandby(bool value) { nvs_config_set_u16(NVS_CONFIG_STRATUM_HOT_STANDBY, value ? 1 : 0); }
 
 
     // with board specific default values
@@ -24,6 +24,7 @@
 #include "nvs_config.h"
 #include "influx_task.h"
 #include "history.h"
+#include "history_log.h"
 #include "boards/board.h"
 
 static const char* TAG = "SystemModule";
@@ -97,6 +98,13 @@ void System::initSystem() {
     if (!m_history->init(m_board->getAsicCount())) {
         ESP_LOGE(TAG, "history couldn't be initialized!");
     }
+
+    // before the first share, the averages start where they were before the reboot
+    m_historyLog = new HistoryLog();
+    if (m_historyLog->init() && m_history->isAvailable()) {
+        m_historyLog->replay(m_history);
+        m_currentHashrate10m = m_history->getCurrentHashrate10m();
+    }
 }
 
 void System::updateHashrate() {}
@@ -326,11 +334,11 @@ void System::notifyMiningStarted() {}
 
 void System::notifyNewNtime(uint32_t ntime) {}
 
-void System::notifyFoundNonce(double poolDiff, int asicNr) {
+void System::notifyFoundNonce(double poolDiff, int asicNr, int poolNr) {
     // ms timestamp
     uint64_t timestamp = esp_timer_get_time() / 1000llu;
 
-    m_history->pushShare(poolDiff, timestamp, asicNr);
+    m_history->pushShare(poolDiff, timestamp, asicNr, poolNr);
 
     m_currentHashrate10m = m_history->getCurrentHashrate10m();
     updateHashrate();
@@ -8,6 +8,7 @@
 #include "freertos/queue.h"
 #include "boards/board.h"
 #include "history.h"
+#include "history_log.h"
 
 // Configuration and constants
 #define STRATUM_USER CONFIG_STRATUM_USER
@@ -60,6 +61,7 @@ class System {
     const char* m_lastResetReason;
 
     History *m_history;
+    HistoryLog *m_historyLog;
 
     // Network interface
     esp_netif_t *m_netif;         // ESP32 network interface structure
@@ -104,7 +106,7 @@ class System {
     // Notification methods to update share statistics
     void notifyAcceptedShare();                              // Notify system of an accepted share
     void notifyRejectedShare();                              // Notify system of a rejected share
-    void notifyFoundNonce(double poolDiff, int asicNr);      // Notify system of a found nonce
+    void notifyFoundNonce(double poolDiff, int asicNr, int poolNr); // Notify system of a found nonce
     void checkForBestDiff(double foundDiff, uint32_t nbits); // Check if the found difficulty is the best so far
     void notifyMiningStarted();                              // Notify system that mining has started
     void notifyNewNtime(uint32_t ntime);                     // Notify system of new `ntime` received from the pool
@@ -227,6 +229,10 @@ class System {
         return m_history;
     }
 
+    HistoryLog* getHistoryLog() {
+        return m_historyLog;
+    }
+
     void showLastResetReason();
 
     const char* getLastResetReason() {
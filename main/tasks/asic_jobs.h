@@ -1,5 +1,6 @@
 #pragma once
 
+#include <atomic>
 #include <pthread.h>
 #include <string.h>
 
@@ -7,9 +8,22 @@
 
 #define MAX_ASIC_JOBS 128
 
+// number of lock-free read attempts before getJob falls back to the mutex
+#define ASIC_JOBS_READ_RETRIES 4
+
+// Jobs sent to the asics, indexed by asic job id. The slots are a fixed slab,
+// nothing is allocated per job. Writers are serialized by the mutex, readers
+// copy a slot out under its sequence counter and only take the mutex if a
+// write is in progress (a spinning reader could starve a preempted writer).
 class AsicJobs {
 protected:
-    bm_job *m_activeJobs[MAX_ASIC_JOBS];
+    struct Slot {
+        std::atomic<uint32_t> seq; // odd while the slot is written
+        bool valid;
+        bm_job job;
+    };
+
+    Slot m_slots[MAX_ASIC_JOBS];
     pthread_mutex_t m_validJobsLock;
 
     void lock() {
@@ -20,63 +34,79 @@ protected:
         pthread_mutex_unlock(&m_validJobsLock);
     }
 
-    bm_job *cloneBmJob(bm_job *src)
-    {
-        bm_job *dst = (bm_job *) malloc(sizeof(bm_job));
-
-        // copy all
-        memcpy(dst, src, sizeof(bm_job));
-
-        // copy strings
-        dst->extranonce2 = strdup(src->extranonce2);
-        dst->jobid = strdup(src->jobid);
+    void beginWrite(Slot *slot) {
+        slot->seq.store(slot->seq.load(std::memory_order_relaxed) + 1, std::memory_order_relaxed);
+        std::atomic_thread_fence(std::memory_order_release);
+    }
 
-        return dst;
+    void endWrite(Slot *slot) {
+        slot->seq.store(slot->seq.load(std::memory_order_relaxed) + 1, std::memory_order_release);
     }
 
 public:
     AsicJobs() {
         m_validJobsLock = PTHREAD_MUTEX_INITIALIZER;
-        memset(m_activeJobs, 0, sizeof(m_activeJobs));
+        for (int i = 0; i < MAX_ASIC_JOBS; i++) {
+            m_slots[i].seq.store(0, std::memory_order_relaxed);
+            m_slots[i].valid = false;
+        }
     }
 
     void cleanJobs() {
         lock();
         for (int i = 0; i < MAX_ASIC_JOBS; i++) {
-            if (m_activeJobs[i]) {
-                free_bm_job(m_activeJobs[i]);
-                m_activeJobs[i] = 0;
+            if (m_slots[i].valid) {
+                beginWrite(&m_slots[i]);
+                m_slots[i].valid = false;
+                endWrite(&m_slots[i]);
             }
         }
         unlock();
     }
 
-    void storeJob(bm_job *next_job, uint8_t asic_job_id) {
-        lock();
-        // if a slot was used before free it
-        if (m_activeJobs[asic_job_id]) {
-            free_bm_job(m_activeJobs[asic_job_id]);
+    void storeJob(const bm_job *next_job, uint8_t asic_job_id) {
+        if (asic_job_id >= MAX_ASIC_JOBS) {
+            return;
         }
-        // save job into slot
-        m_activeJobs[asic_job_id] = next_job;
+        Slot *slot = &m_slots[asic_job_id];
+
+        lock();
+        // overwrite the job the slot was used for before
+        beginWrite(slot);
+        memcpy(&slot->job, next_job, sizeof(bm_job));
+        slot->valid = true;
+        endWrite(slot);
         unlock();
     }
 
-    bm_job *getClone(uint8_t asic_job_id) {
-        // check if we have a job with this job id
+    // copy the job with this asic job id, false if there is none
+    bool getJob(uint8_t asic_job_id, bm_job *job) {
+        if (asic_job_id >= MAX_ASIC_JOBS) {
+            return false;
+        }
+        Slot *slot = &m_slots[asic_job_id];
+
+        for (int i = 0; i < ASIC_JOBS_READ_RETRIES; i++) {
+            uint32_t seq = slot->seq.load(std::memory_order_acquire);
+            if (seq & 1) {
+                continue;
+            }
+            bool valid = slot->valid;
+            if (valid) {
+                memcpy(job, &slot->job, sizeof(bm_job));
+            }
+            std::atomic_thread_fence(std::memory_order_acquire);
+            if (slot->seq.load(std::memory_order_relaxed) == seq) {
+                return valid;
+            }
+        }
+
         lock();
-        if (!m_activeJobs[asic_job_id]) {
-            unlock();
-            return NULL;
+        bool valid = slot->valid;
+        if (valid) {
+            memcpy(job, &slot->job, sizeof(bm_job));
         }
-        // create a clone
-        bm_job *job = cloneBmJob(m_activeJobs[asic_job_id]);
         unlock();
-
-        // and return it
-        return job;
+        return valid;
     }
-
 };
-
-
@@ -45,11 +45,13 @@ void ASIC_result_task(void *pvParameters)
 
         uint8_t asic_job_id = asic_result.job_id;
 
-        bm_job *job = asicJobs.getClone(asic_job_id);
-        if (!job) {
+        // copy of the job, the slot may be reused while we submit
+        bm_job job_copy;
+        if (!asicJobs.getJob(asic_job_id, &job_copy)) {
             ESP_LOGI(TAG, "Invalid job id found, 0x%02X", asic_job_id);
             continue;
         }
+        bm_job *job = &job_copy;
 
         // now we have the original job and can `or` the version
         asic_result.rolled_version |= job->version;
@@ -72,11 +74,11 @@ void ASIC_result_task(void *pvParameters)
         }
 
         if (nonce_diff > job->asic_diff) {
-            SYSTEM_MODULE.notifyFoundNonce((double) job->asic_diff, asic_result.asic_nr);
+            // the share counts for the pool the work is submitted to
+            SYSTEM_MODULE.notifyFoundNonce((double) job->asic_diff, asic_result.asic_nr,
+                                           STRATUM_MANAGER.isUsingFallback() ? 1 : 0);
         }
 
         SYSTEM_MODULE.checkForBestDiff(nonce_diff, job->target);
-
-        free_bm_job(job);
     }
 }
@@ -9,8 +9,10 @@
 #include "esp_system.h"
 #include "esp_timer.h"
 #include "mining.h"
+#include "utils.h"
 
 #include "global_state.h"
+#include "create_jobs_task.h"
 
 #include "boards/board.h"
 #include "system.h"
@@ -27,6 +29,27 @@ static mining_notify current_job;
 static char *extranonce_str = NULL;
 static int extranonce_2_len = 0;
 
+// binary coinbase and merkle branches of current_job, rebuilt when the job or extranonce 1 changes
+static coinbase_midstate current_coinbase;
+static bool coinbase_valid = false;
+static bool coinbase_dirty = false;
+
+// jobs serialized ahead of time for the current notify, so the timer only has to push bytes
+typedef struct
+{
+    bm_job job;
+    uint8_t asic_job_id;
+    uint8_t packet[ASIC_JOB_PACKET_SIZE];
+} prepared_job;
+
+#define JOB_RING_SIZE 4
+
+// protected by current_stratum_job_mutex
+static prepared_job job_ring[JOB_RING_SIZE];
+static int job_ring_head = 0;
+static int job_ring_count = 0;
+static uint32_t extranonce_2 = 0;
+
 static uint32_t stratum_difficulty = 8192;
 static uint32_t active_stratum_difficulty = 8192;
 static uint32_t version_mask = 0;
@@ -36,8 +59,13 @@ static uint32_t version_mask = 0;
 #define HASHRATE_SAFETY_FACTOR 0.7f
 #define HASHRATE_MEASURED_THRESHOLD_GH 100.0f
 
+static pthread_mutex_t stats_mutex = PTHREAD_MUTEX_INITIALIZER;
 static double s_total_idle_time_ms = 0.0;
 static double s_max_idle_time_ms = 0.0;
+static uint32_t s_idle_count = 0;
+static uint32_t s_jobs_sent = 0;
+static uint32_t s_ring_misses = 0;
+static uint32_t s_job_interval_ms = 0;
 
 static inline uint32_t clamp_job_interval(uint32_t interval_ms)
 {
@@ -120,6 +148,78 @@ static bool compute_idle_metrics(Board *board, double actual_interval_ms, double
     return true;
 }
 
+void create_job_get_stats(job_stats *stats)
+{
+    pthread_mutex_lock(&stats_mutex);
+    stats->total_idle_ms = s_total_idle_time_ms;
+    stats->max_idle_ms = s_max_idle_time_ms;
+    stats->idle_count = s_idle_count;
+    stats->jobs_sent = s_jobs_sent;
+    stats->ring_misses = s_ring_misses;
+    stats->job_interval_ms = s_job_interval_ms;
+    pthread_mutex_unlock(&stats_mutex);
+}
+
+static void clear_job_ring()
+{
+    job_ring_head = 0;
+    job_ring_count = 0;
+}
+
+static void build_job(Board *board, bm_job *next_job)
+{
+    // only the extranonce 2 and coinbase_2 are hashed per job
+    uint8_t extranonce_2_bin[MAX_EXTRANONCE_2_LEN];
+    extranonce_2_to_bin(extranonce_2, extranonce_2_bin, extranonce_2_len);
+
+    uint8_t merkle_root[32];
+    calculate_merkle_root_midstate(&current_coinbase, extranonce_2_bin, merkle_root);
+
+    construct_bm_job(&current_job, merkle_root, version_mask, next_job);
+
+    // the length was checked when the coinbase was decoded
+    strcpy(next_job->jobid, current_job.job_id);
+    bin2hex(extranonce_2_bin, extranonce_2_len, next_job->extranonce2, sizeof(next_job->extranonce2));
+    next_job->pool_diff = active_stratum_difficulty;
+
+    // clamp stratum difficulty
+    next_job->asic_diff = max(min(active_stratum_difficulty, board->getAsicMaxDifficulty()), board->getAsicMinDifficulty());
+}
+
+// fill the ring up to count jobs, called with current_stratum_job_mutex held
+static bool prepare_jobs(Board *board, Asic *asics, int count)
+{
+    if (!current_job.ntime) {
+        return false;
+    }
+
+    // decode coinbase and merkle branches once per mining.notify / extranonce 1,
+    // jobs prepared for the previous one must not be sent anymore (clean jobs)
+    if (coinbase_dirty) {
+        clear_job_ring();
+        coinbase_midstate_free(&current_coinbase);
+        coinbase_valid = extranonce_str && strlen(current_job.job_id) < MAX_JOB_ID_LEN &&
+                         coinbase_midstate_init(&current_coinbase, &current_job, extranonce_str, extranonce_2_len);
+        coinbase_dirty = false;
+        if (!coinbase_valid) {
+            ESP_LOGE(TAG, "Invalid coinbase for job %s", current_job.job_id);
+        }
+    }
+
+    if (!coinbase_valid) {
+        return false;
+    }
+
+    while (job_ring_count < count) {
+        prepared_job *slot = &job_ring[(job_ring_head + job_ring_count) % JOB_RING_SIZE];
+        build_job(board, &slot->job);
+        slot->asic_job_id = asics->prepareWork(extranonce_2, &slot->job, slot->packet);
+        extranonce_2++;
+        job_ring_count++;
+    }
+    return true;
+}
+
 static void create_job_timer(TimerHandle_t xTimer)
 {
     pthread_mutex_lock(&job_mutex);
@@ -137,7 +237,11 @@ void trigger_job_creation()
 void create_job_set_version_mask(uint32_t mask)
 {
     pthread_mutex_lock(&current_stratum_job_mutex);
-    version_mask = mask;
+    if (version_mask != mask) {
+        // the prepared jobs carry the old mask, the next job gets the new one
+        version_mask = mask;
+        clear_job_ring();
+    }
     pthread_mutex_unlock(&current_stratum_job_mutex);
 }
 
@@ -162,6 +266,7 @@ void create_job_set_enonce(char *enonce, int enonce2_len)
     }
     extranonce_str = strdup(enonce);
     extranonce_2_len = enonce2_len;
+    coinbase_dirty = true;
     pthread_mutex_unlock(&current_stratum_job_mutex);
 }
 
@@ -190,12 +295,14 @@ void create_job_mining_notify(mining_notify *notifiy)
     // set active difficulty with the mining.notify command
     active_stratum_difficulty = stratum_difficulty;
 
+    coinbase_dirty = true;
+
     pthread_mutex_unlock(&current_stratum_job_mutex);
 
     trigger_job_creation();
 }
 
-void *create_jobs_task(void *pvParameters)
+void create_jobs_task(void *pvParameters)
 {
     Board *board = SYSTEM_MODULE.getBoard();
     Asic *asics = board->getAsics();
@@ -214,13 +321,13 @@ void *create_jobs_task(void *pvParameters)
 
     if (job_timer == NULL) {
         ESP_LOGE(TAG, "Failed to create timer");
-        return NULL;
+        return;
     }
 
     // Start the timer
     if (xTimerStart(job_timer, 0) != pdPASS) {
         ESP_LOGE(TAG, "Failed to start timer");
-        return NULL;
+        return;
     }
 
     // initialize notify
@@ -229,7 +336,6 @@ void *create_jobs_task(void *pvParameters)
     uint32_t last_asic_diff = 0;
     uint32_t last_ntime = 0;
     uint64_t last_submit_time = 0;
-    uint32_t extranonce_2 = 0;
 
     uint32_t last_configured_interval = (uint32_t) board->getAsicJobIntervalMs();
 
@@ -261,34 +367,23 @@ void *create_jobs_task(void *pvParameters)
             ESP_LOGI(TAG, "New Work Received %s", current_job.job_id);
         }
 
-        // generate extranonce2 hex string
-        char extranonce_2_str[extranonce_2_len * 2 + 1]; // +1 zero termination
-        snprintf(extranonce_2_str, sizeof(extranonce_2_str), "%0*lx", (int) extranonce_2_len * 2, extranonce_2);
-
-        // generate coinbase tx
-        int coinbase_tx_len =
-            strlen(current_job.coinbase_1) + strlen(extranonce_str) + strlen(extranonce_2_str) + strlen(current_job.coinbase_2);
-        char coinbase_tx[coinbase_tx_len + 1]; // +1 zero termination
-        snprintf(coinbase_tx, sizeof(coinbase_tx), "%s%s%s%s", current_job.coinbase_1, extranonce_str, extranonce_2_str,
-                 current_job.coinbase_2);
-
-        // calculate merkle root
-        char merkle_root[65];
-        calculate_merkle_root_hash(coinbase_tx, current_job._merkle_branches, current_job.n_merkle_branches, merkle_root);
-
-        // we need malloc because we will save it in the job array
-        bm_job *next_job = (bm_job *) malloc(sizeof(bm_job));
-        construct_bm_job(&current_job, merkle_root, version_mask, next_job);
-
-        next_job->jobid = strdup(current_job.job_id);
-        next_job->extranonce2 = strdup(extranonce_2_str);
-        next_job->pool_diff = active_stratum_difficulty;
+        // normally the job was prepared after the previous send, only build it now
+        // when the ring was invalidated by a new notify
+        bool ring_miss = coinbase_dirty || job_ring_count == 0;
+        if (!prepare_jobs(board, asics, 1)) {
+            pthread_mutex_unlock(&current_stratum_job_mutex);
+            continue;
+        }
 
-        // clamp stratum difficulty
-        next_job->asic_diff = max(min(active_stratum_difficulty, board->getAsicMaxDifficulty()), board->getAsicMinDifficulty());
+        prepared_job *next = &job_ring[job_ring_head];
+        job_ring_head = (job_ring_head + 1) % JOB_RING_SIZE;
+        job_ring_count--;
 
         pthread_mutex_unlock(&current_stratum_job_mutex);
 
+        // the slot is only refilled by this task, after the job was sent
+        bm_job *next_job = &next->job;
+
         if (next_job->asic_diff != last_asic_diff) {
             ESP_LOGI(TAG, "New ASIC difficulty %" PRIu32, next_job->asic_diff);
             last_asic_diff = next_job->asic_diff;
@@ -308,22 +403,36 @@ void *create_jobs_task(void *pvParameters)
 
             if (compute_idle_metrics(board, actual_interval_ms, &idle_ms, &job_runtime_ms, &hashrateGh) &&
                 idle_ms >= IDLE_REPORT_THRESHOLD_MS) {
+                pthread_mutex_lock(&stats_mutex);
                 s_total_idle_time_ms += idle_ms;
+                s_idle_count++;
                 if (idle_ms > s_max_idle_time_ms) {
                     s_max_idle_time_ms = idle_ms;
                 }
+                pthread_mutex_unlock(&stats_mutex);
             }
         }
         last_submit_time = current_time;
 
-        int asic_job_id = asics->sendWork(extranonce_2, next_job);
+        asics->sendPacket(next->packet, ASIC_JOB_PACKET_SIZE);
 
-        ESP_LOGD(TAG, "Sent Job: %02X", asic_job_id);
+        ESP_LOGD(TAG, "Sent Job: %02X", next->asic_job_id);
 
         // save job
-        asicJobs.storeJob(next_job, asic_job_id);
+        asicJobs.storeJob(next_job, next->asic_job_id);
 
-        extranonce_2++;
+        pthread_mutex_lock(&stats_mutex);
+        s_jobs_sent++;
+        s_job_interval_ms = current_job_interval;
+        if (ring_miss) {
+            s_ring_misses++;
+        }
+        pthread_mutex_unlock(&stats_mutex);
+
+        // prepare the next jobs while the asics are hashing
+        pthread_mutex_lock(&current_stratum_job_mutex);
+        prepare_jobs(board, asics, JOB_RING_SIZE);
+        pthread_mutex_unlock(&current_stratum_job_mutex);
 
         if (adaptive_scheduling_enabled) {
             uint32_t target_interval = compute_adaptive_job_interval(board, configured_job_interval);
@@ -351,6 +460,4 @@ void *create_jobs_task(void *pvParameters)
             }
         }
     }
-
-    return NULL;
 }
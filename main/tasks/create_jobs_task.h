@@ -1,10 +1,22 @@
 #pragma once
 
 #include <stdbool.h>
+#include <stdint.h>
 
 #include "stratum_api.h"
 
 
+// ASIC idle time between jobs and how often a job had to be built on demand
+typedef struct
+{
+    double total_idle_ms;
+    double max_idle_ms;
+    uint32_t idle_count;
+    uint32_t jobs_sent;
+    uint32_t ring_misses;
+    uint32_t job_interval_ms;
+} job_stats;
+
 void create_jobs_task(void *pvParameters);
 void create_job_mining_notify(mining_notify *notify);
 
@@ -12,3 +24,5 @@ void create_job_set_enonce(char *enonce, int enonce2_len);
 bool create_job_set_difficulty(uint32_t diffituly);
 void create_job_set_version_mask(uint32_t mask);
 
+void create_job_get_stats(job_stats *stats);
+
@@ -0,0 +1,29 @@
+#include "esp_log.h"
+#include "freertos/FreeRTOS.h"
+#include "freertos/task.h"
+
+#include "global_state.h"
+#include "history_log_task.h"
+
+// the 1 min tier completes a bucket every minute, a page holds 9 records
+#define HISTORY_LOG_INTERVAL_MS 10000
+
+static const char *TAG = "history log task";
+
+// appends the completed tier buckets to the flash log, off the result task
+// because erasing a sector takes tens of ms
+void history_log_task(void *pvParameters)
+{
+    History *history = SYSTEM_MODULE.getHistory();
+    HistoryLog *log = SYSTEM_MODULE.getHistoryLog();
+    if (!history || !log || !log->isAvailable()) {
+        ESP_LOGW(TAG, "history log not available");
+        vTaskDelete(NULL);
+        return;
+    }
+
+    while (1) {
+        vTaskDelay(HISTORY_LOG_INTERVAL_MS / portTICK_PERIOD_MS);
+        log->append(history);
+    }
+}
@@ -0,0 +1,3 @@
+#pragma once
+
+void history_log_task(void *pvParameters);
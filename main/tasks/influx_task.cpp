@@ -64,6 +64,16 @@ static void influx_task_fetch_from_system_module(System *module)
     // fetch hashrate
     influxdb->m_stats.hashing_speed = module->getCurrentHashrate10m();
 
+    // all windows of the moving average
+    history_snapshot hashrates;
+    module->getHistory()->getSnapshot(&hashrates);
+    int num = (HISTORY_NUM_WINDOWS < INFLUX_MAX_HASHRATES) ? HISTORY_NUM_WINDOWS : INFLUX_MAX_HASHRATES;
+    for (int i = 0; i < num; i++) {
+        influxdb->m_stats.hashrate_names[i] = HISTORY_WINDOWS[i].name;
+        influxdb->m_stats.hashrates[i] = hashrates.hashrate[i];
+    }
+    influxdb->m_stats.num_hashrates = num;
+
     // accepted
     influxdb->m_stats.accepted = module->getSharesAccepted();
 
@@ -34,6 +34,12 @@ void PowerManagementTask::restart() {
     lock();
 
     ESP_LOGW(TAG, "HW lock acquired!");
+    // keep the buckets of the last minutes
+    HistoryLog* historyLog = SYSTEM_MODULE.getHistoryLog();
+    if (historyLog) {
+        historyLog->flush(SYSTEM_MODULE.getHistory());
+    }
+
     // shutdown asics and LDOs before reset
     Board* board = SYSTEM_MODULE.getBoard();
     board->shutdown();
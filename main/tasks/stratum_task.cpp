@@ -2,6 +2,7 @@
 #include <sys/types.h>
 #include <time.h>
 
+#include "esp_heap_caps.h"
 #include "esp_log.h"
 #include "esp_sntp.h"
 #include "esp_task_wdt.h"
@@ -20,15 +21,14 @@
 #include "stratum_task.h"
 #include "system.h"
 
-#ifdef CONFIG_SPIRAM
-#define ALLOC(s) heap_caps_malloc(s, MALLOC_CAP_SPIRAM)
-#else
-#define ALLOC(s) malloc(s)
-#endif
-
 // fallback can nicely be tested with netcat
 // mkfifo /tmp/ncpipe
 // nc -l -p 4444 < /tmp/ncpipe | nc solo.ckpool.org 3333 > /tmp/ncpipe
+// or with a local pool that can be stopped and sends client.reconnect
+// python3 test/host/pool_simulator.py serve --host 0.0.0.0 --port 4444 --reconnect-every 120
+
+// every submit line fits into this, the user name being the longest part
+#define SUBMIT_LINE_SIZE 512
 
 enum Selected
 {
@@ -36,14 +36,6 @@ enum Selected
     SECONDARY = 1
 };
 
-static void safe_free(char *&ptr)
-{
-    if (ptr) {         // Check if pointer is not null
-        free(ptr);     // Free memory
-        ptr = nullptr; // Set pointer to null to prevent dangling pointer issues
-    }
-}
-
 int is_socket_connected(int socket)
 {
     if (socket == -1) {
@@ -67,6 +59,7 @@ StratumTask::StratumTask(StratumManager *manager, int index, StratumConfig *conf
     m_manager = manager;
     m_config = config;
     m_index = index;
+    memset(&m_lastNotify, 0, sizeof(m_lastNotify));
 
     if (config->primary) {
         m_tag = "stratum task";
@@ -165,6 +158,20 @@ bool StratumTask::setupSocketTimeouts(int sock)
         ESP_LOGE(m_tag, "Failed to set socket send timeout");
         return false;
     }
+
+    // a connection that died silently stays writable and the recv timeout
+    // doesn't notice it, keepalive drops it after 15 s + 3 * 5 s
+    int keepAlive = 1;
+    int keepIdle = 15;
+    int keepInterval = 5;
+    int keepCount = 3;
+    if (setsockopt(sock, SOL_SOCKET, SO_KEEPALIVE, &keepAlive, sizeof(keepAlive)) < 0 ||
+        setsockopt(sock, IPPROTO_TCP, TCP_KEEPIDLE, &keepIdle, sizeof(keepIdle)) < 0 ||
+        setsockopt(sock, IPPROTO_TCP, TCP_KEEPINTVL, &keepInterval, sizeof(keepInterval)) < 0 ||
+        setsockopt(sock, IPPROTO_TCP, TCP_KEEPCNT, &keepCount, sizeof(keepCount)) < 0) {
+        ESP_LOGE(m_tag, "Failed to set socket keepalive");
+        return false;
+    }
     return true;
 }
 
@@ -233,6 +240,7 @@ void StratumTask::task()
         // mark invalid
         m_sock = -1;
 
+        clearSession();
         m_manager->disconnectedCallback(m_index);
         m_isConnected = false;
 
@@ -248,6 +256,9 @@ void StratumTask::stratumLoop()
     m_stratumAPI.resetUid();
     m_stratumAPI.clearBuffer();
 
+    // ids start at 1 again, submits of the last connection won't get a result
+    m_manager->m_submitTrackers[m_index].reset();
+
     ///// Start Stratum Action
     // mining.subscribe - ID: 1
     bool success = m_stratumAPI.subscribe(m_sock, board->getMiningAgent(), board->getAsicModel());
@@ -270,15 +281,14 @@ void StratumTask::stratumLoop()
     // but we make sure to clear the jobs on the first job
     m_firstJob = true;
 
-    char *line = nullptr;
-
     while (1) {
         if (!is_socket_connected(m_sock)) {
             ESP_LOGE(m_tag, "Socket is not connected ...");
             break;
         }
 
-        line = m_stratumAPI.receiveJsonRpcLine(m_sock);
+        size_t line_len;
+        const char *line = m_stratumAPI.receiveJsonRpcLine(m_sock, &line_len);
         if (!line) {
             ESP_LOGE(m_tag, "Failed to receive JSON-RPC line, reconnecting ...");
             break;
@@ -286,15 +296,29 @@ void StratumTask::stratumLoop()
 
         ESP_LOGI(m_tag, "rx: %s", line); // debug incoming stratum messages
 
-        PSRAMAllocator allocator;
-        JsonDocument doc(&allocator);
-
-        // Deserialize JSON
-        // we want to know if it's valid json before the connected callback is executed
-        DeserializationError error = deserializeJson(doc, line);
-        if (error) {
-            ESP_LOGE(m_tag, "Unable to parse JSON: %s", error.c_str());
-            break;
+        StratumApiV1Message message;
+        memset(&message, 0, sizeof(StratumApiV1Message));
+
+        // mining.notify and mining.set_difficulty are taken straight from the
+        // line, everything else goes through a JsonDocument
+        bool parsed = StratumApi::parseFast(&message, line, line_len);
+        if (!parsed) {
+            PSRAMAllocator allocator;
+            JsonDocument doc(&allocator);
+
+            // Deserialize JSON
+            // we want to know if it's valid json before the connected callback is executed
+            // straight from the receive buffer, the document keeps its own copies of the strings
+            DeserializationError error = deserializeJson(doc, line, line_len);
+            if (error) {
+                ESP_LOGE(m_tag, "Unable to parse JSON: %s", error.c_str());
+                break;
+            }
+
+            parsed = StratumApi::parse(&message, doc);
+            if (!parsed) {
+                ESP_LOGE(m_tag, "error in stratum");
+            }
         }
 
         // we are pretty confident now that we have valid json and we can
@@ -307,23 +331,121 @@ void StratumTask::stratumLoop()
         // if stop is requested, don't dispatch anything
         // and break the loop
         if (m_stopFlag) {
+            StratumApi::freeMessage(&message);
             break;
         }
 
-        // parse the line
-        m_manager->dispatch(m_index, doc);
+        if (parsed) {
+            m_manager->dispatch(m_index, &message);
+        }
+        StratumApi::freeMessage(&message);
+    }
+}
+
+void StratumTask::submitShares(const queued_share *shares, int count, char *batch, size_t size)
+{
+    SubmitTracker *tracker = &m_manager->m_submitTrackers[m_index];
+    int ids[SUBMIT_QUEUE_SIZE];
+    int lines = 0;
+    size_t len = 0;
+
+    // all shares go out in one write, the pool answers each id separately
+    for (int i = 0; i < count && lines < SUBMIT_QUEUE_SIZE; i++) {
+        size_t line = m_stratumAPI.formatSubmit(batch + len, size - len, &ids[lines], m_config->user, shares[i].jobid,
+                                                shares[i].extranonce2, shares[i].ntime, shares[i].nonce, shares[i].version);
+        if (!line) {
+            ESP_LOGE(m_tag, "submit too long, share dropped");
+            continue;
+        }
+        len += line;
+        lines++;
+    }
+
+    // track before sending, the result can be received before write() returns
+    uint64_t now = esp_timer_get_time();
+    for (int i = 0; i < lines; i++) {
+        tracker->sent(ids[i], now);
+    }
+
+    if (lines && !m_stratumAPI.sendLines(m_sock, batch, len)) {
+        ESP_LOGE(m_tag, "Failed to submit %d shares", lines);
+    }
+}
 
-        // sets line to nullptr too
-        safe_free(line);
+void StratumTask::updateSession(const StratumApiV1Message *message)
+{
+    pthread_mutex_lock(&m_sessionMutex);
+    switch (message->method) {
+    case MINING_NOTIFY: {
+        const mining_notify *notify = message->mining_notification;
+        StratumApi::freeMiningNotify(&m_lastNotify);
+        m_lastNotify = *notify;
+        m_lastNotify.job_id = strdup(notify->job_id);
+        m_lastNotify.coinbase_1 = strdup(notify->coinbase_1);
+        m_lastNotify.coinbase_2 = strdup(notify->coinbase_2);
+        m_hasNotify = m_lastNotify.job_id && m_lastNotify.coinbase_1 && m_lastNotify.coinbase_2;
+        if (!m_hasNotify) {
+            // nothing to replay rather than a job with missing parts
+            ESP_LOGE(m_tag, "Failed to allocate memory for the session notify");
+            StratumApi::freeMiningNotify(&m_lastNotify);
+        }
+        break;
+    }
+    case MINING_SET_DIFFICULTY:
+        m_difficulty = message->new_difficulty;
+        break;
+    case MINING_SET_VERSION_MASK:
+    case STRATUM_RESULT_VERSION_MASK:
+        m_versionMask = message->version_mask;
+        m_hasVersionMask = true;
+        break;
+    case STRATUM_RESULT_SUBSCRIBE:
+        free(m_extranonce);
+        m_extranonce = message->extranonce_str ? strdup(message->extranonce_str) : nullptr;
+        if (message->extranonce_str && !m_extranonce) {
+            ESP_LOGE(m_tag, "Failed to allocate memory for the session extranonce");
+        }
+        m_extranonce2Len = message->extranonce_2_len;
+        break;
+    default:
+        break;
     }
+    pthread_mutex_unlock(&m_sessionMutex);
+}
 
-    safe_free(line);
+void StratumTask::clearSession()
+{
+    pthread_mutex_lock(&m_sessionMutex);
+    StratumApi::freeMiningNotify(&m_lastNotify);
+    m_hasNotify = false;
+    free(m_extranonce);
+    m_extranonce = nullptr;
+    m_extranonce2Len = 0;
+    m_hasVersionMask = false;
+    m_difficulty = 0;
+    pthread_mutex_unlock(&m_sessionMutex);
 }
 
-void StratumTask::submitShare(const char *jobid, const char *extranonce_2, const uint32_t ntime, const uint32_t nonce,
-                              const uint32_t version)
+bool StratumTask::replaySession()
 {
-    m_stratumAPI.submitShare(m_sock, m_config->user, jobid, extranonce_2, ntime, nonce, version);
+    pthread_mutex_lock(&m_sessionMutex);
+    if (m_extranonce) {
+        create_job_set_enonce(m_extranonce, m_extranonce2Len);
+    }
+    if (m_hasVersionMask) {
+        create_job_set_version_mask(m_versionMask);
+    }
+    if (m_difficulty) {
+        SYSTEM_MODULE.setPoolDifficulty(m_difficulty);
+        create_job_set_difficulty(m_difficulty);
+    }
+    bool hasJob = m_extranonce && m_hasNotify;
+    if (hasJob) {
+        SYSTEM_MODULE.notifyNewNtime(m_lastNotify.ntime);
+        create_job_mining_notify(&m_lastNotify);
+    }
+    pthread_mutex_unlock(&m_sessionMutex);
+    return hasJob;
 }
 
 void StratumTask::connect()
@@ -338,7 +460,6 @@ void StratumTask::disconnect()
 
 StratumManager::StratumManager()
 {
-    m_stratum_api_v1_message = (StratumApiV1Message *) ALLOC(sizeof(StratumApiV1Message));
 }
 
 bool StratumManager::isUsingFallback()
@@ -346,6 +467,50 @@ bool StratumManager::isUsingFallback()
     return m_selected != Selected::PRIMARY;
 }
 
+bool StratumManager::isHotStandby()
+{
+    return m_hotStandby;
+}
+
+void StratumManager::getFailoverStats(failover_stats *stats)
+{
+    pthread_mutex_lock(&m_mutex);
+    *stats = m_failoverStats;
+    pthread_mutex_unlock(&m_mutex);
+}
+
+void StratumManager::selectPool(int index)
+{
+    StratumTask *task = m_stratumTasks[index];
+    ESP_LOGI(m_tag, "Switching to %s", task->getTag());
+    m_selected = index;
+
+    // jobs of the other pool can't be submitted to this one
+    cleanQueue();
+    task->m_firstJob = true;
+
+    // a hot standby pool already has everything for the next job
+    if (task->replaySession()) {
+        task->m_firstJob = false;
+        failoverDone();
+    }
+}
+
+void StratumManager::failoverDone()
+{
+    if (!m_failoverStart) {
+        return;
+    }
+    uint32_t ms = (esp_timer_get_time() - m_failoverStart) / 1000;
+    m_failoverStart = 0;
+    m_failoverStats.count++;
+    m_failoverStats.last_ms = ms;
+    if (ms > m_failoverStats.max_ms) {
+        m_failoverStats.max_ms = ms;
+    }
+    ESP_LOGI(m_tag, "Failover took %lu ms", ms);
+}
+
 void StratumManager::connect(int index)
 {
     m_stratumTasks[index]->connect();
@@ -385,7 +550,9 @@ void StratumManager::reconnectTimerCallback(TimerHandle_t xTimer)
     // Check if primary is still disconnected
     if (!isConnected(Selected::PRIMARY)) {
         connect(Selected::SECONDARY);
-        m_selected = Selected::SECONDARY;
+        if (m_selected != Selected::SECONDARY) {
+            selectPool(Selected::SECONDARY);
+        }
     }
     pthread_mutex_unlock(&m_mutex);
 }
@@ -417,8 +584,12 @@ void StratumManager::connectedCallback(int index)
     pthread_mutex_lock(&m_mutex);
 
     if (index == Selected::PRIMARY) {
-        m_selected = Selected::PRIMARY;
-        disconnect(Selected::SECONDARY);
+        // a hot standby stays connected, mining goes back to the primary
+        // with its first job (see dispatch)
+        if (!m_hotStandby) {
+            m_selected = Selected::PRIMARY;
+            disconnect(Selected::SECONDARY);
+        }
         stopReconnectTimer(); // Stop reconnect attempts
     }
 
@@ -428,6 +599,19 @@ void StratumManager::connectedCallback(int index)
 // Disconnected Callback
 void StratumManager::disconnectedCallback(int index)
 {
+    pthread_mutex_lock(&m_mutex);
+    if (index == m_selected) {
+        // the ASICs are out of work from now until the first job of a pool
+        m_failoverStart = esp_timer_get_time();
+
+        // the hot standby is live, no need to wait for the reconnect timer
+        int other = index == Selected::PRIMARY ? Selected::SECONDARY : Selected::PRIMARY;
+        if (m_hotStandby && isConnected(other)) {
+            selectPool(other);
+        }
+    }
+    pthread_mutex_unlock(&m_mutex);
+
     startReconnectTimer(); // Start the timer to attempt reconnects
 }
 
@@ -443,6 +627,10 @@ void StratumManager::task()
 {
     System *system = &SYSTEM_MODULE;
 
+    m_hotStandby = Config::isStratumHotStandbyEnabled();
+
+    xTaskCreate(submitTaskWrapper, "stratum submit", 8192, (void *) this, 5, &m_submitTaskHandle);
+
     // Create the Stratum tasks for both pools
     for (int i = 0; i < 2; i++) {
         m_stratumTasks[i] = new StratumTask(this, i, system->getStratumConfig(i));
@@ -453,6 +641,11 @@ void StratumManager::task()
     // Always start by connecting to the primary pool
     connect(Selected::PRIMARY);
 
+    // the hot standby pool is subscribed and authorized from the start
+    if (m_hotStandby) {
+        connect(Selected::SECONDARY);
+    }
+
     // Start the reconnect timer
     startReconnectTimer();
 
@@ -467,6 +660,49 @@ void StratumManager::task()
     }
 }
 
+void StratumManager::submitTaskWrapper(void *pvParameters)
+{
+    StratumManager *manager = static_cast<StratumManager *>(pvParameters);
+    manager->submitTask();
+}
+
+void StratumManager::submitTask()
+{
+    // the popped shares and the lines formatted from them, off the task stack
+    queued_share *shares = (queued_share *) heap_caps_malloc(SUBMIT_QUEUE_SIZE * sizeof(queued_share), MALLOC_CAP_SPIRAM);
+    char *batch = (char *) heap_caps_malloc(SUBMIT_QUEUE_SIZE * SUBMIT_LINE_SIZE, MALLOC_CAP_SPIRAM);
+    if (!shares || !batch) {
+        ESP_LOGE(m_tag, "Failed to allocate memory for the submit batch");
+        heap_caps_free(shares);
+        heap_caps_free(batch);
+        vTaskDelete(NULL);
+        return;
+    }
+
+    while (1) {
+        // woken by submitShare, the timeout lets unanswered submits expire
+        ulTaskNotifyTake(pdTRUE, pdMS_TO_TICKS(1000));
+
+        uint64_t now = esp_timer_get_time();
+        for (int i = 0; i < 2; i++) {
+            m_submitTrackers[i].expire(now);
+        }
+
+        int count = m_submitQueue.popAll(shares, SUBMIT_QUEUE_SIZE);
+        if (!count) {
+            continue;
+        }
+
+        // send to the selected pool
+        StratumTask *selected = m_stratumTasks[m_selected];
+        if (!selected || !selected->m_isConnected) {
+            ESP_LOGE(m_tag, "selected pool not connected");
+            continue;
+        }
+        selected->submitShares(shares, count, batch, SUBMIT_QUEUE_SIZE * SUBMIT_LINE_SIZE);
+    }
+}
+
 void StratumManager::cleanQueue()
 {
     ESP_LOGI(m_tag, "Clean Jobs: clearing queue");
@@ -489,10 +725,22 @@ int StratumManager::getCurrentPoolPort()
     return m_stratumTasks[m_selected]->getPort();
 }
 
-void StratumManager::dispatch(int pool, JsonDocument &doc)
+void StratumManager::dispatch(int pool, const StratumApiV1Message *message)
 {
+    // with hot standby both pools keep their session for the switchover,
+    // without it there is never a session to replay
+    if (m_hotStandby) {
+        m_stratumTasks[pool]->updateSession(message);
+    }
+
     // only accept data from the selected pool
     if (pool != m_selected) {
+        // with hot standby mining goes back to the primary pool as soon as it has work
+        if (m_hotStandby && pool == Selected::PRIMARY && message->method == MINING_NOTIFY) {
+            pthread_mutex_lock(&m_mutex);
+            selectPool(Selected::PRIMARY);
+            pthread_mutex_unlock(&m_mutex);
+        }
         return;
     }
 
@@ -500,52 +748,45 @@ void StratumManager::dispatch(int pool, JsonDocument &doc)
 
     const char *tag = selected->getTag();
 
-    memset(m_stratum_api_v1_message, 0, sizeof(StratumApiV1Message));
-
-    if (!StratumApi::parse(m_stratum_api_v1_message, doc)) {
-        ESP_LOGE(m_tag, "error in stratum");
-        return;
-    }
-
-    switch (m_stratum_api_v1_message->method) {
+    switch (message->method) {
     case MINING_NOTIFY: {
-        SYSTEM_MODULE.notifyNewNtime(m_stratum_api_v1_message->mining_notification->ntime);
+        SYSTEM_MODULE.notifyNewNtime(message->mining_notification->ntime);
 
         // abandon work clears the asic job list
         // also clear on first job
-        if (selected->m_firstJob || m_stratum_api_v1_message->should_abandon_work) {
+        if (selected->m_firstJob || message->should_abandon_work) {
             cleanQueue();
             selected->m_firstJob = false;
         }
-        create_job_mining_notify(m_stratum_api_v1_message->mining_notification);
+        create_job_mining_notify(message->mining_notification);
 
-        // free notify
-        if (m_stratum_api_v1_message->mining_notification) {
-            StratumApi::freeMiningNotify(m_stratum_api_v1_message->mining_notification);
-            free(m_stratum_api_v1_message->mining_notification);
+        if (m_failoverStart) {
+            pthread_mutex_lock(&m_mutex);
+            failoverDone();
+            pthread_mutex_unlock(&m_mutex);
         }
         break;
     }
 
     case MINING_SET_DIFFICULTY: {
-        SYSTEM_MODULE.setPoolDifficulty(m_stratum_api_v1_message->new_difficulty);
-        if (create_job_set_difficulty(m_stratum_api_v1_message->new_difficulty)) {
-            ESP_LOGI(tag, "Set stratum difficulty: %ld", m_stratum_api_v1_message->new_difficulty);
+        SYSTEM_MODULE.setPoolDifficulty(message->new_difficulty);
+        if (create_job_set_difficulty(message->new_difficulty)) {
+            ESP_LOGI(tag, "Set stratum difficulty: %ld", message->new_difficulty);
         }
         break;
     }
 
     case MINING_SET_VERSION_MASK:
     case STRATUM_RESULT_VERSION_MASK: {
-        ESP_LOGI(tag, "Set version mask: %08lx", m_stratum_api_v1_message->version_mask);
-        create_job_set_version_mask(m_stratum_api_v1_message->version_mask);
+        ESP_LOGI(tag, "Set version mask: %08lx", message->version_mask);
+        create_job_set_version_mask(message->version_mask);
         break;
     }
 
     case STRATUM_RESULT_SUBSCRIBE: {
-        ESP_LOGI(tag, "Set enonce %s enonce2-len: %d", m_stratum_api_v1_message->extranonce_str,
-                 m_stratum_api_v1_message->extranonce_2_len);
-        create_job_set_enonce(m_stratum_api_v1_message->extranonce_str, m_stratum_api_v1_message->extranonce_2_len);
+        ESP_LOGI(tag, "Set enonce %s enonce2-len: %d", message->extranonce_str,
+                 message->extranonce_2_len);
+        create_job_set_enonce(message->extranonce_str, message->extranonce_2_len);
         break;
     }
 
@@ -555,19 +796,24 @@ void StratumManager::dispatch(int pool, JsonDocument &doc)
     }
 
     case STRATUM_RESULT: {
-        if (m_stratum_api_v1_message->response_success) {
-            ESP_LOGI(tag, "message result accepted");
+        uint64_t now = esp_timer_get_time();
+        double latency_ms = 0.0;
+        if (!m_submitTrackers[pool].completed((int) message->message_id, now, &latency_ms)) {
+            ESP_LOGW(tag, "result for unknown submit id %d", (int) message->message_id);
+        }
+        if (message->response_success) {
+            ESP_LOGI(tag, "message result accepted (id %d, %.1f ms)", (int) message->message_id, latency_ms);
             SYSTEM_MODULE.notifyAcceptedShare();
         } else {
-            ESP_LOGW(tag, "message result rejected");
+            ESP_LOGW(tag, "message result rejected (id %d, %.1f ms)", (int) message->message_id, latency_ms);
             SYSTEM_MODULE.notifyRejectedShare();
         }
-        m_lastSubmitResponseTimestamp = esp_timer_get_time();
+        m_lastSubmitResponseTimestamp = now;
         break;
     }
 
     case STRATUM_RESULT_SETUP: {
-        if (m_stratum_api_v1_message->response_success) {
+        if (message->response_success) {
             ESP_LOGI(tag, "setup message accepted");
         } else {
             ESP_LOGE(tag, "setup message rejected");
@@ -584,10 +830,22 @@ void StratumManager::dispatch(int pool, JsonDocument &doc)
 void StratumManager::submitShare(const char *jobid, const char *extranonce_2, const uint32_t ntime, const uint32_t nonce,
                                  const uint32_t version)
 {
-    // send to the selected pool
-    if (!m_stratumTasks[m_selected]->m_isConnected) {
-        ESP_LOGE(m_tag, "selected pool not connected");
+    // only copied here, the submit task does the network part
+    if (!m_submitQueue.push(jobid, extranonce_2, ntime, nonce, version)) {
+        ESP_LOGE(m_tag, "submit queue full, share dropped");
         return;
     }
-    m_stratumTasks[m_selected]->submitShare(jobid, extranonce_2, ntime, nonce, version);
+    if (m_submitTaskHandle) {
+        xTaskNotifyGive(m_submitTaskHandle);
+    }
+}
+
+void StratumManager::getSubmitStats(int pool, submit_stats *stats)
+{
+    m_submitTrackers[pool].getStats(stats);
+}
+
+uint32_t StratumManager::getSubmitDropped()
+{
+    return m_submitQueue.getDropped();
 }
@@ -5,8 +5,18 @@
 #include "lwip/inet.h"
 #include <pthread.h>
 
+#include "submit_queue.h"
+
 class StratumManager;
 
+// time without work after the selected pool was lost
+typedef struct
+{
+    uint32_t count;   // failovers finished with a job from the new pool
+    uint32_t last_ms; // loss of the old pool to the first job of the new one
+    uint32_t max_ms;
+} failover_stats;
+
 /**
  * @brief Configuration structure for Stratum pools
  */
@@ -38,6 +48,20 @@ class StratumTask {
     bool m_stopFlag = true;     ///< Stop flag for the task
     bool m_firstJob;
 
+    // Work state of the session, a hot standby pool hands it over when it gets selected
+    pthread_mutex_t m_sessionMutex = PTHREAD_MUTEX_INITIALIZER;
+    char *m_extranonce = nullptr; ///< Extranonce 1 from the subscribe result
+    int m_extranonce2Len = 0;
+    uint32_t m_versionMask = 0;
+    bool m_hasVersionMask = false;
+    uint32_t m_difficulty = 0;
+    mining_notify m_lastNotify;   ///< Last job, the strings are owned
+    bool m_hasNotify = false;
+
+    void updateSession(const StratumApiV1Message *message); ///< Remember what the pool sent for a later switchover
+    void clearSession();                                    ///< Forget the session after a disconnect
+    bool replaySession();                                   ///< Hand the session to create_jobs_task, false without a job
+
     // Connection and network-related methods
     bool isWifiConnected();                                                      ///< Check if Wi-Fi is connected
     bool resolveHostname(const char *hostname, char *ip_str, size_t ip_str_len); ///< Resolve hostname to IP
@@ -50,9 +74,8 @@ class StratumTask {
     void connect();    ///< Establish a connection to the pool
     void disconnect(); ///< Disconnect from the pool
 
-    // Submit mining shares to the pool
-    void submitShare(const char *jobid, const char *extranonce_2, const uint32_t ntime, const uint32_t nonce,
-                     const uint32_t version);
+    // Submit queued shares to the pool, batch is the scratch buffer for the lines
+    void submitShares(const queued_share *shares, int count, char *batch, size_t size);
 
     // Stratum task function
     void task();
@@ -97,26 +120,41 @@ class StratumManager {
     const char *m_tag = "stratum-manager"; ///< Debug tag for logging
 
     pthread_mutex_t m_mutex = PTHREAD_MUTEX_INITIALIZER; ///< Mutex for thread safety
-    StratumApiV1Message *m_stratum_api_v1_message;       ///< API message handler
     StratumTask *m_stratumTasks[2] = {nullptr, nullptr}; ///< Primary and secondary Stratum tasks
 
     int m_selected = 0;                         ///< Tracks the currently active pool (0 = primary, 1 = secondary)
     uint64_t m_lastSubmitResponseTimestamp = 0; ///< Timestamp of last submitted share response
 
+    bool m_hotStandby = false;      ///< Keep the secondary pool subscribed and authorized next to the primary
+    uint64_t m_failoverStart = 0;   ///< When the selected pool was lost, 0 if no failover is running
+    failover_stats m_failoverStats = {};
+
+    SubmitQueue m_submitQueue;                 ///< Shares waiting for the submit task
+    SubmitTracker m_submitTrackers[2];         ///< Submits waiting for their result, per pool
+    TaskHandle_t m_submitTaskHandle = nullptr; ///< Sends the queued shares to the selected pool
+
     // Helper methods for connection management
     void connect(int index);     ///< Connect to a specified pool (0 = primary, 1 = secondary)
     void disconnect(int index);  ///< Disconnect from a specified pool
     bool isConnected(int index); ///< Check if a pool is connected
 
     // Handles incoming Stratum responses
-    void dispatch(int pool, JsonDocument &doc);
+    void dispatch(int pool, const StratumApiV1Message *message);
 
     // Core Stratum management task
     void task();
 
+    // Sends the queued shares so that a slow socket doesn't stall the result task
+    void submitTask();
+    static void submitTaskWrapper(void *pvParameters);
+
     // Clears queued mining jobs
     void cleanQueue();
 
+    // Switches mining to a pool and replays its session, caller holds m_mutex
+    void selectPool(int index);
+    void failoverDone(); ///< First job after a failover, caller holds m_mutex
+
     // Reconnection management
     TimerHandle_t m_reconnectTimer;                                  ///< FreeRTOS timer for automatic reconnection
     static void reconnectTimerCallbackWrapper(TimerHandle_t xTimer); ///< Static wrapper for FreeRTOS timer callback
@@ -137,10 +175,16 @@ class StratumManager {
     int getCurrentPoolPort();
     bool isAnyConnected();
 
-    // Submit shares to the active Stratum pool
+    // Queue shares for the active Stratum pool
     void submitShare(const char *jobid, const char *extranonce_2, const uint32_t ntime, const uint32_t nonce,
                      const uint32_t version);
 
+    // Submit latency of a pool (0 = primary, 1 = secondary)
+    void getSubmitStats(int pool, submit_stats *stats);
+    uint32_t getSubmitDropped(); ///< Shares dropped because the submit queue was full
+
     bool isUsingFallback(); ///< Check if the secondary (fallback) pool is in use
+    bool isHotStandby();    ///< Check if the secondary pool is kept connected as hot standby
+    void getFailoverStats(failover_stats *stats);
     const char* getResolvedIpForSelected() const;
 };
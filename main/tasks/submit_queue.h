@@ -0,0 +1,199 @@
+#pragma once
+
+#include <pthread.h>
+#include <stdint.h>
+#include <string.h>
+
+#include "mining.h"
+
+#define SUBMIT_QUEUE_SIZE 16
+
+// submits sent to a pool that still wait for their result
+#define MAX_PENDING_SUBMITS 32
+
+// a submit without a result after this long is counted as lost
+#define SUBMIT_TIMEOUT_US (60 * 1000000ULL)
+
+#define SUBMIT_LATENCY_BUCKETS 10
+
+// upper bounds of the latency histogram buckets in ms, the last bucket takes the rest
+static const uint32_t SUBMIT_LATENCY_BUCKET_MS[SUBMIT_LATENCY_BUCKETS - 1] = {10, 25, 50, 100, 250, 500, 1000, 2500, 5000};
+
+typedef struct
+{
+    char jobid[MAX_JOB_ID_LEN];
+    char extranonce2[MAX_EXTRANONCE_2_LEN * 2 + 1];
+    uint32_t ntime;
+    uint32_t nonce;
+    uint32_t version;
+} queued_share;
+
+typedef struct
+{
+    uint32_t counts[SUBMIT_LATENCY_BUCKETS]; // results per latency bucket
+    uint32_t count;                          // results matched to a submit
+    uint32_t lost;                           // submits without a result (timeout or reconnect)
+    uint32_t pending;                        // submits waiting for their result
+    double totalMs;
+    double maxMs;
+    double lastMs;
+} submit_stats;
+
+// Shares found by ASIC_result_task on their way to the pool. The result
+// task only copies the share in, the stratum sender takes all queued shares
+// out at once. When the queue is full the new share is dropped and counted,
+// the result task never waits for the network.
+class SubmitQueue {
+protected:
+    queued_share m_shares[SUBMIT_QUEUE_SIZE];
+    int m_head = 0;
+    int m_count = 0;
+    uint32_t m_dropped = 0;
+    pthread_mutex_t m_lock = PTHREAD_MUTEX_INITIALIZER;
+
+public:
+    bool push(const char *jobid, const char *extranonce_2, uint32_t ntime, uint32_t nonce, uint32_t version) {
+        pthread_mutex_lock(&m_lock);
+        if (m_count == SUBMIT_QUEUE_SIZE) {
+            m_dropped++;
+            pthread_mutex_unlock(&m_lock);
+            return false;
+        }
+        queued_share *share = &m_shares[(m_head + m_count) % SUBMIT_QUEUE_SIZE];
+        strncpy(share->jobid, jobid, sizeof(share->jobid) - 1);
+        share->jobid[sizeof(share->jobid) - 1] = '\0';
+        strncpy(share->extranonce2, extranonce_2, sizeof(share->extranonce2) - 1);
+        share->extranonce2[sizeof(share->extranonce2) - 1] = '\0';
+        share->ntime = ntime;
+        share->nonce = nonce;
+        share->version = version;
+        m_count++;
+        pthread_mutex_unlock(&m_lock);
+        return true;
+    }
+
+    // copies up to max shares into out in the order they were queued, returns the number
+    int popAll(queued_share *out, int max) {
+        pthread_mutex_lock(&m_lock);
+        int n = m_count < max ? m_count : max;
+        for (int i = 0; i < n; i++) {
+            memcpy(&out[i], &m_shares[m_head], sizeof(queued_share));
+            m_head = (m_head + 1) % SUBMIT_QUEUE_SIZE;
+        }
+        m_count -= n;
+        pthread_mutex_unlock(&m_lock);
+        return n;
+    }
+
+    uint32_t getDropped() {
+        pthread_mutex_lock(&m_lock);
+        uint32_t dropped = m_dropped;
+        pthread_mutex_unlock(&m_lock);
+        return dropped;
+    }
+};
+
+// JSON-RPC ids of the submits sent to one pool with their send time. The
+// result of a submit is matched by its id, so several submits can be on the
+// wire at once and every result gets its own latency.
+class SubmitTracker {
+protected:
+    struct Pending {
+        int id;
+        uint64_t sent_us;
+    };
+
+    Pending m_pending[MAX_PENDING_SUBMITS];
+    int m_count = 0;
+    submit_stats m_stats;
+    pthread_mutex_t m_lock = PTHREAD_MUTEX_INITIALIZER;
+
+    void remove(int i) {
+        m_pending[i] = m_pending[--m_count];
+    }
+
+public:
+    SubmitTracker() {
+        memset(&m_stats, 0, sizeof(m_stats));
+    }
+
+    // call before the submit is written, the result can arrive before write() returns
+    void sent(int id, uint64_t now_us) {
+        pthread_mutex_lock(&m_lock);
+        if (m_count == MAX_PENDING_SUBMITS) {
+            // give up on the oldest submit, remove() doesn't keep the order
+            int oldest = 0;
+            for (int i = 1; i < m_count; i++) {
+                if (m_pending[i].sent_us < m_pending[oldest].sent_us) {
+                    oldest = i;
+                }
+            }
+            remove(oldest);
+            m_stats.lost++;
+        }
+        m_pending[m_count].id = id;
+        m_pending[m_count].sent_us = now_us;
+        m_count++;
+        pthread_mutex_unlock(&m_lock);
+    }
+
+    // returns false if the id is not a pending submit
+    bool completed(int id, uint64_t now_us, double *latency_ms) {
+        pthread_mutex_lock(&m_lock);
+        for (int i = 0; i < m_count; i++) {
+            if (m_pending[i].id != id) {
+                continue;
+            }
+            double ms = (double) (now_us - m_pending[i].sent_us) / 1000.0;
+            remove(i);
+
+            int bucket = 0;
+            while (bucket < SUBMIT_LATENCY_BUCKETS - 1 && ms > SUBMIT_LATENCY_BUCKET_MS[bucket]) {
+                bucket++;
+            }
+            m_stats.counts[bucket]++;
+            m_stats.count++;
+            m_stats.totalMs += ms;
+            m_stats.lastMs = ms;
+            if (ms > m_stats.maxMs) {
+                m_stats.maxMs = ms;
+            }
+            pthread_mutex_unlock(&m_lock);
+            if (latency_ms) {
+                *latency_ms = ms;
+            }
+            return true;
+        }
+        pthread_mutex_unlock(&m_lock);
+        return false;
+    }
+
+    // counts submits older than SUBMIT_TIMEOUT_US as lost
+    void expire(uint64_t now_us) {
+        pthread_mutex_lock(&m_lock);
+        for (int i = 0; i < m_count;) {
+            if (now_us - m_pending[i].sent_us > SUBMIT_TIMEOUT_US) {
+                remove(i);
+                m_stats.lost++;
+            } else {
+                i++;
+            }
+        }
+        pthread_mutex_unlock(&m_lock);
+    }
+
+    // a new connection starts the ids at 1 again, nothing pending will get a result
+    void reset() {
+        pthread_mutex_lock(&m_lock);
+        m_stats.lost += m_count;
+        m_count = 0;
+        pthread_mutex_unlock(&m_lock);
+    }
+
+    void getStats(submit_stats *stats) {
+        pthread_mutex_lock(&m_lock);
+        memcpy(stats, &m_stats, sizeof(submit_stats));
+        stats->pending = m_count;
+        pthread_mutex_unlock(&m_lock);
+    }
+};
@@ -1,271 +1,503 @@
 #!/usr/bin/env python3
 """
 ESP32 NVS Partition Generator
-使用ESP-IDF标准的NVS格式生成配置分区
+
+Builds ESP-IDF compatible NVS partition images (format version 2) from the
+config CSV files (key,type,encoding,value) in a single streaming pass:
+every page is written out as soon as it is full, with entry, data and page
+header CRCs and the entry state bitmap filled in. Strings and blobs that do
+not fit the current page move to the next one, blobs are split into chunks
+across pages. The parser at the bottom reads images back for verification.
+
+Drop-in replacement for `nvs_partition_gen.py generate <csv> <bin> <size>`;
+without a size the nvs partition size is taken from partitions.csv.
 """
 
-import os
-import sys
+import argparse
+import base64
+import binascii
 import csv
+import os
 import struct
-import hashlib
-from io import StringIO
-
-class ESP32NVSGenerator:
-    """符合ESP32标准的NVS生成器"""
-    
-    # NVS常量
-    NVS_VERSION = 0xFE
-    NVS_PAGE_SIZE = 4096
-    NVS_ENTRY_SIZE = 32
-    NVS_NAMESPACE = 0x00
-    NVS_TYPE_STR = 0x21
-    NVS_TYPE_U16 = 0x02
-    NVS_TYPE_U32 = 0x04
-    NVS_TYPE_U64 = 0x08
-    
-    def __init__(self, partition_size=0x6000):
-        self.partition_size = partition_size
-        self.data = bytearray(partition_size)
-        self.current_offset = 0
-        self.namespace_index = 1
-        
-        # 初始化为全FF
-        for i in range(partition_size):
-            self.data[i] = 0xFF
-            
-    def write_page_header(self, page_index, seq_no=0):
-        """写入NVS页头"""
-        offset = page_index * self.NVS_PAGE_SIZE
-        
-        # NVS页头结构
-        header = bytearray(32)
-        header[0] = self.NVS_VERSION  # version
-        header[4:8] = struct.pack('<I', seq_no)  # sequence number
-        header[8:12] = struct.pack('<I', 0)  # crc32 (稍后计算)
-        
-        self.data[offset:offset+32] = header
-        return offset + 32
-        
-    def write_namespace_entry(self, namespace_name, namespace_index):
-        """写入namespace条目"""
-        if self.current_offset + 32 > self.partition_size:
-            return False
-            
-        entry = bytearray(32)
-        
-        # Entry header
-        entry[0] = namespace_index  # namespace index
-        entry[1] = self.NVS_NAMESPACE  # type
-        entry[2] = 1  # span
-        entry[3] = 0  # chunk index
-        # entry[4:8] = crc32 (稍后计算)
-        
-        # Key (namespace name)
-        name_bytes = namespace_name.encode('utf-8')[:15]
-        entry[8:8+len(name_bytes)] = name_bytes
-        
-        # Value (empty for namespace)
-        
-        self.data[self.current_offset:self.current_offset+32] = entry
-        self.current_offset += 32
-        return True
-        
-    def write_string_entry(self, namespace_index, key, value):
-        """写入字符串条目"""
-        if self.current_offset + 32 > self.partition_size:
-            return False
-            
-        value_bytes = value.encode('utf-8')
-        
-        # 计算需要的span
-        span = 1
-        if len(value_bytes) > 8:
-            span += (len(value_bytes) - 1) // 32 + 1
-            
-        if self.current_offset + span * 32 > self.partition_size:
-            return False
-            
-        # 主条目
-        entry = bytearray(32)
-        entry[0] = namespace_index
-        entry[1] = self.NVS_TYPE_STR
-        entry[2] = span
-        entry[3] = 0
-        
-        # Key
-        key_bytes = key.encode('utf-8')[:15]
-        entry[8:8+len(key_bytes)] = key_bytes
-        
-        # Value (前8字节或长度信息)
-        if len(value_bytes) <= 8:
-            entry[24:24+len(value_bytes)] = value_bytes
-        else:
-            # 存储长度和偏移
-            entry[24:26] = struct.pack('<H', len(value_bytes))
-            
-        self.data[self.current_offset:self.current_offset+32] = entry
-        self.current_offset += 32
-        
-        # 如果字符串超过8字节，写入额外数据
-        if len(value_bytes) > 8:
-            remaining = value_bytes
-            while remaining and self.current_offset + 32 <= self.partition_size:
-                chunk = remaining[:32]
-                chunk_data = bytearray(32)
-                chunk_data[:len(chunk)] = chunk
-                self.data[self.current_offset:self.current_offset+32] = chunk_data
-                self.current_offset += 32
-                remaining = remaining[32:]
-                
-        return True
-        
-    def write_u16_entry(self, namespace_index, key, value):
-        """写入u16条目"""
-        if self.current_offset + 32 > self.partition_size:
-            return False
-            
-        entry = bytearray(32)
-        entry[0] = namespace_index
-        entry[1] = self.NVS_TYPE_U16
-        entry[2] = 1
-        entry[3] = 0
-        
-        # Key
-        key_bytes = key.encode('utf-8')[:15]
-        entry[8:8+len(key_bytes)] = key_bytes
-        
-        # Value
-        entry[24:26] = struct.pack('<H', int(value))
-        
-        self.data[self.current_offset:self.current_offset+32] = entry
-        self.current_offset += 32
-        return True
-        
-    def write_u32_entry(self, namespace_index, key, value):
-        """写入u32条目"""
-        if self.current_offset + 32 > self.partition_size:
-            return False
-            
-        entry = bytearray(32)
-        entry[0] = namespace_index
-        entry[1] = self.NVS_TYPE_U32
-        entry[2] = 1
-        entry[3] = 0
-        
-        # Key
-        key_bytes = key.encode('utf-8')[:15]
-        entry[8:8+len(key_bytes)] = key_bytes
-        
-        # Value
-        entry[24:28] = struct.pack('<I', int(value))
-        
-        self.data[self.current_offset:self.current_offset+32] = entry
-        self.current_offset += 32
-        return True
-        
-    def generate_from_csv(self, csv_file):
-        """从CSV生成NVS数据"""
-        print(f"正在生成ESP32标准NVS格式: {csv_file}")
-        
-        # 写入页头
-        self.current_offset = self.write_page_header(0)
-        
-        # 写入main namespace
-        if not self.write_namespace_entry("main", self.namespace_index):
-            print("错误: 无法写入namespace")
-            return False
-            
-        # 预处理CSV
-        processed_lines = []
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            
-        header_found = False
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            if not header_found and 'key,type,encoding,value' in line:
-                processed_lines.append(line)
-                header_found = True
+import sys
+import zlib
+from collections import namedtuple
+
+import partition_table
+
+PAGE_SIZE = 4096
+ENTRY_SIZE = 32
+ENTRIES_PER_PAGE = 126
+BITMAP_OFFSET = 32
+FIRST_ENTRY_OFFSET = 64
+MAX_KEY_LEN = 15
+MAX_STRING_SIZE = (ENTRIES_PER_PAGE - 1) * ENTRY_SIZE
+MIN_PARTITION_SIZE = 3 * PAGE_SIZE
+
+NVS_VERSION = 0xFE  # format version 2 (multi page blobs)
+
+PAGE_UNINITIALIZED = 0xFFFFFFFF
+PAGE_ACTIVE = 0xFFFFFFFE
+PAGE_FULL = 0xFFFFFFFC
+PAGE_FREEING = 0xFFFFFFF8
+
+ENTRY_EMPTY = 0b11
+ENTRY_WRITTEN = 0b10
+
+CHUNK_ANY = 0xFF
+
+TYPE_STR = 0x21
+TYPE_BLOB = 0x41
+TYPE_BLOB_DATA = 0x42
+TYPE_BLOB_IDX = 0x48
+
+# encoding -> (type, struct format)
+PRIMITIVE_TYPES = {
+    'u8': (0x01, '<B'),
+    'i8': (0x11, '<b'),
+    'u16': (0x02, '<H'),
+    'i16': (0x12, '<h'),
+    'u32': (0x04, '<I'),
+    'i32': (0x14, '<i'),
+    'u64': (0x08, '<Q'),
+    'i64': (0x18, '<q'),
+}
+PRIMITIVE_ENCODINGS = {nvs_type: (encoding, fmt) for encoding, (nvs_type, fmt) in PRIMITIVE_TYPES.items()}
+BLOB_ENCODINGS = ('hex2bin', 'base64', 'binary')
+
+CsvRow = namedtuple('CsvRow', ['key', 'type', 'encoding', 'value'])
+Blob = namedtuple('Blob', ['ns_index', 'key', 'data'])
+Item = namedtuple('Item', ['namespace', 'key', 'encoding', 'value'])
+
+
+class NVSError(Exception):
+    pass
+
+
+def crc32(data):
+    return zlib.crc32(data, 0xFFFFFFFF) & 0xFFFFFFFF
+
+
+def _entry_count(size):
+    return (size + ENTRY_SIZE - 1) // ENTRY_SIZE
+
+
+def _pad(data):
+    return data + b'\xff' * (_entry_count(len(data)) * ENTRY_SIZE - len(data))
+
+
+def make_entry(ns_index, nvs_type, key, data, span=1, chunk_index=CHUNK_ANY):
+    """One 32 byte entry header with its CRC, data is the 8 byte data field"""
+    entry = bytearray(ENTRY_SIZE)
+    entry[0:4] = bytes((ns_index, nvs_type, span, chunk_index))
+    entry[8:24] = key.encode('utf-8').ljust(16, b'\x00')
+    entry[24:32] = data
+    struct.pack_into('<I', entry, 4, crc32(bytes(entry[0:4]) + bytes(entry[8:32])))
+    return bytes(entry)
+
+
+def encode_namespace(name, ns_index):
+    return make_entry(0, PRIMITIVE_TYPES['u8'][0], name, struct.pack('<B', ns_index).ljust(8, b'\xff'))
+
+
+def encode_primitive(ns_index, key, encoding, value):
+    nvs_type, fmt = PRIMITIVE_TYPES[encoding]
+    try:
+        packed = struct.pack(fmt, value)
+    except struct.error:
+        raise NVSError(f"value {value} of '{key}' does not fit {encoding}")
+    return make_entry(ns_index, nvs_type, key, packed.ljust(8, b'\xff'))
+
+
+def encode_string(ns_index, key, value):
+    """Header plus data entries, a string always stays on one page"""
+    data = value.encode('utf-8') + b'\x00'
+    if len(data) > MAX_STRING_SIZE:
+        raise NVSError(f"string '{key}' is {len(data)} bytes, at most {MAX_STRING_SIZE} fit a page")
+    header = make_entry(ns_index, TYPE_STR, key, struct.pack('<HHI', len(data), 0xFFFF, crc32(data)),
+                        span=1 + _entry_count(len(data)))
+    return header + _pad(data)
+
+
+def parse_value(row, base_dir='.'):
+    """Convert the value column of a data/file row into an int, str or bytes"""
+    value = row.value
+    if row.type == 'file':
+        mode = 'r' if row.encoding == 'string' else 'rb'
+        with open(os.path.join(base_dir, value), mode) as f:
+            value = f.read()
+        if row.encoding in ('string', 'binary'):
+            return value
+        value = value.decode('ascii')
+
+    try:
+        if row.encoding in PRIMITIVE_TYPES:
+            return int(value, 0)
+        if row.encoding == 'string':
+            return value
+        if row.encoding == 'hex2bin':
+            return binascii.a2b_hex(value.strip())
+        if row.encoding == 'base64':
+            return base64.b64decode(value)
+    except (ValueError, binascii.Error) as e:
+        raise NVSError(f"invalid {row.encoding} value for '{row.key}': {e}")
+    raise NVSError(f"unsupported encoding '{row.encoding}' for '{row.key}'")
+
+
+def encode_value(ns_index, key, encoding, value):
+    """Encoded entries of one key. Strings and primitives don't depend on their
+    position and come back as bytes, blobs are laid out by the writer."""
+    if len(key) > MAX_KEY_LEN:
+        raise NVSError(f"key '{key}' is longer than {MAX_KEY_LEN} characters")
+    if encoding in PRIMITIVE_TYPES:
+        return encode_primitive(ns_index, key, encoding, value)
+    if encoding == 'string':
+        return encode_string(ns_index, key, value)
+    return Blob(ns_index, key, bytes(value))
+
+
+def read_csv(path):
+    """Rows of an NVS CSV file, comments and empty lines are skipped"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+    reader = csv.reader(lines)
+    header = [field.strip() for field in next(reader, [])]
+    if header != ['key', 'type', 'encoding', 'value']:
+        raise NVSError(f"{path}: expected the header 'key,type,encoding,value'")
+
+    rows = []
+    for fields in reader:
+        fields = [field.strip() for field in fields] + [''] * (4 - len(fields))
+        row = CsvRow(*fields[:3], fields[3] if len(fields) == 4 else ','.join(fields[3:]))
+        if row.type not in ('namespace', 'data', 'file'):
+            raise NVSError(f"{path}: unknown type '{row.type}' for '{row.key}'")
+        rows.append(row)
+    return rows
+
+
+def encode_rows(rows, base_dir='.', index=None):
+    """Turn CSV rows into the sequence of items the writer lays out.
+
+    If index is a dict it is filled with (namespace, key) -> (position, ns_index, row)
+    so single items can be replaced without encoding everything again."""
+    namespaces = {}
+    namespace = None
+    ns_index = None
+    seen = set()
+    items = []
+
+    for row in rows:
+        if row.type == 'namespace':
+            if row.key not in namespaces:
+                if len(namespaces) >= 254:
+                    raise NVSError("too many namespaces")
+                namespaces[row.key] = len(namespaces) + 1
+                items.append(encode_namespace(row.key, namespaces[row.key]))
+            namespace = row.key
+            ns_index = namespaces[row.key]
+            continue
+
+        if ns_index is None:
+            raise NVSError(f"'{row.key}' is not inside a namespace")
+        if (ns_index, row.key) in seen:
+            raise NVSError(f"duplicate key '{row.key}'")
+        seen.add((ns_index, row.key))
+
+        if index is not None:
+            index[(namespace, row.key)] = (len(items), ns_index, row)
+        items.append(encode_value(ns_index, row.key, row.encoding, parse_value(row, base_dir)))
+
+    return items
+
+
+class NVSWriter:
+    """Lays out encoded items page by page and streams the finished pages to out"""
+
+    def __init__(self, out, size):
+        if size % PAGE_SIZE or size < MIN_PARTITION_SIZE:
+            raise NVSError(f"partition size 0x{size:x} must be a multiple of 0x{PAGE_SIZE:x} and >= 0x{MIN_PARTITION_SIZE:x}")
+        self.out = out
+        self.num_pages = size // PAGE_SIZE
+        self.pages_written = 0
+        self.page = None
+        self.entry_index = 0
+
+    def _new_page(self):
+        if self.page is not None:
+            self._flush_page(PAGE_FULL)
+        # the last page stays empty, NVS needs it to garbage collect
+        if self.pages_written >= self.num_pages - 1:
+            raise NVSError(f"data does not fit into {self.num_pages} pages (one of them is reserved)")
+
+        self.page = bytearray(b'\xff' * PAGE_SIZE)
+        header = bytearray(b'\xff' * 32)
+        struct.pack_into('<IIB', header, 0, PAGE_ACTIVE, self.pages_written, NVS_VERSION)
+        struct.pack_into('<I', header, 28, crc32(bytes(header[4:28])))
+        self.page[0:32] = header
+        self.entry_index = 0
+
+    def _flush_page(self, state):
+        struct.pack_into('<I', self.page, 0, state)
+        self.out.write(self.page)
+        self.pages_written += 1
+        self.page = None
+
+    def free_entries(self):
+        return 0 if self.page is None else ENTRIES_PER_PAGE - self.entry_index
+
+    def write_entries(self, entries):
+        """Write position independent entries, they never cross a page"""
+        count = len(entries) // ENTRY_SIZE
+        if count > self.free_entries():
+            self._new_page()
+
+        offset = FIRST_ENTRY_OFFSET + self.entry_index * ENTRY_SIZE
+        self.page[offset:offset + len(entries)] = entries
+        for i in range(self.entry_index, self.entry_index + count):
+            # 2 bits per entry, 0b11 -> 0b10 marks it as written
+            self.page[BITMAP_OFFSET + i // 4] &= ~(1 << ((i % 4) * 2)) & 0xFF
+        self.entry_index += count
+
+    def write_blob(self, blob):
+        """Split a blob into BLOB_DATA chunks filling up the pages, followed by its BLOB_IDX"""
+        offset = 0
+        chunk_index = 0
+        while True:
+            if self.free_entries() < 2:
+                self._new_page()
+            chunk = blob.data[offset:offset + (self.free_entries() - 1) * ENTRY_SIZE]
+            header = make_entry(blob.ns_index, TYPE_BLOB_DATA, blob.key,
+                                struct.pack('<HHI', len(chunk), 0xFFFF, crc32(chunk)),
+                                span=1 + _entry_count(len(chunk)), chunk_index=chunk_index)
+            self.write_entries(header + _pad(chunk))
+            offset += len(chunk)
+            chunk_index += 1
+            if offset >= len(blob.data):
+                break
+
+        self.write_entries(make_entry(blob.ns_index, TYPE_BLOB_IDX, blob.key,
+                                      struct.pack('<IBBH', len(blob.data), chunk_index, 0, 0xFFFF)))
+
+    def write(self, item):
+        if isinstance(item, Blob):
+            self.write_blob(item)
+            return
+        # same placement as nvs_partition_gen.py: an item with data entries
+        # (a string) never ends exactly on the last entry of a page
+        count = len(item) // ENTRY_SIZE
+        if count > 1 and count >= self.free_entries():
+            self._new_page()
+        self.write_entries(item)
+
+    def finish(self):
+        """Write the last active page and the untouched rest of the partition"""
+        if self.page is not None:
+            self._flush_page(PAGE_ACTIVE)
+        self.out.write(b'\xff' * ((self.num_pages - self.pages_written) * PAGE_SIZE))
+        self.pages_written = self.num_pages
+
+
+def write_image(items, out, size):
+    writer = NVSWriter(out, size)
+    for item in items:
+        writer.write(item)
+    writer.finish()
+
+
+def encode_csv(csv_file):
+    return encode_rows(read_csv(csv_file), os.path.dirname(os.path.abspath(csv_file)))
+
+
+def generate(csv_file, output_file, size):
+    items = encode_csv(csv_file)
+    with open(output_file, 'wb') as f:
+        write_image(items, f, size)
+
+
+# ─── Parser ──────────────────────────────────────────────────────────────────
+
+
+def _entry_states(page):
+    bitmap = int.from_bytes(page[BITMAP_OFFSET:FIRST_ENTRY_OFFSET], 'little')
+    return [(bitmap >> (i * 2)) & 0b11 for i in range(ENTRIES_PER_PAGE)]
+
+
+def parse_image(image):
+    """Decode an NVS partition image (bytes, mmap or memoryview), either generated
+    or dumped from a device.
+
+    Pages are read in sequence order and erased entries are skipped, so a key
+    written several times shows its current value. Returns (items, errors):
+    items in the order the keys first appear, errors lists every CRC or layout
+    problem found on the way."""
+    image = memoryview(image)
+    namespaces = {}
+    chunks = {}
+    blob_indices = []
+    items = {}
+    errors = []
+
+    if len(image) % PAGE_SIZE:
+        errors.append(f"image size 0x{len(image):x} is not a multiple of 0x{PAGE_SIZE:x}")
+
+    pages = []
+    for page_no in range(len(image) // PAGE_SIZE):
+        page = image[page_no * PAGE_SIZE:(page_no + 1) * PAGE_SIZE]
+        state, seq, version = struct.unpack_from('<IIB', page, 0)
+        if state == PAGE_UNINITIALIZED:
+            continue
+        if state not in (PAGE_ACTIVE, PAGE_FULL, PAGE_FREEING):
+            errors.append(f"page {page_no}: state 0x{state:08x} is not active or full")
+            continue
+        if struct.unpack_from('<I', page, 28)[0] != crc32(bytes(page[4:28])):
+            errors.append(f"page {page_no}: header CRC mismatch")
+        if version != NVS_VERSION:
+            errors.append(f"page {page_no}: unsupported version 0x{version:02x}")
+        pages.append((seq, page_no, page))
+
+    for _, page_no, page in sorted(pages, key=lambda p: p[0]):
+        states = _entry_states(page)
+        i = 0
+        while i < ENTRIES_PER_PAGE:
+            if states[i] != ENTRY_WRITTEN:
+                i += 1
                 continue
-            if header_found:
-                processed_lines.append(line)
-        
-        csv_content = '\n'.join(processed_lines)
-        csv_file_obj = StringIO(csv_content)
-        reader = csv.DictReader(csv_file_obj)
-        
-        entry_count = 0
-        for row in reader:
-            key = row.get('key', '').strip() if row.get('key') else ''
-            type_str = row.get('type', '').strip() if row.get('type') else ''
-            encoding = row.get('encoding', '').strip() if row.get('encoding') else ''
-            value = row.get('value', '').strip() if row.get('value') else ''
-            
-            if type_str == 'namespace' or not key or not value:
+
+            entry = page[FIRST_ENTRY_OFFSET + i * ENTRY_SIZE:FIRST_ENTRY_OFFSET + (i + 1) * ENTRY_SIZE]
+            ns_index, nvs_type, span, chunk_index = entry[0], entry[1], entry[2], entry[3]
+            key = bytes(entry[8:24]).split(b'\x00')[0].decode('utf-8', 'replace')
+            where = f"page {page_no} entry {i} '{key}'"
+
+            if struct.unpack_from('<I', entry, 4)[0] != crc32(bytes(entry[0:4]) + bytes(entry[8:32])):
+                errors.append(f"{where}: entry CRC mismatch")
+            if span < 1 or i + span > ENTRIES_PER_PAGE:
+                errors.append(f"{where}: invalid span {span}")
+                i += 1
                 continue
-                
-            # 根据encoding确定写入方法
-            success = False
-            if encoding == 'u16':
-                success = self.write_u16_entry(self.namespace_index, key, value)
-            elif encoding == 'u32':
-                success = self.write_u32_entry(self.namespace_index, key, value)
-            else:  # string 或其他
-                success = self.write_string_entry(self.namespace_index, key, value)
-                
-            if success:
-                entry_count += 1
-                print(f"  添加: {key} = {value} ({encoding})")
+
+            data = bytes(entry[24:32])
+            if ns_index == 0:
+                namespaces[data[0]] = key
+            elif nvs_type in PRIMITIVE_ENCODINGS:
+                encoding, fmt = PRIMITIVE_ENCODINGS[nvs_type]
+                items[(ns_index, key)] = Item(ns_index, key, encoding, struct.unpack_from(fmt, data)[0])
+            elif nvs_type in (TYPE_STR, TYPE_BLOB_DATA, TYPE_BLOB):
+                size, _, data_crc = struct.unpack('<HHI', data)
+                start = FIRST_ENTRY_OFFSET + (i + 1) * ENTRY_SIZE
+                payload = bytes(page[start:start + size])
+                if size > (span - 1) * ENTRY_SIZE or crc32(payload) != data_crc:
+                    errors.append(f"{where}: data CRC mismatch")
+                if nvs_type == TYPE_STR:
+                    value = payload.rstrip(b'\x00').decode('utf-8', 'replace')
+                    items[(ns_index, key)] = Item(ns_index, key, 'string', value)
+                elif nvs_type == TYPE_BLOB:
+                    items[(ns_index, key)] = Item(ns_index, key, 'binary', payload)
+                else:
+                    chunks[(ns_index, key, chunk_index)] = payload
+            elif nvs_type == TYPE_BLOB_IDX:
+                items[(ns_index, key)] = None  # keeps the position, filled in below
+                blob_indices.append((where, ns_index, key, struct.unpack_from('<IBB', data)))
             else:
-                print(f"  跳过: {key} (空间不足)")
-                break
-                
-        print(f"共写入 {entry_count} 个配置项")
-        return True
-
-def convert_csv_to_esp32_nvs(csv_file, output_file):
-    """转换CSV到ESP32 NVS格式"""
-    if not os.path.exists(csv_file):
-        print(f"错误: 配置文件不存在 {csv_file}")
-        return False
-        
-    generator = ESP32NVSGenerator()
-    
-    if not generator.generate_from_csv(csv_file):
-        print("错误: NVS生成失败")
-        return False
-        
-    # 写入文件
-    try:
-        output_dir = os.path.dirname(output_file)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-            
-        with open(output_file, 'wb') as f:
-            f.write(generator.data)
-        print(f"ESP32 NVS文件已生成: {output_file} ({len(generator.data)} 字节)")
-        return True
-    except Exception as e:
-        print(f"错误: 写入失败 - {e}")
-        return False
+                errors.append(f"{where}: unknown type 0x{nvs_type:02x}")
+
+            i += span
+
+    # the chunks of a blob can be spread over pages written before and after its index
+    for where, ns_index, key, (size, chunk_count, chunk_start) in blob_indices:
+        parts = [chunks.get((ns_index, key, chunk_start + n)) for n in range(chunk_count)]
+        if None in parts or sum(len(p) for p in parts) != size:
+            errors.append(f"{where}: blob chunks missing or incomplete")
+            parts = [p for p in parts if p is not None]
+        items[(ns_index, key)] = Item(ns_index, key, 'binary', b''.join(parts))
+
+    named = [item._replace(namespace=namespaces.get(item.namespace, f"#{item.namespace}"))
+             for item in items.values() if item is not None]
+    return named, errors
+
+
+def expected_items(rows, base_dir='.'):
+    """What parse_image should return for an image generated from rows"""
+    expected = {}
+    namespace = None
+    for row in rows:
+        if row.type == 'namespace':
+            namespace = row.key
+            continue
+        value = parse_value(row, base_dir)
+        if row.encoding in PRIMITIVE_TYPES or row.encoding == 'string':
+            expected[(namespace, row.key)] = (row.encoding, value)
+        else:
+            expected[(namespace, row.key)] = ('binary', bytes(value))
+    return expected
+
+
+def verify(image, rows, base_dir='.'):
+    """Compare an image with the CSV rows, returns a list of problems"""
+    items, errors = parse_image(image)
+    actual = {(item.namespace, item.key): (item.encoding, item.value) for item in items}
+    expected = expected_items(rows, base_dir)
+
+    for key, value in expected.items():
+        if key not in actual:
+            errors.append(f"{key[0]}/{key[1]}: missing")
+        elif actual[key] != value:
+            errors.append(f"{key[0]}/{key[1]}: expected {value!r}, found {actual[key]!r}")
+    for key in actual.keys() - expected.keys():
+        errors.append(f"{key[0]}/{key[1]}: not in the CSV")
+    return errors
+
+
+def nvs_partition_size(partitions_csv, name='nvs'):
+    return partition_table.find_partition(partition_table.read_partitions(partitions_csv), name).size
+
 
 def main():
-    if len(sys.argv) != 3:
-        print("用法: python esp32_nvs_generator.py <配置.csv> <输出.bin>")
-        print("示例: python esp32_nvs_generator.py config.cvs nvs_esp32.bin")
-        sys.exit(1)
-        
-    csv_file = sys.argv[1]
-    output_file = sys.argv[2]
-    
-    if convert_csv_to_esp32_nvs(csv_file, output_file):
-        print("转换成功! 使用ESP32标准NVS格式")
-    else:
-        print("转换失败!")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description='Generate and verify ESP-IDF NVS partition images')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help='generate an NVS image from a CSV file')
+    gen.add_argument('input', help='CSV file (key,type,encoding,value)')
+    gen.add_argument('output', help='binary image to write')
+    gen.add_argument('size', nargs='?', help='partition size, default: size of the nvs partition in partitions.csv')
+    gen.add_argument('--partitions', default=partition_table.DEFAULT_PARTITIONS_CSV, help='partition table CSV')
+    gen.add_argument('--partition', default='nvs', help='name of the NVS partition in the partition table')
+
+    ver = sub.add_parser('verify', help='check an NVS image against a CSV file')
+    ver.add_argument('input', help='CSV file (key,type,encoding,value)')
+    ver.add_argument('image', help='binary image to check')
+
+    args = parser.parse_args()
+
+    try:
+        base_dir = os.path.dirname(os.path.abspath(args.input))
+        rows = read_csv(args.input)
+
+        if args.command == 'generate':
+            size = partition_table.parse_size(args.size) if args.size else nvs_partition_size(args.partitions, args.partition)
+            output_dir = os.path.dirname(args.output)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            generate(args.input, args.output, size)
+            print(f"NVS image written: {args.output} ({size} bytes)")
+            image_file = args.output
+        else:
+            image_file = args.image
+
+        with open(image_file, 'rb') as f:
+            errors = verify(f.read(), rows, base_dir)
+    except (NVSError, partition_table.PartitionTableError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    for error in errors:
+        print(f"  {error}")
+    if errors:
+        print(f"Verification failed: {len(errors)} problem(s)")
+        return 1
+    print(f"Verified {len(expected_items(rows, base_dir))} entries")
+    return 0
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
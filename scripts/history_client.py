@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+History Client
+
+Fetches the hashrate history from GET /api/history/binary and writes it as
+CSV for offline analysis. The device keeps the last 128k shares; with
+--follow only the samples since the last poll are fetched, using the cursor
+and the boot id of the previous response. After a reboot of the device the
+cursor starts over at its oldest sample.
+
+  python scripts/history_client.py 192.168.1.42 > history.csv
+  python scripts/history_client.py 192.168.1.42 --follow 60 --csv history.csv
+
+  # save the raw response and decode it later
+  curl -o history.bin "http://192.168.1.42/api/history/binary"
+  python scripts/history_client.py --file history.bin
+
+The timestamps are ms since boot of the device unless the wall clock is
+sent as cur, which the client does when fetching.
+"""
+
+import argparse
+import array
+import csv
+import struct
+import sys
+import time
+import urllib.request
+
+# history_binary_header and history_record in main/history.h
+HEADER = struct.Struct('<IHHIIQII')
+MAGIC = 0x42484d4a
+VERSION = 2
+
+
+def decode(data):
+    """Decode a response into its boot id, the cursor of its first sample, the cursor for the next poll and the samples"""
+    if len(data) < HEADER.size:
+        raise ValueError("response is shorter than the header")
+    magic, version, record_size, first, count, timestamp, boot_id, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a binary history export")
+
+    # the device cuts the stream short if samples were overwritten while sending
+    count = min(count, (len(data) - HEADER.size) // record_size)
+    words = array.array('I', data[HEADER.size:HEADER.size + count * record_size])
+    if sys.byteorder == 'big':
+        words.byteswap()
+
+    stride = record_size // 4
+    samples = []
+    for i in range(0, count * stride, stride):
+        timestamp += words[i]
+        samples.append((timestamp, words[i + 1] / 100.0, words[i + 2] / 100.0, words[i + 3] / 100.0))
+    return boot_id, first, first + count, samples
+
+
+def fetch(host, since=0, boot_id=0, limit=0, timeout=30):
+    url = f"http://{host}/api/history/binary?since={since}&cur={int(time.time() * 1000)}"
+    if boot_id:
+        url += f"&boot={boot_id}"
+    if limit:
+        url += f"&limit={limit}"
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return decode(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch the binary hashrate history of a miner")
+    parser.add_argument('host', nargs='?', help="IP or hostname of the miner")
+    parser.add_argument('--file', help="decode a saved response instead of fetching")
+    parser.add_argument('--since', type=int, default=0, help="cursor of the first sample, 0 for the oldest, -n for the latest n")
+    parser.add_argument('--limit', type=int, default=0, help="max number of samples per request")
+    parser.add_argument('--follow', type=float, metavar='SECONDS', help="keep polling for new samples")
+    parser.add_argument('--csv', help="output file, stdout by default")
+    args = parser.parse_args()
+
+    if not args.host and not args.file:
+        parser.error("host or --file is required")
+
+    out = open(args.csv, 'w', newline='') if args.csv else sys.stdout
+    writer = csv.writer(out)
+    writer.writerow(['timestamp_ms', 'hashrate_10m_gh', 'hashrate_1h_gh', 'hashrate_1d_gh'])
+
+    try:
+        if args.file:
+            with open(args.file, 'rb') as f:
+                _, _, _, samples = decode(f.read())
+            writer.writerows(samples)
+            return 0
+
+        since = args.since
+        boot_id = 0
+        while True:
+            response_boot_id, first, next_since, samples = fetch(args.host, since, boot_id, args.limit)
+            if boot_id and response_boot_id != boot_id:
+                # the device started over at its oldest sample
+                print(f"the device rebooted, history restarted at {first}", file=sys.stderr)
+            elif first > since and since:
+                print(f"samples {since}..{first - 1} were overwritten before they were fetched", file=sys.stderr)
+            since = next_since
+            boot_id = response_boot_id
+            writer.writerows(samples)
+            out.flush()
+            if not args.follow:
+                return 0
+            # a limited request may have left samples for the next one
+            if not args.limit or len(samples) < args.limit:
+                time.sleep(args.follow)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
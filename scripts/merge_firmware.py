@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Merged Flash Image Builder
+
+Assembles the complete flash image of a release (bootloader, partition table,
+factory app, www SPIFFS, NVS config and OTA data) at the offsets found in
+partitions.csv, replacing `esptool.py merge_bin` plus the NVS tool. The
+inputs are mmap'ed and copied straight into the mmap'ed output, only the
+gaps between them are filled with 0xFF. The flash mode/size/frequency in the
+bootloader header are set like merge_bin does and a SHA-256 of every image is
+written next to it.
+
+  python scripts/merge_firmware.py 1.2T=build-1.2T 4.8T=build-4.8T
+
+builds both release bundles concurrently from their build directories.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import esp32_nvs_generator as nvs
+import partition_table
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+BOOTLOADER_OFFSET = 0x0  # esp32s3
+ESP_IMAGE_MAGIC = 0xE9
+EXTENDED_HEADER_END = 24  # 8 byte image header + 16 byte extended header
+SHA256_LEN = 32
+
+FLASH_MODES = {'qio': 0, 'qout': 1, 'dio': 2, 'dout': 3}
+FLASH_SIZES = {'1MB': 0x00, '2MB': 0x10, '4MB': 0x20, '8MB': 0x30, '16MB': 0x40, '32MB': 0x50}
+FLASH_FREQUENCIES = {'80m': 0xF, '40m': 0x0, '26m': 0x1, '20m': 0x2}
+
+Release = namedtuple('Release', ['board', 'config', 'output'])
+
+RELEASES = {
+    '1.2T': Release('NERDAXEGAMMA', 'config/JingleMiner1.2T.cvs', 'release/BTC_Solo_Lite_1.2T.bin'),
+    '4.8T': Release('NERDQAXEPLUS2', 'config/JingleMiner4.8T.cvs', 'release/BTC_Solo_Pro_4.8T.bin'),
+}
+
+Segment = namedtuple('Segment', ['offset', 'name', 'source'])  # source: file path or bytes
+
+
+class MergeError(Exception):
+    pass
+
+
+def app_binary(build_dir):
+    """Path of the application binary, named after the project"""
+    description = os.path.join(build_dir, 'project_description.json')
+    if os.path.exists(description):
+        with open(description, 'r', encoding='utf-8') as f:
+            return os.path.join(build_dir, json.load(f)['app_bin'])
+    return os.path.join(build_dir, 'esp-miner.bin')
+
+
+def plan_segments(partitions, build_dir, config=None):
+    """Everything that goes into the image, sorted by offset"""
+    segments = [
+        Segment(BOOTLOADER_OFFSET, 'bootloader', os.path.join(build_dir, 'bootloader', 'bootloader.bin')),
+        Segment(partition_table.PARTITION_TABLE_OFFSET, 'partition-table',
+                os.path.join(build_dir, 'partition_table', 'partition-table.bin')),
+    ]
+    sources = {
+        'factory': app_binary(build_dir),
+        'www': os.path.join(build_dir, 'www.bin'),
+        'otadata': os.path.join(build_dir, 'ota_data_initial.bin'),
+    }
+
+    for partition in partitions:
+        if partition.name in sources:
+            segments.append(Segment(partition.offset, partition.name, sources[partition.name]))
+        elif partition.name == 'nvs' and config:
+            image = io.BytesIO()
+            nvs.write_image(nvs.encode_csv(config), image, partition.size)
+            segments.append(Segment(partition.offset, partition.name, image.getvalue()))
+
+    return sorted(segments, key=lambda s: s.offset)
+
+
+def segment_limits(partitions):
+    """offset -> the first byte the segment starting there may not touch"""
+    limits = {BOOTLOADER_OFFSET: partition_table.PARTITION_TABLE_OFFSET,
+              partition_table.PARTITION_TABLE_OFFSET: partition_table.PARTITION_TABLE_OFFSET + partition_table.PARTITION_TABLE_SIZE}
+    for partition in partitions:
+        limits[partition.offset] = partition.offset + partition.size
+    return limits
+
+
+def image_data_length(image):
+    """Length of an ESP app/bootloader image up to its appended SHA-256"""
+    pos = EXTENDED_HEADER_END
+    for _ in range(image[1]):
+        _, length = struct.unpack_from('<II', image, pos)
+        pos += 8 + length
+        if pos > len(image):
+            raise MergeError("bootloader image is truncated")
+    # the checksum byte ends on a 16 byte boundary
+    return pos + (15 - pos % 16) + 1
+
+
+def update_flash_params(image, flash_mode, flash_size, flash_freq):
+    """Patch the flash parameters of the bootloader in place (image is a writable
+    memoryview) and recalculate its SHA-256 if one is appended"""
+    if len(image) < EXTENDED_HEADER_END or image[0] != ESP_IMAGE_MAGIC:
+        raise MergeError("bootloader.bin is not an ESP image")
+
+    params = bytes((FLASH_MODES[flash_mode], FLASH_SIZES[flash_size] | FLASH_FREQUENCIES[flash_freq]))
+    if image[2:4] == params:
+        return
+    image[2:4] = params
+
+    if image[8 + 15] == 1:
+        length = image_data_length(image)
+        if length + SHA256_LEN > len(image):
+            raise MergeError("bootloader image is truncated")
+        image[length:length + SHA256_LEN] = hashlib.sha256(image[:length]).digest()
+
+
+def merge(segments, limits, output, flash_mode='dio', flash_size='16MB', flash_freq='80m'):
+    """Write the merged image, returns ({name: sha256} of the parts and the image, size)"""
+    files = []
+    maps = []
+    datas = []
+    try:
+        end = 0
+        for segment in segments:
+            if isinstance(segment.source, bytes):
+                data = memoryview(segment.source)
+            else:
+                if not os.path.exists(segment.source):
+                    raise MergeError(f"{segment.name}: {segment.source} not found")
+                if os.path.getsize(segment.source) == 0:
+                    raise MergeError(f"{segment.name}: {segment.source} is empty")
+                files.append(open(segment.source, 'rb'))
+                maps.append(mmap.mmap(files[-1].fileno(), 0, access=mmap.ACCESS_READ))
+                data = memoryview(maps[-1])
+            datas.append(data)
+
+            if segment.offset < end:
+                raise MergeError(f"{segment.name} at 0x{segment.offset:x} overlaps the previous part")
+            limit = limits.get(segment.offset)
+            if limit is not None and segment.offset + len(data) > limit:
+                raise MergeError(f"{segment.name} is {len(data)} bytes, only {limit - segment.offset} fit")
+            end = segment.offset + len(data)
+
+        digests = {}
+        with open(output, 'w+b') as out:
+            out.truncate(end)
+            with mmap.mmap(out.fileno(), end) as image:
+                with memoryview(image) as view:
+                    pos = 0
+                    for segment, data in zip(segments, datas):
+                        # pad only the gap up to the next part
+                        view[pos:segment.offset] = b'\xff' * (segment.offset - pos)
+                        pos = segment.offset + len(data)
+                        view[segment.offset:pos] = data
+                        if segment.offset == BOOTLOADER_OFFSET:
+                            update_flash_params(view[segment.offset:pos], flash_mode, flash_size, flash_freq)
+                        digests[segment.name] = hashlib.sha256(view[segment.offset:pos]).hexdigest()
+                    digests['image'] = hashlib.sha256(view).hexdigest()
+                image.flush()
+    finally:
+        for data in datas:
+            data.release()
+        for m in maps:
+            m.close()
+        for f in files:
+            f.close()
+
+    return digests, end
+
+
+def build_release(name, build_dir, partitions_csv, output=None, config=None, flash=('dio', '16MB', '80m')):
+    """Merge one release, runs in a worker process"""
+    release = RELEASES.get(name)
+    output = output or os.path.join(ROOT, release.output)
+    config = config or (os.path.join(ROOT, release.config) if release else None)
+
+    start = time.perf_counter()
+    partitions = partition_table.read_partitions(partitions_csv)
+    segments = plan_segments(partitions, build_dir, config)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    digests, size = merge(segments, segment_limits(partitions), output, *flash)
+
+    with open(output + '.sha256', 'w', encoding='utf-8') as f:
+        f.write(f"{digests['image']}  {os.path.basename(output)}\n")
+
+    lines = [f"{name}: {output} ({size} bytes, {time.perf_counter() - start:.2f}s)"]
+    for segment in segments:
+        lines.append(f"  0x{segment.offset:06x} {segment.name:<16} {digests[segment.name]}")
+    lines.append(f"  sha256 {digests['image']}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build merged flash images from partitions.csv')
+    parser.add_argument('releases', nargs='*', metavar='NAME[=BUILD_DIR]',
+                        help=f"releases to build ({', '.join(RELEASES)}), build directory default: build")
+    parser.add_argument('--partitions', default=partition_table.DEFAULT_PARTITIONS_CSV, help='partition table CSV')
+    parser.add_argument('--config', help='NVS config CSV, overrides the one of the release')
+    parser.add_argument('--output', help='output image, only with a single release')
+    parser.add_argument('--flash-mode', default='dio', choices=FLASH_MODES)
+    parser.add_argument('--flash-size', default='16MB', choices=FLASH_SIZES)
+    parser.add_argument('--flash-freq', default='80m', choices=FLASH_FREQUENCIES)
+    args = parser.parse_args()
+
+    jobs = []
+    for spec in args.releases or RELEASES:
+        name, _, build_dir = spec.partition('=')
+        if name not in RELEASES:
+            print(f"Error: unknown release '{name}' (known: {', '.join(RELEASES)})")
+            return 1
+        jobs.append((name, build_dir or os.path.join(ROOT, 'build')))
+
+    if len(set(build_dir for _, build_dir in jobs)) != len(jobs):
+        print("Error: every release needs its own build directory (NAME=BUILD_DIR)")
+        return 1
+    if args.output and len(jobs) > 1:
+        print("Error: --output needs a single release")
+        return 1
+
+    flash = (args.flash_mode, args.flash_size, args.flash_freq)
+    failed = 0
+    with ProcessPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = [executor.submit(build_release, name, build_dir, args.partitions, args.output, args.config, flash)
+                   for name, build_dir in jobs]
+        for (name, _), future in zip(jobs, futures):
+            try:
+                print(future.result())
+            except (MergeError, nvs.NVSError, partition_table.PartitionTableError, OSError) as e:
+                print(f"{name}: Error: {e}")
+                failed += 1
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
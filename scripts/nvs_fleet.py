@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+NVS Fleet Provisioning
+
+Generates one NVS image per device from a template CSV (e.g.
+config/JingleMiner1.2T.cvs) and a device manifest with per-device overrides.
+The template is encoded once, every device only re-encodes the keys it
+overrides, and the images are written by a pool of worker processes.
+
+Manifest formats:
+  CSV    device,wifissid,wifipass,stratumuser
+         rack1-01,Farm,secret,bc1q....rack1-01
+  JSONL  {"device": "rack1-01", "wifissid": "Farm", "stratumuser": "bc1q....rack1-01"}
+
+Columns are template keys, written as `key` or `namespace/key` when the
+key exists in more than one namespace. Empty values keep the template value.
+With --merge the NVS partition of a merged flash image is replaced instead,
+giving one ready to flash image per device.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import esp32_nvs_generator as nvs
+import partition_table
+
+DEVICE_ID = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+BATCH_SIZE = 64
+
+# template state of a worker process, set by _init_worker
+_state = None
+
+
+def read_manifest(path, id_field='device'):
+    """List of (device id, {column: value}) in file order"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.json')):
+            records = []
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise nvs.NVSError(f"{path}:{line_no}: {e}")
+        else:
+            records = list(csv.DictReader(line for line in f if not line.lstrip().startswith('#')))
+
+    devices = []
+    seen = set()
+    for record in records:
+        record = dict(record)
+        device = str(record.pop(id_field, '') or '').strip()
+        if not DEVICE_ID.match(device):
+            raise nvs.NVSError(f"invalid or missing device id '{device}' in {path}")
+        if device in seen:
+            raise nvs.NVSError(f"duplicate device id '{device}' in {path}")
+        seen.add(device)
+        devices.append((device, record))
+    return devices
+
+
+def resolve_column(index, column):
+    """Map a manifest column to its (namespace, key) in the template"""
+    if '/' in column:
+        key = tuple(column.split('/', 1))
+        if key not in index:
+            raise nvs.NVSError(f"'{column}' is not in the template")
+        return key
+
+    matches = [key for key in index if key[1] == column]
+    if not matches:
+        raise nvs.NVSError(f"'{column}' is not in the template")
+    if len(matches) > 1:
+        raise nvs.NVSError(f"'{column}' exists in several namespaces, use namespace/{column}")
+    return matches[0]
+
+
+def _init_worker(state):
+    global _state
+    _state = state
+
+
+def _build_device(device, overrides):
+    state = _state
+    items = list(state['items'])
+    rows = list(state['rows']) if state['verify'] else None
+
+    for key, value in overrides:
+        position, ns_index, row = state['index'][key]
+        row = row._replace(value=str(value))
+        items[position] = nvs.encode_value(ns_index, row.key, row.encoding, nvs.parse_value(row, state['base_dir']))
+        if rows is not None:
+            rows[state['row_positions'][key]] = row
+
+    image = io.BytesIO()
+    nvs.write_image(items, image, state['size'])
+    image = image.getbuffer()
+
+    if rows is not None:
+        errors = nvs.verify(image, rows, state['base_dir'])
+        if errors:
+            raise nvs.NVSError('; '.join(errors))
+
+    path = os.path.join(state['output_dir'], device + '.bin')
+    if state['merge']:
+        shutil.copyfile(state['merge'], path)
+        with open(path, 'r+b') as f:
+            f.seek(state['offset'])
+            f.write(image)
+    else:
+        with open(path, 'wb') as f:
+            f.write(image)
+    return path
+
+
+def _build_batch(batch):
+    """Build a batch of devices, returns (device, path or None, error or None) tuples"""
+    results = []
+    for device, overrides in batch:
+        try:
+            results.append((device, _build_device(device, overrides), None))
+        except (nvs.NVSError, ValueError, OSError) as e:
+            results.append((device, None, str(e)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate per-device NVS images from a template and a device manifest')
+    parser.add_argument('template', help='template CSV (key,type,encoding,value)')
+    parser.add_argument('manifest', help='device manifest (.csv or .jsonl)')
+    parser.add_argument('output_dir', help='directory for the <device>.bin images')
+    parser.add_argument('--id-field', default='device', help='manifest column holding the device id (default: device)')
+    parser.add_argument('--size', help='NVS partition size, default: size of the nvs partition in partitions.csv')
+    parser.add_argument('--partitions', default=partition_table.DEFAULT_PARTITIONS_CSV, help='partition table CSV')
+    parser.add_argument('--partition', default='nvs', help='name of the NVS partition in the partition table')
+    parser.add_argument('--merge', metavar='IMAGE', help='merged flash image whose NVS partition is replaced per device')
+    parser.add_argument('--verify', action='store_true', help='parse every image back and compare it with its values')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes (default: number of CPUs)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        nvs_partition = partition_table.find_partition(partition_table.read_partitions(args.partitions), args.partition)
+        size = partition_table.parse_size(args.size) if args.size else nvs_partition.size
+
+        if args.merge and os.path.getsize(args.merge) < nvs_partition.offset + size:
+            raise nvs.NVSError(f"{args.merge} ends before the {args.partition} partition at 0x{nvs_partition.offset:x}")
+
+        rows = nvs.read_csv(args.template)
+        index = {}
+        items = nvs.encode_rows(rows, os.path.dirname(os.path.abspath(args.template)), index)
+        row_positions = {}
+        namespace = None
+        for i, row in enumerate(rows):
+            if row.type == 'namespace':
+                namespace = row.key
+            else:
+                row_positions[(namespace, row.key)] = i
+
+        manifest_dir = os.path.dirname(os.path.abspath(args.manifest))
+
+        devices = read_manifest(args.manifest, args.id_field)
+        columns = {}
+        work = []
+        for device, record in devices:
+            overrides = []
+            for column, value in record.items():
+                if value is None or value == '':
+                    continue
+                if column not in columns:
+                    columns[column] = resolve_column(index, column)
+                key = columns[column]
+                if index[key][2].type == 'file':
+                    value = os.path.join(manifest_dir, value)
+                overrides.append((key, value))
+            work.append((device, overrides))
+    except (nvs.NVSError, partition_table.PartitionTableError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    if not work:
+        print(f"No devices in {args.manifest}")
+        return 1
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    state = {
+        'items': items,
+        'index': index,
+        'rows': rows,
+        'row_positions': row_positions,
+        'size': size,
+        'base_dir': os.path.dirname(os.path.abspath(args.template)),
+        'output_dir': args.output_dir,
+        'merge': args.merge,
+        'offset': nvs_partition.offset,
+        'verify': args.verify,
+    }
+
+    batches = [work[i:i + BATCH_SIZE] for i in range(0, len(work), BATCH_SIZE)]
+    failed = 0
+    jobs = max(1, min(args.jobs or 1, len(batches)))
+    if jobs == 1:
+        _init_worker(state)
+        results = map(_build_batch, batches)
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(state,))
+        results = executor.map(_build_batch, batches)
+
+    for batch in results:
+        for device, path, error in batch:
+            if error:
+                failed += 1
+                print(f"  {device}: {error}")
+
+    if jobs > 1:
+        executor.shutdown()
+
+    elapsed = time.perf_counter() - start
+    built = len(work) - failed
+    kind = 'flash' if args.merge else 'NVS'
+    print(f"{built} {kind} images written to {args.output_dir} in {elapsed:.2f}s "
+          f"({built / elapsed:.0f}/s, {jobs} processes), {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
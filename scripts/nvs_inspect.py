@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+NVS Inspector
+
+Decodes NVS partitions dumped from devices and shows or diffs their content
+against a config CSV, i.e. what the firmware reads through
+Config::nvs_config_get_*() versus what config.cvs intended.
+
+  # dump the partition of a device
+  esptool.py read_flash 0x9000 0x6000 nvs.bin
+
+  python scripts/nvs_inspect.py nvs.bin
+  python scripts/nvs_inspect.py nvs.bin --csv config/JingleMiner1.2T.cvs
+  python scripts/nvs_inspect.py dumps/ --csv config/JingleMiner1.2T.cvs \\
+      --ignore stratumuser,hostname --json summary.json
+
+A directory is scanned for *.bin dumps which are decoded in parallel; the
+JSON summary lists the problems and differences of every dump plus how many
+dumps differ per key. Keys missing on a device fall back to the firmware
+defaults.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import esp32_nvs_generator as nvs
+import partition_table
+
+MAX_BLOB_DISPLAY = 32
+
+
+def format_value(value):
+    if isinstance(value, bytes):
+        text = value[:MAX_BLOB_DISPLAY].hex()
+        return f"{text}... ({len(value)} bytes)" if len(value) > MAX_BLOB_DISPLAY else text
+    return value
+
+
+def json_value(value):
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def read_dump(path, offset=0, size=None):
+    """Decode the NVS partition in a dump file, offset/size select it inside a full flash dump"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [], ["empty file"]
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if offset + (size or 0) > len(m):
+                return [], [f"file is too small for a partition at 0x{offset:x}"]
+            with memoryview(m) as view:
+                part = view[offset:offset + size] if size else view[offset:]
+                try:
+                    return nvs.parse_image(part)
+                finally:
+                    part.release()
+
+
+def diff(items, expected, ignore=()):
+    """Differences between decoded items and expected_items() of a CSV"""
+    actual = {(item.namespace, item.key): (item.encoding, item.value) for item in items}
+    changed = []
+    missing = []
+    extra = []
+
+    for key, (encoding, value) in expected.items():
+        if key[1] in ignore:
+            continue
+        if key not in actual:
+            missing.append({'key': '/'.join(key), 'expected': json_value(value)})
+        elif actual[key] != (encoding, value):
+            found_encoding, found = actual[key]
+            change = {'key': '/'.join(key), 'expected': json_value(value), 'found': json_value(found)}
+            if found_encoding != encoding:
+                change['type'] = f"{encoding} -> {found_encoding}"
+            changed.append(change)
+
+    for key in actual.keys() - expected.keys():
+        if key[1] not in ignore:
+            extra.append({'key': '/'.join(key), 'found': json_value(actual[key][1])})
+
+    return {'changed': changed, 'missing': missing, 'extra': sorted(extra, key=lambda e: e['key'])}
+
+
+def inspect(path, expected=None, ignore=(), offset=0, size=None):
+    """Summary of one dump, runs in a worker process"""
+    try:
+        items, errors = read_dump(path, offset, size)
+    except OSError as e:
+        items, errors = [], [str(e)]
+
+    summary = {'file': path, 'entries': len(items), 'errors': errors}
+    if expected is not None:
+        summary.update(diff(items, expected, ignore))
+    return summary, items
+
+
+def print_items(items):
+    width = max([len(f"{item.namespace}/{item.key}") for item in items] + [3])
+    for item in items:
+        print(f"  {item.namespace + '/' + item.key:<{width}}  {item.encoding:<7} {format_value(item.value)}")
+
+
+def print_diff(summary):
+    for change in summary['changed']:
+        print(f"  ~ {change['key']}: {change['expected']!r} -> {change['found']!r}"
+              + (f" ({change['type']})" if 'type' in change else ''))
+    for entry in summary['missing']:
+        print(f"  - {entry['key']}: {entry['expected']!r} (firmware default)")
+    for entry in summary['extra']:
+        print(f"  + {entry['key']}: {entry['found']!r}")
+
+
+def _inspect_summary(args):
+    return inspect(*args)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode NVS partition dumps and diff them against a config CSV')
+    parser.add_argument('input', help='NVS dump (.bin) or a directory of dumps')
+    parser.add_argument('--csv', help='config CSV to compare with')
+    parser.add_argument('--ignore', default='', help='comma separated keys expected to differ per device')
+    parser.add_argument('--flash', action='store_true',
+                        help='inputs are full flash dumps, the NVS partition is located via the partition table')
+    parser.add_argument('--partitions', default=partition_table.DEFAULT_PARTITIONS_CSV, help='partition table CSV')
+    parser.add_argument('--partition', default='nvs', help='name of the NVS partition in the partition table')
+    parser.add_argument('--json', metavar='FILE', help="write the JSON summary to FILE ('-' for stdout)")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes (default: number of CPUs)')
+    args = parser.parse_args()
+
+    try:
+        offset, size = 0, None
+        if args.flash:
+            partition = partition_table.find_partition(partition_table.read_partitions(args.partitions), args.partition)
+            offset, size = partition.offset, partition.size
+
+        expected = None
+        if args.csv:
+            expected = nvs.expected_items(nvs.read_csv(args.csv), os.path.dirname(os.path.abspath(args.csv)))
+    except (nvs.NVSError, partition_table.PartitionTableError, OSError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    ignore = {key.strip() for key in args.ignore.split(',') if key.strip()}
+
+    if os.path.isdir(args.input):
+        files = sorted(os.path.join(args.input, name) for name in os.listdir(args.input) if name.endswith('.bin'))
+        if not files:
+            print(f"No .bin files in {args.input}")
+            return 1
+        work = [(path, expected, ignore, offset, size) for path in files]
+        jobs = max(1, min(args.jobs or 1, len(files)))
+        if jobs == 1:
+            summaries = [_inspect_summary(w) for w in work]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                summaries = list(executor.map(_inspect_summary, work, chunksize=64))
+    else:
+        summary, items = inspect(args.input, expected, ignore, offset, size)
+        summaries = [summary]
+        if args.json != '-':
+            print(f"{args.input}: {len(items)} entries")
+            print_items(items)
+
+    keys = Counter()
+    corrupt = 0
+    differing = 0
+    for summary in summaries:
+        corrupt += bool(summary['errors'])
+        entries = summary.get('changed', []) + summary.get('missing', []) + summary.get('extra', [])
+        differing += bool(entries)
+        keys.update(entry['key'] for entry in entries)
+
+    report = {
+        'dumps': len(summaries),
+        'with_errors': corrupt,
+        'differing': differing,
+        'keys': dict(keys.most_common()),
+        'devices': summaries,
+    }
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        for summary in summaries:
+            entries = summary.get('changed', []) + summary.get('missing', []) + summary.get('extra', [])
+            if not summary['errors'] and not entries:
+                continue
+            print(f"{summary['file']}:")
+            for error in summary['errors']:
+                print(f"  ! {error}")
+            if expected is not None:
+                print_diff(summary)
+        print(f"{len(summaries)} dump(s), {corrupt} with errors"
+              + (f", {differing} differing from {args.csv}" if expected is not None else ''))
+        if len(summaries) > 1:
+            for key, count in keys.most_common():
+                print(f"  {key}: {count}")
+
+    return 1 if corrupt else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
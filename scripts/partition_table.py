@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Partition table parser
+
+Reads partitions.csv the same way ESP-IDF's gen_esp32part.py does, including
+size suffixes (K/M) and partitions without an explicit offset.
+"""
+
+import csv
+import os
+import sys
+from collections import namedtuple
+
+# the partition table itself lives at 0x8000, the first partition follows it
+PARTITION_TABLE_OFFSET = 0x8000
+PARTITION_TABLE_SIZE = 0x1000
+APP_ALIGNMENT = 0x10000
+DATA_ALIGNMENT = 0x1000
+
+DEFAULT_PARTITIONS_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'partitions.csv')
+
+Partition = namedtuple('Partition', ['name', 'type', 'subtype', 'offset', 'size', 'flags'])
+
+
+class PartitionTableError(Exception):
+    pass
+
+
+def parse_size(text):
+    """Parse 0x6000, 24576, 8k, 4M, ..."""
+    text = text.strip()
+    multiplier = 1
+    if text[-1:] in ('k', 'K'):
+        multiplier, text = 1024, text[:-1]
+    elif text[-1:] in ('m', 'M'):
+        multiplier, text = 1024 * 1024, text[:-1]
+    try:
+        return int(text, 0) * multiplier
+    except ValueError:
+        raise PartitionTableError(f"invalid size or offset '{text}'")
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def read_partitions(path=DEFAULT_PARTITIONS_CSV):
+    """Return the partitions of a partitions.csv with all offsets resolved"""
+    partitions = []
+    next_offset = PARTITION_TABLE_OFFSET + PARTITION_TABLE_SIZE
+
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+    for row in csv.reader(lines):
+        row = [field.strip() for field in row] + [''] * (6 - len(row))
+        name, ptype, subtype, offset, size, flags = row[:6]
+
+        alignment = APP_ALIGNMENT if ptype == 'app' else DATA_ALIGNMENT
+        offset = parse_size(offset) if offset else _align(next_offset, alignment)
+        if offset < next_offset:
+            raise PartitionTableError(f"partition '{name}' at 0x{offset:x} overlaps the previous one")
+
+        size = parse_size(size)
+        partitions.append(Partition(name, ptype, subtype, offset, size, flags))
+        next_offset = offset + size
+
+    return partitions
+
+
+def find_partition(partitions, name):
+    for partition in partitions:
+        if partition.name == name:
+            return partition
+    raise PartitionTableError(f"no partition named '{name}'")
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PARTITIONS_CSV
+    for p in read_partitions(path):
+        print(f"{p.name:<10} {p.type:<5} {p.subtype:<9} 0x{p.offset:08x} 0x{p.size:08x} ({p.size // 1024}K)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+// Host fuzz test and throughput benchmark of the stratum line framing.
+// A pool session and random byte streams are fed to StratumFramer in random
+// sized pieces, like recv() returns them, and must come out as exactly the
+// lines of the stream; the session lines must parse as JSON. The throughput
+// is compared with the previous receiveJsonRpcLine (strchr over the whole
+// buffer, a copy per line, memmove of the rest).
+//
+//   make -C test/host benchmark_framer && ./test/host/benchmark_framer [capture]
+//
+// The default session is data/stratum_session.txt, built from the self test
+// notify of block 792980. A capture of real pool traffic works as well, e.g.
+// recorded with the nc pipe described in main/tasks/stratum_task.cpp.
+
+#include <algorithm>
+#include <chrono>
+#include <random>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <string>
+#include <vector>
+
+#include "ArduinoJson.h"
+#include "stratum_framer.h"
+
+#define BIG_BUFFER_SIZE 16384
+#define FUZZ_ROUNDS 2000
+#define THROUGHPUT_REPEAT 100
+
+static const size_t CHUNK_SIZES[] = {1, 7, 64, 536, 1460, 4096};
+
+// recv() replacement handing out the stream in random pieces
+struct Source {
+    const std::string *data;
+    size_t pos;
+    size_t max_chunk;
+    std::mt19937 *rng;
+
+    size_t recv(char *buf, size_t available)
+    {
+        size_t n = std::min(available, data->size() - pos);
+        if (rng) {
+            n = std::min(n, (size_t) (*rng)() % max_chunk + 1);
+        } else {
+            n = std::min(n, max_chunk);
+        }
+        memcpy(buf, data->data() + pos, n);
+        pos += n;
+        return n;
+    }
+};
+
+// the framing before StratumFramer
+struct LegacyReceiver {
+    char buffer[BIG_BUFFER_SIZE];
+    size_t len = 0;
+
+    LegacyReceiver()
+    {
+        memset(buffer, 0, sizeof(buffer));
+    }
+
+    char *receive(Source *source)
+    {
+        while (strchr(buffer, '\n') == NULL) {
+            if (len >= BIG_BUFFER_SIZE - 1) {
+                len = 0;
+                buffer[0] = '\0';
+            }
+            size_t nbytes = source->recv(buffer + len, BIG_BUFFER_SIZE - len - 1);
+            if (!nbytes) {
+                return NULL;
+            }
+            len += nbytes;
+            buffer[len] = '\0';
+        }
+
+        char *newline = strchr(buffer, '\n');
+        size_t line_length = newline - buffer;
+        char *line = (char *) malloc(line_length + 1);
+        memcpy(line, buffer, line_length);
+        line[line_length] = '\0';
+
+        size_t remaining = len - (line_length + 1);
+        if (remaining > 0) {
+            memmove(buffer, newline + 1, remaining);
+        }
+        len = remaining;
+        buffer[len] = '\0';
+        return line;
+    }
+};
+
+// the loop of StratumApi::receiveJsonRpcLine
+static const char *framer_receive(StratumFramer *framer, Source *source, size_t *len)
+{
+    char *line;
+    while ((line = framer->nextLine(len)) == NULL) {
+        size_t available;
+        char *buf = framer->recvBuffer(&available);
+        if (!available) {
+            framer->clear();
+            buf = framer->recvBuffer(&available);
+        }
+        size_t nbytes = source->recv(buf, available);
+        if (!nbytes) {
+            return NULL;
+        }
+        framer->commit(nbytes);
+    }
+    return line;
+}
+
+static std::vector<std::string> split_lines(const std::string &data)
+{
+    std::vector<std::string> lines;
+    size_t start = 0;
+    size_t newline;
+    while ((newline = data.find('\n', start)) != std::string::npos) {
+        size_t end = (newline > start && data[newline - 1] == '\r') ? newline - 1 : newline;
+        lines.push_back(data.substr(start, end - start));
+        start = newline + 1;
+    }
+    return lines;
+}
+
+static std::vector<std::string> frame_all(const std::string &data, size_t buffer_size, size_t max_chunk, std::mt19937 *rng)
+{
+    std::vector<char> buffer(buffer_size);
+    StratumFramer framer(buffer.data(), buffer.size());
+    Source source = {&data, 0, max_chunk, rng};
+
+    std::vector<std::string> lines;
+    const char *line;
+    size_t len;
+    while ((line = framer_receive(&framer, &source, &len)) != NULL) {
+        lines.push_back(std::string(line, len));
+    }
+    return lines;
+}
+
+static std::string random_stream(std::mt19937 &rng, size_t max_line)
+{
+    static const char alphabet[] = "{}[]\",:0123456789abcdef\r\0 ";
+    std::string data;
+    int lines = rng() % 50;
+    for (int i = 0; i < lines; i++) {
+        size_t len = rng() % max_line;
+        for (size_t j = 0; j < len; j++) {
+            data += alphabet[rng() % (sizeof(alphabet) - 1)];
+        }
+        data += (rng() % 4) ? "\n" : "\r\n";
+    }
+    // an incomplete line at the end is never returned
+    data += "unterminated";
+    return data;
+}
+
+static int fuzz(const std::string &session)
+{
+    std::mt19937 rng(792980);
+    std::vector<std::string> expected = split_lines(session);
+    int failures = 0;
+
+    for (int round = 0; round < FUZZ_ROUNDS; round++) {
+        size_t max_chunk = CHUNK_SIZES[round % (sizeof(CHUNK_SIZES) / sizeof(CHUNK_SIZES[0]))];
+
+        // the session, everything has to parse
+        std::vector<std::string> lines = frame_all(session, BIG_BUFFER_SIZE, max_chunk, &rng);
+        if (lines != expected) {
+            printf("round %d: session framed differently (chunks up to %zu)\n", round, max_chunk);
+            failures++;
+        }
+        if (round % 100 == 0) {
+            for (const std::string &line : lines) {
+                JsonDocument doc;
+                if (deserializeJson(doc, line.data(), line.size())) {
+                    printf("round %d: line does not parse: %.60s\n", round, line.c_str());
+                    failures++;
+                }
+            }
+        }
+
+        // random bytes including NULs and carriage returns in a small buffer
+        size_t buffer_size = 256 + rng() % 4096;
+        std::string data = random_stream(rng, buffer_size / 2);
+        if (frame_all(data, buffer_size, max_chunk, &rng) != split_lines(data)) {
+            printf("round %d: random stream framed differently (buffer %zu)\n", round, buffer_size);
+            failures++;
+        }
+
+        // a line larger than the buffer is dropped, the following lines survive
+        std::string tail = random_stream(rng, buffer_size / 2);
+        data = std::string(buffer_size * 2 + rng() % buffer_size, 'x') + "\n" + tail;
+        std::vector<std::string> tail_lines = split_lines(tail);
+        lines = frame_all(data, buffer_size, max_chunk, &rng);
+        if (lines.size() < tail_lines.size() || !std::equal(tail_lines.begin(), tail_lines.end(), lines.end() - tail_lines.size())) {
+            printf("round %d: lines after an overflow are lost\n", round);
+            failures++;
+        }
+    }
+    return failures;
+}
+
+static double seconds_since(std::chrono::steady_clock::time_point start)
+{
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+}
+
+static void throughput(const std::string &session)
+{
+    std::string data;
+    for (int i = 0; i < THROUGHPUT_REPEAT; i++) {
+        data += session;
+    }
+    double mb = data.size() / 1e6;
+
+    for (size_t max_chunk : {(size_t) 64, (size_t) 536, (size_t) 1460}) {
+        static LegacyReceiver legacy;
+        legacy = LegacyReceiver();
+        Source source = {&data, 0, max_chunk, NULL};
+        size_t legacy_lines = 0;
+        auto start = std::chrono::steady_clock::now();
+        char *line;
+        while ((line = legacy.receive(&source)) != NULL) {
+            legacy_lines++;
+            free(line);
+        }
+        double legacy_s = seconds_since(start);
+
+        static char buffer[BIG_BUFFER_SIZE];
+        StratumFramer framer(buffer, sizeof(buffer));
+        source = {&data, 0, max_chunk, NULL};
+        size_t framer_lines = 0;
+        size_t len;
+        start = std::chrono::steady_clock::now();
+        while (framer_receive(&framer, &source, &len) != NULL) {
+            framer_lines++;
+        }
+        double framer_s = seconds_since(start);
+
+        printf("%4zu byte reads: legacy %8.1f MB/s, framer %8.1f MB/s (%.1fx), %zu/%zu lines\n", max_chunk, mb / legacy_s,
+               mb / framer_s, legacy_s / framer_s, legacy_lines, framer_lines);
+    }
+}
+
+int main(int argc, char **argv)
+{
+    const char *path = argc > 1 ? argv[1] : "data/stratum_session.txt";
+    FILE *f = fopen(path, "rb");
+    if (!f) {
+        // also run from the repository root
+        std::string fallback = std::string("test/host/") + path;
+        f = argc > 1 ? NULL : fopen(fallback.c_str(), "rb");
+    }
+    if (!f) {
+        printf("Unable to open %s\n", path);
+        return 1;
+    }
+    std::string session;
+    char chunk[4096];
+    size_t n;
+    while ((n = fread(chunk, 1, sizeof(chunk), f)) > 0) {
+        session.append(chunk, n);
+    }
+    fclose(f);
+
+    std::vector<std::string> lines = split_lines(session);
+    size_t longest = 0;
+    for (const std::string &line : lines) {
+        longest = std::max(longest, line.size());
+    }
+    printf("%s: %zu bytes, %zu lines, longest %zu bytes\n", path, session.size(), lines.size(), longest);
+
+    int failures = fuzz(session);
+    printf("fuzz: %d rounds, %d failures\n", FUZZ_ROUNDS, failures);
+
+    throughput(session);
+
+    return failures ? 1 : 0;
+}
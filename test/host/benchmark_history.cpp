@@ -0,0 +1,321 @@
+// Host benchmark of the history export with and without the downsampled
+// tiers. Three days of shares are pushed into History so the raw ring wraps,
+// then the chart ranges are exported like GET /api/system/info does, once
+// with all raw samples and once with a point budget. The size of the JSON
+// and the time the export takes are compared, the exports don't block
+// pushShare but a long one is more likely to be cut short by the writer. The binary export of
+// GET /api/history/binary is encoded chunk by chunk the same way, decoded and
+// polled with its cursor.
+//
+//   make -C test/host benchmark_history && ./test/host/benchmark_history [dump.bin]
+//
+// The binary export of the whole ring is written to dump.bin if given, for
+// python scripts/history_client.py --file dump.bin
+
+#include <chrono>
+#include <math.h>
+#include <random>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <vector>
+
+#include "ArduinoJson.h"
+#include "esp_timer.h"
+#include "history.h"
+
+#define DAY_MS (86400 * 1000ULL)
+#define HOUR_MS (3600 * 1000ULL)
+#define MEAN_SHARE_INTERVAL_MS 1500.0
+#define POOL_DIFF 1000
+#define NUM_ASICS 4
+#define POINT_BUDGET 600
+#define CHUNK_RECORDS 256 // like GET_history_binary
+
+static int failures = 0;
+
+#define CHECK(cond)                                                                                                            \
+    do {                                                                                                                       \
+        if (!(cond)) {                                                                                                         \
+            printf("FAIL %s:%d: %s\n", __FILE__, __LINE__, #cond);                                                            \
+            failures++;                                                                                                        \
+        }                                                                                                                      \
+    } while (0)
+
+static uint64_t now_us()
+{
+    return std::chrono::duration_cast<std::chrono::microseconds>(std::chrono::steady_clock::now().time_since_epoch())
+        .count();
+}
+
+static uint64_t now_ms()
+{
+    return esp_timer_get_time() / 1000ULL;
+}
+
+struct Export {
+    int points;
+    size_t json_bytes;
+    uint64_t us;
+    int resolution;
+};
+
+static Export export_range(History *history, uint64_t range_ms, int max_points)
+{
+    JsonDocument doc;
+    JsonObject json_history = doc["history"].to<JsonObject>();
+
+    // the wall clock of the browser is the host clock here
+    uint64_t current = now_ms();
+    uint64_t start = now_us();
+    history->exportHistoryData(json_history, current - range_ms, current, current, max_points);
+
+    Export result;
+    result.us = now_us() - start;
+    result.points = json_history["timestamps"].size();
+    result.json_bytes = measureJson(doc);
+    result.resolution = json_history["resolution"] | -1;
+    return result;
+}
+
+static void print_export(const char *range, int max_points, const Export *e)
+{
+    printf("%-3s points=%-4d %6d values resolution %7d ms %8zu bytes JSON, export %6llu us\n", range, max_points, e->points,
+           e->resolution, e->json_bytes, (unsigned long long) e->us);
+}
+
+struct Binary {
+    std::vector<uint8_t> data;
+    uint64_t us;
+    uint64_t max_chunk_us; // longest chunk
+};
+
+// like GET_history_binary, the chunks are appended instead of sent
+static Binary export_binary(History *history, int since, int limit)
+{
+    Binary result;
+    result.max_chunk_us = 0;
+    uint64_t start = now_us();
+
+    history_binary_header header;
+    int count = history->exportBinaryHeader(&header, since, limit, 0);
+    result.data.insert(result.data.end(), (uint8_t *) &header, (uint8_t *) &header + sizeof(header));
+
+    history_record records[CHUNK_RECORDS];
+    uint64_t timestamp = 0;
+    for (int index = header.first; index < (int) header.first + count;) {
+        int max = (int) header.first + count - index;
+        uint64_t chunk_start = now_us();
+        int num = history->exportRecords(records, index, (max > CHUNK_RECORDS) ? CHUNK_RECORDS : max, &timestamp);
+        uint64_t chunk_us = now_us() - chunk_start;
+        if (chunk_us > result.max_chunk_us) {
+            result.max_chunk_us = chunk_us;
+        }
+        if (num <= 0) {
+            break;
+        }
+        result.data.insert(result.data.end(), (uint8_t *) records, (uint8_t *) (records + num));
+        index += num;
+    }
+
+    result.us = now_us() - start;
+    return result;
+}
+
+// checks the records against the raw samples, returns the next cursor
+static int check_binary(History *history, const Binary *binary)
+{
+    history_binary_header header;
+    memcpy(&header, binary->data.data(), sizeof(header));
+    CHECK(header.magic == HISTORY_BINARY_MAGIC && header.version == HISTORY_BINARY_VERSION);
+    CHECK(header.recordSize == sizeof(history_record));
+    CHECK(binary->data.size() == sizeof(header) + header.count * sizeof(history_record));
+
+    const history_record *records = (const history_record *) (binary->data.data() + sizeof(header));
+    uint64_t timestamp = header.timestamp;
+    int errors = 0;
+    for (uint32_t i = 0; i < header.count; i++) {
+        int index = header.first + i;
+        timestamp += records[i].delta;
+        if (timestamp != history->getTimestampSample(index) ||
+            records[i].hashrate10m != (uint32_t) (history->getHashrate10mSample(index) * 100.0) ||
+            records[i].hashrate1h != (uint32_t) (history->getHashrate1hSample(index) * 100.0) ||
+            records[i].hashrate1d != (uint32_t) (history->getHashrate1dSample(index) * 100.0)) {
+            errors++;
+        }
+    }
+    CHECK(errors == 0);
+    return header.first + header.count;
+}
+
+int main(int argc, char **argv)
+{
+    History history;
+    if (!history.init(NUM_ASICS)) {
+        printf("init failed\n");
+        return 1;
+    }
+
+    // a month of uptime so the first shares have positive timestamps
+    esp_timer_host_offset_us = 30 * DAY_MS * 1000;
+    uint64_t first_ms = now_ms();
+
+    std::mt19937 rng(1);
+    std::exponential_distribution<double> interval(1.0 / MEAN_SHARE_INTERVAL_MS);
+
+    int shares = 0;
+    uint64_t push_us = 0;
+    uint64_t push_max_us = 0;
+    while (now_ms() - first_ms < 3 * DAY_MS) {
+        esp_timer_host_offset_us += (int64_t) (1.0 + interval(rng) * 1000.0);
+        uint64_t start = now_us();
+        history.pushShare(POOL_DIFF, now_ms(), shares % NUM_ASICS);
+        uint64_t us = now_us() - start;
+        push_us += us;
+        if (us > push_max_us) {
+            push_max_us = us;
+        }
+        shares++;
+    }
+    printf("%d shares in 3 days, %d raw samples kept, pushShare avg %.2f us max %llu us\n", shares,
+           shares < HISTORY_MAX_SAMPLES ? shares : HISTORY_MAX_SAMPLES, (double) push_us / shares,
+           (unsigned long long) push_max_us);
+
+    Export raw_1h = export_range(&history, HOUR_MS, 0);
+    Export tier_1h = export_range(&history, HOUR_MS, POINT_BUDGET);
+    Export raw_1d = export_range(&history, DAY_MS, 0);
+    Export tier_1d = export_range(&history, DAY_MS, POINT_BUDGET);
+    Export tier_3d = export_range(&history, 3 * DAY_MS, POINT_BUDGET);
+    Export small_3d = export_range(&history, 3 * DAY_MS, 50);
+    print_export("1h", 0, &raw_1h);
+    print_export("1h", POINT_BUDGET, &tier_1h);
+    print_export("1d", 0, &raw_1d);
+    print_export("1d", POINT_BUDGET, &tier_1d);
+    print_export("3d", POINT_BUDGET, &tier_3d);
+    print_export("3d", 50, &small_3d);
+
+    // the finest tier that fits the budget
+    CHECK(raw_1h.resolution == 0 && raw_1h.points > POINT_BUDGET);
+    CHECK(tier_1h.resolution == 60000 && tier_1h.points <= 61);
+    CHECK(tier_1d.resolution == 600000 && tier_1d.points <= 145);
+    CHECK(tier_3d.resolution == 600000 && tier_3d.points <= 433);
+    // nothing fits, the coarsest tier cut to the latest buckets
+    CHECK(small_3d.resolution == 3600000 && small_3d.points == 50);
+    CHECK(tier_1d.json_bytes * 20 < raw_1d.json_bytes);
+
+    // a bucket holds the average, min and max of its raw samples
+    {
+        JsonDocument doc;
+        JsonObject json_history = doc["history"].to<JsonObject>();
+        uint64_t current = now_ms();
+        history.exportHistoryData(json_history, current - HOUR_MS, current, current, POINT_BUDGET);
+        JsonArray timestamps = json_history["timestamps"];
+        int64_t base = (int64_t) json_history["timestampBase"].as<uint64_t>();
+        // the second to last bucket is complete
+        int b = timestamps.size() - 2;
+        int64_t bucket_end = timestamps[b].as<int64_t>() + base;
+        int64_t bucket_start = bucket_end - bucket_end % 60000;
+
+        double sum = 0;
+        float min = INFINITY, max = -INFINITY;
+        int n = 0;
+        for (int i = history.getNumSamples() - 1; i >= 0; i--) {
+            int64_t ts = history.getTimestampSample(i);
+            if (ts < bucket_start) {
+                break;
+            }
+            if (ts > bucket_end) {
+                continue;
+            }
+            float hr = history.getHashrate10mSample(i);
+            sum += hr;
+            min = fminf(min, hr);
+            max = fmaxf(max, hr);
+            n++;
+        }
+        CHECK(n > 0);
+        CHECK(abs(json_history["hashrate_10m"][b].as<int>() - (int) ((float) (sum / n) * 100.0)) <= 1);
+        CHECK(json_history["hashrate_10m_min"][b].as<int>() == (int) (min * 100.0));
+        CHECK(json_history["hashrate_10m_max"][b].as<int>() == (int) (max * 100.0));
+    }
+
+    // binary export of the last day and of the whole ring
+    int day_index = history.searchNearestTimestamp(now_ms() - DAY_MS);
+    Binary day = export_binary(&history, day_index, 0);
+    Binary all = export_binary(&history, 0, 0);
+    int day_samples = (day.data.size() - sizeof(history_binary_header)) / sizeof(history_record);
+    int all_samples = (all.data.size() - sizeof(history_binary_header)) / sizeof(history_record);
+    printf("1d  binary     %6d values %8zu bytes, %.1f bytes/value vs %.1f JSON, %6llu us, max %4llu us per chunk\n",
+           day_samples, day.data.size(), (double) day.data.size() / day_samples, (double) raw_1d.json_bytes / raw_1d.points,
+           (unsigned long long) day.us, (unsigned long long) day.max_chunk_us);
+    printf("all binary     %6d values %8zu bytes, %6llu us, max %4llu us per chunk\n", all_samples, all.data.size(),
+           (unsigned long long) all.us, (unsigned long long) all.max_chunk_us);
+    CHECK(abs(day_samples - raw_1d.points) <= 1);
+    // the oldest samples are left out, they would be overwritten while sending
+    CHECK(all_samples == HISTORY_MAX_SAMPLES - HISTORY_EXPORT_MARGIN);
+    check_binary(&history, &day);
+    int cursor = check_binary(&history, &all);
+    CHECK(cursor == history.getNumSamples());
+
+    if (argc > 1) {
+        FILE *f = fopen(argv[1], "wb");
+        if (!f || fwrite(all.data.data(), 1, all.data.size(), f) != all.data.size()) {
+            printf("can't write %s\n", argv[1]);
+            failures++;
+        }
+        if (f) {
+            fclose(f);
+        }
+    }
+
+    // polling with the cursor only returns the new samples
+    {
+        Binary none = export_binary(&history, cursor, 0);
+        CHECK(none.data.size() == sizeof(history_binary_header));
+        CHECK(check_binary(&history, &none) == cursor);
+
+        for (int i = 0; i < 10; i++) {
+            esp_timer_host_offset_us += (int64_t) (1.0 + interval(rng) * 1000.0);
+            history.pushShare(POOL_DIFF, now_ms(), i % NUM_ASICS);
+        }
+        Binary limited = export_binary(&history, cursor, 4);
+        CHECK(check_binary(&history, &limited) == cursor + 4);
+        Binary rest = export_binary(&history, cursor + 4, 0);
+        CHECK(check_binary(&history, &rest) == cursor + 10);
+
+        // a cursor from before a reboot or an overwritten one starts at the oldest sample
+        history_binary_header header;
+        int oldest = history.getNumSamples() - HISTORY_MAX_SAMPLES + HISTORY_EXPORT_MARGIN;
+        history.exportBinaryHeader(&header, cursor + 1000, 0, 0);
+        CHECK((int) header.first == oldest);
+        history.exportBinaryHeader(&header, 5, 0, 0);
+        CHECK((int) header.first == oldest);
+
+        // a cursor that is still in range after a reboot is told apart by the boot id
+        history.exportBinaryHeader(&header, cursor, 0, 0);
+        uint32_t boot_id = header.bootId;
+        CHECK(boot_id != 0);
+        history.exportBinaryHeader(&header, cursor, 0, 0, boot_id);
+        CHECK((int) header.first == cursor && header.bootId == boot_id);
+        history.exportBinaryHeader(&header, cursor, 0, 0, boot_id + 1);
+        CHECK((int) header.first == oldest && header.bootId == boot_id);
+
+        // a negative cursor counts back from the newest sample
+        int num_samples = history.getNumSamples();
+        CHECK(history.exportBinaryHeader(&header, -10, 0, 0) == 10 && (int) header.first == num_samples - 10);
+        history.exportBinaryHeader(&header, -(HISTORY_MAX_SAMPLES + 1), 0, 0);
+        CHECK((int) header.first == oldest);
+
+        // samples overwritten between two chunks abort the export
+        history_record records[1];
+        uint64_t timestamp = 0;
+        CHECK(history.exportRecords(records, oldest - HISTORY_EXPORT_MARGIN - 1, 1, &timestamp) == -1);
+    }
+
+    if (failures) {
+        printf("%d failures\n", failures);
+        return 1;
+    }
+    printf("ok\n");
+    return 0;
+}
@@ -0,0 +1,212 @@
+// Host benchmark of the moving averages in History. Four rings worth of shares
+// from 12 ASICs and two pools are pushed and the cost per share is measured
+// while the ring fills up to its 128k samples and after it wrapped, with and
+// without the per ASIC and per pool breakdowns. The shares come in fast
+// enough that the ring doesn't reach back a day, so the longest windows are
+// cut short by the ring. Every window and breakdown is checked against the
+// sums over a plain copy of the shares, which also gives the cost of
+// rescanning the windows for every share.
+//
+//   make -C test/host benchmark_history_avg && ./test/host/benchmark_history_avg
+
+#include <algorithm>
+#include <chrono>
+#include <math.h>
+#include <random>
+#include <stdio.h>
+#include <stdlib.h>
+#include <vector>
+
+#include "history.h"
+
+#define NUM_SHARES (4 * HISTORY_MAX_SAMPLES)
+#define FIRST_TIMESTAMP 1000000ULL
+#define MEAN_SHARE_INTERVAL_MS 250.0
+#define NUM_ASICS 12
+#define BLOCK_SHARES 4096
+#define CHECK_EVERY 8191
+
+static int failures = 0;
+
+#define CHECK(cond)                                                                                                            \
+    do {                                                                                                                       \
+        if (!(cond)) {                                                                                                         \
+            printf("FAIL %s:%d: %s\n", __FILE__, __LINE__, #cond);                                                            \
+            failures++;                                                                                                        \
+        }                                                                                                                      \
+    } while (0)
+
+static uint64_t now_ns()
+{
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now().time_since_epoch())
+        .count();
+}
+
+struct Share {
+    uint32_t diff;
+    uint64_t timestamp;
+    int asic;
+    int pool;
+};
+
+static std::vector<Share> shares;
+
+static void make_shares()
+{
+    std::mt19937 rng(25);
+    std::exponential_distribution<double> interval(1.0 / MEAN_SHARE_INTERVAL_MS);
+    std::uniform_int_distribution<uint32_t> diff(256, 65536);
+    // one ASIC is slower than the others
+    std::discrete_distribution<int> asic({4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 4, 1});
+
+    uint64_t timestamp = FIRST_TIMESTAMP;
+    for (int i = 0; i < NUM_SHARES; i++) {
+        timestamp += 1 + (uint64_t) interval(rng);
+        // on the fallback pool for a while every 100k shares
+        int pool = (i % 100000) >= 80000;
+        shares.push_back({diff(rng), timestamp, asic(rng), pool});
+    }
+}
+
+// the expected averages of a window after the share at last, without the ring
+struct Window {
+    double gh;
+    double asics[HISTORY_MAX_ASICS];
+    double pools[HISTORY_NUM_POOLS];
+};
+
+static Window brute_force(int last, uint64_t timespan)
+{
+    // the window starts at the last sample at least timespan old, or the
+    // oldest one still in the ring
+    int oldest = (last + 1 > HISTORY_MAX_SAMPLES) ? last + 1 - HISTORY_MAX_SAMPLES : 0;
+    int first = last;
+    while (first > oldest && shares[last].timestamp - shares[first].timestamp < timespan) {
+        first--;
+    }
+    bool truncated = oldest > 0 && first == oldest && shares[last].timestamp - shares[first].timestamp < timespan;
+
+    uint64_t sum = 0;
+    uint64_t asics[HISTORY_MAX_ASICS] = {};
+    uint64_t pools[HISTORY_NUM_POOLS] = {};
+    for (int i = first + 1; i <= last; i++) {
+        sum += shares[i].diff;
+        asics[shares[i].asic] += shares[i].diff;
+        pools[shares[i].pool] += shares[i].diff;
+    }
+
+    uint64_t duration = shares[last].timestamp - shares[first].timestamp;
+    duration = (duration < timespan && !truncated) ? timespan : duration;
+    double seconds = (double) duration / 1000.0;
+
+    Window w;
+    w.gh = (double) sum * 4294967296.0 / seconds / 1.0e9;
+    for (int i = 0; i < HISTORY_MAX_ASICS; i++) {
+        w.asics[i] = (double) asics[i] * 4294967296.0 / seconds / 1.0e9;
+    }
+    for (int i = 0; i < HISTORY_NUM_POOLS; i++) {
+        w.pools[i] = (double) pools[i] * 4294967296.0 / seconds / 1.0e9;
+    }
+    return w;
+}
+
+static bool matches(double a, double b)
+{
+    return fabs(a - b) <= 1.0e-5 * fmax(fabs(b), 1.0);
+}
+
+// compares all windows after the share at last, returns the ns the brute force took
+static uint64_t verify(History *history, int last, bool breakdowns)
+{
+    history_snapshot snapshot;
+    history->getSnapshot(&snapshot);
+    CHECK(snapshot.numSamples == last + 1);
+    CHECK(snapshot.numAsics == (breakdowns ? NUM_ASICS : 0));
+    CHECK(snapshot.numPools == (breakdowns ? HISTORY_NUM_POOLS : 0));
+
+    uint64_t start = now_ns();
+    int mismatches = 0;
+    for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+        Window expected = brute_force(last, HISTORY_WINDOWS[w].seconds * 1000ULL);
+        mismatches += !matches(snapshot.hashrate[w], expected.gh);
+        for (int i = 0; i < snapshot.numAsics; i++) {
+            mismatches += !matches(snapshot.asicHashrate[w][i], expected.asics[i]);
+        }
+        for (int i = 0; i < snapshot.numPools; i++) {
+            mismatches += !matches(snapshot.poolHashrate[w][i], expected.pools[i]);
+        }
+    }
+    uint64_t ns = now_ns() - start;
+
+    if (mismatches) {
+        printf("%d mismatches after share %d\n", mismatches, last);
+    }
+    CHECK(mismatches == 0);
+    CHECK(history->getCurrentHashrate1h() == snapshot.hashrate[HISTORY_WINDOW_1H]);
+    CHECK(history->getCurrentHashrate1d() == snapshot.hashrate[HISTORY_WINDOW_1D]);
+    return ns;
+}
+
+static void run(bool breakdowns)
+{
+    History *history = new History();
+    CHECK(history->init(NUM_ASICS, breakdowns));
+
+    // ns per share of every block
+    std::vector<double> blocks;
+    uint64_t brute_ns = 0;
+    int brute_checks = 0;
+    uint64_t block_ns = 0;
+    for (int i = 0; i < NUM_SHARES; i++) {
+        uint64_t start = now_ns();
+        history->pushShare(shares[i].diff, shares[i].timestamp, shares[i].asic, shares[i].pool);
+        block_ns += now_ns() - start;
+        if ((i + 1) % BLOCK_SHARES == 0) {
+            blocks.push_back((double) block_ns / BLOCK_SHARES);
+            block_ns = 0;
+        }
+        if (i % CHECK_EVERY == CHECK_EVERY - 1 || i == NUM_SHARES - 1) {
+            brute_ns += verify(history, i, breakdowns);
+            brute_checks++;
+        }
+    }
+    delete history;
+
+    // the median of the blocks up to a fill level, the first ones are
+    // disturbed by the page faults of the ring
+    auto median = [&](int from, int to) {
+        std::vector<double> range(blocks.begin() + from / BLOCK_SHARES, blocks.begin() + to / BLOCK_SHARES);
+        std::sort(range.begin(), range.end());
+        return range[range.size() / 2];
+    };
+    int full = HISTORY_MAX_SAMPLES;
+    double filling = median(full / 8, full / 4);
+    double at_full = median(full - full / 8, full);
+    double wrapped = median(3 * full, NUM_SHARES);
+
+    printf("%-13s %d windows: %6.0f ns/share at 16k-32k samples, %6.0f at 120k-128k, %6.0f wrapped at 384k-512k\n",
+           breakdowns ? "breakdowns" : "no breakdowns", HISTORY_NUM_WINDOWS, filling, at_full, wrapped);
+    printf("%-13s rescanning all windows: %.0f us per share\n", "", (double) brute_ns / brute_checks / 1000.0);
+
+    // constant per share, allowing for noise on a shared host
+    CHECK(at_full < 3.0 * filling);
+    CHECK(wrapped < 3.0 * filling);
+}
+
+int main()
+{
+    make_shares();
+    printf("%d shares over %.1f h, the ring keeps %.1f h\n", NUM_SHARES,
+           (double) (shares.back().timestamp - shares.front().timestamp) / 3600000.0,
+           (double) (shares.back().timestamp - shares[NUM_SHARES - HISTORY_MAX_SAMPLES].timestamp) / 3600000.0);
+
+    run(true);
+    run(false);
+
+    if (failures) {
+        printf("%d failures\n", failures);
+        return 1;
+    }
+    printf("ok\n");
+    return 0;
+}
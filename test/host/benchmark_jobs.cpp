@@ -0,0 +1,151 @@
+// Host benchmark of the job construction in create_jobs_task: the previous
+// hex based path (coinbase snprintf, hex2bin, full double SHA-256, merkle root
+// back to hex and sscanf) against the cached coinbase midstate. Both paths
+// must produce identical bm_jobs.
+//
+//   make -C test/host benchmark_jobs && ./test/host/benchmark_jobs
+
+#include <chrono>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include "mining.h"
+#include "utils.h"
+
+// coinbase and merkle branches of the self test (block 792980)
+static const char *COINBASE_1 = "01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff4b0389130cfab"
+                                "e6d6d5cbab26a2599e92916edec5657a94a0708ddb970f5c45b5d12905085617eff8e010000000000000031650707";
+static const char *EXTRANONCE_1 = "758de07b";
+static const int EXTRANONCE_2_LEN = 8;
+static const char *COINBASE_2 = "1cfd7038212f736c7573682f000000000379ad0c2a000000001976a9147c154ed1dc59609e3d26abb2df2ea3d587cd8c"
+                                "4188ac00000000000000002c6a4c2952534b424c4f434b3ae725d3994b811572c1f345deb98b56b465ef8e153ecbbd27"
+                                "fa37bf1b005161380000000000000000266a24aa21a9ed63b06a7946b190a3fda1d76165b25c9b883bcc6621b0407730"
+                                "50ee2a1bb18f1800000000";
+static const char *MERKLE_BRANCHES[] = {
+    "2b77d9e413e8121cd7a17ff46029591051d0922bd90b2b2a38811af1cb57a2b2", "5c8874cef00f3a233939516950e160949ef327891c9090467cead995441d22c5",
+    "2d91ff8e19ac5fa69a40081f26c5852d366d608b04d2efe0d5b65d111d0d8074", "0ae96f609ad2264112a0b2dfb65624bedbcea3b036a59c0173394bba3a74e887",
+    "e62172e63973d69574a82828aeb5711fc5ff97946db10fc7ec32830b24df7bde", "adb49456453aab49549a9eb46bb26787fb538e0a5f656992275194c04651ec97",
+    "a7bc56d04d2672a8683892d6c8d376c73d250a4871fdf6f57019bcc737d6d2c2", "d94eceb8182b4f418cd071e93ec2a8993a0898d4c93bc33d9302f60dbbd0ed10",
+    "5ad7788b8c66f8f50d332b88a80077ce10e54281ca472b4ed9bbbbcb6cf99083", "9f9d784b33df1b3ed3edb4211afc0dc1909af9758c6f8267e469f5148ed04809",
+    "48fd17affa76b23e6fb2257df30374da839d6cb264656a82e34b350722b05123", "c4f5ab01913fc186d550c1a28f3f3e9ffaca2016b961a6a751f8cca0089df924",
+    "cff737e1d00176dd6bbfa73071adbb370f227cfb5fba186562e4060fcec877e1",
+};
+
+#define NUM_JOBS 20000
+
+// the job construction before the midstate cache
+static void legacy_job(mining_notify *job, uint32_t extranonce_2, bm_job *out)
+{
+    char extranonce_2_str[EXTRANONCE_2_LEN * 2 + 1];
+    snprintf(extranonce_2_str, sizeof(extranonce_2_str), "%0*lx", EXTRANONCE_2_LEN * 2, (unsigned long) extranonce_2);
+
+    int coinbase_tx_len = strlen(job->coinbase_1) + strlen(EXTRANONCE_1) + strlen(extranonce_2_str) + strlen(job->coinbase_2);
+    char coinbase_tx[coinbase_tx_len + 1];
+    snprintf(coinbase_tx, sizeof(coinbase_tx), "%s%s%s%s", job->coinbase_1, EXTRANONCE_1, extranonce_2_str, job->coinbase_2);
+
+    size_t coinbase_tx_bin_len = strlen(coinbase_tx) / 2;
+    uint8_t coinbase_tx_bin[coinbase_tx_bin_len];
+    hex2bin(coinbase_tx, coinbase_tx_bin, coinbase_tx_bin_len);
+
+    uint8_t both_merkles[64];
+    uint8_t new_root[32];
+    double_sha256_bin(coinbase_tx_bin, coinbase_tx_bin_len, new_root);
+    memcpy(both_merkles, new_root, 32);
+    for (size_t i = 0; i < job->n_merkle_branches; i++) {
+        memcpy(both_merkles + 32, job->_merkle_branches[i], 32);
+        double_sha256_bin(both_merkles, 64, new_root);
+        memcpy(both_merkles, new_root, 32);
+    }
+    char merkle_root[65];
+    bin2hex(both_merkles, 32, merkle_root, 65);
+
+    out->version = job->version;
+    out->starting_nonce = 0;
+    out->target = job->target;
+    out->ntime = job->ntime;
+    out->pool_diff = job->difficulty;
+    hex2bin(merkle_root, out->merkle_root, 32);
+    swap_endian_words(merkle_root, out->merkle_root_be);
+    reverse_bytes(out->merkle_root_be, 32);
+    swap_endian_words_bin(job->_prev_block_hash, out->prev_block_hash, HASH_SIZE);
+    memcpy(out->prev_block_hash_be, job->_prev_block_hash, HASH_SIZE);
+    reverse_bytes(out->prev_block_hash_be, 32);
+    strcpy(out->extranonce2, extranonce_2_str);
+}
+
+static void midstate_job(mining_notify *job, const coinbase_midstate *cb, uint32_t extranonce_2, bm_job *out)
+{
+    uint8_t extranonce_2_bin[MAX_EXTRANONCE_2_LEN];
+    extranonce_2_to_bin(extranonce_2, extranonce_2_bin, EXTRANONCE_2_LEN);
+
+    uint8_t merkle_root[32];
+    calculate_merkle_root_midstate(cb, extranonce_2_bin, merkle_root);
+    construct_bm_job(job, merkle_root, 0, out);
+
+    bin2hex(extranonce_2_bin, EXTRANONCE_2_LEN, out->extranonce2, sizeof(out->extranonce2));
+}
+
+static bool same_job(const bm_job *a, const bm_job *b)
+{
+    return !memcmp(a->merkle_root, b->merkle_root, 32) && !memcmp(a->merkle_root_be, b->merkle_root_be, 32) &&
+           !memcmp(a->prev_block_hash, b->prev_block_hash, 32) && !memcmp(a->prev_block_hash_be, b->prev_block_hash_be, 32) &&
+           a->version == b->version && a->ntime == b->ntime && a->target == b->target && !strcmp(a->extranonce2, b->extranonce2);
+}
+
+static double elapsed_us(std::chrono::steady_clock::time_point start)
+{
+    return std::chrono::duration<double, std::micro>(std::chrono::steady_clock::now() - start).count();
+}
+
+int main()
+{
+    mining_notify job = {};
+    job.coinbase_1 = (char *) COINBASE_1;
+    job.coinbase_2 = (char *) COINBASE_2;
+    hex2bin("0c859545a3498373a57452fac22eb7113df2a465000543520000000000000000", job._prev_block_hash, 32);
+    job.n_merkle_branches = sizeof(MERKLE_BRANCHES) / sizeof(MERKLE_BRANCHES[0]);
+    for (size_t i = 0; i < job.n_merkle_branches; i++) {
+        hex2bin(MERKLE_BRANCHES[i], job._merkle_branches[i], 32);
+    }
+    job.version = 0x20000004;
+    job.target = 0x1705ae3a;
+    job.ntime = 0x647025b5;
+
+    static bm_job legacy[NUM_JOBS];
+    static bm_job midstate[NUM_JOBS];
+
+    auto start = std::chrono::steady_clock::now();
+    for (uint32_t i = 0; i < NUM_JOBS; i++) {
+        legacy_job(&job, i, &legacy[i]);
+    }
+    double legacy_us = elapsed_us(start);
+
+    start = std::chrono::steady_clock::now();
+    coinbase_midstate cb = {};
+    if (!coinbase_midstate_init(&cb, &job, EXTRANONCE_1, EXTRANONCE_2_LEN)) {
+        printf("coinbase_midstate_init failed\n");
+        return 1;
+    }
+    double init_us = elapsed_us(start);
+
+    start = std::chrono::steady_clock::now();
+    for (uint32_t i = 0; i < NUM_JOBS; i++) {
+        midstate_job(&job, &cb, i, &midstate[i]);
+    }
+    double midstate_us = elapsed_us(start);
+    coinbase_midstate_free(&cb);
+
+    int mismatches = 0;
+    for (int i = 0; i < NUM_JOBS; i++) {
+        mismatches += !same_job(&legacy[i], &midstate[i]);
+    }
+
+    size_t coinbase_len = (strlen(COINBASE_1) + strlen(EXTRANONCE_1) + strlen(COINBASE_2)) / 2 + EXTRANONCE_2_LEN;
+    printf("%d jobs, coinbase %zu bytes, %zu merkle branches\n", NUM_JOBS, coinbase_len, job.n_merkle_branches);
+    printf("hex path:      %8.2f us/job\n", legacy_us / NUM_JOBS);
+    printf("midstate path: %8.2f us/job (+ %.1f us once per mining.notify)\n", midstate_us / NUM_JOBS, init_us);
+    printf("speedup:       %8.2fx, mismatches: %d\n", legacy_us / midstate_us, mismatches);
+
+    return mismatches ? 1 : 0;
+}
@@ -0,0 +1,24 @@
+// esp_heap_caps.h for host builds: there is only one heap.
+#pragma once
+
+#include <stdlib.h>
+
+#define MALLOC_CAP_SPIRAM (1 << 10)
+#define MALLOC_CAP_INTERNAL (1 << 11)
+
+static inline void *heap_caps_malloc(size_t size, unsigned int caps)
+{
+    (void) caps;
+    return malloc(size);
+}
+
+static inline void *heap_caps_realloc(void *ptr, size_t size, unsigned int caps)
+{
+    (void) caps;
+    return realloc(ptr, size);
+}
+
+static inline void heap_caps_free(void *ptr)
+{
+    free(ptr);
+}
@@ -0,0 +1,15 @@
+// esp_log.h for host builds: errors and warnings go to stderr, the rest is dropped.
+#pragma once
+
+#include <stdio.h>
+
+#define ESP_LOGE(tag, fmt, ...) fprintf(stderr, "E %s: " fmt "\n", tag, ##__VA_ARGS__)
+#define ESP_LOGW(tag, fmt, ...) fprintf(stderr, "W %s: " fmt "\n", tag, ##__VA_ARGS__)
+// the dropped arguments still count as used
+static inline void esp_log_host_drop(const char *tag, ...)
+{
+    (void) tag;
+}
+
+#define ESP_LOGI(tag, fmt, ...) esp_log_host_drop(tag, ##__VA_ARGS__)
+#define ESP_LOGD(tag, fmt, ...) esp_log_host_drop(tag, ##__VA_ARGS__)
@@ -0,0 +1,145 @@
+// esp_partition.h for host builds: one partition in RAM that behaves like NOR
+// flash, erasing sets a sector to 0xff and writing can only clear bits. Tests
+// cut the power after a number of programmed or erased bytes: the operation
+// in progress is left half done and every following one fails until
+// esp_partition_host_power_on().
+#pragma once
+
+#include <stdint.h>
+#include <string.h>
+#include <vector>
+
+#include "esp_err.h"
+
+#define SPI_FLASH_SEC_SIZE 4096
+
+typedef enum {
+    ESP_PARTITION_TYPE_APP = 0x00,
+    ESP_PARTITION_TYPE_DATA = 0x01,
+    ESP_PARTITION_TYPE_ANY = 0xff,
+} esp_partition_type_t;
+
+typedef enum {
+    ESP_PARTITION_SUBTYPE_DATA_UNDEFINED = 0x06,
+    ESP_PARTITION_SUBTYPE_ANY = 0xff,
+} esp_partition_subtype_t;
+
+typedef struct
+{
+    esp_partition_type_t type;
+    esp_partition_subtype_t subtype;
+    uint32_t address;
+    uint32_t size;
+    uint32_t erase_size;
+    char label[17];
+    bool encrypted;
+    bool readonly;
+} esp_partition_t;
+
+struct esp_partition_host_flash {
+    esp_partition_t partition;
+    std::vector<uint8_t> data;
+    std::vector<uint32_t> erases; // per sector
+    int64_t budget = -1;          // bytes until the power is cut, -1 for never
+    bool off = false;
+    uint64_t bytesRead = 0;
+    uint64_t bytesWritten = 0;
+};
+
+inline esp_partition_host_flash esp_partition_host;
+
+// a new data partition, fill 0xff is erased flash
+static inline void esp_partition_host_create(const char *label, uint32_t size, uint8_t fill = 0xff)
+{
+    esp_partition_host = esp_partition_host_flash();
+    esp_partition_host.partition.type = ESP_PARTITION_TYPE_DATA;
+    esp_partition_host.partition.subtype = ESP_PARTITION_SUBTYPE_DATA_UNDEFINED;
+    esp_partition_host.partition.size = size;
+    esp_partition_host.partition.erase_size = SPI_FLASH_SEC_SIZE;
+    strncpy(esp_partition_host.partition.label, label, sizeof(esp_partition_host.partition.label) - 1);
+    esp_partition_host.data.assign(size, fill);
+    esp_partition_host.erases.assign(size / SPI_FLASH_SEC_SIZE, 0);
+}
+
+static inline void esp_partition_host_cut_power_after(int64_t bytes)
+{
+    esp_partition_host.budget = bytes;
+}
+
+static inline void esp_partition_host_power_on()
+{
+    esp_partition_host.budget = -1;
+    esp_partition_host.off = false;
+}
+
+// bytes of the operation that still get done before the power is cut
+static inline size_t esp_partition_host_consume(size_t size)
+{
+    if (esp_partition_host.budget < 0) {
+        return size;
+    }
+    if ((int64_t) size <= esp_partition_host.budget) {
+        esp_partition_host.budget -= size;
+        return size;
+    }
+    size = (size_t) esp_partition_host.budget;
+    esp_partition_host.budget = 0;
+    esp_partition_host.off = true;
+    return size;
+}
+
+static inline const esp_partition_t *esp_partition_find_first(esp_partition_type_t type, esp_partition_subtype_t subtype,
+                                                              const char *label)
+{
+    const esp_partition_t *p = &esp_partition_host.partition;
+    if (!p->size || (type != ESP_PARTITION_TYPE_ANY && type != p->type) ||
+        (subtype != ESP_PARTITION_SUBTYPE_ANY && subtype != p->subtype) || (label && strcmp(label, p->label))) {
+        return NULL;
+    }
+    return p;
+}
+
+static inline esp_err_t esp_partition_read(const esp_partition_t *partition, size_t src_offset, void *dst, size_t size)
+{
+    if (src_offset + size > partition->size) {
+        return ESP_ERR_INVALID_SIZE;
+    }
+    memcpy(dst, &esp_partition_host.data[src_offset], size);
+    esp_partition_host.bytesRead += size;
+    return ESP_OK;
+}
+
+static inline esp_err_t esp_partition_write(const esp_partition_t *partition, size_t dst_offset, const void *src, size_t size)
+{
+    if (dst_offset + size > partition->size) {
+        return ESP_ERR_INVALID_SIZE;
+    }
+    if (esp_partition_host.off) {
+        return ESP_FAIL;
+    }
+    size_t done = esp_partition_host_consume(size);
+    for (size_t i = 0; i < done; i++) {
+        esp_partition_host.data[dst_offset + i] &= ((const uint8_t *) src)[i];
+    }
+    esp_partition_host.bytesWritten += done;
+    return (done == size) ? ESP_OK : ESP_FAIL;
+}
+
+static inline esp_err_t esp_partition_erase_range(const esp_partition_t *partition, size_t offset, size_t size)
+{
+    if (offset % SPI_FLASH_SEC_SIZE || size % SPI_FLASH_SEC_SIZE) {
+        return ESP_ERR_INVALID_ARG;
+    }
+    if (offset + size > partition->size) {
+        return ESP_ERR_INVALID_SIZE;
+    }
+    if (esp_partition_host.off) {
+        return ESP_FAIL;
+    }
+    for (size_t sector = offset / SPI_FLASH_SEC_SIZE; sector < (offset + size) / SPI_FLASH_SEC_SIZE; sector++) {
+        esp_partition_host.erases[sector]++;
+    }
+    size_t done = esp_partition_host_consume(size);
+    memset(&esp_partition_host.data[offset], 0xff, done);
+    return (done == size) ? ESP_OK : ESP_FAIL;
+}
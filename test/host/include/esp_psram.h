@@ -0,0 +1,2 @@
+// esp_psram.h for host builds: PSRAM is the heap, see esp_heap_caps.h.
+#pragma once
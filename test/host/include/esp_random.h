@@ -0,0 +1,11 @@
+// esp_random.h for host builds: the hardware RNG is the system's.
+#pragma once
+
+#include <random>
+#include <stdint.h>
+
+static inline uint32_t esp_random(void)
+{
+    static std::random_device device;
+    return device();
+}
@@ -0,0 +1,15 @@
+// esp_timer.h for host builds: microseconds of the monotonic clock plus an
+// offset tests can set to pretend a long uptime.
+#pragma once
+
+#include <stdint.h>
+#include <time.h>
+
+inline int64_t esp_timer_host_offset_us = 0;
+
+static inline int64_t esp_timer_get_time(void)
+{
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (int64_t) ts.tv_sec * 1000000 + ts.tv_nsec / 1000 + esp_timer_host_offset_us;
+}
@@ -0,0 +1,24 @@
+// esp_wifi.h for host builds: the station is always connected.
+#pragma once
+
+#include <stdint.h>
+
+#include "esp_err.h"
+
+typedef struct
+{
+    uint8_t bssid[6];
+    uint8_t ssid[33];
+    int8_t rssi;
+} wifi_ap_record_t;
+
+static inline esp_err_t esp_wifi_sta_get_ap_info(wifi_ap_record_t *ap_info)
+{
+    (void) ap_info;
+    return ESP_OK;
+}
+
+static inline esp_err_t esp_wifi_connect(void)
+{
+    return ESP_OK;
+}
@@ -0,0 +1,20 @@
+// freertos/FreeRTOS.h for host builds: tasks are threads and timers are
+// threads waiting for their deadline. Delays, notify timeouts and timer
+// periods run freertos_host_speedup times faster than on the device, so
+// tests of code with long waits don't take as long.
+#pragma once
+
+#include <stdint.h>
+
+typedef uint32_t TickType_t;
+typedef int BaseType_t;
+typedef unsigned int UBaseType_t;
+
+#define pdTRUE 1
+#define pdFALSE 0
+#define pdPASS pdTRUE
+#define portTICK_PERIOD_MS 1
+#define portMAX_DELAY 0xffffffffUL
+#define pdMS_TO_TICKS(ms) ((TickType_t) (ms))
+
+inline int freertos_host_speedup = 1;
@@ -0,0 +1,76 @@
+// freertos/task.h for host builds, see FreeRTOS.h
+#pragma once
+
+#include <chrono>
+#include <condition_variable>
+#include <mutex>
+#include <pthread.h>
+#include <thread>
+
+#include "freertos/FreeRTOS.h"
+
+typedef void (*TaskFunction_t)(void *);
+
+struct freertos_host_task {
+    std::mutex mutex;
+    std::condition_variable cv;
+    uint32_t notifications = 0;
+};
+
+typedef freertos_host_task *TaskHandle_t;
+
+inline thread_local freertos_host_task *freertos_host_current_task = nullptr;
+
+static inline std::chrono::microseconds freertos_host_duration(TickType_t ticks)
+{
+    return std::chrono::microseconds((int64_t) ticks * portTICK_PERIOD_MS * 1000 / freertos_host_speedup);
+}
+
+static inline BaseType_t xTaskCreate(TaskFunction_t function, const char *name, uint32_t stack_depth, void *parameters,
+                                     UBaseType_t priority, TaskHandle_t *handle)
+{
+    (void) name;
+    (void) stack_depth;
+    (void) priority;
+    freertos_host_task *task = new freertos_host_task();
+    if (handle) {
+        *handle = task;
+    }
+    std::thread([=]() {
+        freertos_host_current_task = task;
+        function(parameters);
+    }).detach();
+    return pdPASS;
+}
+
+// only a task deleting itself
+static inline void vTaskDelete(TaskHandle_t task)
+{
+    (void) task;
+    pthread_exit(nullptr);
+}
+
+static inline void vTaskDelay(TickType_t ticks)
+{
+    std::this_thread::sleep_for(freertos_host_duration(ticks));
+}
+
+static inline BaseType_t xTaskNotifyGive(TaskHandle_t task)
+{
+    std::lock_guard<std::mutex> lock(task->mutex);
+    task->notifications++;
+    task->cv.notify_one();
+    return pdPASS;
+}
+
+static inline uint32_t ulTaskNotifyTake(BaseType_t clear_on_exit, TickType_t ticks)
+{
+    freertos_host_task *task = freertos_host_current_task;
+    std::unique_lock<std::mutex> lock(task->mutex);
+    task->cv.wait_for(lock, freertos_host_duration(ticks), [task]() { return task->notifications != 0; });
+    uint32_t notifications = task->notifications;
+    if (notifications) {
+        task->notifications = clear_on_exit ? 0 : notifications - 1;
+    }
+    return notifications;
+}
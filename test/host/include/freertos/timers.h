@@ -0,0 +1,81 @@
+// freertos/timers.h for host builds, see FreeRTOS.h. Every timer has its own
+// thread instead of the timer service task.
+#pragma once
+
+#include "freertos/task.h"
+
+struct freertos_host_timer;
+typedef freertos_host_timer *TimerHandle_t;
+typedef void (*TimerCallbackFunction_t)(TimerHandle_t);
+
+struct freertos_host_timer {
+    std::mutex mutex;
+    std::condition_variable cv;
+    bool active = false;
+    bool autoReload;
+    TickType_t period;
+    std::chrono::steady_clock::time_point deadline;
+    void *id;
+    TimerCallbackFunction_t callback;
+};
+
+static inline TimerHandle_t xTimerCreate(const char *name, TickType_t period, UBaseType_t auto_reload, void *id,
+                                         TimerCallbackFunction_t callback)
+{
+    (void) name;
+    freertos_host_timer *timer = new freertos_host_timer();
+    timer->autoReload = auto_reload;
+    timer->period = period;
+    timer->id = id;
+    timer->callback = callback;
+    std::thread([timer]() {
+        std::unique_lock<std::mutex> lock(timer->mutex);
+        while (true) {
+            if (!timer->active) {
+                timer->cv.wait(lock);
+                continue;
+            }
+            if (timer->cv.wait_until(lock, timer->deadline) == std::cv_status::no_timeout ||
+                std::chrono::steady_clock::now() < timer->deadline || !timer->active) {
+                continue;
+            }
+            // the callback may start or stop the timer
+            timer->active = timer->autoReload;
+            timer->deadline += freertos_host_duration(timer->period);
+            lock.unlock();
+            timer->callback(timer);
+            lock.lock();
+        }
+    }).detach();
+    return timer;
+}
+
+static inline void *pvTimerGetTimerID(TimerHandle_t timer)
+{
+    return timer->id;
+}
+
+static inline BaseType_t xTimerIsTimerActive(TimerHandle_t timer)
+{
+    std::lock_guard<std::mutex> lock(timer->mutex);
+    return timer->active ? pdTRUE : pdFALSE;
+}
+
+static inline BaseType_t xTimerStart(TimerHandle_t timer, TickType_t ticks_to_wait)
+{
+    (void) ticks_to_wait;
+    std::lock_guard<std::mutex> lock(timer->mutex);
+    timer->active = true;
+    timer->deadline = std::chrono::steady_clock::now() + freertos_host_duration(timer->period);
+    timer->cv.notify_one();
+    return pdPASS;
+}
+
+static inline BaseType_t xTimerStop(TimerHandle_t timer, TickType_t ticks_to_wait)
+{
+    (void) ticks_to_wait;
+    std::lock_guard<std::mutex> lock(timer->mutex);
+    timer->active = false;
+    timer->cv.notify_one();
+    return pdPASS;
+}
@@ -0,0 +1,6 @@
+// lwip/dns.h for host builds: getaddrinfo comes from the C library.
+#pragma once
+
+#include <netdb.h>
+
+#include "lwip/sockets.h"
@@ -0,0 +1,4 @@
+// lwip/inet.h for host builds
+#pragma once
+
+#include <arpa/inet.h>
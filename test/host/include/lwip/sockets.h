@@ -0,0 +1,9 @@
+// lwip/sockets.h for host builds: lwip implements the BSD socket API.
+#pragma once
+
+#include <arpa/inet.h>
+#include <netinet/in.h>
+#include <netinet/tcp.h>
+#include <sys/select.h>
+#include <sys/socket.h>
+#include <unistd.h>
@@ -0,0 +1,136 @@
+// C interface of the host mining core library, see mining_core.h.
+
+#include <stdlib.h>
+#include <string.h>
+
+#include "mining_core.h"
+
+static void flatten(const StratumApiV1Message *message, mining_core_message *out)
+{
+    memset(out, 0, sizeof(mining_core_message));
+    out->method = message->method;
+    out->message_id = message->message_id;
+    out->new_difficulty = message->new_difficulty;
+    out->version_mask = message->version_mask;
+    out->should_abandon_work = message->should_abandon_work;
+    out->response_success = message->response_success;
+    out->extranonce_2_len = message->extranonce_2_len;
+    if (message->extranonce_str) {
+        strncpy(out->extranonce, message->extranonce_str, sizeof(out->extranonce) - 1);
+    }
+
+    const mining_notify *notify = message->mining_notification;
+    if (!notify) {
+        return;
+    }
+    if (notify->job_id) {
+        strncpy(out->job_id, notify->job_id, sizeof(out->job_id) - 1);
+    }
+    memcpy(out->prev_block_hash, notify->_prev_block_hash, HASH_SIZE);
+    out->coinbase_1_len = notify->coinbase_1 ? strlen(notify->coinbase_1) : 0;
+    out->coinbase_2_len = notify->coinbase_2 ? strlen(notify->coinbase_2) : 0;
+    out->n_merkle_branches = notify->n_merkle_branches;
+    memcpy(out->merkle_branches, notify->_merkle_branches, notify->n_merkle_branches * HASH_SIZE);
+    out->version = notify->version;
+    out->target = notify->target;
+    out->ntime = notify->ntime;
+}
+
+size_t mining_core_message_size(void)
+{
+    return sizeof(mining_core_message);
+}
+
+void mining_core_merkle_root(const char *coinbase_tx, const uint8_t *merkle_branches, int n, uint8_t merkle_root[32])
+{
+    calculate_merkle_root_hash(coinbase_tx, (const uint8_t(*)[32]) merkle_branches, n, merkle_root);
+}
+
+bm_job *mining_core_job_new(const uint8_t prev_block_hash[32], const uint8_t merkle_root[32], uint32_t version,
+                            uint32_t version_mask, uint32_t target, uint32_t ntime)
+{
+    mining_notify notify;
+    memset(&notify, 0, sizeof(notify));
+    memcpy(notify._prev_block_hash, prev_block_hash, HASH_SIZE);
+    notify.version = version;
+    notify.version_mask = version_mask;
+    notify.target = target;
+    notify.ntime = ntime;
+
+    bm_job *job = (bm_job *) calloc(1, sizeof(bm_job));
+    if (job) {
+        construct_bm_job(&notify, merkle_root, version_mask, job);
+    }
+    return job;
+}
+
+void mining_core_job_free(bm_job *job)
+{
+    free(job);
+}
+
+double mining_core_test_nonce_value(const bm_job *job, uint32_t nonce, uint32_t rolled_version)
+{
+    return test_nonce_value(job, nonce, rolled_version);
+}
+
+double mining_core_scan_nonces(const bm_job *job, uint32_t first_nonce, uint32_t count, uint32_t rolled_version,
+                               uint32_t *best_nonce)
+{
+    double best = 0.0;
+    for (uint32_t i = 0; i < count; i++) {
+        double diff = test_nonce_value(job, first_nonce + i, rolled_version);
+        if (diff > best) {
+            best = diff;
+            if (best_nonce) {
+                *best_nonce = first_nonce + i;
+            }
+        }
+    }
+    return best;
+}
+
+StratumApi *mining_core_stratum_new(void)
+{
+    return new StratumApi();
+}
+
+void mining_core_stratum_free(StratumApi *api)
+{
+    delete api;
+}
+
+const char *mining_core_receive_line(StratumApi *api, int sockfd, size_t *len)
+{
+    return api->receiveJsonRpcLine(sockfd, len);
+}
+
+size_t mining_core_receive_all(StratumApi *api, int sockfd)
+{
+    size_t lines = 0;
+    size_t len;
+    while (api->receiveJsonRpcLine(sockfd, &len)) {
+        lines++;
+    }
+    return lines;
+}
+
+bool mining_core_parse(const char *json, mining_core_message *out)
+{
+    StratumApiV1Message message;
+    memset(&message, 0, sizeof(message));
+    bool parsed = StratumApi::parse(&message, json);
+    flatten(&message, out);
+    StratumApi::freeMessage(&message);
+    return parsed;
+}
+
+bool mining_core_parse_fast(const char *json, size_t len, mining_core_message *out)
+{
+    StratumApiV1Message message;
+    memset(&message, 0, sizeof(message));
+    bool parsed = StratumApi::parseFast(&message, json, len);
+    flatten(&message, out);
+    StratumApi::freeMessage(&message);
+    return parsed;
+}
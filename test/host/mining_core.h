@@ -0,0 +1,73 @@
+#pragma once
+
+// C interface of libminingcore.so, the host build of the stratum and mining
+// code, for mining_core.py (ctypes). The C++ types stay behind opaque
+// pointers; parsed messages are flattened into mining_core_message.
+
+#include <stddef.h>
+#include <stdint.h>
+
+#include "mining.h"
+#include "stratum_api.h"
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+typedef struct
+{
+    int32_t method; // stratum_method
+    int64_t message_id;
+    uint32_t new_difficulty;
+    uint32_t version_mask;
+    int32_t should_abandon_work;
+    int32_t response_success;
+    int32_t extranonce_2_len;
+    char extranonce[MAX_EXTRANONCE_2_LEN * 2 + 1];
+
+    // mining.notify
+    char job_id[MAX_JOB_ID_LEN];
+    uint8_t prev_block_hash[HASH_SIZE];
+    uint32_t coinbase_1_len;
+    uint32_t coinbase_2_len;
+    uint32_t n_merkle_branches;
+    uint8_t merkle_branches[MAX_MERKLE_BRANCHES][HASH_SIZE];
+    uint32_t version;
+    uint32_t target;
+    uint32_t ntime;
+} mining_core_message;
+
+size_t mining_core_message_size(void);
+
+// calculate_merkle_root_hash() of a hex coinbase and n binary branches
+void mining_core_merkle_root(const char *coinbase_tx, const uint8_t *merkle_branches, int n, uint8_t merkle_root[32]);
+
+// construct_bm_job() like the self test does, free with mining_core_job_free()
+bm_job *mining_core_job_new(const uint8_t prev_block_hash[32], const uint8_t merkle_root[32], uint32_t version,
+                            uint32_t version_mask, uint32_t target, uint32_t ntime);
+void mining_core_job_free(bm_job *job);
+
+double mining_core_test_nonce_value(const bm_job *job, uint32_t nonce, uint32_t rolled_version);
+
+// test_nonce_value() of count nonces from first_nonce, returns the best difficulty
+double mining_core_scan_nonces(const bm_job *job, uint32_t first_nonce, uint32_t count, uint32_t rolled_version,
+                               uint32_t *best_nonce);
+
+StratumApi *mining_core_stratum_new(void);
+void mining_core_stratum_free(StratumApi *api);
+
+// receiveJsonRpcLine() from a socket, NULL when the peer closed it
+const char *mining_core_receive_line(StratumApi *api, int sockfd, size_t *len);
+
+// receives lines until the peer closes the socket, returns the number of lines
+size_t mining_core_receive_all(StratumApi *api, int sockfd);
+
+// StratumApi::parse() of a JSON string, false if it is not a known message
+bool mining_core_parse(const char *json, mining_core_message *out);
+
+// StratumApi::parseFast(), false if the line has to take parse()
+bool mining_core_parse_fast(const char *json, size_t len, mining_core_message *out);
+
+#ifdef __cplusplus
+}
+#endif
@@ -0,0 +1,298 @@
+"""ctypes harness for libminingcore.so, the host build of the stratum and
+mining code (see mining_core.h).
+
+  make -C test/host libminingcore.so
+  python3 test/host/mining_core.py bench --save baseline.json
+  python3 test/host/mining_core.py bench --compare baseline.json
+
+bench times calculate_merkle_root_hash and test_nonce_value on the self
+test block (792980), and receiveJsonRpcLine, parse and parseFast on the
+pool session in data/stratum_session.txt; with --compare it fails if one
+of them got slower than the tolerance, so regressions in the mining path
+show up on any Linux box. The checks of the same paths are the pytest
+tests in test_mining_core.py (make -C test/host pytest).
+"""
+
+import argparse
+import ctypes
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_LIBRARY = os.path.join(HERE, 'libminingcore.so')
+DEFAULT_SESSION = os.path.join(HERE, 'data', 'stratum_session.txt')
+
+HASH_SIZE = 32
+MAX_MERKLE_BRANCHES = 32
+MAX_JOB_ID_LEN = 64
+MAX_EXTRANONCE_2_LEN = 32
+
+# stratum_method in stratum_api.h
+STRATUM_METHODS = ['STRATUM_UNKNOWN', 'MINING_NOTIFY', 'MINING_SET_DIFFICULTY', 'MINING_SET_VERSION_MASK',
+                   'STRATUM_RESULT', 'STRATUM_RESULT_SETUP', 'STRATUM_RESULT_VERSION_MASK',
+                   'STRATUM_RESULT_SUBSCRIBE', 'CLIENT_RECONNECT']
+
+# the self test of main/self_test/self_test.cpp, block 792980
+SELF_TEST = {
+    'prev_block_hash': '0c859545a3498373a57452fac22eb7113df2a465000543520000000000000000',
+    'version': 0x20000004,
+    'version_mask': 0x1fffe000,
+    'target': 0x1705ae3a,
+    'ntime': 0x647025b5,
+    'coinbase_tx': '01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff4b0389130cfab'
+                   'e6d6d5cbab26a2599e92916edec5657a94a0708ddb970f5c45b5d12905085617eff8e010000000000000031650707'
+                   '758de07b010000000000001cfd7038212f736c7573682f000000000379ad0c2a000000001976a9147c154ed1dc5960'
+                   '9e3d26abb2df2ea3d587cd8c4188ac00000000000000002c6a4c2952534b424c4f434b3ae725d3994b811572c1f345'
+                   'deb98b56b465ef8e153ecbbd27fa37bf1b005161380000000000000000266a24aa21a9ed63b06a7946b190a3fda1d7'
+                   '6165b25c9b883bcc6621b040773050ee2a1bb18f1800000000',
+    'merkle_branches': [
+        '2b77d9e413e8121cd7a17ff46029591051d0922bd90b2b2a38811af1cb57a2b2',
+        '5c8874cef00f3a233939516950e160949ef327891c9090467cead995441d22c5',
+        '2d91ff8e19ac5fa69a40081f26c5852d366d608b04d2efe0d5b65d111d0d8074',
+        '0ae96f609ad2264112a0b2dfb65624bedbcea3b036a59c0173394bba3a74e887',
+        'e62172e63973d69574a82828aeb5711fc5ff97946db10fc7ec32830b24df7bde',
+        'adb49456453aab49549a9eb46bb26787fb538e0a5f656992275194c04651ec97',
+        'a7bc56d04d2672a8683892d6c8d376c73d250a4871fdf6f57019bcc737d6d2c2',
+        'd94eceb8182b4f418cd071e93ec2a8993a0898d4c93bc33d9302f60dbbd0ed10',
+        '5ad7788b8c66f8f50d332b88a80077ce10e54281ca472b4ed9bbbbcb6cf99083',
+        '9f9d784b33df1b3ed3edb4211afc0dc1909af9758c6f8267e469f5148ed04809',
+        '48fd17affa76b23e6fb2257df30374da839d6cb264656a82e34b350722b05123',
+        'c4f5ab01913fc186d550c1a28f3f3e9ffaca2016b961a6a751f8cca0089df924',
+        'cff737e1d00176dd6bbfa73071adbb370f227cfb5fba186562e4060fcec877e1',
+    ],
+    # the share the asic returns for this job
+    'nonce': 4054974794,
+    'rolled_version': 0x379fc004,
+    'nonce_difficulty': 27640.04,
+}
+
+
+class Message(ctypes.Structure):
+    _fields_ = [
+        ('method', ctypes.c_int32),
+        ('message_id', ctypes.c_int64),
+        ('new_difficulty', ctypes.c_uint32),
+        ('version_mask', ctypes.c_uint32),
+        ('should_abandon_work', ctypes.c_int32),
+        ('response_success', ctypes.c_int32),
+        ('extranonce_2_len', ctypes.c_int32),
+        ('extranonce', ctypes.c_char * (MAX_EXTRANONCE_2_LEN * 2 + 1)),
+        ('job_id', ctypes.c_char * MAX_JOB_ID_LEN),
+        ('prev_block_hash', ctypes.c_uint8 * HASH_SIZE),
+        ('coinbase_1_len', ctypes.c_uint32),
+        ('coinbase_2_len', ctypes.c_uint32),
+        ('n_merkle_branches', ctypes.c_uint32),
+        ('merkle_branches', (ctypes.c_uint8 * HASH_SIZE) * MAX_MERKLE_BRANCHES),
+        ('version', ctypes.c_uint32),
+        ('target', ctypes.c_uint32),
+        ('ntime', ctypes.c_uint32),
+    ]
+
+    @property
+    def method_name(self):
+        return STRATUM_METHODS[self.method]
+
+
+class MiningCore:
+    def __init__(self, path=DEFAULT_LIBRARY):
+        lib = ctypes.CDLL(path)
+        lib.mining_core_message_size.restype = ctypes.c_size_t
+        lib.mining_core_merkle_root.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p]
+        lib.mining_core_merkle_root.restype = None
+        lib.mining_core_job_new.argtypes = [ctypes.c_char_p, ctypes.c_char_p] + [ctypes.c_uint32] * 4
+        lib.mining_core_job_new.restype = ctypes.c_void_p
+        lib.mining_core_job_free.argtypes = [ctypes.c_void_p]
+        lib.mining_core_job_free.restype = None
+        lib.mining_core_test_nonce_value.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.c_uint32]
+        lib.mining_core_test_nonce_value.restype = ctypes.c_double
+        lib.mining_core_scan_nonces.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.c_uint32, ctypes.c_uint32,
+                                                ctypes.POINTER(ctypes.c_uint32)]
+        lib.mining_core_scan_nonces.restype = ctypes.c_double
+        lib.mining_core_stratum_new.restype = ctypes.c_void_p
+        lib.mining_core_stratum_free.argtypes = [ctypes.c_void_p]
+        lib.mining_core_stratum_free.restype = None
+        lib.mining_core_receive_line.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.POINTER(ctypes.c_size_t)]
+        lib.mining_core_receive_line.restype = ctypes.c_void_p
+        lib.mining_core_receive_all.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        lib.mining_core_receive_all.restype = ctypes.c_size_t
+        lib.mining_core_parse.argtypes = [ctypes.c_char_p, ctypes.POINTER(Message)]
+        lib.mining_core_parse.restype = ctypes.c_bool
+        lib.mining_core_parse_fast.argtypes = [ctypes.c_char_p, ctypes.c_size_t, ctypes.POINTER(Message)]
+        lib.mining_core_parse_fast.restype = ctypes.c_bool
+
+        if lib.mining_core_message_size() != ctypes.sizeof(Message):
+            raise RuntimeError('mining_core_message layout differs from mining_core.h, rebuild the library')
+        self.lib = lib
+
+    def merkle_root(self, coinbase_tx, merkle_branches):
+        branches = b''.join(bytes.fromhex(branch) for branch in merkle_branches)
+        root = ctypes.create_string_buffer(HASH_SIZE)
+        self.lib.mining_core_merkle_root(coinbase_tx.encode(), branches, len(merkle_branches), root)
+        return root.raw
+
+    def job(self, prev_block_hash, merkle_root, version, version_mask, target, ntime):
+        return Job(self, bytes.fromhex(prev_block_hash), merkle_root, version, version_mask, target, ntime)
+
+    def parse(self, line):
+        message = Message()
+        return self.lib.mining_core_parse(line, ctypes.byref(message)), message
+
+    def parse_fast(self, line):
+        message = Message()
+        return self.lib.mining_core_parse_fast(line, len(line), ctypes.byref(message)), message
+
+    def stratum(self):
+        return Stratum(self)
+
+
+class Job:
+    def __init__(self, core, prev_block_hash, merkle_root, version, version_mask, target, ntime):
+        self.lib = core.lib
+        self.handle = self.lib.mining_core_job_new(prev_block_hash, merkle_root, version, version_mask, target, ntime)
+        if not self.handle:
+            raise MemoryError('mining_core_job_new')
+
+    def __del__(self):
+        if getattr(self, 'handle', None):
+            self.lib.mining_core_job_free(self.handle)
+
+    def test_nonce_value(self, nonce, rolled_version):
+        return self.lib.mining_core_test_nonce_value(self.handle, nonce, rolled_version)
+
+    def scan_nonces(self, first_nonce, count, rolled_version):
+        best_nonce = ctypes.c_uint32(0)
+        best = self.lib.mining_core_scan_nonces(self.handle, first_nonce, count, rolled_version, ctypes.byref(best_nonce))
+        return best, best_nonce.value
+
+
+class Stratum:
+    """A StratumApi instance receiving from a socket."""
+
+    def __init__(self, core):
+        self.lib = core.lib
+        self.handle = self.lib.mining_core_stratum_new()
+
+    def __del__(self):
+        if getattr(self, 'handle', None):
+            self.lib.mining_core_stratum_free(self.handle)
+
+    def receive_line(self, sock):
+        length = ctypes.c_size_t(0)
+        line = self.lib.mining_core_receive_line(self.handle, sock.fileno(), ctypes.byref(length))
+        return ctypes.string_at(line, length.value) if line else None
+
+    def receive_all(self, sock):
+        return self.lib.mining_core_receive_all(self.handle, sock.fileno())
+
+
+def read_session(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, [line.rstrip(b'\r') for line in data.split(b'\n')[:-1]]
+
+
+def feed(data, chunk_size):
+    """Socket pair with a thread writing data in chunks and closing its end."""
+    ours, theirs = socket.socketpair()
+
+    def writer():
+        with theirs:
+            for i in range(0, len(data), chunk_size):
+                theirs.sendall(data[i:i + chunk_size])
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    return ours, thread
+
+
+def best_of(func, repeat, number):
+    """Seconds per call, best of repeat runs of number calls."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def bench(core, session_path, repeat):
+    data, lines = read_session(session_path)
+    notify = [line for line in lines if b'"mining.notify"' in line and b'"method"' in line]
+    results = {}
+
+    root = core.merkle_root(SELF_TEST['coinbase_tx'], SELF_TEST['merkle_branches'])
+    job = core.job(SELF_TEST['prev_block_hash'], root, SELF_TEST['version'], SELF_TEST['version_mask'],
+                   SELF_TEST['target'], SELF_TEST['ntime'])
+
+    results['calculate_merkle_root_hash'] = best_of(
+        lambda: core.merkle_root(SELF_TEST['coinbase_tx'], SELF_TEST['merkle_branches']), repeat, 2000)
+
+    # the nonce loop runs in C, ctypes would dominate a single header hash
+    nonces = 100000
+    results['test_nonce_value'] = best_of(lambda: job.scan_nonces(0, nonces, SELF_TEST['rolled_version']), repeat, 1) / nonces
+
+    stream = data * 20
+    stratum = core.stratum()
+
+    def receive():
+        sock, thread = feed(stream, 1460)
+        with sock:
+            stratum.receive_all(sock)
+        thread.join()
+
+    results['receiveJsonRpcLine'] = best_of(receive, repeat, 1) / (len(lines) * 20)
+
+    results['parse (notify)'] = best_of(lambda: [core.parse(line) for line in notify], repeat, 50) / len(notify)
+    results['parseFast (notify)'] = best_of(lambda: [core.parse_fast(line) for line in notify], repeat, 50) / len(notify)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the host build of the stratum and mining code')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--library', default=DEFAULT_LIBRARY, help='path of libminingcore.so')
+    parser.add_argument('--session', default=DEFAULT_SESSION, help='pool session capture, one JSON-RPC line each')
+    parser.add_argument('--repeat', type=int, default=5, help='benchmark runs, the best one counts')
+    parser.add_argument('--save', metavar='FILE', help='write the benchmark results as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='fail if slower than the results in FILE')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown for --compare (default: 0.25)')
+    args = parser.parse_args()
+
+    try:
+        core = MiningCore(args.library)
+    except OSError as e:
+        print(f"Unable to load {args.library}: {e}\nBuild it with: make -C test/host libminingcore.so")
+        return 1
+
+    results = bench(core, args.session, args.repeat)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    regressions = []
+    print(f"{'':<28} {'time':>10} {'baseline':>10} {'change':>8}")
+    for name, seconds in results.items():
+        line = f"{name:<28} {seconds * 1e6:>8.3f}us"
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            line += f" {baseline[name] * 1e6:>8.3f}us {change:>+7.1%}"
+            if change > args.tolerance:
+                regressions.append(name)
+                line += '  REGRESSION'
+        print(line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,665 @@
+"""Local stratum pool for latency and throughput tests of the miner and of
+stratum proxies, and a swarm of simulated miners to load it.
+
+  # a pool for devices, replaying the recorded session every 10 s
+  python3 test/host/pool_simulator.py serve --port 3333 --notify-interval 10
+
+  # 300 simulated miners against any pool or proxy
+  python3 test/host/pool_simulator.py swarm --port 3333 --miners 300 --duration 60
+
+  # both in one process
+  python3 test/host/pool_simulator.py load --miners 300 --duration 60
+
+The pool speaks mining.subscribe, mining.configure, mining.authorize,
+mining.suggest_difficulty and mining.submit. It sends mining.notify,
+mining.set_difficulty, mining.set_version_mask and client.reconnect.
+Block templates are replayed from a capture (the mining.notify lines of a
+session like data/stratum_session.txt) or generated. Every submitted share
+is validated: the header is assembled the way test_nonce_value does it,
+and the share needs the difficulty its session had when the job was sent.
+
+The pool records, per share, the time from the job's notify to the share
+and its own response time. It counts stale shares (for a job replaced by
+a clean_jobs notify) and how long a worker takes to come back after
+client.reconnect. The swarm records the round trip of every submit. Both
+print percentiles and can write them as JSON (--stats).
+
+Pool fallback can be tested with two pools and --reconnect-every or
+--kill-every (the pool drops every connection and refuses new ones for
+--down-for seconds). test_stratum_failover runs the StratumManager of the
+firmware against such a pool and a second serve. For a device, point its
+pools at serve --kill-every and at a second serve on another port and read
+failoverLastMs and failoverMaxMs from /api/system/info.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+from share_validator import TRUEDIFFONE, block_header, double_sha256, merkle_root, share_difficulty
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_SESSION = os.path.join(HERE, 'data', 'stratum_session.txt')
+
+# jobs the pool still accepts shares for
+MAX_JOBS = 64
+
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+def format_difficulty(difficulty):
+    # the miner parses integers only
+    return int(difficulty) if difficulty == int(difficulty) else difficulty
+
+
+class Latency:
+    """Recorded durations in seconds, reported as percentiles in ms."""
+
+    def __init__(self):
+        self.samples = []
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        if not self.samples:
+            return {'count': 0}
+        samples = sorted(self.samples)
+        result = {'count': len(samples), 'mean_ms': sum(samples) * 1e3 / len(samples)}
+        for p in LATENCY_PERCENTILES:
+            result[f'p{p}_ms'] = samples[min(len(samples) - 1, len(samples) * p // 100)] * 1e3
+        result['max_ms'] = samples[-1] * 1e3
+        return result
+
+    def format(self):
+        s = self.summary()
+        if not s['count']:
+            return 'none'
+        percentiles = ' '.join(f"p{p} {s[f'p{p}_ms']:.2f}" for p in LATENCY_PERCENTILES)
+        return f"{s['count']} mean {s['mean_ms']:.2f} {percentiles} max {s['max_ms']:.2f} ms"
+
+
+class Job:
+    def __init__(self, job_id, params, epoch):
+        self.job_id = job_id
+        self.prev_block_hash_hex, self.coinbase_1_hex, self.coinbase_2_hex = params[1], params[2], params[3]
+        self.merkle_branches_hex = params[4]
+        self.version_hex, self.nbits_hex, self.ntime_hex = params[5], params[6], params[7]
+        self.clean = bool(params[-1])
+        self.epoch = epoch
+
+        self.prev_block_hash = bytes.fromhex(self.prev_block_hash_hex)
+        self.coinbase_1 = bytes.fromhex(self.coinbase_1_hex)
+        self.coinbase_2 = bytes.fromhex(self.coinbase_2_hex)
+        self.merkle_branches = [bytes.fromhex(branch) for branch in self.merkle_branches_hex]
+        self.version = int(self.version_hex, 16)
+        self.nbits = int(self.nbits_hex, 16)
+        self.ntime = int(self.ntime_hex, 16)
+        self.sent_at = None
+
+    def notify(self):
+        params = [self.job_id, self.prev_block_hash_hex, self.coinbase_1_hex, self.coinbase_2_hex,
+                  self.merkle_branches_hex, self.version_hex, self.nbits_hex, self.ntime_hex, self.clean]
+        return {'id': None, 'method': 'mining.notify', 'params': params}
+
+
+def recorded_templates(path):
+    """mining.notify params of a capture, repeated forever with fresh ntimes."""
+    templates = []
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and message.get('method') == 'mining.notify':
+                templates.append(message['params'])
+    if not templates:
+        raise ValueError(f"no mining.notify in {path}")
+
+    previous = None
+    for params in itertools.cycle(templates):
+        params = list(params)
+        # a new previous block always cleans the jobs
+        params[-1] = bool(params[-1]) or params[1] != previous
+        previous = params[1]
+        params[7] = f"{int(time.time()):08x}"
+        yield params
+
+
+def synthetic_templates(rng, branches, blocks_every):
+    """Random templates, a new previous block every blocks_every jobs."""
+    prev_block_hash = None
+    for n in itertools.count():
+        clean = n % blocks_every == 0
+        if clean:
+            prev_block_hash = rng.randbytes(28).hex() + '00000000'
+        height = 800000 + n // blocks_every
+        coinbase_1 = ('01000000010000000000000000000000000000000000000000000000000000000000000000ffffffff'
+                      f"1703{height.to_bytes(3, 'little').hex()}" + rng.randbytes(8).hex())
+        coinbase_2 = ('ffffffff01' + rng.randbytes(8).hex() + '1976a914' + rng.randbytes(20).hex() + '88ac00000000')
+        yield [None, prev_block_hash, coinbase_1, coinbase_2, [rng.randbytes(32).hex() for _ in range(branches)],
+               '20000000', '1705ae3a', f"{int(time.time()):08x}", clean]
+
+
+class Session:
+    def __init__(self, pool, reader, writer, extranonce_1):
+        self.pool = pool
+        self.reader = reader
+        self.writer = writer
+        self.extranonce_1 = extranonce_1
+        self.extranonce_1_bin = bytes.fromhex(extranonce_1)
+        self.version_mask = 0
+        self.difficulty = pool.args.difficulty
+        self.sent_difficulty = None
+        self.subscribed = False
+        self.worker = None
+        self.job_difficulty = {}
+        self.seen = set()
+
+    def send(self, message):
+        self.writer.write(json.dumps(message).encode() + b'\n')
+
+    def respond(self, message_id, result, error=None):
+        self.send({'id': message_id, 'result': result, 'error': error})
+
+    def send_job(self, job):
+        if self.sent_difficulty != self.difficulty:
+            self.send({'id': None, 'method': 'mining.set_difficulty', 'params': [format_difficulty(self.difficulty)]})
+            self.sent_difficulty = self.difficulty
+        self.job_difficulty[job.job_id] = self.difficulty
+        if len(self.job_difficulty) > MAX_JOBS:
+            del self.job_difficulty[next(iter(self.job_difficulty))]
+        self.send(job.notify())
+
+    async def run(self):
+        try:
+            while line := await self.reader.readline():
+                received = time.perf_counter()
+                try:
+                    message = json.loads(line)
+                    method = message.get('method')
+                    params = message.get('params') or []
+                    message_id = message.get('id')
+                except (ValueError, AttributeError):
+                    self.pool.stats['invalid_lines'] += 1
+                    continue
+                handler = getattr(self, 'on_' + str(method).replace('.', '_'), None)
+                if handler:
+                    try:
+                        handler(message_id, params, received)
+                    except (ValueError, TypeError, IndexError, AttributeError):
+                        self.pool.stats['invalid_lines'] += 1
+                        self.respond(message_id, None, [20, 'Invalid params', None])
+                elif message_id is not None:
+                    self.respond(message_id, None, [20, 'Unsupported method', None])
+                await self.writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # the pool shuts down
+            pass
+        finally:
+            self.pool.sessions.discard(self)
+            self.writer.close()
+
+    def on_mining_subscribe(self, message_id, params, received):
+        self.subscribed = True
+        subscriptions = [['mining.set_difficulty', self.extranonce_1], ['mining.notify', self.extranonce_1]]
+        self.respond(message_id, [subscriptions, self.extranonce_1, self.pool.args.extranonce_2_size])
+
+    def on_mining_configure(self, message_id, params, received):
+        result = {}
+        if params and 'version-rolling' in params[0]:
+            requested = int((params[1] if len(params) > 1 else {}).get('version-rolling.mask', 'ffffffff'), 16)
+            self.version_mask = requested & self.pool.args.version_mask
+            result = {'version-rolling': True, 'version-rolling.mask': f"{self.version_mask:08x}"}
+        self.respond(message_id, result)
+
+    def on_mining_authorize(self, message_id, params, received):
+        self.worker = params[0] if params else ''
+        self.respond(message_id, True)
+        self.pool.authorized(self)
+        if self.pool.job:
+            self.send_job(self.pool.job)
+
+    def on_mining_suggest_difficulty(self, message_id, params, received):
+        if params and not self.pool.args.fixed_difficulty:
+            self.difficulty = max(float(params[0]), self.pool.args.min_difficulty)
+        self.respond(message_id, True)
+        # the miner suggests after authorizing, send the job again with its difficulty
+        if self.worker is not None and self.pool.job and self.sent_difficulty != self.difficulty:
+            self.send_job(self.pool.job)
+
+    def on_mining_submit(self, message_id, params, received):
+        error = self.validate(params)
+        self.respond(message_id, error is None, error)
+        self.pool.share_latency.add(time.perf_counter() - received)
+
+    def validate(self, params):
+        stats = self.pool.stats
+        stats['shares'] += 1
+        if len(params) < 5:
+            stats['invalid'] += 1
+            return [20, 'Invalid params', None]
+        job_id, extranonce_2, ntime, nonce = params[1:5]
+        version_bits = params[5] if len(params) > 5 else '00000000'
+
+        job = self.pool.jobs.get(job_id)
+        if job is None:
+            stats['unknown_job'] += 1
+            return [21, 'Job not found', None]
+        self.pool.job_age.add(time.perf_counter() - job.sent_at)
+        if job.epoch != self.pool.epoch:
+            stats['stale'] += 1
+            return [21, 'Stale', None]
+        try:
+            extranonce_2_bin = bytes.fromhex(extranonce_2)
+            ntime, nonce, version_bits = int(ntime, 16), int(nonce, 16), int(version_bits, 16)
+        except (TypeError, ValueError):
+            stats['invalid'] += 1
+            return [20, 'Invalid params', None]
+        if len(extranonce_2_bin) != self.pool.args.extranonce_2_size:
+            stats['invalid'] += 1
+            return [20, 'Invalid extranonce2 size', None]
+        if version_bits & ~self.version_mask:
+            stats['invalid'] += 1
+            return [20, 'Invalid version bits', None]
+        key = (job_id, extranonce_2, ntime, nonce, version_bits)
+        if key in self.seen:
+            stats['duplicate'] += 1
+            return [22, 'Duplicate share', None]
+        self.seen.add(key)
+
+        coinbase = job.coinbase_1 + self.extranonce_1_bin + extranonce_2_bin + job.coinbase_2
+        root = merkle_root(coinbase, job.merkle_branches)
+        header = block_header(job.version ^ version_bits, job.prev_block_hash, root, ntime, job.nbits, nonce)
+        difficulty = share_difficulty(header)
+        if difficulty < self.job_difficulty.get(job_id, self.difficulty):
+            stats['low_difficulty'] += 1
+            return [23, 'Low difficulty share', None]
+        stats['accepted'] += 1
+        stats['best_difficulty'] = max(stats['best_difficulty'], difficulty)
+        return None
+
+
+class Pool:
+    def __init__(self, args):
+        self.args = args
+        self.sessions = set()
+        self.jobs = {}
+        self.job = None
+        self.epoch = 0
+        self.job_ids = itertools.count(1)
+        self.extranonces = itertools.count(random.randrange(1 << 24))
+        self.stats = {key: 0 for key in ('connections', 'shares', 'accepted', 'stale', 'duplicate', 'low_difficulty',
+                                         'unknown_job', 'invalid', 'invalid_lines', 'notifies', 'reconnects_sent',
+                                         'outages')}
+        self.stats['best_difficulty'] = 0.0
+        self.share_latency = Latency()
+        self.job_age = Latency()
+        self.reconnect_time = Latency()
+        self.reconnect_pending = {}
+        self.server = None
+
+        if args.templates == 'synthetic':
+            self.templates = synthetic_templates(random.Random(args.seed), args.branches, args.clean_every)
+        else:
+            self.templates = recorded_templates(args.templates)
+
+    def authorized(self, session):
+        sent = self.reconnect_pending.pop(session.worker, None)
+        if sent is not None:
+            self.reconnect_time.add(time.perf_counter() - sent)
+
+    async def handle(self, reader, writer):
+        self.stats['connections'] += 1
+        session = Session(self, reader, writer, f"{next(self.extranonces) & 0xffffffff:08x}")
+        self.sessions.add(session)
+        await session.run()
+
+    def next_job(self):
+        params = next(self.templates)
+        if self.args.clean_every and self.stats['notifies'] % self.args.clean_every == 0:
+            params[-1] = True
+        if params[-1]:
+            self.epoch += 1
+        job = Job(f"{next(self.job_ids):x}", params, self.epoch)
+        self.jobs[job.job_id] = job
+        while len(self.jobs) > MAX_JOBS:
+            del self.jobs[next(iter(self.jobs))]
+        return job
+
+    async def broadcast(self):
+        while True:
+            job = self.next_job()
+            job.sent_at = time.perf_counter()
+            self.job = job
+            self.stats['notifies'] += 1
+            for session in list(self.sessions):
+                if session.worker is not None:
+                    session.send_job(job)
+            await asyncio.sleep(self.args.notify_interval)
+
+    async def version_masks(self):
+        while True:
+            await asyncio.sleep(self.args.version_mask_every)
+            for session in list(self.sessions):
+                if session.version_mask:
+                    session.send({'id': None, 'method': 'mining.set_version_mask',
+                                  'params': [f"{session.version_mask:08x}"]})
+
+    async def reconnects(self):
+        while True:
+            await asyncio.sleep(self.args.reconnect_every)
+            for session in list(self.sessions):
+                if session.worker is None:
+                    continue
+                self.stats['reconnects_sent'] += 1
+                self.reconnect_pending[session.worker] = time.perf_counter()
+                session.send({'id': None, 'method': 'client.reconnect', 'params': []})
+                # not every miner acts on client.reconnect, the pool drops them
+                asyncio.get_running_loop().call_later(self.args.reconnect_grace, session.writer.close)
+
+    async def outages(self):
+        while True:
+            await asyncio.sleep(self.args.kill_every)
+            # a crashed pool: no goodbye, nobody gets in until it is back
+            self.stats['outages'] += 1
+            self.server.close()
+            for session in list(self.sessions):
+                session.writer.transport.abort()
+            await asyncio.sleep(self.args.down_for)
+            self.server = await asyncio.start_server(self.handle, self.args.host, self.args.port, limit=1 << 20)
+
+    def summary(self):
+        stats = dict(self.stats)
+        stats['sessions'] = len(self.sessions)
+        stats['stale_rate'] = stats['stale'] / stats['shares'] if stats['shares'] else 0.0
+        stats['share_response'] = self.share_latency.summary()
+        stats['job_age'] = self.job_age.summary()
+        stats['reconnect'] = self.reconnect_time.summary()
+        return stats
+
+    def report(self):
+        s = self.stats
+        print(f"pool: {len(self.sessions)} sessions, {s['notifies']} jobs, {s['shares']} shares: {s['accepted']} accepted, "
+              f"{s['stale']} stale, {s['low_difficulty']} low, {s['duplicate']} duplicate, "
+              f"{s['unknown_job'] + s['invalid']} invalid")
+        print(f"  response   {self.share_latency.format()}")
+        print(f"  job age    {self.job_age.format()}")
+        print(f"  reconnect  {self.reconnect_time.format()}")
+
+    async def serve(self):
+        self.server = await asyncio.start_server(self.handle, self.args.host, self.args.port, limit=1 << 20)
+        print(f"pool listening on {self.args.host}:{self.args.port}")
+        tasks = [asyncio.create_task(self.broadcast())]
+        if self.args.version_mask_every:
+            tasks.append(asyncio.create_task(self.version_masks()))
+        if self.args.reconnect_every:
+            tasks.append(asyncio.create_task(self.reconnects()))
+        if self.args.kill_every:
+            tasks.append(asyncio.create_task(self.outages()))
+        return tasks
+
+
+class SimulatedMiner:
+    """A miner that finds real shares at a tiny difficulty with hashlib."""
+
+    def __init__(self, index, args, swarm):
+        self.index = index
+        self.args = args
+        self.swarm = swarm
+        self.rng = random.Random(args.seed * 1000003 + index)
+        self.worker = f"{args.user}.{index}"
+        self.pending = {}
+        self.ids = itertools.count(1)
+        self.job = None
+        self.difficulty = 1.0
+        self.version_mask = 0
+        self.extranonce_1 = b''
+        self.extranonce_2_size = 0
+        self.extranonce_2 = 0
+        self.subscribed = asyncio.Event()
+
+    def send(self, method, params):
+        message_id = next(self.ids)
+        self.pending[message_id] = (method, time.perf_counter())
+        self.writer.write(json.dumps({'id': message_id, 'method': method, 'params': params}).encode() + b'\n')
+        return message_id
+
+    def mine(self):
+        """Nonce search for the current job, None if nothing is found in time."""
+        job = self.job
+        self.extranonce_2 += 1
+        extranonce_2 = self.extranonce_2.to_bytes(self.extranonce_2_size, 'big')
+        root = merkle_root(job.coinbase_1 + self.extranonce_1 + extranonce_2 + job.coinbase_2, job.merkle_branches)
+        version_bits = self.rng.getrandbits(32) & self.version_mask
+        prefix = block_header(job.version ^ version_bits, job.prev_block_hash, root, job.ntime, job.nbits, 0)[:76]
+        target = int(TRUEDIFFONE / self.difficulty)
+        start = self.rng.getrandbits(32)
+        for i in range(self.args.max_hashes):
+            nonce = (start + i) & 0xffffffff
+            if int.from_bytes(double_sha256(prefix + struct.pack('<I', nonce)), 'little') <= target:
+                return [self.worker, job.job_id, extranonce_2.hex(), f"{job.ntime:08x}", f"{nonce:08x}",
+                        f"{version_bits:08x}"]
+        return None
+
+    def on_message(self, message):
+        method = message.get('method')
+        params = message.get('params') or []
+        if method == 'mining.notify':
+            job = Job(params[0], params, 0)
+            job.sent_at = time.perf_counter()
+            self.job = job
+        elif method == 'mining.set_difficulty':
+            self.difficulty = float(params[0])
+        elif method == 'mining.set_version_mask':
+            self.version_mask = int(params[0], 16)
+        elif method == 'client.reconnect':
+            self.swarm.stats['reconnect_requests'] += 1
+            self.writer.close()
+        elif message.get('id') in self.pending:
+            request, sent = self.pending.pop(message['id'])
+            result = message.get('result')
+            if request == 'mining.subscribe':
+                self.extranonce_1 = bytes.fromhex(result[1])
+                self.extranonce_2_size = result[2]
+                self.subscribed.set()
+            elif request == 'mining.configure':
+                self.version_mask = int((result or {}).get('version-rolling.mask', '0'), 16)
+            elif request == 'mining.submit':
+                self.swarm.submit_latency.add(time.perf_counter() - sent)
+                error = message.get('error')
+                if result:
+                    self.swarm.stats['accepted'] += 1
+                elif error and len(error) > 1 and 'stale' in str(error[1]).lower():
+                    self.swarm.stats['stale'] += 1
+                else:
+                    self.swarm.stats['rejected'] += 1
+
+    async def receive(self):
+        while line := await self.reader.readline():
+            try:
+                self.on_message(json.loads(line))
+            except (ValueError, AttributeError, IndexError, TypeError):
+                self.swarm.stats['invalid_lines'] += 1
+
+    async def submit_loop(self):
+        while True:
+            await asyncio.sleep(self.rng.expovariate(1 / self.args.share_interval))
+            if not self.job or not self.extranonce_2_size:
+                continue
+            share = self.mine()
+            if share is None:
+                self.swarm.stats['not_found'] += 1
+                continue
+            self.send('mining.submit', share)
+            self.swarm.stats['submitted'] += 1
+            await self.writer.drain()
+
+    async def session(self):
+        self.subscribed.clear()
+        self.pending.clear()
+        self.job = None
+        self.send('mining.subscribe', [f"pool_simulator/{self.index}"])
+        self.send('mining.configure', [['version-rolling'], {'version-rolling.mask': 'ffffffff'}])
+        self.send('mining.authorize', [self.worker, 'x'])
+        self.send('mining.suggest_difficulty', [self.args.swarm_difficulty])
+        await self.writer.drain()
+
+        receiver = asyncio.create_task(self.receive())
+        submitter = asyncio.create_task(self.submit_loop())
+        try:
+            await receiver
+        finally:
+            submitter.cancel()
+
+    async def run(self):
+        disconnected = None
+        while True:
+            try:
+                self.reader, self.writer = await asyncio.open_connection(self.args.host, self.args.port, limit=1 << 20)
+                self.swarm.stats['connections'] += 1
+                if disconnected is not None:
+                    self.swarm.reconnect_time.add(time.perf_counter() - disconnected)
+                await self.session()
+            except (ConnectionError, OSError):
+                self.swarm.stats['connect_errors'] += 1
+            disconnected = time.perf_counter()
+            await asyncio.sleep(self.rng.uniform(0, self.args.reconnect_delay))
+
+
+class Swarm:
+    def __init__(self, args):
+        self.args = args
+        self.stats = {key: 0 for key in ('connections', 'connect_errors', 'submitted', 'accepted', 'stale', 'rejected',
+                                         'not_found', 'reconnect_requests', 'invalid_lines')}
+        self.submit_latency = Latency()
+        self.reconnect_time = Latency()
+
+    async def start(self):
+        miners = [SimulatedMiner(i, self.args, self) for i in range(self.args.miners)]
+        tasks = []
+        for miner in miners:
+            tasks.append(asyncio.create_task(miner.run()))
+            # do not open hundreds of connections in the same instant
+            await asyncio.sleep(self.args.ramp_up / max(len(miners), 1))
+        return tasks
+
+    def summary(self):
+        stats = dict(self.stats)
+        answered = stats['accepted'] + stats['stale'] + stats['rejected']
+        stats['stale_rate'] = stats['stale'] / answered if answered else 0.0
+        stats['submit_rtt'] = self.submit_latency.summary()
+        stats['reconnect'] = self.reconnect_time.summary()
+        return stats
+
+    def report(self):
+        s = self.stats
+        print(f"swarm: {self.args.miners} miners, {s['connections']} connections ({s['connect_errors']} failed), "
+              f"{s['submitted']} submitted: {s['accepted']} accepted, {s['stale']} stale, {s['rejected']} rejected")
+        print(f"  submit rtt {self.submit_latency.format()}")
+        print(f"  reconnect  {self.reconnect_time.format()}")
+
+
+async def run(args):
+    parts = []
+    tasks = []
+    pools = []
+    if args.command in ('serve', 'load'):
+        pool = Pool(args)
+        tasks += await pool.serve()
+        pools.append(pool)
+        parts.append(('pool', pool))
+    if args.command in ('swarm', 'load'):
+        swarm = Swarm(args)
+        tasks += await swarm.start()
+        parts.append(('swarm', swarm))
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(args.report_every)
+            for _, part in parts:
+                part.report()
+
+    if args.report_every:
+        tasks.append(asyncio.create_task(reporter()))
+    try:
+        if args.duration:
+            await asyncio.sleep(args.duration)
+        else:
+            await asyncio.Event().wait()
+    except asyncio.CancelledError:
+        # interrupted, still print the statistics
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        for pool in pools:
+            pool.server.close()
+
+    summary = {}
+    for name, part in parts:
+        part.report()
+        summary[name] = part.summary()
+    if args.stats:
+        with open(args.stats, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stratum pool simulator and simulated miners')
+    parser.add_argument('command', choices=['serve', 'swarm', 'load'])
+    parser.add_argument('--host', default='127.0.0.1', help="pool address (serve: '0.0.0.0' for devices)")
+    parser.add_argument('--port', type=int, default=3333)
+    parser.add_argument('--duration', type=float, default=0, help='seconds to run, 0 runs until interrupted')
+    parser.add_argument('--report-every', type=float, default=10, help='seconds between reports, 0 only at the end')
+    parser.add_argument('--stats', metavar='FILE', help='write the final statistics as JSON')
+    parser.add_argument('--seed', type=int, default=792980)
+
+    pool = parser.add_argument_group('pool')
+    pool.add_argument('--templates', default=DEFAULT_SESSION,
+                      help="capture with mining.notify lines to replay, or 'synthetic'")
+    pool.add_argument('--notify-interval', type=float, default=30, help='seconds between jobs')
+    pool.add_argument('--clean-every', type=int, default=10, help='a clean_jobs notify (new block) every N jobs')
+    pool.add_argument('--branches', type=int, default=12, help='merkle branches of synthetic templates')
+    pool.add_argument('--difficulty', type=float, default=1024, help='share difficulty until a miner suggests one')
+    pool.add_argument('--min-difficulty', type=float, default=0, help='lowest suggested difficulty accepted')
+    pool.add_argument('--fixed-difficulty', action='store_true', help='ignore mining.suggest_difficulty')
+    pool.add_argument('--version-mask', type=lambda s: int(s, 16), default=0x1fffe000, help='version rolling mask (hex)')
+    pool.add_argument('--version-mask-every', type=float, default=0, help='seconds between mining.set_version_mask')
+    pool.add_argument('--extranonce-2-size', type=int, default=8)
+    pool.add_argument('--reconnect-every', type=float, default=0, help='seconds between client.reconnect to everyone')
+    pool.add_argument('--reconnect-grace', type=float, default=1, help='seconds before the pool drops the connection')
+    pool.add_argument('--kill-every', type=float, default=0, help='seconds between outages that drop every connection')
+    pool.add_argument('--down-for', type=float, default=10, help='seconds an outage refuses new connections')
+
+    swarm = parser.add_argument_group('swarm')
+    swarm.add_argument('--miners', type=int, default=100)
+    swarm.add_argument('--user', default='bc1qsimulated')
+    swarm.add_argument('--share-interval', type=float, default=5, help='mean seconds between shares per miner')
+    swarm.add_argument('--swarm-difficulty', type=float, default=1e-6,
+                       help='suggested difficulty, shares are really hashed (1e-6 is ~4300 hashes)')
+    swarm.add_argument('--max-hashes', type=int, default=1 << 20, help='give up the nonce search after this many')
+    swarm.add_argument('--ramp-up', type=float, default=2, help='seconds to connect all miners')
+    swarm.add_argument('--reconnect-delay', type=float, default=1, help='longest random wait before reconnecting')
+
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""Share difficulty in bulk, computed exactly like test_nonce_value.
+
+  python3 test/host/share_validator.py validate shares.csv --out checked.csv
+  python3 test/host/share_validator.py crosscheck      # against libminingcore.so
+  python3 test/host/share_validator.py bench --shares 2000000
+
+The header is assembled as test_nonce_value does: rolled version, the
+notify's previous block hash with every 32 bit word reversed, merkle
+root, ntime, nbits and nonce, little endian. The double SHA-256 runs
+through hashlib on a process pool. Each worker converts the hashes to
+doubles in one NumPy pass; without NumPy it repeats le256todouble per
+share. Both paths do the same float operations in the same order as the
+C code, so the difficulties are bit for bit the ones the miner logged.
+
+Input is CSV with a header row or JSON lines, one share each, hex values:
+  version          job version, or the rolled version if version_bits is absent
+  version_bits     the bits of mining.submit, rolled version = version ^ version_bits
+  prev_block_hash  as in mining.notify
+  merkle_root      as calculate_merkle_root_hash returns it, or instead
+  coinbase_1, extranonce_1, extranonce_2, coinbase_2, merkle_branches
+                   (branches space separated in CSV, a list in JSON)
+  ntime, nbits, nonce
+  difficulty       optional, the difficulty the device logged, compared
+  pool_difficulty  optional, the share is valid if it reaches it
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import random
+import struct
+import sys
+import time
+
+# NumPy is optional, the pure Python path gives the same results
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# cgminer constants of mining.cpp and utils.cpp
+TRUEDIFFONE = 26959535291011309493156476344723991336010898738574164086137773096960.0
+BITS192 = 6277101735386680763835789423207666416102355444464034512896.0
+BITS128 = 340282366920938463463374607431768211456.0
+BITS64 = 18446744073709551616.0
+
+HEADER_SIZE = 80
+CHUNK_SIZE = 50000
+
+# relative difference allowed against a logged difficulty (printed with %.1f)
+LOGGED_TOLERANCE = 1e-3
+
+_sha256 = hashlib.sha256
+
+
+def double_sha256(data):
+    return _sha256(_sha256(data).digest()).digest()
+
+
+def swap_endian_words(data):
+    """swap_endian_words_bin() of utils.cpp, reverses every 32 bit word."""
+    return b''.join(data[i:i + 4][::-1] for i in range(0, len(data), 4))
+
+
+def merkle_root(coinbase, merkle_branches):
+    root = double_sha256(coinbase)
+    for branch in merkle_branches:
+        root = double_sha256(root + branch)
+    return root
+
+
+def block_header(version, prev_block_hash, root, ntime, nbits, nonce):
+    """The 80 bytes test_nonce_value hashes, prev_block_hash as in mining.notify."""
+    return struct.pack('<I', version) + swap_endian_words(prev_block_hash) + root + struct.pack('<III', ntime, nbits, nonce)
+
+
+def le256todouble(hash_value):
+    w0, w1, w2, w3 = struct.unpack('<4Q', hash_value)
+    d = w3 * BITS192
+    d += w2 * BITS128
+    d += w1 * BITS64
+    d += w0
+    return d
+
+
+def difficulty_of(hash_value):
+    """test_nonce_value() of an already hashed header."""
+    return TRUEDIFFONE / le256todouble(hash_value)
+
+
+def share_difficulty(header):
+    return difficulty_of(double_sha256(header))
+
+
+def hash_headers(headers):
+    """Double SHA-256 of concatenated 80 byte headers, concatenated."""
+    sha256 = _sha256
+    return b''.join(sha256(sha256(headers[i:i + HEADER_SIZE]).digest()).digest()
+                    for i in range(0, len(headers), HEADER_SIZE))
+
+
+def difficulties(hashes, use_numpy=True):
+    """test_nonce_value() of every 32 byte hash."""
+    if np is not None and use_numpy:
+        words = np.frombuffer(hashes, dtype='<u8').reshape(-1, 4).astype(np.float64)
+        with np.errstate(divide='ignore'):
+            d = words[:, 3] * BITS192
+            d += words[:, 2] * BITS128
+            d += words[:, 1] * BITS64
+            d += words[:, 0]
+            return TRUEDIFFONE / d
+    return [TRUEDIFFONE / le256todouble(hashes[i:i + 32]) if any(hashes[i:i + 32]) else float('inf')
+            for i in range(0, len(hashes), 32)]
+
+
+def _hex(value):
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def share_header(share):
+    """80 byte header of a share record (dict of strings)."""
+    version = _hex(share['version'])
+    if share.get('version_bits'):
+        version ^= _hex(share['version_bits'])
+    prev_block_hash = bytes.fromhex(share['prev_block_hash'])
+    if share.get('merkle_root'):
+        root = bytes.fromhex(share['merkle_root'])
+    else:
+        branches = share.get('merkle_branches') or []
+        if isinstance(branches, str):
+            branches = branches.split()
+        coinbase = bytes.fromhex(share['coinbase_1'] + share['extranonce_1'] + share['extranonce_2'] + share['coinbase_2'])
+        root = merkle_root(coinbase, [bytes.fromhex(branch) for branch in branches])
+    return block_header(version, prev_block_hash, root, _hex(share['ntime']), _hex(share['nbits']), _hex(share['nonce']))
+
+
+def _optional_float(value):
+    return float(value) if value not in (None, '') else None
+
+
+def validate_chunk(shares, use_numpy=True):
+    """Worker: difficulty, validity and logged mismatch of each share."""
+    headers = bytearray()
+    bad = []
+    for i, share in enumerate(shares):
+        try:
+            headers += share_header(share)
+        except (KeyError, ValueError, TypeError, struct.error):
+            headers += bytes(HEADER_SIZE)
+            bad.append(i)
+    found = difficulties(hash_headers(bytes(headers)), use_numpy)
+
+    results = []
+    bad = set(bad)
+    for i, share in enumerate(shares):
+        if i in bad:
+            results.append((None, False, False))
+            continue
+        difficulty = float(found[i])
+        pool_difficulty = _optional_float(share.get('pool_difficulty'))
+        logged = _optional_float(share.get('difficulty'))
+        valid = pool_difficulty is None or difficulty >= pool_difficulty
+        mismatch = logged is not None and abs(difficulty - logged) > LOGGED_TOLERANCE * max(logged, 1.0)
+        results.append((difficulty, valid, mismatch))
+    return results
+
+
+def read_shares(path):
+    with open(path, newline='') as f:
+        first = f.read(1)
+        f.seek(0)
+        if first == '{':
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def validate(shares, jobs, use_numpy=True):
+    """Results of validate_chunk for all shares, in order."""
+    if jobs <= 1:
+        return [result for chunk in chunks(shares, CHUNK_SIZE) for result in validate_chunk(chunk, use_numpy)]
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        parts = pool.map(validate_chunk, chunks(shares, CHUNK_SIZE), [use_numpy] * ((len(shares) + CHUNK_SIZE - 1) // CHUNK_SIZE))
+        return [result for part in parts for result in part]
+
+
+def validate_headers_chunk(headers, use_numpy=True):
+    """Worker for prepared headers: difficulties as a list."""
+    found = difficulties(hash_headers(headers), use_numpy)
+    return found.tolist() if np is not None and use_numpy else found
+
+
+def validate_headers(headers, jobs, use_numpy=True):
+    """Difficulties of concatenated 80 byte headers."""
+    step = CHUNK_SIZE * HEADER_SIZE
+    parts = [headers[i:i + step] for i in range(0, len(headers), step)]
+    if jobs <= 1:
+        return [d for part in parts for d in validate_headers_chunk(part, use_numpy)]
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        return [d for result in pool.map(validate_headers_chunk, parts, [use_numpy] * len(parts)) for d in result]
+
+
+def random_headers(count, seed):
+    rng = random.Random(seed)
+    return rng.randbytes(count * HEADER_SIZE)
+
+
+def command_validate(args):
+    shares = read_shares(args.input)
+    start = time.perf_counter()
+    results = validate(shares, args.jobs, not args.no_numpy)
+    seconds = time.perf_counter() - start
+
+    unreadable = sum(1 for difficulty, _, _ in results if difficulty is None)
+    invalid = sum(1 for difficulty, valid, _ in results if difficulty is not None and not valid)
+    mismatches = sum(1 for _, _, mismatch in results if mismatch)
+    summary = {
+        'shares': len(shares),
+        'valid': len(shares) - unreadable - invalid,
+        'invalid': invalid,
+        'unreadable': unreadable,
+        'logged_mismatches': mismatches,
+        'best_difficulty': max((d for d, _, _ in results if d is not None), default=0.0),
+        'shares_per_minute': len(shares) / seconds * 60 if seconds else 0.0,
+    }
+
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['index', 'difficulty', 'valid', 'logged_mismatch'])
+            for i, (difficulty, valid, mismatch) in enumerate(results):
+                writer.writerow([i, '' if difficulty is None else repr(difficulty), int(valid), int(mismatch)])
+
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+    return 1 if invalid or unreadable or mismatches else 0
+
+
+def command_crosscheck(args):
+    """Compares both paths with test_nonce_value of libminingcore.so."""
+    sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+    import mining_core
+
+    try:
+        core = mining_core.MiningCore(args.library)
+    except OSError as e:
+        print(f"Unable to load {args.library}: {e}\nBuild it with: make -C test/host libminingcore.so")
+        return 1
+
+    rng = random.Random(args.seed)
+    self_test = mining_core.SELF_TEST
+    root = core.merkle_root(self_test['coinbase_tx'], self_test['merkle_branches'])
+    cases = [(self_test['prev_block_hash'], root, self_test['version'], self_test['rolled_version'], self_test['target'],
+              self_test['ntime'], self_test['nonce'])]
+    for _ in range(args.count):
+        version = rng.getrandbits(32)
+        cases.append((rng.randbytes(32).hex(), rng.randbytes(32), version, version ^ (rng.getrandbits(32) & 0x1fffe000),
+                      rng.getrandbits(32), rng.getrandbits(32), rng.getrandbits(32)))
+
+    headers = bytearray()
+    expected = []
+    for prev_block_hash, root, version, rolled_version, nbits, ntime, nonce in cases:
+        job = core.job(prev_block_hash, root, version, 0x1fffe000, nbits, ntime)
+        expected.append(job.test_nonce_value(nonce, rolled_version))
+        headers += block_header(rolled_version, bytes.fromhex(prev_block_hash), root, ntime, nbits, nonce)
+    headers = bytes(headers)
+
+    failures = 0
+    paths = [('pure', False)] + ([('numpy', True)] if np is not None else [])
+    for name, use_numpy in paths:
+        found = validate_headers(headers, 1, use_numpy)
+        different = sum(1 for a, b in zip(found, expected) if a != b)
+        print(f"{name:<6} {len(cases)} headers, {different} differ from test_nonce_value")
+        failures += different
+    print(f"self test share difficulty {expected[0]:.2f}")
+    return 1 if failures else 0
+
+
+def command_bench(args):
+    headers = random_headers(args.shares, args.seed)
+    results = {}
+    for jobs in sorted({1, args.jobs}):
+        for name, use_numpy in [('pure', False)] + ([('numpy', True)] if np is not None else []):
+            start = time.perf_counter()
+            validate_headers(headers, jobs, use_numpy)
+            seconds = time.perf_counter() - start
+            results[f'{name}/{jobs}'] = args.shares / seconds * 60
+            print(f"{name:<6} {jobs:>3} processes: {args.shares / seconds * 60 / 1e6:8.2f}M shares/minute")
+
+    # the whole path from share records, header assembly included
+    rng = random.Random(args.seed)
+    records = [{'version': f"{rng.getrandbits(32):08x}", 'version_bits': f"{rng.getrandbits(32) & 0x1fffe000:08x}",
+                'prev_block_hash': rng.randbytes(32).hex(), 'merkle_root': rng.randbytes(32).hex(),
+                'ntime': f"{rng.getrandbits(32):08x}", 'nbits': '1705ae3a', 'nonce': f"{rng.getrandbits(32):08x}"}
+               for _ in range(min(args.shares, 500000))]
+    start = time.perf_counter()
+    validate(records, args.jobs, np is not None)
+    seconds = time.perf_counter() - start
+    print(f"records {args.jobs:>3} processes: {len(records) / seconds * 60 / 1e6:8.2f}M shares/minute")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate shares in bulk with the difficulty of test_nonce_value')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('validate', help='validate a CSV or JSON lines file of shares')
+    p.add_argument('input')
+    p.add_argument('--out', metavar='FILE', help='write the difficulty and validity of every share as CSV')
+    p.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes (default: number of CPUs)')
+    p.add_argument('--no-numpy', action='store_true', help='use the pure Python path')
+
+    p = sub.add_parser('crosscheck', help='compare with test_nonce_value of libminingcore.so')
+    p.add_argument('--library', default=os.path.join(os.path.dirname(os.path.realpath(__file__)), 'libminingcore.so'))
+    p.add_argument('--count', type=int, default=100000, help='random headers')
+    p.add_argument('--seed', type=int, default=792980)
+
+    p = sub.add_parser('bench', help='shares per minute with and without NumPy')
+    p.add_argument('--shares', type=int, default=1000000)
+    p.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes (default: number of CPUs)')
+    p.add_argument('--seed', type=int, default=792980)
+
+    args = parser.parse_args()
+    return {'validate': command_validate, 'crosscheck': command_crosscheck, 'bench': command_bench}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
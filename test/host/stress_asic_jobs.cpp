@@ -0,0 +1,201 @@
+// Host stress test of AsicJobs: one writer storing jobs like create_jobs_task
+// and reader threads fetching them like ASIC_result_task. Compares the
+// previous malloc/strdup/clone store with the slab and counts heap
+// allocations per second. Every job carries its sequence number in all
+// fields, so a torn read shows up as an inconsistent job.
+//
+//   make -C test/host stress_asic_jobs && ./test/host/stress_asic_jobs
+
+#include <atomic>
+#include <chrono>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <thread>
+#include <vector>
+
+#include "asic_jobs.h"
+
+#define DURATION_MS 1000
+#define NUM_READERS 2
+
+static std::atomic<uint64_t> allocations(0);
+
+extern "C" void *__libc_malloc(size_t size);
+
+// count every heap allocation of the process, strdup allocates through malloc too
+extern "C" void *malloc(size_t size)
+{
+    allocations.fetch_add(1, std::memory_order_relaxed);
+    return __libc_malloc(size);
+}
+
+// the job store before the slab, strings on the heap and a clone per result
+typedef struct
+{
+    bm_job job;
+    char *jobid;
+    char *extranonce2;
+} legacy_bm_job;
+
+class LegacyAsicJobs {
+    legacy_bm_job *m_activeJobs[MAX_ASIC_JOBS];
+    pthread_mutex_t m_validJobsLock = PTHREAD_MUTEX_INITIALIZER;
+
+    static void freeJob(legacy_bm_job *job)
+    {
+        free(job->jobid);
+        free(job->extranonce2);
+        free(job);
+    }
+
+public:
+    LegacyAsicJobs() {
+        memset(m_activeJobs, 0, sizeof(m_activeJobs));
+    }
+
+    ~LegacyAsicJobs() {
+        for (int i = 0; i < MAX_ASIC_JOBS; i++) {
+            if (m_activeJobs[i]) {
+                freeJob(m_activeJobs[i]);
+            }
+        }
+    }
+
+    void storeJob(const bm_job *src, uint8_t asic_job_id) {
+        legacy_bm_job *next_job = (legacy_bm_job *) malloc(sizeof(legacy_bm_job));
+        memcpy(&next_job->job, src, sizeof(bm_job));
+        next_job->jobid = strdup(src->jobid);
+        next_job->extranonce2 = strdup(src->extranonce2);
+
+        pthread_mutex_lock(&m_validJobsLock);
+        if (m_activeJobs[asic_job_id]) {
+            freeJob(m_activeJobs[asic_job_id]);
+        }
+        m_activeJobs[asic_job_id] = next_job;
+        pthread_mutex_unlock(&m_validJobsLock);
+    }
+
+    bool getJob(uint8_t asic_job_id, bm_job *job) {
+        pthread_mutex_lock(&m_validJobsLock);
+        legacy_bm_job *src = m_activeJobs[asic_job_id];
+        if (!src) {
+            pthread_mutex_unlock(&m_validJobsLock);
+            return false;
+        }
+        legacy_bm_job *clone = (legacy_bm_job *) malloc(sizeof(legacy_bm_job));
+        memcpy(clone, src, sizeof(legacy_bm_job));
+        clone->jobid = strdup(src->jobid);
+        clone->extranonce2 = strdup(src->extranonce2);
+        pthread_mutex_unlock(&m_validJobsLock);
+
+        // the result task used the clone's strings and freed it
+        memcpy(job, &clone->job, sizeof(bm_job));
+        strcpy(job->jobid, clone->jobid);
+        strcpy(job->extranonce2, clone->extranonce2);
+        freeJob(clone);
+        return true;
+    }
+};
+
+static void make_job(uint32_t seq, bm_job *job)
+{
+    memset(job, 0, sizeof(bm_job));
+    job->version = seq * 3;
+    job->ntime = seq;
+    job->target = ~seq;
+    memset(job->merkle_root, seq & 0xff, 32);
+    memset(job->merkle_root_be, seq & 0xff, 32);
+    snprintf(job->jobid, sizeof(job->jobid), "%08x", (unsigned) seq);
+    snprintf(job->extranonce2, sizeof(job->extranonce2), "%016x", (unsigned) seq);
+}
+
+static bool consistent(const bm_job *job)
+{
+    bm_job expected;
+    make_job(job->ntime, &expected);
+    return !memcmp(job, &expected, sizeof(bm_job));
+}
+
+struct Result {
+    double stores_per_s;
+    double reads_per_s;
+    double allocations_per_s;
+    uint64_t torn;
+};
+
+template <typename Jobs> static Result run(Jobs *jobs)
+{
+    std::atomic<bool> start(false);
+    std::atomic<bool> stop(false);
+    std::atomic<uint64_t> stores(0);
+    std::atomic<uint64_t> reads(0);
+    std::atomic<uint64_t> torn(0);
+
+    std::thread writer([&]() {
+        while (!start.load()) {
+        }
+        uint64_t n = 0;
+        bm_job job;
+        for (uint32_t seq = 1; !stop.load(std::memory_order_relaxed); seq++) {
+            make_job(seq, &job);
+            jobs->storeJob(&job, seq % MAX_ASIC_JOBS);
+            n++;
+        }
+        stores += n;
+    });
+
+    std::vector<std::thread> readers;
+    for (int r = 0; r < NUM_READERS; r++) {
+        readers.emplace_back([&, r]() {
+            while (!start.load()) {
+            }
+            uint64_t n = 0;
+            uint64_t bad = 0;
+            bm_job job;
+            for (uint32_t i = r; !stop.load(std::memory_order_relaxed); i += 7) {
+                if (jobs->getJob(i % MAX_ASIC_JOBS, &job)) {
+                    bad += !consistent(&job);
+                }
+                n++;
+            }
+            reads += n;
+            torn += bad;
+        });
+    }
+
+    uint64_t allocations_before = allocations.load();
+    auto begin = std::chrono::steady_clock::now();
+    start = true;
+    std::this_thread::sleep_for(std::chrono::milliseconds(DURATION_MS));
+    stop = true;
+    double seconds = std::chrono::duration<double>(std::chrono::steady_clock::now() - begin).count();
+    uint64_t allocated = allocations.load() - allocations_before;
+
+    writer.join();
+    for (auto &reader : readers) {
+        reader.join();
+    }
+
+    return Result{stores / seconds, reads / seconds, allocated / seconds, torn.load()};
+}
+
+static void print_result(const char *name, const Result &result)
+{
+    printf("%-8s %12.0f stores/s %12.0f reads/s %12.0f allocations/s %6llu torn reads\n", name, result.stores_per_s,
+           result.reads_per_s, result.allocations_per_s, (unsigned long long) result.torn);
+}
+
+int main()
+{
+    static LegacyAsicJobs legacy;
+    static AsicJobs slab;
+
+    printf("1 writer, %d readers, %d ms each\n", NUM_READERS, DURATION_MS);
+    Result before = run(&legacy);
+    print_result("clone", before);
+    Result after = run(&slab);
+    print_result("slab", after);
+
+    return (before.torn || after.torn || after.allocations_per_s > 0) ? 1 : 0;
+}
@@ -0,0 +1,336 @@
+// Host stress test of History with one writer pushing shares like
+// ASIC_result_task and readers polling the current hashrate, exporting JSON
+// and the binary history at the same time. A single threaded History fed with
+// the same shares gives the expected value of every sample, so a torn or
+// overwritten sample a reader didn't notice shows up as a mismatch. The
+// pushShare latency next to a busy exporter is compared with the previous
+// locking, emulated by a mutex around pushShare and the exports.
+//
+//   make -C test/host stress_history && ./test/host/stress_history
+
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <mutex>
+#include <random>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <thread>
+#include <unistd.h>
+#include <vector>
+
+#include "ArduinoJson.h"
+#include "esp_timer.h"
+#include "history.h"
+
+// wraps the raw ring three times
+#define NUM_SHARES (4 * HISTORY_MAX_SAMPLES)
+#define FIRST_TIMESTAMP 1000000ULL
+#define NUM_ASICS 4
+#define LATENCY_SHARES 5000
+#define LATENCY_PAUSE_US 100
+
+static int failures = 0;
+
+#define CHECK(cond)                                                                                                            \
+    do {                                                                                                                       \
+        if (!(cond)) {                                                                                                         \
+            printf("FAIL %s:%d: %s\n", __FILE__, __LINE__, #cond);                                                            \
+            failures++;                                                                                                        \
+        }                                                                                                                      \
+    } while (0)
+
+static uint64_t now_us()
+{
+    return std::chrono::duration_cast<std::chrono::microseconds>(std::chrono::steady_clock::now().time_since_epoch())
+        .count();
+}
+
+struct Share {
+    uint32_t diff;
+    uint64_t timestamp;
+};
+
+struct Expected {
+    uint64_t timestamp;
+    uint64_t current; // of the averages, 0 until there are two shares
+    uint32_t hashrate10m;
+    uint32_t hashrate1h;
+    uint32_t hashrate1d;
+};
+
+static std::vector<Share> shares;
+static std::vector<Expected> expected;
+
+static void make_shares()
+{
+    std::mt19937 rng(7);
+    std::exponential_distribution<double> interval(1.0 / 1500.0);
+    std::uniform_int_distribution<uint32_t> diff(512, 4096);
+
+    uint64_t timestamp = FIRST_TIMESTAMP;
+    for (int i = 0; i < NUM_SHARES; i++) {
+        timestamp += 1 + (uint64_t) interval(rng);
+        shares.push_back({diff(rng), timestamp});
+    }
+
+    History *history = new History();
+    history->init(NUM_ASICS);
+    for (int i = 0; i < NUM_SHARES; i++) {
+        history->pushShare(shares[i].diff, shares[i].timestamp, i % NUM_ASICS);
+        expected.push_back({shares[i].timestamp, history->getCurrentTimestamp(), (uint32_t) (history->getHashrate10mSample(i) * 100.0),
+                            (uint32_t) (history->getHashrate1hSample(i) * 100.0),
+                            (uint32_t) (history->getHashrate1dSample(i) * 100.0)});
+    }
+    delete history;
+}
+
+// index of the share with the timestamp, -1 if there is none
+static int find_share(uint64_t timestamp)
+{
+    auto it = std::lower_bound(expected.begin(), expected.end(), timestamp,
+                               [](const Expected &e, uint64_t ts) { return e.timestamp < ts; });
+    return (it != expected.end() && it->timestamp == timestamp) ? (int) (it - expected.begin()) : -1;
+}
+
+struct Counters {
+    std::atomic<uint64_t> snapshots{0};
+    std::atomic<uint64_t> records{0};
+    std::atomic<uint64_t> overwritten{0};
+    std::atomic<uint64_t> json_values{0};
+    std::atomic<uint64_t> mismatches{0};
+};
+
+// the current hashrate like create_jobs_task and the display poll it
+static void snapshot_reader(History *history, std::atomic<bool> *done, Counters *counters)
+{
+    int last = 0;
+    while (!done->load()) {
+        history_snapshot snapshot;
+        history->getSnapshot(&snapshot);
+        counters->snapshots++;
+        if (snapshot.numSamples < last) {
+            counters->mismatches++;
+        }
+        last = snapshot.numSamples;
+        if (!snapshot.numSamples) {
+            continue;
+        }
+        const Expected *e = &expected[snapshot.numSamples - 1];
+        if (snapshot.timestamp != e->current || (uint32_t) (snapshot.hashrate[HISTORY_WINDOW_10M] * 100.0) != e->hashrate10m ||
+            (uint32_t) (snapshot.hashrate[HISTORY_WINDOW_1H] * 100.0) != e->hashrate1h ||
+            (uint32_t) (snapshot.hashrate[HISTORY_WINDOW_1D] * 100.0) != e->hashrate1d) {
+            counters->mismatches++;
+        }
+        for (int i = 0; i < HISTORY_NUM_TIERS; i++) {
+            if (!snapshot.hasBucket[i] || snapshot.bucket[i].timestamp != e->timestamp) {
+                counters->mismatches++;
+            }
+        }
+    }
+}
+
+// the binary export from the oldest sample, which the writer keeps overwriting
+static void binary_reader(History *history, std::atomic<bool> *done, Counters *counters)
+{
+    history_record records[256];
+    while (!done->load()) {
+        history_binary_header header;
+        int count = history->exportBinaryHeader(&header, 0, 0, 0);
+        uint64_t timestamp = 0;
+        int index = header.first;
+        if (count && find_share(header.timestamp) != index) {
+            counters->mismatches++;
+        }
+        while (index < (int) header.first + count && !done->load()) {
+            int max = std::min((int) header.first + count - index, 256);
+            int num = history->exportRecords(records, index, max, &timestamp);
+            if (num < 0) {
+                counters->overwritten++;
+                break;
+            }
+            // the timestamp of the last record is the one of the share at its index
+            uint64_t ts = timestamp;
+            for (int i = num - 1; i >= 0; i--) {
+                const Expected *e = &expected[index + i];
+                if (ts != e->timestamp || records[i].hashrate10m != e->hashrate10m || records[i].hashrate1h != e->hashrate1h ||
+                    records[i].hashrate1d != e->hashrate1d) {
+                    counters->mismatches++;
+                }
+                ts -= records[i].delta;
+            }
+            counters->records += num;
+            index += num;
+        }
+    }
+}
+
+// JSON exports of the last hour, raw and downsampled, like the web UI
+static void json_reader(History *history, std::atomic<bool> *done, Counters *counters)
+{
+    int round = 0;
+    while (!done->load()) {
+        int num_samples = history->getNumSamples();
+        if (!num_samples) {
+            continue;
+        }
+        // in the time of the samples, the current time of the client is the host clock
+        uint64_t end = expected[num_samples - 1].timestamp;
+        uint64_t cur = esp_timer_get_time() / 1000;
+        int max_points = (round++ & 1) ? 600 : 0;
+
+        JsonDocument doc;
+        JsonObject json_history = doc["history"].to<JsonObject>();
+        history->exportHistoryData(json_history, end - 3600 * 1000, end, cur, max_points);
+
+        JsonArray timestamps = json_history["timestamps"];
+        JsonArray hashrate_10m = json_history["hashrate_10m"];
+        bool raw = json_history["resolution"].as<int>() == 0;
+
+        // the timestamps are relative to the start in the clock of the export
+        // which moved on by up to the time the export took, find that offset
+        // with the first sample
+        int64_t start = (int64_t) json_history["timestampBase"].as<uint64_t>();
+        int64_t window = esp_timer_get_time() / 1000 - (int64_t) cur;
+        int64_t offset = 0;
+        bool found = false;
+        for (int64_t d = 0; raw && timestamps.size() && d <= window && !found; d++) {
+            int index = find_share((uint64_t) (timestamps[0].as<int64_t>() + start + d));
+            if (index >= 0 && hashrate_10m[0].as<uint32_t>() == expected[index].hashrate10m) {
+                offset = start + d;
+                found = true;
+            }
+        }
+
+        int64_t previous = 0;
+        for (size_t i = 0; i < timestamps.size(); i++) {
+            int64_t ts = timestamps[i].as<int64_t>();
+            if (ts <= previous && i) {
+                counters->mismatches++;
+            }
+            previous = ts;
+            if (raw) {
+                int index = found ? find_share((uint64_t) (ts + offset)) : -1;
+                if (index < 0 || hashrate_10m[i].as<uint32_t>() != expected[index].hashrate10m) {
+                    counters->mismatches++;
+                }
+            } else if (hashrate_10m[i].as<int>() < json_history["hashrate_10m_min"][i].as<int>() - 1 ||
+                       hashrate_10m[i].as<int>() > json_history["hashrate_10m_max"][i].as<int>() + 1) {
+                counters->mismatches++;
+            }
+        }
+        counters->json_values += timestamps.size();
+    }
+}
+
+static void stress()
+{
+    History *history = new History();
+    history->init(NUM_ASICS);
+
+    std::atomic<bool> done(false);
+    Counters counters;
+    std::thread readers[] = {
+        std::thread(snapshot_reader, history, &done, &counters),
+        std::thread(binary_reader, history, &done, &counters),
+        std::thread(json_reader, history, &done, &counters),
+    };
+
+    uint64_t start = now_us();
+    for (int i = 0; i < NUM_SHARES; i++) {
+        history->pushShare(shares[i].diff, shares[i].timestamp, i % NUM_ASICS);
+        if (i % 1024 == 0) {
+            // let the readers run on a single core
+            std::this_thread::yield();
+        }
+    }
+    uint64_t us = now_us() - start;
+
+    done.store(true);
+    for (auto &t : readers) {
+        t.join();
+    }
+
+    printf("%d shares in %llu ms next to %llu snapshots, %llu binary records (%llu exports cut short), %llu JSON values\n",
+           NUM_SHARES, (unsigned long long) us / 1000, (unsigned long long) counters.snapshots.load(),
+           (unsigned long long) counters.records.load(), (unsigned long long) counters.overwritten.load(),
+           (unsigned long long) counters.json_values.load());
+    printf("%llu mismatches\n", (unsigned long long) counters.mismatches.load());
+    CHECK(counters.mismatches.load() == 0);
+    CHECK(counters.snapshots.load() > 0 && counters.records.load() > 0 && counters.json_values.load() > 0);
+
+    delete history;
+}
+
+// pushShare latency while a thread exports the last day as raw JSON without pause
+static void latency(bool locked)
+{
+    History *history = new History();
+    history->init(NUM_ASICS);
+
+    // a day of shares to export
+    int i = 0;
+    for (; i < NUM_SHARES && shares[i].timestamp < FIRST_TIMESTAMP + 86400 * 1000; i++) {
+        history->pushShare(shares[i].diff, shares[i].timestamp, i % NUM_ASICS);
+    }
+
+    std::mutex lock;
+    std::atomic<bool> done(false);
+    std::atomic<uint64_t> exports(0);
+    std::thread exporter([&]() {
+        while (!done.load()) {
+            JsonDocument doc;
+            JsonObject json_history = doc["history"].to<JsonObject>();
+            uint64_t end = expected[history->getNumSamples() - 1].timestamp;
+            uint64_t cur = esp_timer_get_time() / 1000;
+            if (locked) {
+                lock.lock();
+            }
+            history->exportHistoryData(json_history, end - 86400 * 1000, end, cur);
+            if (locked) {
+                lock.unlock();
+            }
+            exports++;
+        }
+    });
+
+    std::vector<uint64_t> us;
+    for (int n = 0; n < LATENCY_SHARES && i < NUM_SHARES; n++, i++) {
+        uint64_t start = now_us();
+        if (locked) {
+            lock.lock();
+        }
+        history->pushShare(shares[i].diff, shares[i].timestamp, i % NUM_ASICS);
+        if (locked) {
+            lock.unlock();
+        }
+        us.push_back(now_us() - start);
+        usleep(LATENCY_PAUSE_US);
+    }
+
+    done.store(true);
+    exporter.join();
+    delete history;
+
+    std::sort(us.begin(), us.end());
+    printf("%-9s pushShare p50 %6llu us p99 %6llu us p99.9 %6llu us max %6llu us, %llu exports of 1d\n",
+           locked ? "locked" : "lock-free", (unsigned long long) us[us.size() / 2],
+           (unsigned long long) us[us.size() * 99 / 100], (unsigned long long) us[us.size() * 999 / 1000],
+           (unsigned long long) us.back(), (unsigned long long) exports.load());
+}
+
+int main()
+{
+    make_shares();
+    stress();
+    latency(true);
+    latency(false);
+
+    if (failures) {
+        printf("%d failures\n", failures);
+        return 1;
+    }
+    printf("ok\n");
+    return 0;
+}
@@ -0,0 +1,15 @@
+// boards/board.h for host builds of stratum_task.cpp: what the pool is told
+// in mining.subscribe.
+#pragma once
+
+class Board {
+  public:
+    const char *getMiningAgent()
+    {
+        return "NerdQAxe++";
+    }
+    const char *getAsicModel()
+    {
+        return "BM1370";
+    }
+};
@@ -0,0 +1,2 @@
+// connect.h for host builds of stratum_task.cpp: the host network is up.
+#pragma once
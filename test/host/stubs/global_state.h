@@ -0,0 +1,11 @@
+// global_state.h for host builds of stratum_task.cpp: only the globals it
+// uses, the test defines them.
+#pragma once
+
+#include "stratum_api.h"
+
+#include "asic_jobs.h"
+#include "system.h"
+
+extern System SYSTEM_MODULE;
+extern AsicJobs asicJobs;
@@ -0,0 +1,19 @@
+// nvs_config.h for host builds of stratum_task.cpp: the settings are
+// variables the test sets.
+#pragma once
+
+#include <stdint.h>
+
+inline uint32_t config_host_stratum_difficulty = 1000;
+inline bool config_host_hot_standby = false;
+
+namespace Config {
+inline uint32_t getStratumDifficulty()
+{
+    return config_host_stratum_difficulty;
+}
+inline bool isStratumHotStandbyEnabled()
+{
+    return config_host_hot_standby;
+}
+} // namespace Config
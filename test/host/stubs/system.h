@@ -0,0 +1,57 @@
+// system.h for host builds of stratum_task.cpp: the pool configuration and
+// the counters the stratum tasks update.
+#pragma once
+
+#include <atomic>
+#include <stdint.h>
+
+#include "boards/board.h"
+#include "stratum_task.h"
+
+class System {
+  protected:
+    Board m_board;
+    StratumConfig m_stratumConfig[2] = {};
+    std::atomic<uint32_t> m_poolDifficulty{0};
+    std::atomic<int> m_poolErrors{0};
+    std::atomic<uint32_t> m_sharesAccepted{0};
+    std::atomic<uint32_t> m_sharesRejected{0};
+
+  public:
+    Board *getBoard()
+    {
+        return &m_board;
+    }
+    StratumConfig *getStratumConfig(uint8_t index)
+    {
+        return &m_stratumConfig[index];
+    }
+    void setPoolDifficulty(uint32_t difficulty)
+    {
+        m_poolDifficulty = difficulty;
+    }
+    uint32_t getPoolDifficulty() const
+    {
+        return m_poolDifficulty;
+    }
+    void incPoolErrors()
+    {
+        ++m_poolErrors;
+    }
+    int getPoolErrors() const
+    {
+        return m_poolErrors;
+    }
+    void notifyAcceptedShare()
+    {
+        ++m_sharesAccepted;
+    }
+    void notifyRejectedShare()
+    {
+        ++m_sharesRejected;
+    }
+    void notifyNewNtime(uint32_t ntime)
+    {
+        (void) ntime;
+    }
+};
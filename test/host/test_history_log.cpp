@@ -0,0 +1,445 @@
+// Host test of HistoryLog on the simulated flash of include/esp_partition.h.
+// A day of shares is logged and replayed into a fresh History after a reboot,
+// which has to come up with the tiers and warm averages. The log is filled
+// past its size to check the wrap and the wear of the sectors. Then the power
+// is cut at random points while records are appended, up to three times
+// before a reboot: the replay may only return records that were added, in
+// order and intact, and has to return every record whose page was written,
+// also after more reboots following a torn page.
+//
+//   make -C test/host test_history_log && ./test/host/test_history_log
+
+#include <algorithm>
+#include <chrono>
+#include <math.h>
+#include <random>
+#include <stdio.h>
+#include <string.h>
+#include <vector>
+
+#include "esp_partition.h"
+#include "esp_timer.h"
+#include "history.h"
+#include "history_log.h"
+
+#define PARTITION_SIZE (512 * 1024)
+#define CRASH_PARTITION_SIZE (8 * HISTORY_LOG_SECTOR_SIZE)
+#define CRASH_SCENARIOS 500
+#define CRASHES_PER_SCENARIO 3
+#define SHARE_DIFF 2048
+#define SHARE_INTERVAL_MS 1500
+#define DAY_MS (86400ULL * 1000)
+
+static int failures = 0;
+
+#define CHECK(cond)                                                                                                            \
+    do {                                                                                                                       \
+        if (!(cond)) {                                                                                                         \
+            printf("FAIL %s:%d: %s\n", __FILE__, __LINE__, #cond);                                                            \
+            failures++;                                                                                                        \
+        }                                                                                                                      \
+    } while (0)
+
+static uint64_t now_us()
+{
+    return std::chrono::duration_cast<std::chrono::microseconds>(std::chrono::steady_clock::now().time_since_epoch())
+        .count();
+}
+
+static void set_uptime_ms(uint64_t ms)
+{
+    esp_timer_host_offset_us = 0;
+    esp_timer_host_offset_us = (int64_t) ms * 1000 - esp_timer_get_time();
+}
+
+static double share_gh()
+{
+    return (double) SHARE_DIFF * 4294967296.0 / (SHARE_INTERVAL_MS / 1000.0) / 1.0e9;
+}
+
+// shares at a constant rate with random spacing from uptime start to end,
+// the log appends every 10 s like history_log_task
+static uint64_t push_shares(History *history, HistoryLog *log, std::mt19937 *rng, uint64_t start, uint64_t end)
+{
+    std::exponential_distribution<double> interval(1.0 / SHARE_INTERVAL_MS);
+    uint64_t timestamp = start;
+    uint64_t next_append = start + 10000;
+    while (timestamp < end) {
+        timestamp += 1 + (uint64_t) interval(*rng);
+        history->pushShare(SHARE_DIFF, timestamp, 0);
+        if (log && timestamp >= next_append) {
+            set_uptime_ms(timestamp);
+            log->append(history);
+            next_append += 10000;
+        }
+    }
+    return timestamp;
+}
+
+// the completed buckets the ring of the tier still holds
+static std::vector<history_bucket> read_tier(History *history, int tier)
+{
+    int num = history->getNumBuckets(tier);
+    history_bucket bucket;
+    int first = 0;
+    while (first < num && history->readBuckets(tier, &bucket, first, 1) < 0) {
+        first++;
+    }
+    std::vector<history_bucket> buckets(num - first);
+    if (num > first) {
+        CHECK(history->readBuckets(tier, buckets.data(), first, num - first) == num - first);
+    }
+    return buckets;
+}
+
+static void test_empty()
+{
+    // erased, zeroed and random flash all hold no records
+    uint8_t fills[] = {0xff, 0x00, 0x5a};
+    for (uint8_t fill : fills) {
+        esp_partition_host_create(HISTORY_LOG_LABEL, CRASH_PARTITION_SIZE, fill);
+        HistoryLog log;
+        CHECK(log.init());
+        CHECK(log.scan([](const history_log_record *, void *) {}, NULL) == 0);
+
+        history_bucket bucket = {1000, 1, 1, 1, 1, 1};
+        CHECK(log.add(0, &bucket));
+        log.flush();
+        HistoryLog after;
+        CHECK(after.init());
+        CHECK(after.scan([](const history_log_record *, void *) {}, NULL) == 1);
+    }
+
+    // no partition, the history isn't kept
+    esp_partition_host_create(HISTORY_LOG_LABEL, 0);
+    HistoryLog log;
+    CHECK(!log.init());
+    CHECK(!log.isAvailable());
+}
+
+static void test_reboot()
+{
+    esp_partition_host_create(HISTORY_LOG_LABEL, PARTITION_SIZE);
+    std::mt19937 rng(11);
+
+    // a day and a bit of mining, then a restart with a flush
+    set_uptime_ms(5000);
+    History *before = new History();
+    before->init(1);
+    HistoryLog *log = new HistoryLog();
+    CHECK(log->init());
+    CHECK(log->replay(before) == 0);
+    uint64_t end = push_shares(before, log, &rng, 5000, DAY_MS + 2 * 3600 * 1000);
+    set_uptime_ms(end);
+    log->flush(before);
+
+    history_snapshot last;
+    before->getSnapshot(&last);
+    std::vector<history_bucket> tiers[HISTORY_NUM_TIERS];
+    for (int tier = 0; tier < HISTORY_NUM_TIERS; tier++) {
+        tiers[tier] = read_tier(before, tier);
+    }
+    uint64_t written = esp_partition_host.bytesWritten;
+    delete log;
+
+    // boot again a few seconds later
+    set_uptime_ms(3000);
+    History *after = new History();
+    after->init(1);
+    log = new HistoryLog();
+    uint64_t read = esp_partition_host.bytesRead;
+    uint64_t start = now_us();
+    CHECK(log->init());
+    int restored = log->replay(after);
+    uint64_t us = now_us() - start;
+    read = esp_partition_host.bytesRead - read;
+
+    printf("%.1f h logged in %llu bytes, mounted and %d buckets restored in %llu us reading %llu bytes\n",
+           (double) (end - 5000) / 3600000.0, (unsigned long long) written, restored, (unsigned long long) us,
+           (unsigned long long) read);
+
+    // every completed bucket the tiers kept is back, as far apart as before
+    int total = 0;
+    for (int tier = 0; tier < HISTORY_NUM_TIERS; tier++) {
+        total += after->getNumBuckets(tier);
+        std::vector<history_bucket> buckets = read_tier(after, tier);
+        CHECK(buckets.size() == tiers[tier].size());
+        int64_t shift = (int64_t) tiers[tier].back().timestamp - (int64_t) buckets.back().timestamp;
+        for (size_t i = 0; i < buckets.size() && i < tiers[tier].size(); i++) {
+            CHECK((int64_t) buckets[i].timestamp < 0);
+            // the log keeps seconds
+            CHECK(llabs((int64_t) tiers[tier][i].timestamp - (int64_t) buckets[i].timestamp - shift) < 1000);
+            CHECK(buckets[i].avg10m == tiers[tier][i].avg10m && buckets[i].min10m == tiers[tier][i].min10m &&
+                  buckets[i].max10m == tiers[tier][i].max10m && buckets[i].avg1h == tiers[tier][i].avg1h &&
+                  buckets[i].avg1d == tiers[tier][i].avg1d);
+        }
+    }
+    CHECK(restored == total);
+
+    // the averages are there before the first share
+    history_snapshot warm;
+    after->getSnapshot(&warm);
+    printf("before reboot 10m %.1f 1h %.1f 1d %.1f GH/s, after replay %.1f %.1f %.1f GH/s\n",
+           last.hashrate[HISTORY_WINDOW_10M], last.hashrate[HISTORY_WINDOW_1H], last.hashrate[HISTORY_WINDOW_1D],
+           warm.hashrate[HISTORY_WINDOW_10M], warm.hashrate[HISTORY_WINDOW_1H], warm.hashrate[HISTORY_WINDOW_1D]);
+    CHECK(warm.numSamples == 0);
+    CHECK(fabs(warm.hashrate[HISTORY_WINDOW_1D] - last.hashrate[HISTORY_WINDOW_1D]) < 0.02 * last.hashrate[HISTORY_WINDOW_1D]);
+    CHECK(fabs(warm.hashrate[HISTORY_WINDOW_1H] - last.hashrate[HISTORY_WINDOW_1H]) < 0.05 * last.hashrate[HISTORY_WINDOW_1H]);
+    CHECK(fabs(warm.hashrate[HISTORY_WINDOW_10M] - last.hashrate[HISTORY_WINDOW_10M]) < 0.1 * last.hashrate[HISTORY_WINDOW_10M]);
+    CHECK(after->getCurrentHashrate10m() == warm.hashrate[HISTORY_WINDOW_10M]);
+    // the windows the log doesn't keep start from the closest one it does
+    for (int w = 0; w < HISTORY_NUM_WINDOWS; w++) {
+        CHECK(fabs(warm.hashrate[w] - share_gh()) < 0.15 * share_gh());
+    }
+
+    // 10 minutes later, next to a History that starts cold
+    History *cold = new History();
+    cold->init(1);
+    std::mt19937 rng_warm(12);
+    std::mt19937 rng_cold(12);
+    push_shares(after, log, &rng_warm, 3000, 3000 + 600 * 1000);
+    push_shares(cold, NULL, &rng_cold, 3000, 3000 + 600 * 1000);
+    history_snapshot warm10, cold10;
+    after->getSnapshot(&warm10);
+    cold->getSnapshot(&cold10);
+    printf("10 min after boot, %.1f GH/s mined: 1d warm %.1f GH/s, cold %.1f GH/s\n", share_gh(),
+           warm10.hashrate[HISTORY_WINDOW_1D], cold10.hashrate[HISTORY_WINDOW_1D]);
+    CHECK(fabs(warm10.hashrate[HISTORY_WINDOW_1D] - share_gh()) < 0.05 * share_gh());
+    CHECK(cold10.hashrate[HISTORY_WINDOW_1D] < 0.05 * share_gh());
+
+    // the new buckets are appended after the restored ones
+    log->flush(after);
+    HistoryLog again;
+    CHECK(again.init());
+    struct Order {
+        uint32_t time[HISTORY_NUM_TIERS];
+        int errors;
+    } order = {};
+    int count = again.scan(
+        [](const history_log_record *record, void *arg) {
+            Order *order = (Order *) arg;
+            int tier = record->time >> HISTORY_LOG_TIER_SHIFT;
+            uint32_t time = record->time & HISTORY_LOG_TIME_MASK;
+            if (time < order->time[tier]) {
+                order->errors++;
+            }
+            order->time[tier] = time;
+        },
+        &order);
+    CHECK(count > total);
+    CHECK(order.errors == 0);
+
+    delete cold;
+    delete after;
+    delete before;
+    delete log;
+}
+
+// the record with the id, the values tell a torn record apart
+static history_bucket make_bucket(uint32_t id)
+{
+    history_bucket bucket;
+    bucket.timestamp = (uint64_t) id * 1000;
+    bucket.avg10m = (float) id;
+    bucket.min10m = (float) id + 0.25f;
+    bucket.max10m = (float) id + 0.5f;
+    bucket.avg1h = (float) id + 0.75f;
+    bucket.avg1d = -(float) id;
+    return bucket;
+}
+
+struct Replayed {
+    std::vector<uint32_t> ids;
+    int corrupt;
+};
+
+static void collect(const history_log_record *record, void *arg)
+{
+    Replayed *replayed = (Replayed *) arg;
+    uint32_t id = (uint32_t) record->avg10m;
+    if (record->avg10m != (float) id || record->min10m != (float) id + 0.25f || record->max10m != (float) id + 0.5f ||
+        record->avg1h != (float) id + 0.75f || record->avg1d != -(float) id || (record->time >> HISTORY_LOG_TIER_SHIFT) != 0) {
+        replayed->corrupt++;
+    }
+    replayed->ids.push_back(id);
+}
+
+static void test_wrap()
+{
+    esp_partition_host_create(HISTORY_LOG_LABEL, CRASH_PARTITION_SIZE);
+    HistoryLog log;
+    CHECK(log.init());
+
+    int sectors = CRASH_PARTITION_SIZE / HISTORY_LOG_SECTOR_SIZE;
+    int capacity = (sectors - 1) * HISTORY_LOG_PAGES_PER_SECTOR * HISTORY_LOG_RECORDS_PER_PAGE;
+    uint32_t num = 20 * sectors * HISTORY_LOG_PAGES_PER_SECTOR * HISTORY_LOG_RECORDS_PER_PAGE + 5;
+    for (uint32_t id = 0; id < num; id++) {
+        history_bucket bucket = make_bucket(id);
+        CHECK(log.add(0, &bucket));
+    }
+    log.flush();
+
+    HistoryLog after;
+    CHECK(after.init());
+    Replayed replayed = {};
+    after.scan(collect, &replayed);
+    CHECK(replayed.corrupt == 0);
+    CHECK((int) replayed.ids.size() >= capacity);
+    CHECK(!replayed.ids.empty() && replayed.ids.back() == num - 1);
+    for (size_t i = 1; i < replayed.ids.size(); i++) {
+        CHECK(replayed.ids[i] == replayed.ids[i - 1] + 1);
+    }
+
+    uint32_t min = esp_partition_host.erases[0];
+    uint32_t max = min;
+    for (uint32_t erases : esp_partition_host.erases) {
+        min = (erases < min) ? erases : min;
+        max = (erases > max) ? erases : max;
+    }
+    printf("wrap: %u records, %zu kept, sectors erased %u..%u times\n", num, replayed.ids.size(), min, max);
+    CHECK(max - min <= 1);
+}
+
+// a page torn by a power cut followed by a page written after each of two
+// reboots: no seq is written twice and every written page comes back
+static void test_torn_reboots()
+{
+    esp_partition_host_create(HISTORY_LOG_LABEL, CRASH_PARTITION_SIZE);
+    std::vector<uint32_t> written;
+    uint32_t id = 0;
+
+    for (int boot = 0; boot < 3; boot++) {
+        esp_partition_host_power_on();
+        HistoryLog log;
+        CHECK(log.init());
+        for (int i = 0; i < HISTORY_LOG_RECORDS_PER_PAGE; i++) {
+            history_bucket bucket = make_bucket(id);
+            CHECK(log.add(0, &bucket));
+            written.push_back(id++);
+        }
+        if (boot == 0) {
+            // the next page is torn halfway
+            esp_partition_host_cut_power_after(HISTORY_LOG_PAGE_SIZE / 2);
+            for (int i = 0; i < HISTORY_LOG_RECORDS_PER_PAGE; i++) {
+                history_bucket bucket = make_bucket(id++);
+                log.add(0, &bucket);
+            }
+            CHECK(esp_partition_host.off);
+        }
+    }
+
+    esp_partition_host_power_on();
+    HistoryLog after;
+    CHECK(after.init());
+    Replayed replayed = {};
+    after.scan(collect, &replayed);
+    CHECK(replayed.corrupt == 0);
+    CHECK(replayed.ids == written);
+
+    std::vector<uint32_t> seqs;
+    for (size_t offset = 0; offset < CRASH_PARTITION_SIZE; offset += HISTORY_LOG_PAGE_SIZE) {
+        history_log_page_header header;
+        memcpy(&header, &esp_partition_host.data[offset], sizeof(header));
+        if (header.magic == HISTORY_LOG_MAGIC) {
+            seqs.push_back(header.seq);
+        }
+    }
+    std::sort(seqs.begin(), seqs.end());
+    CHECK(seqs.size() == 4);
+    CHECK(std::adjacent_find(seqs.begin(), seqs.end()) == seqs.end());
+    printf("torn page and two reboots: %zu of %zu written records replayed, %zu pages on flash\n", replayed.ids.size(),
+           written.size(), seqs.size());
+}
+
+static void test_crash()
+{
+    std::mt19937 rng(5);
+    int sectors = CRASH_PARTITION_SIZE / HISTORY_LOG_SECTOR_SIZE;
+    // a sector may be erased or torn, a torn page per crash
+    int kept = (sectors - 2) * HISTORY_LOG_PAGES_PER_SECTOR * HISTORY_LOG_RECORDS_PER_PAGE -
+               CRASHES_PER_SCENARIO * HISTORY_LOG_RECORDS_PER_PAGE;
+    uint64_t crashes = 0;
+    uint64_t lost = 0;
+
+    for (int scenario = 0; scenario < CRASH_SCENARIOS; scenario++) {
+        esp_partition_host_create(HISTORY_LOG_LABEL, CRASH_PARTITION_SIZE);
+        uint32_t added = 0;
+        std::vector<bool> durable;
+
+        for (int crash = 0; crash < CRASHES_PER_SCENARIO; crash++) {
+            // up to three times around the log per power cycle
+            std::uniform_int_distribution<int64_t> cut(0, 3 * (int64_t) CRASH_PARTITION_SIZE);
+            esp_partition_host_power_on();
+            HistoryLog log;
+            CHECK(log.init());
+            esp_partition_host_cut_power_after(cut(rng));
+
+            uint32_t pending = added;
+            while (!esp_partition_host.off) {
+                uint64_t written = esp_partition_host.bytesWritten;
+                history_bucket bucket = make_bucket(added++);
+                durable.push_back(false);
+                log.add(0, &bucket);
+                if (!esp_partition_host.off && esp_partition_host.bytesWritten != written) {
+                    // the page with everything added since the last one
+                    for (uint32_t id = pending; id < added; id++) {
+                        durable[id] = true;
+                    }
+                    pending = added;
+                }
+            }
+            crashes++;
+
+            esp_partition_host_power_on();
+            HistoryLog after;
+            CHECK(after.init());
+            Replayed replayed = {};
+            after.scan(collect, &replayed);
+            CHECK(replayed.corrupt == 0);
+
+            // only added records in the order they were added
+            size_t next = 0;
+            for (size_t i = 0; i < replayed.ids.size(); i++) {
+                if (replayed.ids[i] >= added || (i && replayed.ids[i] <= replayed.ids[i - 1])) {
+                    printf("FAIL scenario %d crash %d: id %u after %u of %u\n", scenario, crash, replayed.ids[i],
+                           i ? replayed.ids[i - 1] : 0, added);
+                    failures++;
+                    break;
+                }
+            }
+
+            // every written record that fits into the log
+            uint32_t from = (added > (uint32_t) kept) ? added - kept : 0;
+            for (uint32_t id = from; id < added; id++) {
+                while (next < replayed.ids.size() && replayed.ids[next] < id) {
+                    next++;
+                }
+                bool found = next < replayed.ids.size() && replayed.ids[next] == id;
+                if (durable[id] && !found) {
+                    printf("FAIL scenario %d crash %d: written record %u is missing\n", scenario, crash, id);
+                    failures++;
+                    break;
+                }
+                lost += !found;
+            }
+        }
+    }
+    printf("%llu power cuts, %llu records lost from unwritten or torn pages, none after its page was written\n",
+           (unsigned long long) crashes, (unsigned long long) lost);
+}
+
+int main()
+{
+    test_empty();
+    test_reboot();
+    test_wrap();
+    test_torn_reboots();
+    test_crash();
+
+    if (failures) {
+        printf("%d failures\n", failures);
+        return 1;
+    }
+    printf("ok\n");
+    return 0;
+}
@@ -0,0 +1,121 @@
+"""pytest tests of libminingcore.so, the host build of the stratum and mining
+code, through the ctypes harness in mining_core.py.
+
+  make -C test/host pytest
+
+or after make -C test/host libminingcore.so:
+
+  python3 -m pytest -q test/host/test_mining_core.py
+
+The self test block (792980) goes through calculate_merkle_root_hash and
+test_nonce_value, the pool session in data/stratum_session.txt through
+receiveJsonRpcLine, parse and parseFast.
+"""
+
+import json
+import os
+
+import pytest
+
+from mining_core import DEFAULT_LIBRARY, DEFAULT_SESSION, SELF_TEST, MiningCore, feed, read_session
+
+LIBRARY = os.environ.get('MINING_CORE_LIBRARY', DEFAULT_LIBRARY)
+
+
+@pytest.fixture(scope='module')
+def core():
+    if not os.path.exists(LIBRARY):
+        pytest.fail(f"{LIBRARY} is missing, build it with: make -C test/host libminingcore.so")
+    return MiningCore(LIBRARY)
+
+
+@pytest.fixture(scope='module')
+def session():
+    return read_session(DEFAULT_SESSION)
+
+
+@pytest.fixture(scope='module')
+def job(core):
+    root = core.merkle_root(SELF_TEST['coinbase_tx'], SELF_TEST['merkle_branches'])
+    return core.job(SELF_TEST['prev_block_hash'], root, SELF_TEST['version'], SELF_TEST['version_mask'],
+                    SELF_TEST['target'], SELF_TEST['ntime'])
+
+
+def test_self_test_nonce_difficulty(job):
+    diff = job.test_nonce_value(SELF_TEST['nonce'], SELF_TEST['rolled_version'])
+    assert round(diff, 2) == SELF_TEST['nonce_difficulty']
+
+
+def test_scan_finds_the_self_test_share(job):
+    diff = job.test_nonce_value(SELF_TEST['nonce'], SELF_TEST['rolled_version'])
+    best, best_nonce = job.scan_nonces(SELF_TEST['nonce'] - 500, 1000, SELF_TEST['rolled_version'])
+    assert best_nonce == SELF_TEST['nonce']
+    assert best == diff
+
+
+def test_share_needs_the_rolled_version(job):
+    assert job.test_nonce_value(SELF_TEST['nonce'], SELF_TEST['version']) < 1
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 536, 1460, 65536])
+def test_receive_line_in_pieces(core, session, chunk_size):
+    # like a TCP stream, a line may be split anywhere
+    data, lines = session
+    stratum = core.stratum()
+    sock, thread = feed(data, chunk_size)
+    with sock:
+        received = []
+        while (line := stratum.receive_line(sock)) is not None:
+            received.append(line)
+    thread.join()
+    assert received == lines
+
+
+def test_parse_notify_matches_json(core, session):
+    _, lines = session
+    notify = 0
+    for line in lines:
+        doc = json.loads(line)
+        if doc.get('method') != 'mining.notify':
+            continue
+        notify += 1
+        ok, message = core.parse(line)
+        params = doc['params']
+        assert ok
+        assert message.method_name == 'MINING_NOTIFY'
+        assert message.job_id.decode() == params[0]
+        assert bytes(message.prev_block_hash).hex() == params[1]
+        assert message.coinbase_1_len == len(params[2])
+        assert message.coinbase_2_len == len(params[3])
+        assert [bytes(b).hex() for b in message.merkle_branches[:message.n_merkle_branches]] == params[4]
+        assert message.version == int(params[5], 16)
+        assert message.target == int(params[6], 16)
+        assert message.ntime == int(params[7], 16)
+        assert bool(message.should_abandon_work) == params[-1]
+    assert notify
+
+
+def test_parse_set_difficulty_matches_json(core, session):
+    _, lines = session
+    for line in lines:
+        doc = json.loads(line)
+        if doc.get('method') == 'mining.set_difficulty':
+            ok, message = core.parse(line)
+            assert ok
+            assert message.method_name == 'MINING_SET_DIFFICULTY'
+            assert message.new_difficulty == doc['params'][0]
+
+
+def test_parse_fast_matches_parse(core, session):
+    _, lines = session
+    fast = 0
+    for line in lines:
+        ok_fast, message_fast = core.parse_fast(line)
+        if not ok_fast:
+            # left to parse
+            continue
+        fast += 1
+        ok, message = core.parse(line)
+        assert ok
+        assert bytes(message_fast) == bytes(message)
+    assert fast
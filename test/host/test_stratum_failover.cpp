@@ -0,0 +1,253 @@
+// Host test of the pool failover of StratumManager. The real stratum_task.cpp
+// (with the FreeRTOS and firmware stubs of include/ and stubs/) mines against
+// two pool_simulator.py serve processes, the primary one crashes every few
+// seconds with --kill-every and refuses connections for --down-for seconds.
+// Both modes run side by side in their own process: with hot standby the
+// fallback pool is connected from the start and takes over on the loss of the
+// primary, without it the reconnect timer selects the fallback pool. The
+// failover times are the ones StratumManager measures itself, failoverLastMs
+// and failoverMaxMs of /api/system/info on the device.
+//
+// The 10 s between connection attempts and the 30 s reconnect timer run
+// SPEEDUP times faster, the times are those of the host and the shortened
+// timers.
+//
+//   make -C test/host test_stratum_failover && ./test/host/test_stratum_failover
+
+#include <atomic>
+#include <chrono>
+#include <mutex>
+#include <signal.h>
+#include <stdio.h>
+#include <string.h>
+#include <string>
+#include <sys/socket.h>
+#include <sys/wait.h>
+#include <thread>
+#include <unistd.h>
+#include <vector>
+
+#include <netinet/in.h>
+
+#include "create_jobs_task.h"
+#include "esp_timer.h"
+#include "global_state.h"
+#include "nvs_config.h"
+#include "stratum_task.h"
+
+#define SPEEDUP 20
+#define KILL_EVERY_S 4.0
+#define DOWN_FOR_S 3.0
+#define NOTIFY_INTERVAL_S 0.5
+// two outages, the second one over for a while
+#define RUN_S (2 * KILL_EVERY_S + 2 * DOWN_FOR_S + 2.5)
+#define OUTAGES 2
+// 30 s and 10 s on the device
+#define RECONNECT_TIMER_MS (30000 / SPEEDUP)
+#define RETRY_DELAY_MS (10000 / SPEEDUP)
+
+static int failures = 0;
+
+#define CHECK(cond)                                                                                                            \
+    do {                                                                                                                       \
+        if (!(cond)) {                                                                                                         \
+            printf("FAIL %s:%d: %s\n", __FILE__, __LINE__, #cond);                                                            \
+            failures++;                                                                                                        \
+        }                                                                                                                      \
+    } while (0)
+
+System SYSTEM_MODULE;
+AsicJobs asicJobs;
+
+// what stratum_task.cpp hands to create_jobs_task
+static std::mutex jobs_mutex;
+static std::vector<int64_t> job_times_us;
+static int enonces = 0;
+
+void create_job_mining_notify(mining_notify *notify)
+{
+    (void) notify;
+    std::lock_guard<std::mutex> lock(jobs_mutex);
+    job_times_us.push_back(esp_timer_get_time());
+}
+
+void create_job_set_enonce(char *enonce, int enonce2_len)
+{
+    (void) enonce;
+    (void) enonce2_len;
+    std::lock_guard<std::mutex> lock(jobs_mutex);
+    enonces++;
+}
+
+bool create_job_set_difficulty(uint32_t difficulty)
+{
+    (void) difficulty;
+    return true;
+}
+
+void create_job_set_version_mask(uint32_t mask)
+{
+    (void) mask;
+}
+
+static int free_port()
+{
+    int sock = socket(AF_INET, SOCK_STREAM, 0);
+    struct sockaddr_in addr = {};
+    addr.sin_family = AF_INET;
+    addr.sin_addr.s_addr = htonl(INADDR_LOOPBACK);
+    socklen_t len = sizeof(addr);
+    bind(sock, (struct sockaddr *) &addr, sizeof(addr));
+    getsockname(sock, (struct sockaddr *) &addr, &len);
+    close(sock);
+    return ntohs(addr.sin_port);
+}
+
+static bool pool_listening(int port)
+{
+    int sock = socket(AF_INET, SOCK_STREAM, 0);
+    struct sockaddr_in addr = {};
+    addr.sin_family = AF_INET;
+    addr.sin_addr.s_addr = htonl(INADDR_LOOPBACK);
+    addr.sin_port = htons(port);
+    bool ok = connect(sock, (struct sockaddr *) &addr, sizeof(addr)) == 0;
+    close(sock);
+    return ok;
+}
+
+static pid_t start_pool(const char *simulator, int port, bool crashing)
+{
+    std::string port_arg = std::to_string(port);
+    std::string interval_arg = std::to_string(NOTIFY_INTERVAL_S);
+    std::string kill_arg = std::to_string(KILL_EVERY_S);
+    std::string down_arg = std::to_string(DOWN_FOR_S);
+    std::vector<const char *> args = {"python3", simulator, "serve", "--port", port_arg.c_str(), "--notify-interval",
+                                      interval_arg.c_str(), "--report-every", "0"};
+    if (crashing) {
+        args.insert(args.end(), {"--kill-every", kill_arg.c_str(), "--down-for", down_arg.c_str()});
+    }
+    args.push_back(nullptr);
+
+    pid_t pid = fork();
+    if (pid == 0) {
+        freopen("/dev/null", "w", stdout);
+        freopen("/dev/null", "w", stderr);
+        execvp("python3", (char *const *) args.data());
+        _exit(127);
+    }
+    return pid;
+}
+
+// runs one mode against its own two pools, returns the number of failures
+static int run(const char *simulator, bool hot_standby)
+{
+    const char *name = hot_standby ? "hot standby" : "fallback timer";
+    int ports[2] = {free_port(), free_port()};
+    pid_t pools[2] = {start_pool(simulator, ports[0], true), start_pool(simulator, ports[1], false)};
+    for (int i = 0; i < 100 && !(pool_listening(ports[0]) && pool_listening(ports[1])); i++) {
+        usleep(50000);
+    }
+    CHECK(pool_listening(ports[0]) && pool_listening(ports[1]));
+    // about when the primary pool started its --kill-every clock
+    int64_t start_us = esp_timer_get_time();
+
+    for (int i = 0; i < 2; i++) {
+        StratumConfig *config = SYSTEM_MODULE.getStratumConfig(i);
+        config->primary = i == 0;
+        config->host = "127.0.0.1";
+        config->port = ports[i];
+        config->user = "bc1qfailovertest.worker";
+        config->password = "x";
+    }
+    config_host_hot_standby = hot_standby;
+    freertos_host_speedup = SPEEDUP;
+
+    static StratumManager manager;
+    xTaskCreate(StratumManager::taskWrapper, "stratum manager", 8192, &manager, 5, NULL);
+
+    // how often mining was seen on the fallback pool, sampled every 10 ms
+    int on_fallback = 0;
+    while (esp_timer_get_time() - start_us < (int64_t) (RUN_S * 1e6)) {
+        on_fallback += manager.isUsingFallback();
+        usleep(10000);
+    }
+
+    failover_stats stats;
+    manager.getFailoverStats(&stats);
+    bool back_on_primary = !manager.isUsingFallback();
+
+    int64_t max_gap_us = 0;
+    size_t jobs;
+    {
+        std::lock_guard<std::mutex> lock(jobs_mutex);
+        jobs = job_times_us.size();
+        for (size_t i = 1; i < job_times_us.size(); i++) {
+            max_gap_us = std::max(max_gap_us, job_times_us[i] - job_times_us[i - 1]);
+        }
+    }
+
+    for (int i = 0; i < 2; i++) {
+        kill(pools[i], SIGINT);
+        waitpid(pools[i], NULL, 0);
+    }
+
+    printf("%-14s %u failovers, last %u ms, max %u ms, %zu jobs, longest without a new job %.0f ms, "
+           "%.1f s on the fallback pool\n",
+           name, stats.count, stats.last_ms, stats.max_ms, jobs, max_gap_us / 1000.0, on_fallback / 100.0);
+
+    CHECK(stats.count == OUTAGES);
+    CHECK(on_fallback > 0);
+    CHECK(back_on_primary);
+    CHECK(enonces >= 2);
+    if (hot_standby) {
+        // the standby pool's last job, no connect and no handshake
+        CHECK(stats.max_ms < 100);
+        CHECK(max_gap_us < (int64_t) ((NOTIFY_INTERVAL_S + 0.5) * 1e6));
+    } else {
+        // nothing to mine until the reconnect timer, running since the start, selected the fallback pool
+        // and its task woke up to connect
+        CHECK(stats.max_ms >= 100 && stats.max_ms < RECONNECT_TIMER_MS + RETRY_DELAY_MS + 250);
+        CHECK(max_gap_us >= stats.max_ms * 1000LL);
+    }
+    return failures;
+}
+
+int main(int argc, char **argv)
+{
+    (void) argc;
+    std::string simulator = "pool_simulator.py";
+    if (access(simulator.c_str(), R_OK) != 0) {
+        // also run from the repository root
+        simulator = "test/host/pool_simulator.py";
+    }
+    if (access(simulator.c_str(), R_OK) != 0) {
+        printf("Unable to find pool_simulator.py next to %s\n", argv[0]);
+        return 1;
+    }
+
+    // the stratum tasks never end, every mode gets a process of its own
+    pid_t modes[2];
+    for (int i = 0; i < 2; i++) {
+        modes[i] = fork();
+        if (modes[i] == 0) {
+            int result = run(simulator.c_str(), i == 0);
+            fflush(stdout);
+            _exit(result ? 1 : 0);
+        }
+    }
+
+    for (int i = 0; i < 2; i++) {
+        int status;
+        waitpid(modes[i], &status, 0);
+        if (!WIFEXITED(status) || WEXITSTATUS(status)) {
+            failures++;
+        }
+    }
+
+    if (failures) {
+        printf("failures\n");
+        return 1;
+    }
+    printf("ok\n");
+    return 0;
+}
@@ -0,0 +1,310 @@
+// Host differential test and benchmark of StratumApi::parseFast. Every line of
+// a pool session, rewritten variants of it (key order, whitespace, escapes)
+// and randomly mutated lines go through parseFast and, when it accepts them,
+// through the JsonDocument parser as well; both results have to be the same.
+// Lines parseFast declines are fine, they take the JsonDocument way on the
+// device. Job ids longer than MAX_JOB_ID_LEN - 1 have to be rejected by both.
+// Then the mining.notify lines are timed with both parsers.
+//
+//   make -C test/host test_stratum_parser && ./test/host/test_stratum_parser [capture]
+//
+// The default session is data/stratum_session.txt, see benchmark_framer.cpp.
+
+#include <chrono>
+#include <random>
+#include <stdio.h>
+#include <string.h>
+#include <string>
+#include <vector>
+
+#include "ArduinoJson.h"
+#include "stratum_api.h"
+
+#define MUTATION_ROUNDS 200000
+#define TIMING_REPEAT 200
+
+static bool parse_dom(StratumApiV1Message *message, const std::string &line)
+{
+    memset(message, 0, sizeof(StratumApiV1Message));
+    JsonDocument doc;
+    if (deserializeJson(doc, line.data(), line.size())) {
+        return false;
+    }
+    return StratumApi::parse(message, doc);
+}
+
+static bool parse_fast(StratumApiV1Message *message, const std::string &line)
+{
+    memset(message, 0, sizeof(StratumApiV1Message));
+    return StratumApi::parseFast(message, line.data(), line.size());
+}
+
+static bool same_string(const char *a, const char *b)
+{
+    return (!a && !b) || (a && b && !strcmp(a, b));
+}
+
+static bool same_message(const StratumApiV1Message *a, const StratumApiV1Message *b)
+{
+    if (a->method != b->method || a->message_id != b->message_id || a->new_difficulty != b->new_difficulty ||
+        a->should_abandon_work != b->should_abandon_work || !a->mining_notification != !b->mining_notification) {
+        return false;
+    }
+    if (!a->mining_notification) {
+        return true;
+    }
+    const mining_notify *x = a->mining_notification;
+    const mining_notify *y = b->mining_notification;
+    return same_string(x->job_id, y->job_id) && same_string(x->coinbase_1, y->coinbase_1) &&
+           same_string(x->coinbase_2, y->coinbase_2) && !memcmp(x->_prev_block_hash, y->_prev_block_hash, HASH_SIZE) &&
+           x->n_merkle_branches == y->n_merkle_branches &&
+           !memcmp(x->_merkle_branches, y->_merkle_branches, x->n_merkle_branches * HASH_SIZE) && x->version == y->version &&
+           x->target == y->target && x->ntime == y->ntime;
+}
+
+// parseFast either declines the line or agrees with the JsonDocument parser
+static bool check(const std::string &line, bool *fast_path)
+{
+    StratumApiV1Message fast, dom;
+    *fast_path = parse_fast(&fast, line);
+    bool ok = true;
+    if (*fast_path) {
+        ok = parse_dom(&dom, line) && same_message(&fast, &dom);
+        StratumApi::freeMessage(&dom);
+    }
+    StratumApi::freeMessage(&fast);
+    return ok;
+}
+
+static std::vector<std::string> split_lines(const std::string &data)
+{
+    std::vector<std::string> lines;
+    size_t start = 0;
+    size_t newline;
+    while ((newline = data.find('\n', start)) != std::string::npos) {
+        size_t end = (newline > start && data[newline - 1] == '\r') ? newline - 1 : newline;
+        lines.push_back(data.substr(start, end - start));
+        start = newline + 1;
+    }
+    return lines;
+}
+
+// the same message with the keys in the opposite order, compact and pretty printed
+static std::vector<std::string> rewrite(const std::string &line)
+{
+    std::vector<std::string> variants;
+    JsonDocument doc;
+    if (deserializeJson(doc, line) || !doc.is<JsonObject>()) {
+        return variants;
+    }
+    JsonObject object = doc.as<JsonObject>();
+
+    JsonDocument reversed;
+    std::vector<JsonPair> pairs;
+    for (JsonPair pair : object) {
+        pairs.push_back(pair);
+    }
+    for (auto it = pairs.rbegin(); it != pairs.rend(); ++it) {
+        reversed[it->key()] = it->value();
+    }
+
+    std::string out;
+    serializeJson(reversed, out);
+    variants.push_back(out);
+    out.clear();
+    serializeJson(doc, out);
+    variants.push_back(out);
+    out.clear();
+    serializeJsonPretty(doc, out);
+    variants.push_back(out);
+    return variants;
+}
+
+static std::string method_of(const std::string &line)
+{
+    JsonDocument doc;
+    if (deserializeJson(doc, line) || !doc["method"].is<const char *>()) {
+        return "";
+    }
+    return doc["method"].as<const char *>();
+}
+
+static bool is_fast_method(const std::string &line)
+{
+    std::string method = method_of(line);
+    return method == "mining.notify" || method == "mining.set_difficulty";
+}
+
+static std::string mutate(std::mt19937 &rng, const std::string &line)
+{
+    static const char alphabet[] = "{}[]\",:\\-+.eE0123456789abcdefxtrunlsu \t";
+    std::string out = line;
+    int edits = 1 + rng() % 3;
+    for (int i = 0; i < edits && !out.empty(); i++) {
+        size_t pos = rng() % out.size();
+        char c = alphabet[rng() % (sizeof(alphabet) - 1)];
+        switch (rng() % 4) {
+        case 0:
+            out[pos] = c;
+            break;
+        case 1:
+            out.insert(out.begin() + pos, c);
+            break;
+        case 2:
+            out.erase(pos, 1 + rng() % 8);
+            break;
+        default:
+            out.resize(pos);
+            break;
+        }
+    }
+    return out;
+}
+
+static double seconds_since(std::chrono::steady_clock::time_point start)
+{
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+}
+
+static void timing(const std::vector<std::string> &lines)
+{
+    std::vector<std::string> notify;
+    for (const std::string &line : lines) {
+        if (method_of(line) == "mining.notify") {
+            notify.push_back(line);
+        }
+    }
+    if (notify.empty()) {
+        return;
+    }
+    size_t count = notify.size() * TIMING_REPEAT;
+
+    StratumApiV1Message message;
+    auto start = std::chrono::steady_clock::now();
+    for (int i = 0; i < TIMING_REPEAT; i++) {
+        for (const std::string &line : notify) {
+            parse_dom(&message, line);
+            StratumApi::freeMessage(&message);
+        }
+    }
+    double dom_s = seconds_since(start);
+
+    start = std::chrono::steady_clock::now();
+    for (int i = 0; i < TIMING_REPEAT; i++) {
+        for (const std::string &line : notify) {
+            parse_fast(&message, line);
+            StratumApi::freeMessage(&message);
+        }
+    }
+    double fast_s = seconds_since(start);
+
+    printf("mining.notify: JsonDocument %6.2f us, parseFast %6.2f us (%.1fx)\n", dom_s * 1e6 / count, fast_s * 1e6 / count,
+           dom_s / fast_s);
+}
+
+int main(int argc, char **argv)
+{
+    const char *path = argc > 1 ? argv[1] : "data/stratum_session.txt";
+    FILE *f = fopen(path, "rb");
+    if (!f) {
+        // also run from the repository root
+        std::string fallback = std::string("test/host/") + path;
+        f = argc > 1 ? NULL : fopen(fallback.c_str(), "rb");
+    }
+    if (!f) {
+        printf("Unable to open %s\n", path);
+        return 1;
+    }
+    std::string session;
+    char chunk[4096];
+    size_t n;
+    while ((n = fread(chunk, 1, sizeof(chunk), f)) > 0) {
+        session.append(chunk, n);
+    }
+    fclose(f);
+
+    std::vector<std::string> lines = split_lines(session);
+    int failures = 0;
+    bool fast_path;
+
+    // the session, notify and set_difficulty have to take the fast path
+    size_t fast_lines = 0;
+    size_t expected_fast = 0;
+    for (const std::string &line : lines) {
+        if (!check(line, &fast_path)) {
+            printf("session line differs: %.60s\n", line.c_str());
+            failures++;
+        }
+        fast_lines += fast_path;
+        expected_fast += is_fast_method(line);
+        if (is_fast_method(line) != fast_path) {
+            printf("session line %s the fast path: %.60s\n", fast_path ? "took" : "missed", line.c_str());
+            failures++;
+        }
+    }
+    printf("%s: %zu lines, %zu on the fast path (%zu notify/set_difficulty)\n", path, lines.size(), fast_lines,
+           expected_fast);
+
+    // rewritten and escaped variants
+    size_t variants = 0;
+    for (const std::string &line : lines) {
+        for (const std::string &variant : rewrite(line)) {
+            variants++;
+            if (!check(variant, &fast_path) || is_fast_method(line) != fast_path) {
+                printf("variant differs: %.60s\n", variant.c_str());
+                failures++;
+            }
+        }
+        size_t job_id = line.find("[\"");
+        if (is_fast_method(line) && job_id != std::string::npos) {
+            // 0 is '0', ArduinoJson decodes it, parseFast declines
+            std::string escaped = line;
+            escaped.insert(job_id + 2, "\\u0030");
+            variants++;
+            if (!check(escaped, &fast_path) || fast_path) {
+                printf("escaped variant differs: %.60s\n", escaped.c_str());
+                failures++;
+            }
+        }
+    }
+    printf("variants: %zu\n", variants);
+
+    // job ids up to MAX_JOB_ID_LEN - 1 characters, longer notifies are rejected by both parsers
+    for (const std::string &line : lines) {
+        size_t job_id = line.find("[\"");
+        if (method_of(line) != "mining.notify" || job_id == std::string::npos) {
+            continue;
+        }
+        size_t end = line.find('"', job_id + 2);
+        for (size_t len : {(size_t) MAX_JOB_ID_LEN - 1, (size_t) MAX_JOB_ID_LEN}) {
+            std::string resized = line.substr(0, job_id + 2) + std::string(len, 'a') + line.substr(end);
+            StratumApiV1Message dom;
+            bool accepted = parse_dom(&dom, resized);
+            StratumApi::freeMessage(&dom);
+            bool expected = len < MAX_JOB_ID_LEN;
+            if (!check(resized, &fast_path) || accepted != expected || fast_path != expected) {
+                printf("job id of %zu characters %s\n", len, expected ? "rejected" : "accepted");
+                failures++;
+            }
+        }
+        break;
+    }
+
+    // random mutations, whatever parseFast accepts has to agree
+    std::mt19937 rng(792980);
+    size_t mutated_fast = 0;
+    for (int round = 0; round < MUTATION_ROUNDS; round++) {
+        std::string line = mutate(rng, lines[rng() % lines.size()]);
+        if (!check(line, &fast_path)) {
+            printf("mutation differs: %s\n", line.c_str());
+            failures++;
+        }
+        mutated_fast += fast_path;
+    }
+    printf("mutations: %d rounds, %zu on the fast path\n", MUTATION_ROUNDS, mutated_fast);
+
+    timing(lines);
+
+    printf("%d failures\n", failures);
+    return failures ? 1 : 0;
+}
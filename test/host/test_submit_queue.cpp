@@ -0,0 +1,328 @@
+// Host test of the share submit path: SubmitQueue and SubmitTracker on their
+// own, then the pipeline against a slow pool on a socketpair. A result thread
+// hands shares over like ASIC_result_task, a sender thread batches them like
+// the stratum submit task, the pool reads slowly and answers every id, and a
+// receiver thread matches the results like StratumManager::dispatch. The
+// previous blocking submit of one share per write on the same pool is
+// measured for comparison.
+//
+//   make -C test/host test_submit_queue && ./test/host/test_submit_queue
+
+#include <atomic>
+#include <chrono>
+#include <stdio.h>
+#include <string.h>
+#include <sys/socket.h>
+#include <thread>
+#include <unistd.h>
+
+#include "stratum_api.h"
+#include "submit_queue.h"
+
+#define NUM_SHARES 1000
+#define SHARE_INTERVAL_US 1000
+#define POOL_STALL_EVERY 20    // reads between two stalls of the pool
+#define POOL_STALL_US 20000
+#define LINE_SIZE 512
+#define BATCH_SIZE (SUBMIT_QUEUE_SIZE * LINE_SIZE)
+
+static int failures = 0;
+
+#define CHECK(cond)                                                                                                            \
+    do {                                                                                                                       \
+        if (!(cond)) {                                                                                                         \
+            printf("FAIL %s:%d: %s\n", __FILE__, __LINE__, #cond);                                                            \
+            failures++;                                                                                                        \
+        }                                                                                                                      \
+    } while (0)
+
+static uint64_t now_us()
+{
+    return std::chrono::duration_cast<std::chrono::microseconds>(std::chrono::steady_clock::now().time_since_epoch())
+        .count();
+}
+
+static void test_queue()
+{
+    SubmitQueue queue;
+    queued_share out[SUBMIT_QUEUE_SIZE];
+
+    CHECK(queue.popAll(out, SUBMIT_QUEUE_SIZE) == 0);
+
+    // wraps around and keeps the order
+    for (int round = 0; round < 3; round++) {
+        for (uint32_t i = 0; i < 10; i++) {
+            CHECK(queue.push("job", "00000000", 1, round * 10 + i, 2));
+        }
+        CHECK(queue.popAll(out, 4) == 4);
+        CHECK(queue.popAll(out + 4, SUBMIT_QUEUE_SIZE) == 6);
+        for (uint32_t i = 0; i < 10; i++) {
+            CHECK(out[i].nonce == round * 10 + i);
+        }
+    }
+
+    // full queue drops the new share
+    for (int i = 0; i < SUBMIT_QUEUE_SIZE; i++) {
+        CHECK(queue.push("job", "00000000", 1, i, 2));
+    }
+    CHECK(!queue.push("job", "00000000", 1, 99, 2));
+    CHECK(queue.getDropped() == 1);
+    CHECK(queue.popAll(out, SUBMIT_QUEUE_SIZE) == SUBMIT_QUEUE_SIZE);
+    CHECK(out[SUBMIT_QUEUE_SIZE - 1].nonce == SUBMIT_QUEUE_SIZE - 1);
+
+    // strings are cut to the slot size
+    char long_id[2 * MAX_JOB_ID_LEN];
+    memset(long_id, 'a', sizeof(long_id) - 1);
+    long_id[sizeof(long_id) - 1] = '\0';
+    CHECK(queue.push(long_id, "00000000", 1, 0, 2));
+    CHECK(queue.popAll(out, 1) == 1);
+    CHECK(strlen(out[0].jobid) == MAX_JOB_ID_LEN - 1);
+}
+
+static void test_tracker()
+{
+    SubmitTracker tracker;
+    submit_stats stats;
+    double ms;
+
+    // results out of order, latency into the right bucket
+    tracker.sent(5, 0);
+    tracker.sent(6, 0);
+    tracker.sent(7, 0);
+    CHECK(tracker.completed(7, 30000, &ms) && ms == 30.0);
+    CHECK(tracker.completed(5, 10000, &ms) && ms == 10.0);
+    CHECK(!tracker.completed(5, 10000, &ms));
+    CHECK(!tracker.completed(3, 10000, &ms));
+    CHECK(tracker.completed(6, 9000000, &ms));
+    tracker.getStats(&stats);
+    CHECK(stats.count == 3 && stats.pending == 0 && stats.lost == 0);
+    CHECK(stats.counts[0] == 1); // 10 ms, bounds are inclusive
+    CHECK(stats.counts[2] == 1); // 30 ms
+    CHECK(stats.counts[SUBMIT_LATENCY_BUCKETS - 1] == 1);
+    CHECK(stats.maxMs == 9000.0 && stats.lastMs == 9000.0);
+
+    // a full table gives up on the oldest submit
+    for (int i = 0; i < MAX_PENDING_SUBMITS + 1; i++) {
+        tracker.sent(100 + i, 1000 + i);
+    }
+    tracker.getStats(&stats);
+    CHECK(stats.pending == MAX_PENDING_SUBMITS && stats.lost == 1);
+    CHECK(!tracker.completed(100, 2000, &ms));
+    CHECK(tracker.completed(101, 2000, &ms));
+
+    // expire and reset count as lost
+    tracker.expire(1000 + SUBMIT_TIMEOUT_US + 10);
+    tracker.getStats(&stats);
+    CHECK(stats.pending == 23 && stats.lost == 9);
+    tracker.reset();
+    tracker.getStats(&stats);
+    CHECK(stats.pending == 0 && stats.lost == 32);
+}
+
+// reads what the miner sends, stalls now and then like a congested link and
+// answers every submit
+static void slow_pool(int sock, std::atomic<bool> *done)
+{
+    int reads = 0;
+    char buffer[256];
+    char line[512];
+    size_t line_len = 0;
+    while (!done->load()) {
+        ssize_t n = recv(sock, buffer, sizeof(buffer), 0);
+        if (n <= 0) {
+            break;
+        }
+        for (ssize_t i = 0; i < n; i++) {
+            if (buffer[i] != '\n') {
+                if (line_len < sizeof(line) - 1) {
+                    line[line_len++] = buffer[i];
+                }
+                continue;
+            }
+            line[line_len] = '\0';
+            line_len = 0;
+            // the setup messages aren't answered, only the submits
+            int id;
+            if (sscanf(line, "{\"id\": %d", &id) == 1 && id > STRATUM_ID_SUGGEST_DIFFICULTY) {
+                char result[64];
+                int len = snprintf(result, sizeof(result), "{\"id\":%d,\"result\":true,\"error\":null}\n", id);
+                if (write(sock, result, len) != len) {
+                    return;
+                }
+            }
+        }
+        if (++reads % POOL_STALL_EVERY == 0) {
+            usleep(POOL_STALL_US);
+        }
+    }
+}
+
+static void small_buffers(int sock)
+{
+    int size = 2048;
+    setsockopt(sock, SOL_SOCKET, SO_SNDBUF, &size, sizeof(size));
+    setsockopt(sock, SOL_SOCKET, SO_RCVBUF, &size, sizeof(size));
+}
+
+struct Run {
+    uint64_t max_handover_us;
+    double avg_handover_us;
+    submit_stats stats;
+    uint32_t dropped;
+    uint32_t writes;
+};
+
+static Run run(bool pipelined)
+{
+    int socks[2];
+    socketpair(AF_UNIX, SOCK_STREAM, 0, socks);
+    small_buffers(socks[0]);
+    small_buffers(socks[1]);
+
+    StratumApi api;
+    SubmitQueue queue;
+    SubmitTracker tracker;
+    std::atomic<bool> done(false);
+    std::atomic<uint32_t> writes(0);
+    Run result;
+    memset(&result, 0, sizeof(result));
+
+    std::thread pool(slow_pool, socks[1], &done);
+
+    // submits get the ids after the setup messages like on the miner
+    api.subscribe(socks[0], "host", "BM1370");
+    api.configureVersionRolling(socks[0]);
+    api.authenticate(socks[0], "user", "x");
+    api.suggestDifficulty(socks[0], 1000);
+
+    // the stratum task matching the results
+    std::thread receiver([&]() {
+        size_t len;
+        const char *line;
+        while ((line = api.receiveJsonRpcLine(socks[0], &len))) {
+            StratumApiV1Message message;
+            memset(&message, 0, sizeof(message));
+            if (StratumApi::parse(&message, line) && message.method == STRATUM_RESULT) {
+                tracker.completed((int) message.message_id, now_us(), NULL);
+            }
+            StratumApi::freeMessage(&message);
+        }
+    });
+
+    std::thread sender;
+    if (pipelined) {
+        sender = std::thread([&]() {
+            queued_share shares[SUBMIT_QUEUE_SIZE];
+            int ids[SUBMIT_QUEUE_SIZE];
+            static char batch[BATCH_SIZE];
+            while (!done.load()) {
+                int count = queue.popAll(shares, SUBMIT_QUEUE_SIZE);
+                if (!count) {
+                    usleep(100);
+                    continue;
+                }
+                size_t len = 0;
+                for (int i = 0; i < count; i++) {
+                    len += api.formatSubmit(batch + len, sizeof(batch) - len, &ids[i], "user", shares[i].jobid,
+                                            shares[i].extranonce2, shares[i].ntime, shares[i].nonce, shares[i].version);
+                }
+                uint64_t now = now_us();
+                for (int i = 0; i < count; i++) {
+                    tracker.sent(ids[i], now);
+                }
+                api.sendLines(socks[0], batch, len);
+                writes++;
+            }
+        });
+    }
+
+    // ASIC_result_task finding shares
+    uint64_t total_us = 0;
+    for (uint32_t i = 0; i < NUM_SHARES; i++) {
+        uint64_t start = now_us();
+        if (pipelined) {
+            queue.push("1a2b", "0000000012345678", 0x6543210f, i, 0x00002000);
+        } else {
+            // the previous inline submit, one line per write, tracked only for the comparison
+            char line[LINE_SIZE];
+            int id;
+            size_t len = api.formatSubmit(line, sizeof(line), &id, "user", "1a2b", "0000000012345678", 0x6543210f, i, 0x00002000);
+            tracker.sent(id, start);
+            api.sendLines(socks[0], line, len);
+            writes++;
+        }
+        uint64_t us = now_us() - start;
+        total_us += us;
+        if (us > result.max_handover_us) {
+            result.max_handover_us = us;
+        }
+        usleep(SHARE_INTERVAL_US);
+    }
+
+    // wait for the last results
+    for (int i = 0; i < 500; i++) {
+        tracker.getStats(&result.stats);
+        if (result.stats.count + queue.getDropped() == NUM_SHARES) {
+            break;
+        }
+        usleep(10000);
+    }
+
+    done.store(true);
+    if (sender.joinable()) {
+        sender.join();
+    }
+    shutdown(socks[0], SHUT_RDWR);
+    shutdown(socks[1], SHUT_RDWR);
+    pool.join();
+    receiver.join();
+    close(socks[0]);
+    close(socks[1]);
+
+    tracker.getStats(&result.stats);
+    result.avg_handover_us = (double) total_us / NUM_SHARES;
+    result.dropped = queue.getDropped();
+    result.writes = writes.load();
+    return result;
+}
+
+static void print_run(const char *name, const Run *r)
+{
+    printf("%-10s handover avg %8.1f us max %8llu us, %4u writes, %3u results avg %7.1f ms max %7.1f ms, "
+           "lost %u dropped %u\n",
+           name, r->avg_handover_us, (unsigned long long) r->max_handover_us, r->writes, r->stats.count,
+           r->stats.count ? r->stats.totalMs / r->stats.count : 0.0, r->stats.maxMs, r->stats.lost, r->dropped);
+    printf("%-10s latency", "");
+    for (int i = 0; i < SUBMIT_LATENCY_BUCKETS; i++) {
+        if (i < SUBMIT_LATENCY_BUCKETS - 1) {
+            printf(" <=%u:%u", SUBMIT_LATENCY_BUCKET_MS[i], r->stats.counts[i]);
+        } else {
+            printf(" >:%u", r->stats.counts[i]);
+        }
+    }
+    printf("\n");
+}
+
+int main()
+{
+    test_queue();
+    test_tracker();
+
+    Run blocking = run(false);
+    Run pipelined = run(true);
+    print_run("blocking", &blocking);
+    print_run("pipelined", &pipelined);
+
+    // every share got its result matched by id, none was lost or dropped
+    CHECK(pipelined.stats.count + pipelined.dropped == NUM_SHARES);
+    CHECK(pipelined.stats.lost == 0 && pipelined.stats.pending == 0);
+    CHECK(pipelined.writes < NUM_SHARES);
+    CHECK(pipelined.max_handover_us < blocking.max_handover_us);
+
+    if (failures) {
+        printf("%d failures\n", failures);
+        return 1;
+    }
+    printf("ok\n");
+    return 0;
+}